@@ -1,11 +1,13 @@
 from datetime import datetime, time, timedelta
 from zoneinfo import ZoneInfo
 
+from audio_policy.flag_matcher import get_compiled_flag_condition
 from audio_policy.models import FlagCondition
 from config.validation import TimezoneUtils
 from data_analysis.models import AudioSegments
-from django.db.models import Case, When, Value, FloatField
-from django.db.models.functions import Cast
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
+from data_analysis.services.segment_flags import SegmentFlagService
+from django.db.models import Q
 from shift_analysis.models import Shift, PredefinedFilter
 from shift_analysis.utils import get_shift_datetime_filter, get_predefined_filter_datetime_filter
 import re
@@ -104,17 +106,78 @@ class AudioSegmentFilterV3Utils:
             yield day
             day += timedelta(days=1)
 
+    # filter_segments keys that only narrow by status, which the occupancy index tracks itself
+    INDEXED_FILTER_KEYS = ("status", "slot_date", "slot_index")
+
+    @staticmethod
+    def can_use_occupancy_index(filter_data: dict, shift_id=None, predefined_filter_id=None) -> bool:
+        """True when the segments are the channel's range narrowed by status at most"""
+        if shift_id or predefined_filter_id:
+            return False
+        return not any(
+            value for key, value in (filter_data or {}).items()
+            if key not in AudioSegmentFilterV3Utils.INDEXED_FILTER_KEYS
+        )
+
+    @staticmethod
+    def slot_masks(segments, channel, start_datetime: datetime, end_datetime: datetime,
+                   status: str | None = None, use_index: bool = False) -> dict:
+        """
+        {local day: 24-bit mask} of the hour slots holding segments, for the days of the range.
+
+        With use_index the masks come from the channel's HourOccupancyIndex; only the slots cut
+        by the range ends are checked against `segments`, with one grouped query. Otherwise
+        `segments` (any filters applied) is grouped by hour in one query.
+        """
+        tz = AudioSegmentFilterV3Utils._channel_tz(channel)
+        days = list(AudioSegmentFilterV3Utils.iter_days_in_range(channel, start_datetime, end_datetime))
+
+        if not use_index:
+            masks = HourOccupancyIndex.masks_from_hours(HourOccupancyIndex.grouped_hours(segments, tz), tz)
+            return {day: masks[day][0] | masks[day][1] for day in days if day in masks}
+
+        day_masks = HourOccupancyIndex.get_day_masks(channel, days)
+        result = {}
+        partial_slots = []
+        for day in days:
+            active, inactive = day_masks.get(day, (0, 0))
+            mask = active if status == "active" else inactive if status == "inactive" else active | inactive
+            if day in (days[0], days[-1]):
+                for hour, (window_start, window_end) in enumerate(HourOccupancyIndex.day_windows(day, tz)):
+                    if window_start >= start_datetime and window_end <= end_datetime:
+                        continue
+                    mask &= ~(1 << hour)
+                    if window_start < end_datetime and window_end > start_datetime:
+                        partial_slots.append((day, hour, max(window_start, start_datetime), min(window_end, end_datetime)))
+            result[day] = mask
+
+        if partial_slots:
+            # Slots cut by the range ends: the index counts the whole slot, so ask the range query
+            edge_filter = Q()
+            for _, _, edge_start, edge_end in partial_slots:
+                edge_filter |= Q(start_time__gte=edge_start, start_time__lt=edge_end)
+            edge_masks = HourOccupancyIndex.masks_from_hours(
+                HourOccupancyIndex.grouped_hours(segments.filter(edge_filter), tz), tz
+            )
+            for day, hour, _, _ in partial_slots:
+                day_edge = edge_masks.get(day, (0, 0))
+                if (day_edge[0] | day_edge[1]) & (1 << hour):
+                    result[day] |= 1 << hour
+
+        return {day: mask for day, mask in result.items() if mask}
+
     @staticmethod
-    def find_first_slot_with_data(segments, channel, start_datetime: datetime, end_datetime: datetime):
+    def find_first_slot_with_data(segments, channel, start_datetime: datetime, end_datetime: datetime,
+                                  slot_masks: dict | None = None):
+        if slot_masks is None:
+            slot_masks = AudioSegmentFilterV3Utils.slot_masks(segments, channel, start_datetime, end_datetime)
         for day in AudioSegmentFilterV3Utils.iter_days_in_range(
             channel, start_datetime, end_datetime
         ):
-            slot_date = day.strftime("%Y%m%d")
-            for slot_index in range(24):
-                if AudioSegmentFilterV3Utils.filter_by_slot(
-                    segments, channel, slot_date, slot_index
-                ).exists():
-                    return slot_date, slot_index
+            mask = slot_masks.get(day, 0)
+            if mask:
+                # Lowest set bit: the earliest slot of the day
+                return day.strftime("%Y%m%d"), (mask & -mask).bit_length() - 1
         return None, None
 
     @staticmethod
@@ -132,24 +195,20 @@ class AudioSegmentFilterV3Utils:
         end_datetime: datetime,
         slot_date: str,
         slot_index: int,
+        slot_masks: dict | None = None,
     ):
         tz = AudioSegmentFilterV3Utils._channel_tz(channel)
-        hours = []
-        for hour in range(24):
-            has_data = AudioSegmentFilterV3Utils.filter_by_slot(
-                segments, channel, slot_date, hour
-            ).exists()
-            hours.append({"slot": hour, "has_data": has_data})
+        if slot_masks is None:
+            slot_masks = AudioSegmentFilterV3Utils.slot_masks(segments, channel, start_datetime, end_datetime)
+
+        day_mask = slot_masks.get(datetime.strptime(slot_date, "%Y%m%d").date(), 0)
+        hours = [{"slot": hour, "has_data": bool(day_mask & (1 << hour))} for hour in range(24)]
 
         dates_with_data = []
         for day in AudioSegmentFilterV3Utils.iter_days_in_range(
             channel, start_datetime, end_datetime
         ):
-            day_str = day.strftime("%Y%m%d")
-            if any(
-                AudioSegmentFilterV3Utils.filter_by_slot(segments, channel, day_str, hour).exists()
-                for hour in range(24)
-            ):
+            if slot_masks.get(day):
                 midnight = datetime.combine(day, time.min, tzinfo=tz)
                 dates_with_data.append(
                     TimezoneUtils.convert_to_channel_tz(midnight, channel.timezone)
@@ -193,19 +252,11 @@ class AudioSegmentFilterV3Utils:
         sentiment_min = filter_data.get("sentiment_min")
         sentiment_max = filter_data.get("sentiment_max")
 
-        if sentiment_min is not None or sentiment_max is not None:
-            segments = segments.annotate(sentiment_score=Case(
-                When(
-                    transcription_detail__analysis__sentiment__regex=r'^-?\d+(\.\d+)?$',
-                    then=Cast('transcription_detail__analysis__sentiment', FloatField())
-                ),
-                    default=Value(None),
-                output_field=FloatField()
-            ))
-            if sentiment_min is not None:
-                segments = segments.filter(sentiment_score__gte=sentiment_min)
-            if sentiment_max is not None:
-                segments = segments.filter(sentiment_score__lte=sentiment_max)
+        # sentiment_score is the numeric sentiment parsed when the analysis was stored (NULL when not numeric)
+        if sentiment_min is not None:
+            segments = segments.filter(transcription_detail__analysis__sentiment_score__gte=sentiment_min)
+        if sentiment_max is not None:
+            segments = segments.filter(transcription_detail__analysis__sentiment_score__lte=sentiment_max)
 
         if filter_data.get("search_in"):
             search_in = filter_data.get("search_in")
@@ -228,18 +279,6 @@ class AudioSegmentFilterV3Utils:
 
 
     # Helper functions Flag Conditions
-    @staticmethod
-    def _flatten_nested_list(nested_list):
-        if not nested_list:
-            return []
-        flattened = []
-        for item in nested_list:
-            if isinstance(item, list):
-                flattened.extend(AudioSegmentFilterV3Utils._flatten_nested_list(item))
-            elif item:
-                flattened.append(str(item))
-        return flattened
-
     @staticmethod
     def get_active_flag_condition(channel):
         try:
@@ -269,6 +308,7 @@ class AudioSegmentFilterV3Utils:
             analysis = {
                 "summary": analysis_obj.summary,
                 "sentiment": analysis_obj.sentiment,
+                "sentiment_score": analysis_obj.sentiment_score,
                 "iab_topics": analysis_obj.iab_topics,
                 "bucket_prompt": analysis_obj.bucket_prompt,
                 "general_topics": analysis_obj.general_topics,
@@ -281,131 +321,22 @@ class AudioSegmentFilterV3Utils:
         Evaluate FlagCondition rules for an AudioSegments instance.
         Returns flag entries keyed by condition type.
         """
-        flags = {}
         transcription, analysis = AudioSegmentFilterV3Utils._segment_text_fields(segment)
-
-        def build_flag_entry(triggered, message=""):
-            return {"flagged": bool(triggered), "message": message}
-
-        def check_keywords(text, keyword_groups):
-            if not text or not keyword_groups:
-                return False, ""
-            text_lower = text.lower()
-            matched = []
-            for group in keyword_groups:
-                if isinstance(group, list):
-                    for kw in group:
-                        if kw and kw.lower() in text_lower:
-                            matched.append(group)
-                            break
-            if matched:
-                display_matches = [", ".join(g) for g in matched[:3]]
-                return True, f"Found keywords: {', '.join(display_matches)}"
-            return False, ""
-
-        t_trig, t_msg = check_keywords(
-            transcription.get("transcript", ""),
-            flag_condition.transcription_keywords,
-        )
-        flags["transcription_keywords"] = build_flag_entry(t_trig, t_msg)
-
-        s_trig, s_msg = check_keywords(
-            analysis.get("summary", ""),
-            flag_condition.summary_keywords,
-        )
-        flags["summary_keywords"] = build_flag_entry(s_trig, s_msg)
-
-        sentiment_str = str(analysis.get("sentiment") or "")
-        sentiment_value = None
-        match = re.search(r"-?\d+(\.\d+)?", sentiment_str)
-        if match:
-            try:
-                sentiment_value = float(match.group())
-            except ValueError:
-                pass
-
-        triggered = False
-        message = ""
-        if sentiment_value is not None:
-            if (
-                flag_condition.target_sentiments is not None
-                and sentiment_value == flag_condition.target_sentiments
-            ):
-                triggered = True
-                message = "Matches target sentiment"
-
-            ranges = []
-            if (
-                flag_condition.sentiment_min_lower is not None
-                or flag_condition.sentiment_min_upper is not None
-            ):
-                ranges.append(
-                    (
-                        flag_condition.sentiment_min_lower or float("-inf"),
-                        flag_condition.sentiment_min_upper or float("inf"),
-                    )
-                )
-            if (
-                flag_condition.sentiment_max_lower is not None
-                or flag_condition.sentiment_max_upper is not None
-            ):
-                ranges.append(
-                    (
-                        flag_condition.sentiment_max_lower or float("-inf"),
-                        flag_condition.sentiment_max_upper or float("inf"),
-                    )
-                )
-
-            for lower, upper in ranges:
-                if lower == 0.0 and upper == 100.0:
-                    continue
-                if lower <= sentiment_value <= upper:
-                    triggered = True
-                    message = f"Sentiment {sentiment_value} in range [{lower}, {upper}]"
-                    break
-
-        flags["sentiment"] = build_flag_entry(triggered, message)
-
-        def check_list_overlap(segment_list_or_str, condition_list, label):
-            if not condition_list:
-                return False, ""
-            target_flat = AudioSegmentFilterV3Utils._flatten_nested_list(condition_list)
-            source_val = segment_list_or_str
-            if not isinstance(source_val, list):
-                source_val = [str(source_val)] if source_val else []
-            source_flat = AudioSegmentFilterV3Utils._flatten_nested_list(source_val)
-            source_str = " ".join(source_flat).lower()
-            matched = [topic for topic in target_flat if topic and topic.lower() in source_str]
-            if matched:
-                return True, f"Found {label}: {', '.join(matched[:5])}"
-            return False, ""
-
-        i_trig, i_msg = check_list_overlap(
-            analysis.get("iab_topics"),
-            flag_condition.iab_topics,
-            "IAB topics",
-        )
-        flags["iab_topics"] = build_flag_entry(i_trig, i_msg)
-
-        b_trig, b_msg = check_list_overlap(
-            analysis.get("bucket_prompt"),
-            flag_condition.bucket_prompt,
-            "bucket prompts",
-        )
-        flags["bucket_prompt"] = build_flag_entry(b_trig, b_msg)
-
-        g_trig, g_msg = check_list_overlap(
-            analysis.get("general_topics"),
-            flag_condition.general_topics,
-            "general topics",
-        )
-        flags["general_topics"] = build_flag_entry(g_trig, g_msg)
-
-        return flags
+        return get_compiled_flag_condition(flag_condition).evaluate(transcription, analysis)
 
     @staticmethod
     def build_segment_flags(segment, flag_condition=None):
         """Build flag payload for a segment from FlagCondition only."""
         if not flag_condition:
             return {}
-        return AudioSegmentFilterV3Utils.evaluate_flag_conditions(segment, flag_condition)
\ No newline at end of file
+        stored = SegmentFlagService.current_result_flags(segment, flag_condition)
+        if stored is not None:
+            return stored
+        return AudioSegmentFilterV3Utils.evaluate_flag_conditions(segment, flag_condition)
+
+    @staticmethod
+    def filter_flagged(segments, flag_condition=None):
+        """Segments whose stored flag result for the condition is flagged; rows missing one are evaluated in Python"""
+        if not flag_condition:
+            return segments.none()
+        return segments.filter(SegmentFlagService.current_flagged_filter(segments, flag_condition))
\ No newline at end of file
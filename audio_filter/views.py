@@ -263,17 +263,33 @@ class AudioSegmentFilterV3View(APIView):
             "duration_seconds_max": serializer.validated_data.get("duration_seconds_max"),
             "sentiment_min": serializer.validated_data.get("sentiment_min"),
             "sentiment_max": serializer.validated_data.get("sentiment_max"),
+            "show_flagged_only": serializer.validated_data.get("show_flagged_only"),
         }
         audio_segments = AudioSegmentFilterV3Utils.filter_segments(audio_segments, filter_data)
+        flag_condition = AudioSegmentFilterV3Utils.get_active_flag_condition(channel)
+        if filter_data.get("show_flagged_only"):
+            audio_segments = AudioSegmentFilterV3Utils.filter_flagged(audio_segments, flag_condition)
 
         is_search_mode = filter_data.get("search_text") and filter_data.get("search_in")
         pagination = None
         if not is_search_mode:
+            slot_masks = AudioSegmentFilterV3Utils.slot_masks(
+                audio_segments,
+                channel,
+                start_datetime,
+                end_datetime,
+                status=filter_data.get("status"),
+                use_index=AudioSegmentFilterV3Utils.can_use_occupancy_index(
+                    filter_data,
+                    serializer.validated_data.get("shift_id"),
+                    serializer.validated_data.get("predefined_filter_id"),
+                ),
+            )
             slot_date = serializer.validated_data.get("slot_date")
             slot_index = serializer.validated_data.get("slot_index")
             if slot_date is None or slot_index is None:
                 slot_date, slot_index = AudioSegmentFilterV3Utils.find_first_slot_with_data(
-                    audio_segments, channel, start_datetime, end_datetime
+                    audio_segments, channel, start_datetime, end_datetime, slot_masks
                 )
                 if slot_date is None:
                     slot_date, slot_index = AudioSegmentFilterV3Utils.default_slot(
@@ -286,13 +302,13 @@ class AudioSegmentFilterV3View(APIView):
                 end_datetime,
                 slot_date,
                 slot_index,
+                slot_masks,
             )
             audio_segments = AudioSegmentFilterV3Utils.filter_by_slot(
                 audio_segments, channel, slot_date, slot_index
             )
 
-        audio_segments = audio_segments.order_by("start_time")
-        flag_condition = AudioSegmentFilterV3Utils.get_active_flag_condition(channel)
+        audio_segments = audio_segments.select_related("flag_result").order_by("start_time")
         data = AudioSegmentFilterV3SegmentSerializer(
             audio_segments,
             many=True,
@@ -16,6 +16,7 @@ from data_analysis.models import (
     AudioSegments as AudioSegmentsModel,
 )
 from data_analysis.services.audio_download import ACRCloudAudioDownloader
+from data_analysis.services.audio_merge import LocalAudioMerger
 from data_analysis.services.segment_range_service import create_segment_download_and_queue
 from data_analysis.serializers import AudioSegmentsSerializer
 
@@ -34,7 +35,7 @@ def _parse_dt(value):
 
 
 def _create_merged_segment(channel, start_dt, end_dt, source_segment_ids=None):
-    """Create a merged segment with source='user_merged' and download audio"""
+    """Create a merged segment with source='user_merged' and build its audio (local files first, then ACRCloud)"""
     duration_seconds = int((end_dt - start_dt).total_seconds())
     
     # Build file_name and file_path
@@ -79,15 +80,21 @@ def _create_merged_segment(channel, start_dt, end_dt, source_segment_ids=None):
     settings = GeneralSettingService.get_active_setting(channel=channel, include_buckets=False)
     if not settings or not settings.acr_cloud_api_key:
         raise ValueError("ACRCloud API key not configured for channel")
-    # Download audio
-    media_url = ACRCloudAudioDownloader.download_audio(
-        api_key=settings.acr_cloud_api_key,
-        project_id=channel.project_id,
-        channel_id=channel.channel_id,
-        start_time=start_dt,
-        duration_seconds=duration_seconds,
-        filepath=file_path
-    )
+    # Build the audio from source files already on disk, downloading only uncovered gaps
+    try:
+        media_url = LocalAudioMerger.merge_to_file(channel, start_dt, end_dt, file_path, settings.acr_cloud_api_key)
+    except Exception as e:
+        print(f"Local merge failed for {file_path}, downloading from ACRCloud: {e}")
+        media_url = None
+    if not media_url:
+        media_url = ACRCloudAudioDownloader.download_audio(
+            api_key=settings.acr_cloud_api_key,
+            project_id=channel.project_id,
+            channel_id=channel.channel_id,
+            start_time=start_dt,
+            duration_seconds=duration_seconds,
+            filepath=file_path
+        )
     created_segment.is_audio_downloaded = True
     created_segment.save()
     
@@ -0,0 +1,228 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from audio_policy.models import FlagCondition
+
+
+SENTIMENT_NUMBER_RE = re.compile(r'-?\d+(\.\d+)?')
+# Below this many patterns, one `in` check per pattern beats a pure Python automaton scan
+AUTOMATON_MIN_PATTERNS = 24
+
+
+def flatten_nested_list(nested_list) -> List[str]:
+    """[["item1"], ["item2", ["item3"]]] -> ["item1", "item2", "item3"]; falsy entries are dropped"""
+    if not nested_list:
+        return []
+    flattened = []
+    for item in nested_list:
+        if isinstance(item, list):
+            flattened.extend(flatten_nested_list(item))
+        elif item:
+            flattened.append(str(item))
+    return flattened
+
+
+class KeywordAutomaton:
+    """
+    Case-insensitive multi-pattern substring matcher (Aho-Corasick).
+
+    find(text) returns the indexes of the patterns occurring in text.lower() with one pass over the
+    text, whatever the number of patterns. The goto/failure links are resolved into a transition
+    table over the patterns' alphabet, so each character costs one dict lookup. Small pattern
+    sets skip the automaton and use one substring check per pattern.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = [pattern.lower() for pattern in patterns]
+        self.use_automaton = len(self.patterns) >= AUTOMATON_MIN_PATTERNS
+        if self.use_automaton:
+            self._build()
+
+    def _build(self):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(index)
+
+        # Breadth-first: a state's failure target is shallower, so its transitions are final already
+        transitions: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = list(goto[0].values())
+        fail = [0] * len(goto)
+        position = 0
+        while position < len(queue):
+            state = queue[position]
+            position += 1
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            table = dict(transitions[fail[state]])
+            for char, next_state in goto[state].items():
+                fail[next_state] = transitions[fail[state]].get(char, 0) if state else 0
+                table[char] = next_state
+                queue.append(next_state)
+            transitions[state] = table
+
+        self._transitions = transitions
+        self._outputs = [tuple(output) for output in outputs]
+
+    def find(self, text: str) -> set:
+        """Indexes of the patterns found in the text (the empty pattern never matches)"""
+        if not text:
+            return set()
+        text = text.lower()
+        if not self.use_automaton:
+            return {index for index, pattern in enumerate(self.patterns) if pattern and pattern in text}
+        found = set()
+        transitions, outputs = self._transitions, self._outputs
+        state = 0
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+class CompiledFlagCondition:
+    """
+    A FlagCondition prepared for evaluating many segments: keyword groups and topic lists are
+    flattened and compiled into automatons once, sentiment ranges resolved once. evaluate()
+    returns the same flag entries as the per-segment checks it replaces.
+    """
+
+    def __init__(self, flag_condition: FlagCondition):
+        self.transcription_keywords = self._compile_keyword_groups(flag_condition.transcription_keywords)
+        self.summary_keywords = self._compile_keyword_groups(flag_condition.summary_keywords)
+        self.iab_topics = self._compile_topics(flag_condition.iab_topics)
+        self.bucket_prompt = self._compile_topics(flag_condition.bucket_prompt)
+        self.general_topics = self._compile_topics(flag_condition.general_topics)
+        self.target_sentiment = flag_condition.target_sentiments
+        self.sentiment_ranges = self.get_sentiment_ranges(flag_condition)
+
+    @staticmethod
+    def get_sentiment_ranges(flag_condition) -> List[Tuple[float, float]]:
+        """The (lower, upper) sentiment ranges that flag a segment; open bounds are -inf / inf"""
+        ranges = []
+        if flag_condition.sentiment_min_lower is not None or flag_condition.sentiment_min_upper is not None:
+            ranges.append((flag_condition.sentiment_min_lower or float('-inf'), flag_condition.sentiment_min_upper or float('inf')))
+        if flag_condition.sentiment_max_lower is not None or flag_condition.sentiment_max_upper is not None:
+            ranges.append((flag_condition.sentiment_max_lower or float('-inf'), flag_condition.sentiment_max_upper or float('inf')))
+        # Skip default 0-100 ranges which flag everything
+        return [(lower, upper) for lower, upper in ranges if not (lower == 0.0 and upper == 100.0)]
+
+    @staticmethod
+    def _compile_keyword_groups(keyword_groups):
+        """(groups, automaton, group index per pattern); only list groups take part, as before"""
+        groups = [group for group in (keyword_groups or []) if isinstance(group, list)]
+        patterns, owners = [], []
+        for group_index, group in enumerate(groups):
+            for keyword in group:
+                if keyword:
+                    patterns.append(keyword)
+                    owners.append(group_index)
+        if not patterns:
+            return None
+        return groups, KeywordAutomaton(patterns), owners
+
+    @staticmethod
+    def _compile_topics(condition_list):
+        targets = flatten_nested_list(condition_list)
+        if not targets:
+            return None
+        return targets, KeywordAutomaton(targets)
+
+    @staticmethod
+    def _entry(triggered, message=''):
+        return {'flagged': bool(triggered), 'message': message}
+
+    @staticmethod
+    def _check_keywords(text, compiled):
+        if not text or compiled is None:
+            return CompiledFlagCondition._entry(False)
+        groups, automaton, owners = compiled
+        matched_groups = sorted({owners[index] for index in automaton.find(text)})
+        if not matched_groups:
+            return CompiledFlagCondition._entry(False)
+        display_matches = [', '.join(groups[index]) for index in matched_groups[:3]]
+        return CompiledFlagCondition._entry(True, f"Found keywords: {', '.join(display_matches)}")
+
+    @staticmethod
+    def _check_topics(source, compiled, label):
+        if compiled is None:
+            return CompiledFlagCondition._entry(False)
+        targets, automaton = compiled
+        if not isinstance(source, list):
+            source = [str(source)] if source else []
+        matched = [targets[index] for index in sorted(automaton.find(' '.join(flatten_nested_list(source))))]
+        if not matched:
+            return CompiledFlagCondition._entry(False)
+        return CompiledFlagCondition._entry(True, f"Found {label}: {', '.join(matched[:5])}")
+
+    def _check_sentiment(self, sentiment, sentiment_score=None):
+        # The stored sentiment_score when there is one; the first number of the text otherwise
+        sentiment_value = sentiment_score
+        match = SENTIMENT_NUMBER_RE.search(str(sentiment or '')) if sentiment_value is None else None
+        if match:
+            try:
+                sentiment_value = float(match.group())
+            except ValueError:
+                pass
+
+        triggered = False
+        message = ''
+        if sentiment_value is not None:
+            if self.target_sentiment is not None and sentiment_value == self.target_sentiment:
+                triggered = True
+                message = "Matches target sentiment"
+            for lower, upper in self.sentiment_ranges:
+                if lower <= sentiment_value <= upper:
+                    triggered = True
+                    message = f"Sentiment {sentiment_value} in range [{lower}, {upper}]"
+                    break
+        return self._entry(triggered, message)
+
+    def evaluate(self, transcription: dict, analysis: dict) -> dict:
+        """Flag entries keyed by condition type for a segment's transcription and analysis fields"""
+        transcription = transcription or {}
+        analysis = analysis or {}
+        return {
+            'transcription_keywords': self._check_keywords(transcription.get('transcript', ''), self.transcription_keywords),
+            'summary_keywords': self._check_keywords(analysis.get('summary', ''), self.summary_keywords),
+            'sentiment': self._check_sentiment(analysis.get('sentiment'), analysis.get('sentiment_score')),
+            'iab_topics': self._check_topics(analysis.get('iab_topics'), self.iab_topics, "IAB topics"),
+            'bucket_prompt': self._check_topics(analysis.get('bucket_prompt'), self.bucket_prompt, "bucket prompts"),
+            'general_topics': self._check_topics(analysis.get('general_topics'), self.general_topics, "general topics"),
+        }
+
+
+# {flag condition pk: (updated_at, compiled)}, per process
+_COMPILED_FLAG_CONDITIONS: Dict[int, Tuple[object, CompiledFlagCondition]] = {}
+
+
+def clear_compiled_flag_conditions() -> None:
+    _COMPILED_FLAG_CONDITIONS.clear()
+
+
+def get_compiled_flag_condition(flag_condition: FlagCondition) -> Optional[CompiledFlagCondition]:
+    """
+    The compiled form of the condition, reused until the condition's updated_at changes.
+    Unsaved conditions are compiled on every call.
+    """
+    if flag_condition is None:
+        return None
+    if flag_condition.pk is None:
+        return CompiledFlagCondition(flag_condition)
+    cached = _COMPILED_FLAG_CONDITIONS.get(flag_condition.pk)
+    if cached is not None and cached[0] == flag_condition.updated_at:
+        return cached[1]
+    compiled = CompiledFlagCondition(flag_condition)
+    _COMPILED_FLAG_CONDITIONS[flag_condition.pk] = (flag_condition.updated_at, compiled)
+    return compiled
@@ -67,6 +67,21 @@ class FlagCondition(models.Model):
     def __str__(self):
         return f"Flag Condition for {self.channel.name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Stored SegmentFlagResult rows carry the old updated_at; rewrite them in the background
+        from data_analysis.services.segment_flags import SegmentFlagService
+
+        SegmentFlagService.schedule_recompute(self.channel_id)
+
+    def delete(self, *args, **kwargs):
+        channel_id = self.channel_id
+        result = super().delete(*args, **kwargs)
+        from data_analysis.services.segment_flags import SegmentFlagService
+
+        SegmentFlagService.schedule_recompute(channel_id)
+        return result
+
     class Meta:
         ordering = ['-created_at']
 
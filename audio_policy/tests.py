@@ -1,3 +1,80 @@
+import random
+from datetime import datetime, timezone as dt_timezone
+
 from django.test import TestCase
 
-# Create your tests here.
+from audio_filter.utils import AudioSegmentFilterV3Utils
+from audio_policy.flag_matcher import (
+    CompiledFlagCondition, KeywordAutomaton, clear_compiled_flag_conditions, get_compiled_flag_condition,
+)
+from audio_policy.models import FlagCondition
+from data_analysis.models import AudioSegments, TranscriptionAnalysis
+from data_analysis.serializers import AudioSegmentsSerializer
+from data_analysis.v2.service import check_flag_conditions
+from data_analysis.benchmarks.flag_matcher import (
+    build_synthetic_condition, build_synthetic_segments as build_synthetic_flag_segments, run_compiled as run_flag_matcher,
+    run_reference as run_flag_reference,
+)
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class CompiledFlagConditionTestCase(AnalysisFixtureMixin, TestCase):
+    """The compiled keyword/topic matcher returns the flags of the per-keyword substring checks"""
+
+    def setUp(self):
+        clear_compiled_flag_conditions()
+
+    def test_automaton_finds_every_occurring_pattern(self):
+        rng = random.Random(2)
+        patterns = ['he', 'she', 'his', 'hers', 'Über', 'a', 'ab', 'bab', 'aaa', ''] + [
+            ''.join(rng.choice('abhesr') for _ in range(rng.randint(1, 5))) for _ in range(40)
+        ]
+        automaton = KeywordAutomaton(patterns)
+        self.assertTrue(automaton.use_automaton)
+        texts = ['ushers', 'ÜBERall', '', 'xyz'] + [''.join(rng.choice('abhesrxU') for _ in range(60)) for _ in range(50)]
+        for text in texts:
+            expected = {i for i, pattern in enumerate(patterns) if pattern and pattern.lower() in text.lower()}
+            self.assertEqual(automaton.find(text), expected, text)
+            self.assertEqual(KeywordAutomaton(patterns[:5]).find(text), {i for i in expected if i < 5})
+
+    def test_matches_reference_evaluation(self):
+        for group_count in (5, 300):
+            flag_condition = build_synthetic_condition(group_count, seed=group_count)
+            flag_condition.summary_keywords = flag_condition.summary_keywords + ['not a group', [], ['']]
+            segments = build_synthetic_flag_segments(count=150, words=80, seed=group_count)
+            segments.append(({'transcript': None}, {}))
+            segments.append(({'transcript': 'x ' + flag_condition.transcription_keywords[-1][0].upper()}, {}))
+            segments.append(({}, {'iab_topics': [['Nested'], 'list'], 'sentiment': 'x 15.5 y'}))
+            expected = run_flag_reference(segments, flag_condition)
+            self.assertEqual(run_flag_matcher(segments, CompiledFlagCondition(flag_condition)), expected)
+            self.assertTrue(any(flags['transcription_keywords']['flagged'] for flags in expected))
+
+    def test_compiled_condition_cached_by_updated_at(self):
+        channel = self.create_channel()
+        flag_condition = FlagCondition.objects.create(channel=channel, transcription_keywords=[['rain']])
+        compiled = get_compiled_flag_condition(flag_condition)
+        self.assertIs(get_compiled_flag_condition(FlagCondition.objects.get(pk=flag_condition.pk)), compiled)
+
+        flag_condition.transcription_keywords = [['snow']]
+        flag_condition.save()
+        recompiled = get_compiled_flag_condition(flag_condition)
+        self.assertIsNot(recompiled, compiled)
+        self.assertTrue(recompiled.evaluate({'transcript': 'Heavy SNOW today'}, {})['transcription_keywords']['flagged'])
+
+    def test_list_views_share_the_matcher(self):
+        channel = self.create_channel()
+        flag_condition = FlagCondition.objects.create(
+            channel=channel, transcription_keywords=[['storm', 'Gale']], general_topics=['weather'], target_sentiments=20,
+        )
+        segment = self.create_segment(channel, datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        TranscriptionAnalysis.objects.create(
+            transcription_detail=self.create_transcription(segment, transcript='A gale warning'),
+            summary='s', sentiment='20', general_topics='Weather, Local', iab_topics='', bucket_prompt='',
+        )
+        segment = AudioSegments.objects.select_related('transcription_detail__analysis').get(pk=segment.pk)
+        serialized = AudioSegmentsSerializer.serialize_segments_data([segment], channel.timezone)[0]
+        flags = AudioSegmentFilterV3Utils.evaluate_flag_conditions(segment, flag_condition)
+        self.assertEqual(check_flag_conditions(serialized, flag_condition), flags)
+        self.assertEqual(flags['transcription_keywords']['message'], 'Found keywords: storm, Gale')
+        self.assertEqual(flags['general_topics']['message'], 'Found general topics: weather')
+        self.assertEqual(flags['sentiment']['message'], 'Matches target sentiment')
@@ -31,6 +31,31 @@ app.conf.beat_schedule = {
     'process-previous-day-audio-data': {
         'task': 'data_analysis.tasks.process_previous_day_audio_data',
         'schedule': crontab(hour=2, minute=0),  # Daily at 2:00 AM
+    },
+    # Submit pending transcriptions to the OpenAI Batch API - runs hourly
+    'submit-analysis-batches': {
+        'task': 'data_analysis.tasks.submit_analysis_batches_task',
+        'schedule': crontab(minute=30),  # Every hour at :30
+    },
+    # Poll submitted analysis batches and ingest results - runs every 10 minutes
+    'poll-analysis-batches': {
+        'task': 'data_analysis.tasks.poll_analysis_batches_task',
+        'schedule': 600.0,  # Every 600 seconds (10 minutes)
+    },
+    # Prune expired / least recently used LLM response cache rows - runs daily at 3 AM
+    'prune-llm-response-cache': {
+        'task': 'data_analysis.tasks.prune_llm_response_cache_task',
+        'schedule': crontab(hour=3, minute=0),  # Daily at 3:00 AM
+    },
+    # Apply stored Rev.ai callbacks (the webhook also schedules a run after each burst)
+    'process-rev-callbacks': {
+        'task': 'data_analysis.tasks.process_rev_callbacks_task',
+        'schedule': 60.0,  # Every 60 seconds
+    },
+    # Poll Rev.ai for jobs stuck without a callback
+    'reconcile-rev-jobs': {
+        'task': 'data_analysis.tasks.reconcile_rev_jobs_task',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
     }
 }
 
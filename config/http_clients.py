@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings as django_settings
+from openai import DefaultHttpxClient, OpenAI
+from requests.adapters import HTTPAdapter
+
+
+class InstrumentedSession(requests.Session):
+    """requests.Session that applies the registry's default timeout and records latency and errors per provider"""
+
+    def __init__(self, provider: str):
+        super().__init__()
+        self.provider = provider
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", (
+            django_settings.HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS,
+            django_settings.HTTP_CLIENT_READ_TIMEOUT_SECONDS,
+        ))
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            APIClientRegistry.record(self.provider, time.monotonic() - started, error=True)
+            raise
+        APIClientRegistry.record(
+            self.provider,
+            time.monotonic() - started,
+            error=response.status_code >= 500 or response.status_code == 429,
+        )
+        return response
+
+
+class APIClientRegistry:
+    """
+    Process-wide pool of HTTP clients for external APIs, keyed by (provider, api_key).
+
+    Sessions keep connections alive between calls, so repeated requests to the same provider skip
+    the TCP/TLS handshake. Clients are created lazily in the process that uses them: a Celery
+    prefork child notices the pid change and starts with an empty registry instead of sharing the
+    parent's sockets. Latency and error counters are kept per provider (see get_metrics).
+    """
+
+    _lock = threading.Lock()
+    _pid = os.getpid()
+    _sessions = {}
+    _openai_clients = {}
+    _metrics = {}
+
+    @classmethod
+    def _check_process(cls):
+        # Called with _lock held. Inherited clients are dropped, not closed: their sockets belong to the parent.
+        if cls._pid != os.getpid():
+            cls._pid = os.getpid()
+            cls._sessions = {}
+            cls._openai_clients = {}
+            cls._metrics = {}
+
+    @classmethod
+    def get_session(cls, provider: str, api_key: str = None) -> requests.Session:
+        """Shared keep-alive session for the provider account; api_key None is the provider's shared pool"""
+        with cls._lock:
+            cls._check_process()
+            session = cls._sessions.get((provider, api_key))
+            if session is None:
+                pool_size = django_settings.HTTP_CLIENT_POOL_MAXSIZE
+                session = InstrumentedSession(provider)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._sessions[(provider, api_key)] = session
+            return session
+
+    @classmethod
+    def request(cls, provider: str, method: str, url: str, api_key: str = None, **kwargs) -> requests.Response:
+        return cls.get_session(provider, api_key).request(method, url, **kwargs)
+
+    @classmethod
+    def get_openai_client(cls, api_key: str) -> OpenAI:
+        """Shared OpenAI client for the key, with a tuned httpx connection pool"""
+        with cls._lock:
+            cls._check_process()
+            client = cls._openai_clients.get(api_key)
+            if client is None:
+                pool_size = django_settings.HTTP_CLIENT_POOL_MAXSIZE
+                http_client = DefaultHttpxClient(
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    event_hooks={
+                        "request": [cls._start_openai_timer],
+                        "response": [cls._record_openai_response],
+                    },
+                )
+                client = OpenAI(
+                    api_key=api_key,
+                    timeout=django_settings.OPENAI_CLIENT_TIMEOUT_SECONDS,
+                    max_retries=django_settings.OPENAI_CLIENT_MAX_RETRIES,
+                    http_client=http_client,
+                )
+                cls._openai_clients[api_key] = client
+            return client
+
+    @staticmethod
+    def _start_openai_timer(request: httpx.Request):
+        request.extensions["started_at"] = time.monotonic()
+
+    @staticmethod
+    def _record_openai_response(response: httpx.Response):
+        started = response.request.extensions.get("started_at")
+        if started is not None:
+            APIClientRegistry.record(
+                "openai",
+                time.monotonic() - started,
+                error=response.status_code >= 500 or response.status_code == 429,
+            )
+
+    @classmethod
+    def record(cls, provider: str, elapsed_seconds: float, error: bool = False):
+        with cls._lock:
+            cls._check_process()
+            metrics = cls._metrics.setdefault(
+                provider, {"requests": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            metrics["requests"] += 1
+            metrics["errors"] += 1 if error else 0
+            metrics["total_seconds"] += elapsed_seconds
+            metrics["max_seconds"] = max(metrics["max_seconds"], elapsed_seconds)
+
+    @classmethod
+    def get_metrics(cls) -> dict:
+        """Per provider request and error counts and latency (ms) for this process"""
+        with cls._lock:
+            cls._check_process()
+            return {
+                provider: {
+                    "requests": metrics["requests"],
+                    "errors": metrics["errors"],
+                    "avg_latency_ms": round(metrics["total_seconds"] * 1000 / metrics["requests"], 1),
+                    "max_latency_ms": round(metrics["max_seconds"] * 1000, 1),
+                }
+                for provider, metrics in cls._metrics.items()
+                if metrics["requests"]
+            }
+
+    @classmethod
+    def reset(cls):
+        """Close every client and clear the counters"""
+        with cls._lock:
+            sessions, clients = cls._sessions, cls._openai_clients
+            cls._pid = os.getpid()
+            cls._sessions = {}
+            cls._openai_clients = {}
+            cls._metrics = {}
+        for session in sessions.values():
+            session.close()
+        for client in clients.values():
+            client.close()
@@ -203,6 +203,89 @@ GHL_API_KEY = config('GHL_API_KEY', default='')
 GHL_LOCATION_ID = config('GHL_LOCATION_ID', default='')
 GHL_CUSTOM_FIELD_SET_URL = config('GHL_CUSTOM_FIELD_SET_URL', default='')
 
+# Transcription analysis configuration
+# "sequential" issues the analysis prompts one after another, "concurrent" fans them out over a thread pool,
+# "combined" asks for every field in one structured-output request (falls back to sequential on invalid output)
+TRANSCRIPTION_ANALYSIS_MODE = config('TRANSCRIPTION_ANALYSIS_MODE', default='sequential')
+TRANSCRIPTION_ANALYSIS_MAX_WORKERS = config('TRANSCRIPTION_ANALYSIS_MAX_WORKERS', default=6, cast=int)
+# Max in-flight OpenAI requests per channel across all workers (0 disables the cap)
+OPENAI_CHANNEL_CONCURRENCY_LIMIT = config('OPENAI_CHANNEL_CONCURRENCY_LIMIT', default=12, cast=int)
+
+# Batch API analysis for the non-urgent (previous day backfill) path
+ANALYSIS_BATCH_ENABLED = config('ANALYSIS_BATCH_ENABLED', default=False, cast=bool)
+# Transcriptions younger than this are left to the real-time analysis task
+ANALYSIS_BATCH_MIN_AGE_MINUTES = config('ANALYSIS_BATCH_MIN_AGE_MINUTES', default=30, cast=int)
+ANALYSIS_BATCH_MAX_TRANSCRIPTIONS = config('ANALYSIS_BATCH_MAX_TRANSCRIPTIONS', default=5000, cast=int)
+# Batches a transcription may be part of before it is no longer collected (its results kept failing)
+ANALYSIS_BATCH_MAX_ATTEMPTS = config('ANALYSIS_BATCH_MAX_ATTEMPTS', default=3, cast=int)
+
+# LLM response cache for transcript analysis (Redis with database fallback)
+LLM_RESPONSE_CACHE_ENABLED = config('LLM_RESPONSE_CACHE_ENABLED', default=False, cast=bool)
+LLM_RESPONSE_CACHE_TTL_SECONDS = config('LLM_RESPONSE_CACHE_TTL_SECONDS', default=30 * 24 * 3600, cast=int)
+# Database fallback rows kept after pruning; least recently used rows are evicted first
+LLM_RESPONSE_CACHE_MAX_ENTRIES = config('LLM_RESPONSE_CACHE_MAX_ENTRIES', default=200000, cast=int)
+
+# ACRCloud recording downloads
+ACR_DOWNLOAD_MAX_WORKERS = config('ACR_DOWNLOAD_MAX_WORKERS', default=8, cast=int)
+ACR_DOWNLOAD_CONNECT_TIMEOUT_SECONDS = config('ACR_DOWNLOAD_CONNECT_TIMEOUT_SECONDS', default=10, cast=float)
+ACR_DOWNLOAD_READ_TIMEOUT_SECONDS = config('ACR_DOWNLOAD_READ_TIMEOUT_SECONDS', default=120, cast=float)
+# Retries for connection errors, timeouts and 429/5xx responses; the delay doubles from ACR_DOWNLOAD_BACKOFF_SECONDS
+ACR_DOWNLOAD_MAX_RETRIES = config('ACR_DOWNLOAD_MAX_RETRIES', default=3, cast=int)
+ACR_DOWNLOAD_BACKOFF_SECONDS = config('ACR_DOWNLOAD_BACKOFF_SECONDS', default=1.0, cast=float)
+# Fetch runs of adjacent segments as one recording and cut the per-segment mp3 files locally
+ACR_DOWNLOAD_WINDOW_MODE = config('ACR_DOWNLOAD_WINDOW_MODE', default=False, cast=bool)
+ACR_DOWNLOAD_WINDOW_MAX_SECONDS = config('ACR_DOWNLOAD_WINDOW_MAX_SECONDS', default=1800, cast=int)
+# Largest hole between two segments that still keeps them in one window (the hole is downloaded and discarded)
+ACR_DOWNLOAD_WINDOW_MAX_GAP_SECONDS = config('ACR_DOWNLOAD_WINDOW_MAX_GAP_SECONDS', default=2, cast=int)
+
+# Rev.ai job submission (the jobs endpoint allows 10,000 requests per 10 minutes per account).
+# The rate is per account across all worker processes (shared cache counter); the burst is per process.
+REV_AI_SUBMIT_MAX_WORKERS = config('REV_AI_SUBMIT_MAX_WORKERS', default=8, cast=int)
+REV_AI_SUBMIT_RATE_PER_SECOND = config('REV_AI_SUBMIT_RATE_PER_SECOND', default=15, cast=float)
+REV_AI_SUBMIT_BURST = config('REV_AI_SUBMIT_BURST', default=30, cast=int)
+REV_AI_REQUEST_TIMEOUT_SECONDS = config('REV_AI_REQUEST_TIMEOUT_SECONDS', default=30, cast=float)
+
+# Rev.ai callback inbox consumer
+REV_CALLBACK_BATCH_SIZE = config('REV_CALLBACK_BATCH_SIZE', default=200, cast=int)
+# Delay before the consumer run scheduled by the webhook, so a burst of callbacks lands in one batch
+REV_CALLBACK_CONSUMER_DELAY_SECONDS = config('REV_CALLBACK_CONSUMER_DELAY_SECONDS', default=5, cast=int)
+# Claimed rows not finished within this time are picked up again
+REV_CALLBACK_CLAIM_TIMEOUT_SECONDS = config('REV_CALLBACK_CLAIM_TIMEOUT_SECONDS', default=600, cast=int)
+REV_CALLBACK_MAX_ATTEMPTS = config('REV_CALLBACK_MAX_ATTEMPTS', default=5, cast=int)
+
+# Rev.ai job reconciliation (polling fallback for lost callbacks)
+# Jobs still open this long after creation are polled
+REV_RECONCILE_MIN_AGE_SECONDS = config('REV_RECONCILE_MIN_AGE_SECONDS', default=1800, cast=int)
+# Minimum time between two polls of the same job
+REV_RECONCILE_POLL_INTERVAL_SECONDS = config('REV_RECONCILE_POLL_INTERVAL_SECONDS', default=900, cast=int)
+# Jobs still running after this many polls are marked failed so the segment can be resubmitted
+REV_RECONCILE_MAX_POLLS = config('REV_RECONCILE_MAX_POLLS', default=16, cast=int)
+REV_RECONCILE_BATCH_SIZE = config('REV_RECONCILE_BATCH_SIZE', default=200, cast=int)
+REV_RECONCILE_MAX_WORKERS = config('REV_RECONCILE_MAX_WORKERS', default=4, cast=int)
+
+# Shared HTTP clients for external APIs (config/http_clients.py)
+# Keep-alive connections kept per (provider, api key) pool
+HTTP_CLIENT_POOL_MAXSIZE = config('HTTP_CLIENT_POOL_MAXSIZE', default=16, cast=int)
+# Default timeouts for requests that do not set their own
+HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS = config('HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS', default=10, cast=int)
+HTTP_CLIENT_READ_TIMEOUT_SECONDS = config('HTTP_CLIENT_READ_TIMEOUT_SECONDS', default=60, cast=int)
+OPENAI_CLIENT_TIMEOUT_SECONDS = config('OPENAI_CLIENT_TIMEOUT_SECONDS', default=120, cast=int)
+OPENAI_CLIENT_MAX_RETRIES = config('OPENAI_CLIENT_MAX_RETRIES', default=2, cast=int)
+
+# Channel settings snapshot cache (GeneralSettingSnapshotCache)
+SETTINGS_SNAPSHOT_TTL_SECONDS = config('SETTINGS_SNAPSHOT_TTL_SECONDS', default=86400, cast=int)
+# How long a process trusts its own copy of a channel's active version before asking Redis again
+SETTINGS_SNAPSHOT_LOCAL_TTL_SECONDS = config('SETTINGS_SNAPSHOT_LOCAL_TTL_SECONDS', default=5, cast=int)
+
+# Cache lifetime of hour-slot occupancy reads for audio_filter v3 (the index version invalidates them on change)
+HOUR_OCCUPANCY_CACHE_SECONDS = config('HOUR_OCCUPANCY_CACHE_SECONDS', default=300, cast=int)
+
+# Transcriptions per query when a channel's stored flag results are recomputed after a FlagCondition change
+SEGMENT_FLAG_RECOMPUTE_CHUNK_SIZE = config('SEGMENT_FLAG_RECOMPUTE_CHUNK_SIZE', default=1000, cast=int)
+
+# Compute the v2 dashboard summary sentiment metrics with one grouped SQL query instead of loading every segment
+SUMMARY_SQL_AGGREGATION = config('SUMMARY_SQL_AGGREGATION', default=True, cast=bool)
+
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
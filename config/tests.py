@@ -0,0 +1,44 @@
+import os
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from config.http_clients import APIClientRegistry
+from data_analysis.tests.helpers import StubRevAIServer
+
+
+class APIClientRegistryTestCase(TestCase):
+    """External API clients are pooled per (provider, api key) and per process"""
+
+    def setUp(self):
+        APIClientRegistry.reset()
+
+    def tearDown(self):
+        APIClientRegistry.reset()
+
+    def test_sessions_are_shared_per_provider_account(self):
+        session = APIClientRegistry.get_session('revai', 'key-a')
+        self.assertIs(APIClientRegistry.get_session('revai', 'key-a'), session)
+        self.assertIsNot(APIClientRegistry.get_session('revai', 'key-b'), session)
+        self.assertIsNot(APIClientRegistry.get_session('acrcloud', 'key-a'), session)
+        client = APIClientRegistry.get_openai_client('sk-a')
+        self.assertIs(APIClientRegistry.get_openai_client('sk-a'), client)
+
+        # A forked worker process starts with its own clients
+        with patch('config.http_clients.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(APIClientRegistry.get_session('revai', 'key-a'), session)
+            self.assertIsNot(APIClientRegistry.get_openai_client('sk-a'), client)
+
+    def test_requests_reuse_connection_and_record_metrics(self):
+        with StubRevAIServer(job_states={'known': {'id': 'known', 'status': 'in_progress'}}) as stub:
+            for _ in range(3):
+                response = APIClientRegistry.request('revai', 'GET', f"{stub.jobs_url}/known", api_key='key-a')
+                self.assertEqual(response.json()['status'], 'in_progress')
+            # All three requests went over one keep-alive connection
+            self.assertEqual(len(stub.client_addresses), 1)
+            with StubRevAIServer(failing_media_urls={'bad'}) as failing:
+                APIClientRegistry.request('revai', 'POST', failing.jobs_url, api_key='key-a', json={'media_url': 'bad'})
+
+        metrics = APIClientRegistry.get_metrics()
+        self.assertEqual((metrics['revai']['requests'], metrics['revai']['errors']), (4, 1))
+        self.assertGreaterEqual(metrics['revai']['max_latency_ms'], metrics['revai']['avg_latency_ms'])
@@ -19,7 +19,7 @@ class ValidationUtils:
     @staticmethod
     def validate_settings_exist(channel: Channel | int):
         """Validate that GeneralSetting exists"""
-        settings = GeneralSettingService.get_active_setting(channel=channel, include_buckets=False)
+        settings = GeneralSettingService.get_settings_snapshot(channel)
         if not settings:
             raise ValidationError(f"GeneralSetting not found for channel {channel}. Please configure the application settings.")
         return settings
@@ -1,10 +1,167 @@
+import copy
+import threading
+import time
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Max, Prefetch, Q
 from django.core.exceptions import ValidationError
+from encrypted_model_fields.fields import EncryptedMixin, encrypt_str
 
 from .models import Channel, GeneralSetting, WellnessBucket
 
 
+class GeneralSettingSnapshotCache:
+    """
+    Two-tier cache of active channel settings for read-only hot paths.
+
+    A snapshot is the active GeneralSetting of a channel with its non-deleted wellness buckets,
+    keyed by (channel_id, version). Since a version never changes after activation, snapshots
+    are never stale; only the per-channel "active version" pointer has to move, which
+    create_new_version does once the new version is committed. Loaders only add a missing
+    pointer, so a load racing with a version bump cannot put the old version back.
+
+    Tier 1 is a per-process dict (snapshots, plus pointers remembered for
+    SETTINGS_SNAPSHOT_LOCAL_TTL_SECONDS). Tier 2 is the shared Django cache (Redis), where
+    encrypted fields stay encrypted. The database is read only when both tiers miss.
+    """
+
+    VERSION_KEY = "general_setting_active_version_{channel_id}"
+    SNAPSHOT_KEY = "general_setting_snapshot_{channel_id}_{version}"
+    # Pointer value for channels without an active setting
+    NO_ACTIVE_VERSION = 0
+    BUCKET_FIELDS = ('id', 'title', 'description', 'category', 'created_at', 'is_deleted')
+
+    _lock = threading.Lock()
+    _snapshots = {}
+    _versions = {}
+
+    @staticmethod
+    def _channel_id(channel: Channel | int) -> int:
+        return channel.pk if isinstance(channel, Channel) else int(channel)
+
+    @staticmethod
+    def serialize(setting: GeneralSetting, buckets) -> dict:
+        fields = {}
+        for field in GeneralSetting._meta.concrete_fields:
+            value = getattr(setting, field.attname)
+            if isinstance(field, EncryptedMixin) and value is not None:
+                value = encrypt_str(str(value)).decode('utf-8')
+            fields[field.attname] = value
+        return {
+            'fields': fields,
+            'buckets': [{name: getattr(bucket, name) for name in GeneralSettingSnapshotCache.BUCKET_FIELDS} for bucket in buckets],
+        }
+
+    @staticmethod
+    def materialize(data: dict) -> GeneralSetting:
+        """GeneralSetting instance (decrypted, buckets prefetched) from serialized snapshot data"""
+        values = {}
+        for field in GeneralSetting._meta.concrete_fields:
+            value = data['fields'].get(field.attname)
+            values[field.attname] = field.to_python(value) if isinstance(field, EncryptedMixin) else value
+        setting = GeneralSetting(**values)
+        setting._state.adding = False
+        buckets = [WellnessBucket(general_setting_id=setting.pk, **bucket) for bucket in data['buckets']]
+        for bucket in buckets:
+            bucket._state.adding = False
+        # Same shape as prefetch_related, so setting.wellness_buckets.all() does not query
+        bucket_queryset = setting.wellness_buckets.all()
+        bucket_queryset._result_cache = buckets
+        bucket_queryset._prefetch_done = True
+        setting._prefetched_objects_cache = {'wellness_buckets': bucket_queryset}
+        return setting
+
+    @staticmethod
+    def _load_from_db(channel_id: int):
+        setting = GeneralSettingService.get_active_setting(channel=channel_id, include_buckets=True)
+        if setting is None:
+            try:
+                cache.add(
+                    GeneralSettingSnapshotCache.VERSION_KEY.format(channel_id=channel_id),
+                    GeneralSettingSnapshotCache.NO_ACTIVE_VERSION,
+                    timeout=django_settings.SETTINGS_SNAPSHOT_TTL_SECONDS,
+                )
+            except Exception as e:
+                print(f"Settings snapshot cache write failed: {e}")
+            return GeneralSettingSnapshotCache.NO_ACTIVE_VERSION, None
+
+        data = GeneralSettingSnapshotCache.serialize(setting, setting.wellness_buckets.all())
+        try:
+            ttl = django_settings.SETTINGS_SNAPSHOT_TTL_SECONDS
+            cache.set(GeneralSettingSnapshotCache.SNAPSHOT_KEY.format(channel_id=channel_id, version=setting.version), data, timeout=ttl)
+            cache.add(GeneralSettingSnapshotCache.VERSION_KEY.format(channel_id=channel_id), setting.version, timeout=ttl)
+        except Exception as e:
+            print(f"Settings snapshot cache write failed: {e}")
+        return setting.version, GeneralSettingSnapshotCache.materialize(data)
+
+    @staticmethod
+    def get(channel: Channel | int):
+        """
+        Snapshot of the channel's active settings, or None when the channel has none.
+        Callers get their own copy of the instance and must not save it.
+        """
+        channel_id = GeneralSettingSnapshotCache._channel_id(channel)
+        cls = GeneralSettingSnapshotCache
+        now = time.monotonic()
+
+        with cls._lock:
+            version, checked_at = cls._versions.get(channel_id, (None, 0))
+        if version is None or now - checked_at > django_settings.SETTINGS_SNAPSHOT_LOCAL_TTL_SECONDS:
+            try:
+                version = cache.get(cls.VERSION_KEY.format(channel_id=channel_id))
+            except Exception as e:
+                print(f"Settings snapshot cache read failed: {e}")
+                version = None
+
+        snapshot = None
+        if version == cls.NO_ACTIVE_VERSION:
+            pass
+        elif version is not None:
+            with cls._lock:
+                snapshot = cls._snapshots.get((channel_id, version))
+            if snapshot is None:
+                try:
+                    data = cache.get(cls.SNAPSHOT_KEY.format(channel_id=channel_id, version=version))
+                except Exception as e:
+                    print(f"Settings snapshot cache read failed: {e}")
+                    data = None
+                if data is not None:
+                    snapshot = cls.materialize(data)
+                else:
+                    version = None
+
+        if version is None:
+            version, snapshot = cls._load_from_db(channel_id)
+
+        with cls._lock:
+            cls._versions[channel_id] = (version, now)
+            if snapshot is not None:
+                cls._snapshots[(channel_id, version)] = snapshot
+        return copy.copy(snapshot) if snapshot is not None else None
+
+    @staticmethod
+    def invalidate(channel_id: int, active_version: int = None):
+        """
+        Point the channel at active_version in both tiers, or forget its pointer when no version
+        is given (the next get reloads it from the database).
+        """
+        cls = GeneralSettingSnapshotCache
+        with cls._lock:
+            cls._versions.pop(channel_id, None)
+            for key in [key for key in cls._snapshots if key[0] == channel_id and key[1] != active_version]:
+                del cls._snapshots[key]
+        try:
+            key = cls.VERSION_KEY.format(channel_id=channel_id)
+            if active_version is None:
+                cache.delete(key)
+            else:
+                cache.set(key, active_version, timeout=django_settings.SETTINGS_SNAPSHOT_TTL_SECONDS)
+        except Exception as e:
+            print(f"Settings snapshot cache invalidation failed: {e}")
+
+
 class GeneralSettingService:
 
     @staticmethod
@@ -41,6 +198,14 @@ class GeneralSettingService:
         
         return queryset.first()
 
+    @staticmethod
+    def get_settings_snapshot(channel: Channel | int):
+        """
+        Cached read-only copy of the active setting with its buckets (see GeneralSettingSnapshotCache).
+        Use get_active_setting when the row is going to be modified.
+        """
+        return GeneralSettingSnapshotCache.get(channel)
+
     @staticmethod
     @transaction.atomic
     def create_new_version(
@@ -190,6 +355,13 @@ class GeneralSettingService:
         new_setting.is_active = True
         new_setting.save(update_fields=["is_active"])
 
+        # Cached analysis responses were produced with the previous prompts
+        from data_analysis.services.llm_cache import LLMResponseCache
+        transaction.on_commit(lambda: LLMResponseCache.invalidate_channel(new_setting.channel_id))
+        transaction.on_commit(
+            lambda: GeneralSettingSnapshotCache.invalidate(new_setting.channel_id, new_setting.version)
+        )
+
         return new_setting
 
     @staticmethod
@@ -1,7 +1,10 @@
+from django.core.cache import cache
+from django.test import TestCase
 from rest_framework.test import APITestCase
 from rest_framework import status
 from unittest.mock import patch
-from .models import GeneralSetting, WellnessBucket
+from .models import Channel, GeneralSetting, WellnessBucket
+from .repositories import GeneralSettingService, GeneralSettingSnapshotCache
 
 
 class SettingsAndBucketsViewTestCase(APITestCase):
@@ -131,3 +134,67 @@ class SettingsAndBucketsViewTestCase(APITestCase):
         self.assertIn('error', response.data)
 
 
+class GeneralSettingSnapshotCacheTestCase(TestCase):
+    """Active settings are read from the snapshot tiers until a new version is activated"""
+
+    def setUp(self):
+        cache.clear()
+        self.channel = Channel.objects.create(name='Snapshot', channel_type='broadcast', channel_id=1, project_id=1)
+        GeneralSettingSnapshotCache.invalidate(self.channel.id)
+        GeneralSettingService.create_new_version(
+            settings_data=self.settings_data(summarize_transcript_prompt='v1 summary'),
+            buckets_data=[{'title': 'Emotional', 'description': 'calm', 'category': 'personal'}],
+        )
+
+    def settings_data(self, **overrides):
+        data = {
+            'channel_id': self.channel.id,
+            'openai_api_key': 'sk-secret',
+            'openai_org_id': 'org',
+            'revai_access_token': 'rev-secret',
+            'summarize_transcript_prompt': 'summary',
+            'sentiment_analysis_prompt': 'sentiment',
+            'general_topics_prompt': 'topics',
+            'iab_topics_prompt': 'iab',
+            'custom_vocabulary': ['Luke Radio'],
+        }
+        data.update(overrides)
+        return data
+
+    def test_snapshot_tiers_and_version_bump(self):
+        with self.assertNumQueries(2):
+            snapshot = GeneralSettingService.get_settings_snapshot(self.channel)
+        self.assertEqual((snapshot.version, snapshot.summarize_transcript_prompt), (1, 'v1 summary'))
+        self.assertEqual(snapshot.openai_api_key, 'sk-secret')
+        self.assertEqual(snapshot.custom_vocabulary, ['Luke Radio'])
+
+        with self.assertNumQueries(0):
+            again = GeneralSettingService.get_settings_snapshot(self.channel.id)
+            self.assertEqual([bucket.title for bucket in again.wellness_buckets.all()], ['Emotional'])
+        self.assertIsNot(again, snapshot)
+
+        # Keys are stored encrypted in the shared tier
+        shared = cache.get(GeneralSettingSnapshotCache.SNAPSHOT_KEY.format(channel_id=self.channel.id, version=1))
+        self.assertNotIn('sk-secret', str(shared))
+
+        # Another process only has the shared tier
+        GeneralSettingSnapshotCache._snapshots.clear()
+        GeneralSettingSnapshotCache._versions.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(GeneralSettingService.get_settings_snapshot(self.channel).revai_access_token, 'rev-secret')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GeneralSettingService.create_new_version(
+                settings_data=self.settings_data(summarize_transcript_prompt='v2 summary'),
+                buckets_data=[],
+            )
+        snapshot = GeneralSettingService.get_settings_snapshot(self.channel)
+        self.assertEqual((snapshot.version, snapshot.summarize_transcript_prompt), (2, 'v2 summary'))
+        self.assertEqual([bucket.title for bucket in snapshot.wellness_buckets.all()], ['Emotional'])
+
+    def test_channel_without_settings(self):
+        other = Channel.objects.create(name='Empty', channel_type='broadcast', channel_id=2, project_id=1)
+        GeneralSettingSnapshotCache.invalidate(other.id)
+        self.assertIsNone(GeneralSettingService.get_settings_snapshot(other))
+        with self.assertNumQueries(0):
+            self.assertIsNone(GeneralSettingService.get_settings_snapshot(other))
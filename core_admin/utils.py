@@ -1,13 +1,14 @@
 import requests
+from config.http_clients import APIClientRegistry
 from config.validation import ValidationUtils
 from core_admin.models import GeneralSetting
 
 
 class BaseAPIUtils:
     @staticmethod
-    def _safe_request(url, headers, method="GET", timeout=10, max_attempts=2):
+    def _safe_request(url, headers, method="GET", timeout=10, max_attempts=2, provider="default"):
         """
-        Wrapper around requests with simple retry logic.
+        Wrapper around the provider's shared session with simple retry logic.
         Returns a tuple of (status_or_error, response_or_none).
         - On success (non-5xx HTTP status): (status_code: int, response)
         - On persistent 5xx: ("SERVER_ERROR", None)
@@ -16,8 +17,8 @@ class BaseAPIUtils:
         """
         for attempt in range(max_attempts):
             try:
-                response = requests.request(
-                    method, url, headers=headers, timeout=timeout
+                response = APIClientRegistry.request(
+                    provider, method, url, headers=headers, timeout=timeout
                 )
 
                 # If 500+, retry. If last attempt, return 'SERVER_ERROR'
@@ -78,7 +79,7 @@ class ACRCloudUtils:
         headers = {"Authorization": f"Bearer {api_key.strip()}"}
 
         status, response = BaseAPIUtils._safe_request(
-            url, headers=headers, method="GET"
+            url, headers=headers, method="GET", provider="acrcloud"
         )
 
         # Treat server/network issues as valid per requirements.
@@ -119,7 +120,7 @@ class RevAIUtils:
         headers = {"Authorization": f"Bearer {access_token.strip()}"}
 
         status, response = BaseAPIUtils._safe_request(
-            url, headers=headers, method="GET", timeout=10
+            url, headers=headers, method="GET", timeout=10, provider="revai"
         )
 
         # Treat server/network issues as valid per requirements.
@@ -167,7 +168,7 @@ class RevAIUtils:
             access_token = ValidationUtils.validate_acr_cloud_api_key()
         headers = {"Authorization": f"Bearer {access_token}"}
         try:
-            response = requests.get(url, headers=headers)
+            response = APIClientRegistry.request("acrcloud", "GET", url, api_key=access_token, headers=headers)
             if response.status_code == 403:
                 return {"error": "You don't have permission to access this project (invalid project id)"}, 403
             response.raise_for_status()
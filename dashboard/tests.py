@@ -1,3 +1,68 @@
-from django.test import TestCase
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from core_admin.models import Channel
+from dashboard.v2.service.DashboardSummary import SummaryService
+from data_analysis.models import (
+    AudioSegments, ReportFolder, SavedAudioSegment, TranscriptionAnalysis, TranscriptionDetail,
+)
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class SummaryMetricsSQLTestCase(AnalysisFixtureMixin, TestCase):
+    """The grouped SQL summary metrics must match the Python reference implementation"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        Channel.objects.filter(id=self.channel.id).update(timezone='America/New_York')
+        self.start = datetime(2025, 3, 1, tzinfo=dt_timezone.utc)
+        self.end = self.start + timedelta(days=6)
+        rng = random.Random(11)
+        for i in range(60):
+            segment = self.create_segment(
+                self.channel, self.start + timedelta(hours=2 * i, minutes=rng.randint(0, 59)),
+                duration=rng.choice([0, 15, 30, 60, 90]),
+            )
+            detail = self.create_transcription(segment)
+            # Late evening UTC transcriptions fall on the previous New York day
+            TranscriptionDetail.objects.filter(id=detail.id).update(created_at=segment.start_time + timedelta(minutes=30))
+            TranscriptionAnalysis.objects.create(
+                transcription_detail=detail, summary='summary',
+                sentiment=rng.choice(['0', '20', '35.5', '50', '80', '100', 'Neutral', '']),
+                general_topics='', iab_topics='', bucket_prompt='',
+            )
+        self.thresholds = SummaryService._get_sentiment_thresholds(self.channel.id)
+
+    def test_sql_matches_reference(self):
+        segments = AudioSegments.objects.filter(channel=self.channel)
+        loaded = list(segments.select_related('transcription_detail__analysis'))
+        for tz in (ZoneInfo('UTC'), ZoneInfo('America/New_York'), ZoneInfo('Asia/Kolkata')):
+            reference = SummaryService.calculate_all_metrics(loaded, self.thresholds, tz)
+            with self.assertNumQueries(1):
+                result = SummaryService.calculate_all_metrics_sql(segments, self.thresholds, tz)
+            self.assertEqual(result, reference)
+            self.assertEqual(result['analyzed_segment_count'], 60)
+            self.assertGreater(len(result['per_day_average_sentiments']), 1)
+            self.assertIsNotNone(result['low_sentiment'])
+
+        empty = SummaryService.calculate_all_metrics_sql(segments.none(), self.thresholds)
+        self.assertEqual(empty, SummaryService.calculate_all_metrics([], self.thresholds))
+
+    def test_summary_data_matches_reference(self):
+        folder = ReportFolder.objects.create(channel=self.channel, name='Folder')
+        other = ReportFolder.objects.create(channel=self.channel, name='Other')
+        for segment in AudioSegments.objects.filter(channel=self.channel)[:20]:
+            SavedAudioSegment.objects.create(folder=folder, audio_segment=segment)
+            SavedAudioSegment.objects.create(folder=other, audio_segment=segment)
+
+        for filters in ({'channel_id': self.channel.id}, {'report_folder_id': folder.id}):
+            with override_settings(SUMMARY_SQL_AGGREGATION=False):
+                reference = SummaryService.get_summary_data(start_dt=self.start, end_dt=self.end, **filters)
+            with override_settings(SUMMARY_SQL_AGGREGATION=True):
+                result = SummaryService.get_summary_data(start_dt=self.start, end_dt=self.end, **filters)
+            self.assertEqual(result, reference)
+            self.assertTrue(result['per_day_average_sentiments'])
+        self.assertEqual(result['analyzed_segment_count'], 20)
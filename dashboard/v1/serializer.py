@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from data_analysis.models import TranscriptionDetail, TranscriptionAnalysis, AudioSegments, GeneralTopic
+from data_analysis.models import AnalysisTopic, TranscriptionDetail, TranscriptionAnalysis, AudioSegments, GeneralTopic
 from core_admin.models import Channel
-from django.db.models import Avg, Count, Q
+from django.db.models import Avg, Count, F, FloatField, Q, Sum
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta, datetime
 from zoneinfo import ZoneInfo
@@ -81,6 +82,19 @@ def _get_transcription_stats(date_filter, channel_id, filtered_ids_qs=None):
     return transcriptions_query.count()
 
 
+def _sentiment_totals():
+    """
+    Aggregates of TranscriptionAnalysis rows with a numeric sentiment: count, SUM(sentiment_score * duration)
+    and SUM(duration) of their audio segments
+    """
+    duration = 'transcription_detail__audio_segment__duration_seconds'
+    return {
+        'numeric': Count('id'),
+        'weighted': Sum(F('sentiment_score') * F(duration), output_field=FloatField()),
+        'duration': Sum(duration, output_field=FloatField()),
+    }
+
+
 def _get_sentiment_stats(date_filter, start_dt, end_dt, channel_id, filtered_ids_qs=None):
     """
     Get sentiment statistics and breakdown using duration-weighted calculation
@@ -95,10 +109,6 @@ def _get_sentiment_stats(date_filter, start_dt, end_dt, channel_id, filtered_ids
     Returns:
         tuple: (avg_sentiment, sentiment_breakdown, analyses)
     """
-    total_weighted_sentiment = 0
-    total_duration = 0
-    sentiment_breakdown = {'numeric': 0}
-    
     analyses_query = TranscriptionAnalysis.objects.all()
     
     if date_filter:
@@ -111,162 +121,51 @@ def _get_sentiment_stats(date_filter, start_dt, end_dt, channel_id, filtered_ids
     
     analyses = analyses_query.all()
     
-    for analysis in analyses:
-        if analysis.sentiment:
-            sentiment_value = analysis.sentiment
-            
-            try:
-                # Since sentiment is stored as string format of int, convert directly
-                if isinstance(sentiment_value, str):
-                    sentiment_value = sentiment_value.strip()
-                
-                # Convert string to integer (since it stores int in string format)
-                score = int(sentiment_value)
-                sentiment_breakdown['numeric'] += 1
-                
-                # Get duration from audio segment
-                duration_seconds = 0
-                if analysis.transcription_detail and analysis.transcription_detail.audio_segment:
-                    duration_seconds = analysis.transcription_detail.audio_segment.duration_seconds
-                
-                # Calculate weighted sentiment: sentiment_score * duration
-                total_weighted_sentiment += score * duration_seconds
-                total_duration += duration_seconds
-                        
-            except (ValueError, TypeError):
-                # If conversion fails, skip this sentiment (shouldn't happen with integer strings)
-                continue
+    # sentiment_score was parsed from the sentiment text when the analysis was stored
+    totals = analyses_query.filter(sentiment_score__isnull=False).aggregate(**_sentiment_totals())
+    sentiment_breakdown = {'numeric': totals['numeric']}
     
     # Calculate weighted average: total_weighted_sentiment / total_duration (3 decimal places)
     avg_sentiment = (
-        round((total_weighted_sentiment / total_duration), 3)
-        if total_duration > 0 else None
+        round((totals['weighted'] / totals['duration']), 3)
+        if totals['duration'] else None
     )
     return avg_sentiment, sentiment_breakdown, analyses
 
 
-def _parse_bucket_prompt_line(line):
-    """
-    Parse a single bucket prompt line and return (primary, secondary) topic names.
-    Handles formats like:
-      - "FUN, 85, RELATIONSHIPS, 75"
-      - "MENTAL, 100, FAITH JOURNEY, 0"
-      - "RELATIONSHIPS, 90%, FUN, 85%"
-    
-    Requirements:
-      - Must have at least 4 comma-separated values to determine primary/secondary
-      - Ignores AI output prefixes like "Empty Result", "Output:", etc.
-      - Ignores undefined/invalid tokens such as "Undefined", "undefined", "0%" when paired with undefined topic
-    
-    Returns tuple of (primary_or_None, secondary_or_None)
-    """
-    if not line:
-        return None, None
-    text = line.strip()
-    if not text:
-        return None, None
-    
-    # Skip AI output prefixes
-    ai_prefixes = ["empty result", "output:", "result:", "analysis:", "response:"]
-    text_lower = text.lower()
-    for prefix in ai_prefixes:
-        if text_lower.startswith(prefix):
-            # Remove the prefix and any following newlines/whitespace
-            text = text[len(prefix):].strip()
-            if text.startswith('\n'):
-                text = text[1:].strip()
-            break
-    
-    # Normalize separators to comma
-    parts = [p.strip() for p in text.replace("\t", ",").replace("|", ",").split(",")]
-    
-    # Must have at least 4 comma-separated values to determine primary/secondary
-    if len(parts) < 4:
-        return None, None
-    
-    def is_undefined(token):
-        if token is None:
-            return True
-        t = str(token).strip().lower()
-        return t in {"undefined", "undef", "none", "null", "na", "n/a", "", "empty result", "output"}
-    
-    def is_score(token):
-        if token is None:
-            return False
-        t = str(token).strip().replace("%", "")
-        if not t:
-            return False
-        try:
-            float(t)
-            return True
-        except ValueError:
-            return False
-    
-    # Extract first two valid topics (skip scores)
-    topics = []
-    i = 0
-    while i < len(parts) and len(topics) < 2:
-        token = parts[i]
-        # Skip empty tokens
-        if token == "":
-            i += 1
-            continue
-        # If looks like a score, skip and move on
-        if is_score(token):
-            i += 1
-            continue
-        # This token is a candidate topic; ensure it's not undefined
-        if not is_undefined(token):
-            topics.append(token)
-        # Advance; also skip next token if it's a score paired with this topic
-        if i + 1 < len(parts) and is_score(parts[i+1]):
-            i += 2
-        else:
-            i += 1
-    
-    # Return primary and secondary only if we found both
-    primary = topics[0] if len(topics) > 0 else None
-    secondary = topics[1] if len(topics) > 1 else None
-    return primary, secondary
-
-
 def _compute_bucket_rankings(analyses):
     """
-    Compute primary and secondary bucket topic rankings from TranscriptionAnalysis.bucket_prompt
-    Ignores undefined entries and rows without valid topics.
+    Compute primary and secondary bucket topic rankings from the bucket_primary / bucket_secondary
+    columns parsed from TranscriptionAnalysis.bucket_prompt. Rows without a valid bucket are ignored.
     Returns two sorted lists of dicts: [{ 'topic': TOPIC, 'count': N }, ...]
     """
-    from collections import defaultdict
-    primary_counts = defaultdict(int)
-    secondary_counts = defaultdict(int)
-    for analysis in analyses:
-        bucket_text = getattr(analysis, 'bucket_prompt', None)
-        if not bucket_text:
-            continue
-        # Bucket text may contain multiple lines; process each line
-        lines = [l for l in str(bucket_text).split('\n') if l is not None]
-        if not lines:
-            lines = [str(bucket_text)]
-        found_primary = None
-        found_secondary = None
-        for line in lines:
-            p, s = _parse_bucket_prompt_line(line)
-            # First valid pair wins for this analysis
-            if found_primary is None and p:
-                found_primary = p
-            if found_secondary is None and s:
-                found_secondary = s
-            if found_primary is not None and found_secondary is not None:
-                break
-        if found_primary:
-            primary_counts[found_primary.upper()] += 1
-        if found_secondary:
-            secondary_counts[found_secondary.upper()] += 1
-    def to_sorted_list(counter):
-        items = [{ 'topic': k, 'count': v } for k, v in counter.items()]
-        items.sort(key=lambda x: x['count'], reverse=True)
-        return items
-    return to_sorted_list(primary_counts), to_sorted_list(secondary_counts)
+    def ranking(field):
+        rows = (
+            analyses
+            .filter(**{f'{field}__isnull': False})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .order_by('-count', field)
+        )
+        return [{'topic': row[field], 'count': row['count']} for row in rows]
+    return ranking('bucket_primary'), ranking('bucket_secondary')
+
+
+def _count_topics_for_analyses(analysis_ids):
+    """Number of analyses mentioning each topic, in one grouped AnalysisTopic query"""
+    topic_counts = defaultdict(int)
+    if not analysis_ids:
+        return topic_counts
+    topic_rows = (
+        AnalysisTopic.objects
+        .filter(analysis_id__in=analysis_ids)
+        .values('topic_name')
+        .annotate(count=Count('id'))
+    )
+    for row in topic_rows:
+        topic_counts[row['topic_name']] += row['count']
+    return topic_counts
 
 
 def _get_topics_stats(analyses, show_all_topics=False):
@@ -284,37 +183,16 @@ def _get_topics_stats(analyses, show_all_topics=False):
     topic_counts = defaultdict(int)
     topic_audio_segments = defaultdict(set)  # Track audio segment IDs for each topic
     
-    for analysis in analyses:
-        if analysis.general_topics:
-            topics_text = analysis.general_topics
-            topic_lines = topics_text.split('\n')
-            
-            # Get audio segment ID from the analysis
-            audio_segment_id = None
-            if analysis.transcription_detail and analysis.transcription_detail.audio_segment:
-                audio_segment_id = analysis.transcription_detail.audio_segment.id
-            
-            for line in topic_lines:
-                line = line.strip()
-                if line:
-                    if line[0].isdigit():
-                        # Handle both formats: "1. Topic" and "1 Topic"
-                        if '. ' in line:
-                            topic = line.split('. ', 1)[1]
-                        elif ' ' in line:
-                            topic = line.split(' ', 1)[1]
-                        else:
-                            topic = line
-                    else:
-                        topic = line
-                    
-                    topic = topic.strip()
-                    if topic:
-                        unique_topics.add(topic)
-                        topic_counts[topic] += 1
-                        # Add audio segment ID to the topic's set
-                        if audio_segment_id:
-                            topic_audio_segments[topic].add(audio_segment_id)
+    # Topics were parsed from general_topics into AnalysisTopic when the analyses were stored
+    topic_rows = AnalysisTopic.objects.filter(analysis__in=analyses).values_list(
+        'topic_name', 'analysis__transcription_detail__audio_segment_id'
+    )
+    for topic, audio_segment_id in topic_rows.iterator(chunk_size=2000):
+        unique_topics.add(topic)
+        topic_counts[topic] += 1
+        # Add audio segment ID to the topic's set
+        if audio_segment_id:
+            topic_audio_segments[topic].add(audio_segment_id)
     
     # Filter out inactive topics if show_all_topics is False
     if not show_all_topics:
@@ -355,7 +233,7 @@ def _get_topics_stats(analyses, show_all_topics=False):
     topics_distribution.sort(key=lambda x: x['value'], reverse=True)
     
     # Create top topics ranking with rank, count, and percentage (top 10 only)
-    total_analyses = len(analyses) if analyses else 1
+    total_analyses = analyses.count() or 1
     top_topics_ranking = []
     
     # Get top 10 topics by count
@@ -416,46 +294,30 @@ def _get_sentiment_timeline_data(start_dt, end_dt, avg_sentiment, channel_id, fi
     if start_dt and end_dt:
         current_date = start_dt.date()
         end_date = end_dt.date()
+        range_start = timezone.make_aware(datetime.combine(current_date, datetime.min.time()))
+        range_end = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
+        
+        # One grouped query for every day, in the current timezone like the day boundaries above
+        day_analyses = TranscriptionAnalysis.objects.filter(
+            transcription_detail__created_at__range=(range_start, range_end),
+            sentiment_score__isnull=False
+        ).filter(
+            Q(transcription_detail__audio_segment__channel_id=channel_id)
+        )
+        if filtered_ids_qs is not None:
+            day_analyses = day_analyses.filter(transcription_detail__audio_segment__id__in=filtered_ids_qs)
+        day_totals = {
+            row['day']: row
+            for row in day_analyses.annotate(day=TruncDate('transcription_detail__created_at'))
+            .order_by()
+            .values('day')
+            .annotate(**_sentiment_totals())
+        }
         
         while current_date <= end_date:
-            day_start = timezone.make_aware(datetime.combine(current_date, datetime.min.time()))
-            day_end = timezone.make_aware(datetime.combine(current_date, datetime.max.time()))
-            
-            day_analyses = TranscriptionAnalysis.objects.filter(
-                transcription_detail__created_at__range=(day_start, day_end)
-            ).filter(
-                Q(transcription_detail__audio_segment__channel_id=channel_id)
-            )
-            if filtered_ids_qs is not None:
-                day_analyses = day_analyses.filter(transcription_detail__audio_segment__id__in=filtered_ids_qs)
-            
-            total_weighted_sentiment = 0
-            total_duration = 0
-            for analysis in day_analyses:
-                if analysis.sentiment:
-                    try:
-                        sentiment_value = analysis.sentiment
-                        if isinstance(sentiment_value, str):
-                            sentiment_value = sentiment_value.strip()
-                        
-                        # Convert string to integer (since it stores int in string format)
-                        score = int(sentiment_value)
-                        
-                        # Get duration from audio segment
-                        duration_seconds = 0
-                        if analysis.transcription_detail and analysis.transcription_detail.audio_segment:
-                            duration_seconds = analysis.transcription_detail.audio_segment.duration_seconds
-                        
-                        # Calculate weighted sentiment: sentiment_score * duration
-                        total_weighted_sentiment += score * duration_seconds
-
-                        total_duration += duration_seconds
-                    except (ValueError, TypeError):
-                        # If conversion fails, skip this sentiment (shouldn't happen with integer strings)
-                        continue
-            
-            if total_duration > 0:
-                day_avg = round(total_weighted_sentiment / total_duration, 3)
+            totals = day_totals.get(current_date)
+            if totals and totals['duration'] and totals['duration'] > 0:
+                day_avg = round(totals['weighted'] / totals['duration'], 3)
                 sentiment_data.append({
                     'date': current_date.strftime('%d/%m/%Y'),
                     'sentiment': day_avg
@@ -508,7 +370,6 @@ def _get_shift_analytics_data(start_dt, end_dt, channel_id, show_all_topics=Fals
         # Get transcriptions for this shift
         shift_transcriptions = []
         shift_sentiments = []
-        shift_topics = defaultdict(int)
         
         # Query AudioSegments for this shift and channel
         audio_segments = AudioSegments.objects.filter(
@@ -533,47 +394,32 @@ def _get_shift_analytics_data(start_dt, end_dt, channel_id, show_all_topics=Fals
         # Get transcription details and analysis for this shift
         total_weighted_sentiment = 0
         total_duration = 0
+        shift_analysis_ids = []
         for segment in shift_transcriptions:
             try:
                 transcription_detail = segment.transcription_detail
                 if transcription_detail and hasattr(transcription_detail, 'analysis'):
                     analysis = transcription_detail.analysis
                     if analysis:
-                        # Get sentiment
-                        if analysis.sentiment:
-                            try:
-                                sentiment_value = int(analysis.sentiment.strip())
-                                
-                                # Get duration from audio segment
-                                duration_seconds = 0
-                                if segment:
-                                    duration_seconds = segment.duration_seconds
-                                
-                                # Calculate weighted sentiment: sentiment_score * duration
-                                total_weighted_sentiment += sentiment_value * duration_seconds
-                                total_duration += duration_seconds
-                            except (ValueError, TypeError):
-                                continue
-                        
-                        # Get topics
-                        if analysis.general_topics:
-                            topics_text = analysis.general_topics
-                            topic_lines = topics_text.split('\n')
+                        # Get sentiment (parsed into sentiment_score when the analysis was stored)
+                        if analysis.sentiment_score is not None:
+                            # Get duration from audio segment
+                            duration_seconds = 0
+                            if segment:
+                                duration_seconds = segment.duration_seconds
                             
-                            for line in topic_lines:
-                                line = line.strip()
-                                if line:
-                                    if line[0].isdigit() and '. ' in line:
-                                        topic = line.split('. ', 1)[1] if '. ' in line else line
-                                    else:
-                                        topic = line
-                                    
-                                    topic = topic.strip()
-                                    if topic:
-                                        shift_topics[topic] += 1
+                            # Calculate weighted sentiment: sentiment_score * duration
+                            total_weighted_sentiment += analysis.sentiment_score * duration_seconds
+                            total_duration += duration_seconds
+                        
+                        # Topics are counted for all of the shift's analyses at once below
+                        shift_analysis_ids.append(analysis.id)
             except:
                 continue
         
+        # Get topics (parsed into AnalysisTopic rows)
+        shift_topics = _count_topics_for_analyses(shift_analysis_ids)
+        
         # Filter out inactive topics if show_all_topics is False
         if not show_all_topics:
             # Get all inactive topic names from GeneralTopic model (case-insensitive)
@@ -716,7 +562,7 @@ def _get_shift_analytics_data_v2(start_dt, end_dt, channel_id, show_all_topics=F
         # Get transcription details and analysis for this shift
         total_weighted_sentiment = 0
         total_duration = 0
-        shift_topics = defaultdict(int)
+        shift_analysis_ids = []
         
         for segment in shift_segments:
             try:
@@ -724,41 +570,25 @@ def _get_shift_analytics_data_v2(start_dt, end_dt, channel_id, show_all_topics=F
                 if transcription_detail and hasattr(transcription_detail, 'analysis'):
                     analysis = transcription_detail.analysis
                     if analysis:
-                        # Get sentiment
-                        if analysis.sentiment:
-                            try:
-                                sentiment_value = int(analysis.sentiment.strip())
-                                
-                                # Get duration from audio segment
-                                duration_seconds = 0
-                                if segment:
-                                    duration_seconds = segment.duration_seconds
-                                
-                                # Calculate weighted sentiment: sentiment_score * duration
-                                total_weighted_sentiment += sentiment_value * duration_seconds
-                                total_duration += duration_seconds
-                            except (ValueError, TypeError):
-                                continue
-                        
-                        # Get topics
-                        if analysis.general_topics:
-                            topics_text = analysis.general_topics
-                            topic_lines = topics_text.split('\n')
+                        # Get sentiment (parsed into sentiment_score when the analysis was stored)
+                        if analysis.sentiment_score is not None:
+                            # Get duration from audio segment
+                            duration_seconds = 0
+                            if segment:
+                                duration_seconds = segment.duration_seconds
                             
-                            for line in topic_lines:
-                                line = line.strip()
-                                if line:
-                                    if line[0].isdigit() and '. ' in line:
-                                        topic = line.split('. ', 1)[1] if '. ' in line else line
-                                    else:
-                                        topic = line
-                                    
-                                    topic = topic.strip()
-                                    if topic:
-                                        shift_topics[topic] += 1
+                            # Calculate weighted sentiment: sentiment_score * duration
+                            total_weighted_sentiment += analysis.sentiment_score * duration_seconds
+                            total_duration += duration_seconds
+                        
+                        # Topics are counted for all of the shift's analyses at once below
+                        shift_analysis_ids.append(analysis.id)
             except:
                 continue
         
+        # Get topics (parsed into AnalysisTopic rows)
+        shift_topics = _count_topics_for_analyses(shift_analysis_ids)
+        
         # Filter out inactive topics if show_all_topics is False
         if not show_all_topics:
             # Get all inactive topic names from GeneralTopic model (case-insensitive)
@@ -999,7 +829,10 @@ def get_topic_audio_segments(topic_name, start_date_or_datetime=None, end_date_o
             Q(transcription_detail__audio_segment__channel_id=channel_id)
         )
     
-    analyses = analyses_query.all()
+    # Analyses holding the topic, matched on the lower-case topic parsed from general_topics
+    analyses = analyses_query.filter(topics__topic_key=topic_name.lower()).select_related(
+        'transcription_detail__audio_segment__channel'
+    )
     
     # Find audio segments for the specific topic
     topic_audio_segments = []
@@ -1007,36 +840,13 @@ def get_topic_audio_segments(topic_name, start_date_or_datetime=None, end_date_o
     
     for analysis in analyses:
         if analysis.general_topics:
-            topics_text = analysis.general_topics
-            topic_lines = topics_text.split('\n')
-            
             # Get audio segment from the analysis
             audio_segment = None
             if analysis.transcription_detail and analysis.transcription_detail.audio_segment:
                 audio_segment = analysis.transcription_detail.audio_segment
             
-            # Check if this analysis contains our target topic
-            topic_found = False
-            for line in topic_lines:
-                line = line.strip()
-                if line:
-                    if line[0].isdigit():
-                        # Handle both formats: "1. Topic" and "1 Topic"
-                        if '. ' in line:
-                            topic = line.split('. ', 1)[1]
-                        elif ' ' in line:
-                            topic = line.split(' ', 1)[1]
-                        else:
-                            topic = line
-                    else:
-                        topic = line
-                    topic = topic.strip()
-                    if topic and topic.lower() == topic_name.lower():
-                        topic_found = True
-                        break
-            
-            # If topic found and we have an audio segment, add it to results
-            if topic_found and audio_segment and audio_segment.id not in topic_audio_segment_ids:
+            # If we have an audio segment, add it to results
+            if audio_segment and audio_segment.id not in topic_audio_segment_ids:
                 topic_audio_segment_ids.add(audio_segment.id)
                 
                 # Get transcription details
@@ -1,6 +1,8 @@
 from typing import Dict, Set, Tuple, Optional, List
 from datetime import datetime, timedelta
-from django.db.models import Q
+from zoneinfo import ZoneInfo
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 
 # Import your actual models
@@ -15,73 +17,6 @@ class BucketCountService:
     classified by WellnessBucket categories (personal, community, spiritual).
     """
 
-    @staticmethod
-    def _parse_bucket_prompt_line(line: str) -> Tuple[Optional[str], Optional[str]]:
-        """
-        Parse a single bucket prompt line and return (primary, secondary) topic names.
-        """
-        if not line:
-            return None, None
-        text = line.strip()
-        if not text:
-            return None, None
-        
-        # Skip AI output prefixes
-        ai_prefixes = ["empty result", "output:", "result:", "analysis:", "response:"]
-        text_lower = text.lower()
-        for prefix in ai_prefixes:
-            if text_lower.startswith(prefix):
-                text = text[len(prefix):].strip()
-                if text.startswith('\n'):
-                    text = text[1:].strip()
-                break
-        
-        # Normalize separators to comma
-        parts = [p.strip() for p in text.replace("\t", ",").replace("|", ",").split(",")]
-        
-        if len(parts) < 4:
-            return None, None
-        
-        def is_undefined(token):
-            if token is None:
-                return True
-            t = str(token).strip().lower()
-            return t in {"undefined", "undef", "none", "null", "na", "n/a", "", "empty result", "output"}
-        
-        def is_score(token):
-            if token is None:
-                return False
-            t = str(token).strip().replace("%", "")
-            if not t:
-                return False
-            try:
-                float(t)
-                return True
-            except ValueError:
-                return False
-        
-        topics = []
-        i = 0
-        while i < len(parts) and len(topics) < 2:
-            token = parts[i]
-            if token == "":
-                i += 1
-                continue
-            if is_score(token):
-                i += 1
-                continue
-            if not is_undefined(token):
-                topics.append(token)
-            
-            if i + 1 < len(parts) and is_score(parts[i+1]):
-                i += 2
-            else:
-                i += 1
-        
-        primary = topics[0] if len(topics) > 0 else None
-        secondary = topics[1] if len(topics) > 1 else None
-        return primary, secondary
-
     @staticmethod
     def _get_bucket_title_to_category_mapping() -> Dict[str, str]:
         """
@@ -120,28 +55,42 @@ class BucketCountService:
         return found_categories
 
     @staticmethod
-    def _extract_categories_from_bucket_prompt(
-        bucket_text: str,
+    def _categories_for_buckets(
+        bucket_names: Tuple[Optional[str], Optional[str]],
         bucket_title_to_category: Dict[str, str]
     ) -> Set[str]:
+        """Categories of an analysis' (bucket_primary, bucket_secondary)"""
         found_categories = set()
-        if not bucket_text:
-            return found_categories
-        
-        lines = [l for l in str(bucket_text).split('\n') if l.strip()]
-        if not lines:
-            lines = [str(bucket_text)]
-        
-        for line in lines:
-            primary, secondary = BucketCountService._parse_bucket_prompt_line(line)
-            for bucket_name in [primary, secondary]:
-                categories = BucketCountService._map_bucket_name_to_categories(
-                    bucket_name,
-                    bucket_title_to_category
-                )
-                found_categories.update(categories)
+        for bucket_name in bucket_names:
+            found_categories.update(
+                BucketCountService._map_bucket_name_to_categories(bucket_name, bucket_title_to_category)
+            )
         return found_categories
 
+    @staticmethod
+    def _grouped_buckets(queryset, *fields):
+        """
+        Rows of the segments grouped by the analysis' parsed buckets (and extra fields), with the
+        segment count and total duration; the buckets were parsed from bucket_prompt on save.
+        """
+        return (
+            queryset
+            .order_by()
+            .values(
+                'transcription_detail__analysis__bucket_primary',
+                'transcription_detail__analysis__bucket_secondary',
+                *fields
+            )
+            .annotate(segment_count=Count('id'), total_duration=Sum('duration_seconds'))
+        )
+
+    @staticmethod
+    def _bucket_names(row) -> Tuple[Optional[str], Optional[str]]:
+        return (
+            row['transcription_detail__analysis__bucket_primary'],
+            row['transcription_detail__analysis__bucket_secondary'],
+        )
+
     @staticmethod
     def _get_last_6_months() -> List[Tuple[str, datetime, datetime]]:
         current_time = timezone.now()
@@ -205,23 +154,17 @@ class BucketCountService:
             except Shift.DoesNotExist:
                 return BucketCountService._get_empty_result()
         
-        # MEMORY FIX 1: Use .values() to fetch only the text, not full models
-        # MEMORY FIX 2: Use .iterator() to stream results
-        main_iterator = audio_segments_query.values(
-            'transcription_detail__analysis__bucket_prompt'
-        ).iterator(chunk_size=2000)
-
+        # One row per distinct bucket pair; each pair is mapped to its categories once
         category_counts = {'personal': 0, 'community': 0, 'spiritual': 0}
         
-        for entry in main_iterator:
-            bucket_text = entry.get('transcription_detail__analysis__bucket_prompt')
-            found_categories = BucketCountService._extract_categories_from_bucket_prompt(
-                bucket_text,
+        for row in BucketCountService._grouped_buckets(audio_segments_query):
+            found_categories = BucketCountService._categories_for_buckets(
+                BucketCountService._bucket_names(row),
                 bucket_title_to_category
             )
             for category in found_categories:
                 if category in category_counts:
-                    category_counts[category] += 1
+                    category_counts[category] += row['segment_count']
         
         # --- 2. MONTHLY BREAKDOWN ---
         monthly_breakdown = {}
@@ -247,40 +190,27 @@ class BucketCountService:
                 except Exception:
                     monthly_query = monthly_query.none()
             
-            # MEMORY FIX: Stream monthly data, fetch only start_time and prompt
-            monthly_iterator = monthly_query.values(
-                'start_time',
-                'transcription_detail__analysis__bucket_prompt'
-            ).iterator(chunk_size=2000)
-
             # Prepare buckets
             monthly_counts = {k: {'personal': 0, 'community': 0, 'spiritual': 0} for k, _, _ in last_6_months}
-            month_ranges = {k: (s, e) for k, s, e in last_6_months}
             
-            for entry in monthly_iterator:
-                bucket_text = entry.get('transcription_detail__analysis__bucket_prompt')
-                if not bucket_text:
-                    continue
-                
-                segment_start = entry['start_time']
-                segment_month_key = segment_start.strftime('%Y-%m')
-                
+            # The month ranges are whole UTC months, so grouping by UTC month assigns every segment
+            monthly_rows = BucketCountService._grouped_buckets(
+                monthly_query.annotate(month=TruncMonth('start_time', tzinfo=ZoneInfo("UTC"))),
+                'month'
+            )
+            for row in monthly_rows:
+                segment_month_key = row['month'].strftime('%Y-%m')
                 if segment_month_key not in monthly_counts:
                     continue
                 
-                # Check specific range (crucial for shifts)
-                m_start, m_end = month_ranges[segment_month_key]
-                if not (m_start <= segment_start <= m_end):
-                    continue
-                
-                found_categories = BucketCountService._extract_categories_from_bucket_prompt(
-                    bucket_text,
+                found_categories = BucketCountService._categories_for_buckets(
+                    BucketCountService._bucket_names(row),
                     bucket_title_to_category
                 )
                 
                 for category in found_categories:
                     if category in monthly_counts[segment_month_key]:
-                        monthly_counts[segment_month_key][category] += 1
+                        monthly_counts[segment_month_key][category] += row['segment_count']
             
             # Build breakdown structure
             for m_key, _, _ in last_6_months:
@@ -304,39 +234,31 @@ class BucketCountService:
         }
 
     @staticmethod
-    def _extract_bucket_titles_for_category(
-        bucket_text: str,
+    def _bucket_titles_for_category(
+        bucket_names: Tuple[Optional[str], Optional[str]],
         category_name: str,
         bucket_title_to_category: Dict[str, str]
     ) -> List[str]:
+        """WellnessBucket titles of the category matched by an analysis' (bucket_primary, bucket_secondary)"""
         found_buckets = []
-        if not bucket_text:
-            return found_buckets
-        
-        lines = [l for l in str(bucket_text).split('\n') if l.strip()]
-        if not lines:
-            lines = [str(bucket_text)]
-        
-        for line in lines:
-            primary, secondary = BucketCountService._parse_bucket_prompt_line(line)
-            for bucket_name in [primary, secondary]:
-                if not bucket_name:
-                    continue
-                
-                bucket_name_normalized = ' '.join(bucket_name.upper().split())
-                
-                if bucket_name_normalized in bucket_title_to_category:
-                    if bucket_title_to_category[bucket_name_normalized] == category_name:
-                        found_buckets.append(bucket_name_normalized)
-                else:
-                    for title, cat in bucket_title_to_category.items():
-                        title_normalized = ' '.join(title.split())
-                        if (bucket_name_normalized == title_normalized or 
-                            bucket_name_normalized in title_normalized or 
-                            title_normalized in bucket_name_normalized):
-                            if cat == category_name:
-                                found_buckets.append(title_normalized)
-                            break
+        for bucket_name in bucket_names:
+            if not bucket_name:
+                continue
+            
+            bucket_name_normalized = ' '.join(bucket_name.upper().split())
+            
+            if bucket_name_normalized in bucket_title_to_category:
+                if bucket_title_to_category[bucket_name_normalized] == category_name:
+                    found_buckets.append(bucket_name_normalized)
+            else:
+                for title, cat in bucket_title_to_category.items():
+                    title_normalized = ' '.join(title.split())
+                    if (bucket_name_normalized == title_normalized or 
+                        bucket_name_normalized in title_normalized or 
+                        title_normalized in bucket_name_normalized):
+                        if cat == category_name:
+                            found_buckets.append(title_normalized)
+                        break
         return found_buckets
 
     @staticmethod
@@ -386,35 +308,26 @@ class BucketCountService:
             except Shift.DoesNotExist:
                 return BucketCountService._get_empty_category_result(category_name, start_dt, end_dt)
         
-        # MEMORY FIX: Stream results, select only bucket_prompt and duration
-        data_iterator = audio_segments_query.values(
-            'transcription_detail__analysis__bucket_prompt',
-            'duration_seconds'
-        ).iterator(chunk_size=2000)
-
         bucket_counts = {bucket_title: 0 for bucket_title in category_buckets.keys()}
         bucket_durations = {bucket_title: 0 for bucket_title in category_buckets.keys()}
         total_filtered_duration = 0
         
-        for entry in data_iterator:
-            bucket_text = entry.get('transcription_detail__analysis__bucket_prompt')
-            if not bucket_text:
-                continue
-            
-            found_buckets = BucketCountService._extract_bucket_titles_for_category(
-                bucket_text,
+        for row in BucketCountService._grouped_buckets(audio_segments_query):
+            found_buckets = BucketCountService._bucket_titles_for_category(
+                BucketCountService._bucket_names(row),
                 category_name,
                 bucket_title_to_category
             )
             if not found_buckets:
                 continue
             
-            duration_seconds = entry.get('duration_seconds') or 0
+            segment_count = row['segment_count']
+            duration_seconds = row['total_duration'] or 0
             total_filtered_duration += duration_seconds
             
             for bucket_title in found_buckets:
                 if bucket_title in bucket_counts:
-                    bucket_counts[bucket_title] += 1
+                    bucket_counts[bucket_title] += segment_count
                     bucket_durations[bucket_title] += duration_seconds
         
         # Calculate totals
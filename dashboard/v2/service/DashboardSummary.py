@@ -3,14 +3,21 @@ from __future__ import annotations
 from typing import Optional, List, Dict, Iterable, Any, Tuple
 from datetime import datetime
 from collections import defaultdict
-from django.db.models import Q
+from zoneinfo import ZoneInfo
+from django.conf import settings as django_settings
+from django.db.models import Count, F, FloatField, Q, QuerySet, Sum
+from django.db.models.functions import Cast, TruncDate
 
+from core_admin.models import Channel
 from data_analysis.models import AudioSegments, ReportFolder, SavedAudioSegment
 from data_analysis.repositories import AudioSegmentDAO
 from audio_policy.models import FlagCondition
 from shift_analysis.models import Shift
 
 
+UTC = ZoneInfo("UTC")
+
+
 class ShiftNotFound(Exception):
     """Raised when a requested shift is not found."""
     pass
@@ -26,7 +33,7 @@ class SummaryService:
     @staticmethod
     def _get_sentiment_score_from_segment(segment: AudioSegments) -> Optional[float]:
         """
-        Extract and parse sentiment score from an audio segment.
+        Get the sentiment score of an audio segment.
         
         Note: Assumes segment has transcription_detail and analysis (guaranteed by query filters).
         
@@ -34,23 +41,21 @@ class SummaryService:
             segment: AudioSegments instance to extract sentiment from
         
         Returns:
-            Parsed sentiment score as float, or None if sentiment is missing or invalid
+            The analysis sentiment_score (parsed when the analysis was stored), or None if missing or invalid
         """
-        transcription_detail = segment.transcription_detail
-        analysis = transcription_detail.analysis
-        if not analysis.sentiment:
-            return None
-        
-        return SummaryService._parse_sentiment_score(analysis.sentiment)
+        return segment.transcription_detail.analysis.sentiment_score
 
     @staticmethod
     def calculate_all_metrics(
         audio_segments: Iterable[AudioSegments],
-        thresholds: Dict[str, float]
+        thresholds: Dict[str, float],
+        tz: ZoneInfo = UTC
     ) -> Dict[str, Any]:
         """
         Calculates all metrics in a single pass over the data.
         
+        This is the reference implementation of calculate_all_metrics_sql, which get_summary_data uses.
+        
         Args:
             audio_segments: Iterable of AudioSegments with transcription_detail and analysis loaded
             thresholds: Dictionary containing sentiment threshold values:
@@ -58,6 +63,7 @@ class SummaryService:
                 - sentiment_min_upper: Upper bound for low sentiment
                 - sentiment_max_lower: Lower bound for high sentiment
                 - sentiment_max_upper: Upper bound for high sentiment
+            tz: Timezone of the per-day grouping (of the transcription created_at)
         
         Returns:
             Dictionary containing:
@@ -106,7 +112,7 @@ class SummaryService:
             if not created_at:
                 continue
             
-            date_key = created_at.strftime('%d/%m/%Y')
+            date_key = created_at.astimezone(tz).strftime('%d/%m/%Y')
             daily_stats[date_key]["weighted_sent"] += score * duration
             daily_stats[date_key]["duration"] += duration
 
@@ -133,14 +139,91 @@ class SummaryService:
         }
 
     @staticmethod
-    def _parse_sentiment_score(value: Any) -> Optional[float]:
-        if isinstance(value, str):
-            value = value.strip().rstrip('%')
+    def calculate_all_metrics_sql(
+        audio_segments: QuerySet,
+        thresholds: Dict[str, float],
+        tz: ZoneInfo = UTC
+    ) -> Dict[str, Any]:
+        """
+        calculate_all_metrics computed by the database with one query grouped by day.
+        
+        Each day row holds the segment count, SUM(score * duration), SUM(duration) and the
+        durations in the low and high sentiment ranges. Only segments with a sentiment score and
+        a positive duration are summed. The day is the transcription created_at date in tz.
+        The totals add up the day rows.
+        
+        Args:
+            audio_segments: AudioSegments queryset (duplicate rows from joins are counted once)
+            thresholds: Sentiment threshold values, as for calculate_all_metrics
+            tz: Timezone of the per-day grouping
+        
+        Returns:
+            The same dictionary as calculate_all_metrics
+        """
+        score_field = 'transcription_detail__analysis__sentiment_score'
+        duration = Cast('duration_seconds', FloatField())
+        summed = Q(**{f'{score_field}__isnull': False}, duration_seconds__gt=0)
+        low = summed & Q(**{
+            f'{score_field}__gte': thresholds['sentiment_min_lower'],
+            f'{score_field}__lte': thresholds['sentiment_min_upper'],
+        })
+        high = summed & Q(**{
+            f'{score_field}__gte': thresholds['sentiment_max_lower'],
+            f'{score_field}__lte': thresholds['sentiment_max_upper'],
+        })
 
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
+        rows = (
+            AudioSegments.objects
+            .filter(id__in=audio_segments.values('id'))
+            .annotate(day=TruncDate('transcription_detail__created_at', tzinfo=tz))
+            .order_by()
+            .values('day')
+            .annotate(
+                segment_count=Count('id'),
+                weighted_sent=Sum(F(score_field) * duration, filter=summed, output_field=FloatField()),
+                duration=Sum(duration, filter=summed),
+                low_duration=Sum(duration, filter=low),
+                high_duration=Sum(duration, filter=high),
+            )
+        )
+
+        total_duration = 0.0
+        total_weighted_sentiment = 0.0
+        low_sent_duration = 0.0
+        high_sent_duration = 0.0
+        analyzed_count = 0
+        daily_stats = {}
+        for row in rows:
+            analyzed_count += row['segment_count']
+            if not row['duration']:
+                continue
+            total_duration += row['duration']
+            total_weighted_sentiment += row['weighted_sent']
+            low_sent_duration += row['low_duration'] or 0.0
+            high_sent_duration += row['high_duration'] or 0.0
+            if row['day'] is not None:
+                daily_stats[row['day'].strftime('%d/%m/%Y')] = row
+
+        avg_sentiment = round(total_weighted_sentiment / total_duration, 3) if total_duration > 0 else None
+        low_pct = round((low_sent_duration / total_duration) * 100, 2) if total_duration > 0 else None
+        high_pct = round((high_sent_duration / total_duration) * 100, 2) if total_duration > 0 else None
+
+        # Same order as calculate_all_metrics (by the date string)
+        per_day = [
+            {
+                "date": d,
+                "average_sentiment": round(row["weighted_sent"] / row["duration"], 3)
+            }
+            for d, row in sorted(daily_stats.items())
+        ]
+
+        return {
+            "average_sentiment": avg_sentiment,
+            "low_sentiment": low_pct,
+            "high_sentiment": high_pct,
+            "per_day_average_sentiments": per_day,
+            "analyzed_segment_count": analyzed_count
+        }
 
     @staticmethod
     def _get_sentiment_thresholds(channel_id: int) -> Dict[str, float]:
@@ -244,7 +327,7 @@ class SummaryService:
         start_dt: datetime,
         end_dt: datetime,
         shift_id: Optional[int] = None,
-    ) -> Tuple[List[AudioSegments], int]:
+    ) -> Tuple[QuerySet, int]:
         """
         Get audio segments filtered by channel with datetime and optional shift filtering.
         
@@ -256,7 +339,7 @@ class SummaryService:
         
         Returns:
             Tuple of (audio_segments, total_talk_break)
-            - audio_segments: List of AudioSegments with transcription and analysis
+            - audio_segments: QuerySet of AudioSegments with transcription and analysis
             - total_talk_break: Count of segments with transcription
         
         Raises:
@@ -286,8 +369,8 @@ class SummaryService:
             transcription_detail__analysis__isnull=False  # Also ensure analysis exists
         )
         
-        # Get all audio segments with transcription and analysis
-        audio_segments = list(audio_segments_query)
+        # Audio segments with transcription and analysis (evaluated by the metrics calculation)
+        audio_segments = audio_segments_query
         
         # Count total talk break (segments with transcription, is_active=True, is_delete=False)
         # This uses the same datetime/shift filter but doesn't require analysis
@@ -309,7 +392,7 @@ class SummaryService:
         start_dt: datetime,
         end_dt: datetime,
         shift_id: Optional[int] = None,
-    ) -> Tuple[List[AudioSegments], int, int]:
+    ) -> Tuple[QuerySet, int, int]:
         """
         Get audio segments filtered by report folder with datetime and optional shift filtering.
         
@@ -321,7 +404,7 @@ class SummaryService:
         
         Returns:
             Tuple of (audio_segments, total_talk_break, channel_id)
-            - audio_segments: List of AudioSegments with transcription and analysis
+            - audio_segments: QuerySet of AudioSegments with transcription and analysis
             - total_talk_break: Count of segments with transcription
             - channel_id: Channel ID from the report folder
         
@@ -373,8 +456,8 @@ class SummaryService:
             base_query = base_query.filter(q_object)
             total_talk_break_query = total_talk_break_query.filter(q_object)
         
-        # Get all audio segments with transcription and analysis
-        audio_segments = list(base_query)
+        # Audio segments with transcription and analysis (evaluated by the metrics calculation)
+        audio_segments = base_query
         
         # Count total talk break using the same filters (including shift if applicable)
         total_talk_break = total_talk_break_query.count()
@@ -494,8 +577,14 @@ class SummaryService:
         thresholds = SummaryService._get_sentiment_thresholds(channel_id)
         target_sentiment_score = thresholds['target_sentiment_score']
         
-        # Calculate all metrics in a single pass
-        metrics = SummaryService.calculate_all_metrics(audio_segments, thresholds)
+        # Per-day averages follow the channel's local days
+        tz = ZoneInfo(Channel.objects.filter(id=channel_id).values_list('timezone', flat=True).first() or "UTC")
+        
+        # Calculate all metrics in the database, or in a single pass over the segments
+        if django_settings.SUMMARY_SQL_AGGREGATION:
+            metrics = SummaryService.calculate_all_metrics_sql(audio_segments, thresholds, tz)
+        else:
+            metrics = SummaryService.calculate_all_metrics(audio_segments, thresholds, tz)
         
         # Build and return summary data
         return {
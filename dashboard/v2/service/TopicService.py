@@ -1,11 +1,10 @@
 from typing import Dict, List, Tuple, Optional, Any, Iterable
 from datetime import datetime
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import QuerySet, Q
+from django.db.models import Count, F, FloatField, QuerySet, Q, Sum
 from django.utils import timezone
-from collections import defaultdict
 
-from data_analysis.models import TranscriptionAnalysis, GeneralTopic, AudioSegments
+from data_analysis.models import AnalysisTopic, TranscriptionAnalysis, GeneralTopic, AudioSegments
 
 
 class TopicService:
@@ -13,29 +12,10 @@ class TopicService:
     Service class for getting top topics by duration and count
     """
 
-    @staticmethod
-    def _parse_sentiment_score(value: Any) -> Optional[float]:
-        """
-        Parse sentiment score from various formats.
-        
-        Args:
-            value: Sentiment value (can be string, int, float, or None)
-        
-        Returns:
-            Parsed sentiment score as float, or None if invalid
-        """
-        if isinstance(value, str):
-            value = value.strip().rstrip('%')
-
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
-
     @staticmethod
     def _get_sentiment_score_from_segment(segment: AudioSegments) -> Optional[float]:
         """
-        Extract and parse sentiment score from an audio segment.
+        Get the sentiment score of an audio segment.
 
         Segments without transcription_detail (not yet transcribed) are skipped and return None.
 
@@ -43,16 +23,13 @@ class TopicService:
             segment: AudioSegments instance to extract sentiment from
 
         Returns:
-            Parsed sentiment score as float, or None if sentiment is missing, invalid, or segment has no transcription
+            The analysis sentiment_score, or None if sentiment is missing, invalid, or segment has no transcription
         """
         try:
-            transcription_detail = segment.transcription_detail
-            analysis = transcription_detail.analysis
+            analysis = segment.transcription_detail.analysis
         except ObjectDoesNotExist:
             return None
-        if not analysis or not analysis.sentiment:
-            return None
-        return TopicService._parse_sentiment_score(analysis.sentiment)
+        return analysis.sentiment_score if analysis else None
 
     @staticmethod
     def get_average_sentiment(
@@ -87,76 +64,49 @@ class TopicService:
         return None
 
     @staticmethod
-    def _parse_topics_from_text(topics_text) -> List[str]:
+    def get_queryset_average_sentiment(audio_segments: QuerySet) -> Optional[float]:
         """
-        Parse topics from the general_topics text field.
-        
-        Expected format: "1. Funding  \n2. Listener Support  \n3. Radio Station  \n..."
-        Each line can be:
-        - "1. Topic Name" (with period and space)
-        - "1 Topic Name" (with space but no period)
-        - "Topic Name" (no number prefix)
-        
+        get_average_sentiment computed in the database: SUM(sentiment_score * duration) / SUM(duration)
+        over the segments with a sentiment score and a positive duration.
+
         Args:
-            topics_text: Text containing topics, one per line with optional numbering.
-                        Can be None, "undefined", or empty string.
-            
+            audio_segments: AudioSegments queryset
+
         Returns:
-            List of topic names (cleaned and stripped)
+            Average sentiment score (rounded to 3 decimal places) or None if no valid data
         """
-        # Handle None, undefined, or empty values
-        if not topics_text:
-            return []
-        
-        # Convert to string if not already
-        if not isinstance(topics_text, str):
-            topics_text = str(topics_text)
-        
-        # Handle the string "undefined" (case-insensitive)
-        if topics_text.strip().lower() in ['undefined', 'null', 'none']:
-            return []
-        
-        topics = []
-        # Split by newline to get individual topic lines
-        topic_lines = topics_text.split('\n')
-        
-        for line in topic_lines:
-            # Strip leading/trailing whitespace from the line
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Skip lines that are just "undefined" or similar
-            if line.lower() in ['undefined', 'null', 'none']:
-                continue
-            
-            # Check if line starts with a number (numbered format)
-            if line and line[0].isdigit():
-                # Handle format: "1. Topic Name" or "1 Topic Name"
-                if '. ' in line:
-                    # Format: "1. Topic Name" - split on ". " and take the part after
-                    topic = line.split('. ', 1)[1].strip()
-                elif ' ' in line:
-                    # Format: "1 Topic Name" - split on first space and take the part after
-                    topic = line.split(' ', 1)[1].strip()
-                else:
-                    # Just a number, skip it
-                    continue
-            else:
-                # No number prefix, use the line as-is
-                topic = line.strip()
-            
-            # Skip if topic is "undefined" or similar after parsing
-            if topic.lower() in ['undefined', 'null', 'none']:
-                continue
-            
-            # Only add non-empty topics
-            if topic:
-                topics.append(topic)
-        
-        return topics
+        totals = AudioSegments.objects.filter(
+            id__in=audio_segments.values('id'),
+            duration_seconds__gt=0,
+            transcription_detail__analysis__sentiment_score__isnull=False,
+        ).aggregate(
+            weighted=Sum(
+                F('transcription_detail__analysis__sentiment_score') * F('duration_seconds'),
+                output_field=FloatField()
+            ),
+            duration=Sum('duration_seconds', output_field=FloatField()),
+        )
+        if totals['duration']:
+            return round(totals['weighted'] / totals['duration'], 3)
+        return None
+
+    @staticmethod
+    def _get_topic_totals(analyses: QuerySet, generaltopic_names: Optional[set] = None) -> QuerySet:
+        """
+        (topic_name, count, total_duration) rows of the AnalysisTopic rows of the analyses.
+        An analysis holds a topic once, so count is the number of segments with the topic.
+
+        Args:
+            analyses: TranscriptionAnalysis queryset
+            generaltopic_names: Lower-case topic names to leave out, or None to keep all topics
+        """
+        topics = AnalysisTopic.objects.filter(analysis_id__in=analyses.values('id'))
+        if generaltopic_names:
+            topics = topics.exclude(topic_key__in=generaltopic_names)
+        return topics.values('topic_name').annotate(
+            count=Count('id'),
+            total_duration=Sum('analysis__transcription_detail__audio_segment__duration_seconds'),
+        ).order_by()
 
     @staticmethod
     def _get_active_topic_names() -> set:
@@ -183,20 +133,6 @@ class TopicService:
         """
         return [topic for topic in topics if topic.lower() in active_topic_names]
 
-    @staticmethod
-    def _filter_out_generaltopic_topics(topics: List[str], generaltopic_names: set) -> List[str]:
-        """
-        Filter topics to exclude ones that are in GeneralTopic model.
-        
-        Args:
-            topics: List of topic names
-            generaltopic_names: Set of GeneralTopic names in lowercase (all topics in GeneralTopic, regardless of active status)
-            
-        Returns:
-            List of topic names that are NOT in GeneralTopic
-        """
-        return [topic for topic in topics if topic.lower() not in generaltopic_names]
-
     @staticmethod
     def _get_all_generaltopic_names() -> set:
         """
@@ -300,80 +236,15 @@ class TopicService:
             except Shift.DoesNotExist:
                 pass
         
-        # Get analyses with general_topics
-        analyses = TranscriptionAnalysis.objects.filter(
-            query,
-            general_topics__isnull=False
-        ).exclude(
-            general_topics=''
-        ).exclude(
-            general_topics__iexact='undefined'
-        ).select_related(
-            'transcription_detail__audio_segment'
-        )
-        
-        # Use distinct() when report_folder_id is used to avoid duplicates from the join
-        if report_folder_id is not None:
-            analyses = analyses.distinct()
-        
-        # Track both metrics in a single pass
-        # Use dictionaries to track segments and their durations per topic
-        topic_duration_segments = defaultdict(dict)  # topic_name -> {audio_segment_id: duration}
-        topic_count_segments = defaultdict(set)  # topic_name -> set of audio_segment_ids
-        
-        for analysis in analyses:
-            if not analysis.general_topics:
-                continue
-            
-            # Get audio segment
-            audio_segment = None
-            audio_segment_id = None
-            if analysis.transcription_detail and analysis.transcription_detail.audio_segment:
-                audio_segment = analysis.transcription_detail.audio_segment
-                audio_segment_id = audio_segment.id
-                duration = audio_segment.duration_seconds or 0
-            else:
-                continue
-            
-            # Parse topics
-            topics = TopicService._parse_topics_from_text(analysis.general_topics)
-            
-            # Filter topics based on show_all_topics flag
-            if show_all_topics:
-                # Show all topics (no filtering)
-                filtered_topics = topics
-            else:
-                # Exclude topics that are in GeneralTopic model
-                filtered_topics = TopicService._filter_out_generaltopic_topics(topics, generaltopic_names)
-            
-            # Calculate both metrics for each topic
-            for topic in filtered_topics:
-                # Track duration: store segment duration only once per topic per segment
-                if audio_segment_id not in topic_duration_segments[topic]:
-                    topic_duration_segments[topic][audio_segment_id] = duration
-                
-                # Track count: add segment only once per topic
-                if audio_segment_id not in topic_count_segments[topic]:
-                    topic_count_segments[topic].add(audio_segment_id)
-        
-        # Calculate final metrics from the dictionaries
-        topic_durations = {}
-        topic_counts = {}
-        for topic_name in set(topic_duration_segments.keys()) | set(topic_count_segments.keys()):
-            # Sum durations from unique segments
-            topic_durations[topic_name] = sum(topic_duration_segments.get(topic_name, {}).values())
-            # Count unique segments
-            topic_counts[topic_name] = len(topic_count_segments.get(topic_name, set()))
-        
-        # Format results with both metrics
+        analyses = TranscriptionAnalysis.objects.filter(query)
+
+        # Topics were parsed from general_topics into AnalysisTopic when the analyses were stored
         results = []
-        for topic_name in set(topic_durations.keys()) | set(topic_counts.keys()):
-            duration_seconds = int(topic_durations.get(topic_name, 0))
-            count = topic_counts.get(topic_name, 0)
-            
+        for row in TopicService._get_topic_totals(analyses, generaltopic_names):
+            duration_seconds = int(row['total_duration'] or 0)
             results.append({
-                'topic_name': topic_name,
-                'count': count,
+                'topic_name': row['topic_name'],
+                'count': row['count'],
                 'total_duration_seconds': duration_seconds,
                 'total_duration_formatted': TopicService._format_duration(duration_seconds)
             })
@@ -514,65 +385,16 @@ class TopicService:
                         saved_in_folders__folder_id=report_folder_id
                     )
                 
-                shift_segments = shift_segments.select_related(
-                    'transcription_detail',
-                    'transcription_detail__analysis'
-                )
-                
-                # Use distinct() when report_folder_id is used to avoid duplicates from the join
-                if report_folder_id is not None:
-                    shift_segments = shift_segments.distinct()
-                
-                # Convert queryset to list to ensure related data is loaded
-                # This is needed for both sentiment calculation and getting segment IDs
-                segments_list = list(shift_segments)
-                segment_ids = [seg.id for seg in segments_list]
-
-                # get_average_sentiment skips segments without transcription_detail
-                average_sentiment = TopicService.get_average_sentiment(segments_list)
-                if not segment_ids:
-                    # No segments for this shift, add empty result
-                    shift_results[shift.id] = {
-                        'shift_id': shift.id,
-                        'shift_name': shift.name,
-                        'topics': {},
-                        'average_sentiment': average_sentiment
-                    }
-                    continue
-                
-                # Get transcription analyses for these segments (for topic counting)
+                # Sentiment and topic counts are aggregated in the database from the parsed analysis columns.
+                # Both go through id subqueries, so the report folder join cannot duplicate segments.
+                average_sentiment = TopicService.get_queryset_average_sentiment(shift_segments)
                 analyses = TranscriptionAnalysis.objects.filter(
-                    transcription_detail__audio_segment_id__in=segment_ids,
-                    general_topics__isnull=False
-                ).exclude(
-                    general_topics=''
-                ).exclude(
-                    general_topics__iexact='undefined'
-                ).select_related(
-                    'transcription_detail__audio_segment'
+                    transcription_detail__audio_segment__in=shift_segments.values('id')
                 )
-                
-                # Count topics for this shift
-                topic_counts = defaultdict(int)
-                
-                for analysis in analyses:
-                    if not analysis.general_topics:
-                        continue
-                    
-                    # Parse topics
-                    topics = TopicService._parse_topics_from_text(analysis.general_topics)
-                    
-                    # Filter topics based on show_all_topics flag
-                    if show_all_topics:
-                        # Show all topics (no filtering)
-                        filtered_topics = topics
-                    else:
-                        # Exclude topics that are in GeneralTopic model
-                        filtered_topics = TopicService._filter_out_generaltopic_topics(topics, generaltopic_names)
-                    
-                    # Count each topic
-                    for topic in filtered_topics:
-                        topic_counts[topic] += 1
+                topic_counts = {
+                    row['topic_name']: row['count']
+                    for row in TopicService._get_topic_totals(analyses, generaltopic_names)
+                }
                 
                 # Store results for this shift
                 shift_results[shift.id] = {
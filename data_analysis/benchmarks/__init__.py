@@ -0,0 +1,16 @@
+"""
+Synthetic workloads and the original implementations of optimized code paths. The tests check the
+optimized code against these references and the benchmark management command times both.
+"""
+import time
+
+
+def best_time(runner, repeat, *args):
+    """(result of the last run, best wall time in seconds over `repeat` runs) of runner(*args)"""
+    result = best = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = runner(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
@@ -0,0 +1,142 @@
+"""
+Synthetic flag conditions and transcripts, and the original per-keyword FlagCondition check the
+compiled matcher must reproduce.
+"""
+import random
+import re
+
+from audio_policy.flag_matcher import CompiledFlagCondition, flatten_nested_list
+from audio_policy.models import FlagCondition
+from data_analysis.benchmarks import best_time
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'te', 'su', 'no', 'vi', 'da', 'pe', 'zo', 'ni', 'bu', 'ge', 'fa', 'ho']
+
+
+def _word(rng, syllables=(2, 4)):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(*syllables)))
+
+
+def build_synthetic_condition(group_count=500, seed=7):
+    """Unsaved FlagCondition with group_count keyword groups (1-4 synonyms, some two-word phrases) and topic lists"""
+    rng = random.Random(seed)
+    groups = []
+    for _ in range(group_count):
+        group = []
+        for _ in range(rng.randint(1, 4)):
+            # Longer than most transcript words, so a keyword is not found in every transcript
+            keyword = _word(rng, (4, 5)) if rng.random() < 0.8 else f"{_word(rng)} {_word(rng)}"
+            group.append(keyword.capitalize() if rng.random() < 0.3 else keyword)
+        groups.append(group)
+    return FlagCondition(
+        transcription_keywords=groups,
+        summary_keywords=groups[:group_count // 5],
+        sentiment_min_lower=10, sentiment_min_upper=25, target_sentiments=50,
+        iab_topics=[[_word(rng)] for _ in range(40)],
+        bucket_prompt=[_word(rng) for _ in range(10)],
+        general_topics=[[_word(rng), _word(rng)] for _ in range(20)],
+    )
+
+
+def build_synthetic_segments(count=10000, words=150, seed=7):
+    """(transcription, analysis) dicts shaped like the serialized segments, from the same syllable vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = [_word(rng) for _ in range(5000)]
+    segments = []
+    for _ in range(count):
+        transcript = ' '.join(rng.choice(vocabulary) for _ in range(words))
+        summary = ' '.join(rng.choice(vocabulary) for _ in range(words // 6))
+        analysis = {
+            'summary': summary,
+            'sentiment': rng.choice(['12', 'Sentiment: 50', 'Neutral', '88.5%', '']),
+            'iab_topics': ', '.join(rng.choice(vocabulary) for _ in range(3)),
+            'bucket_prompt': rng.choice(vocabulary),
+            'general_topics': ', '.join(rng.choice(vocabulary) for _ in range(4)),
+        }
+        segments.append(({'transcript': transcript.capitalize()}, analysis))
+    return segments
+
+
+def run_reference(segments, flag_condition):
+    """The original check: one substring scan per keyword and topic, lists flattened per segment"""
+    results = []
+    for transcription, analysis in segments:
+        flags = {}
+
+        def check_keywords(text, keyword_groups):
+            if not text or not keyword_groups:
+                return False, ""
+            text_lower = text.lower()
+            matched = []
+            for group in keyword_groups:
+                if isinstance(group, list):
+                    for kw in group:
+                        if kw and kw.lower() in text_lower:
+                            matched.append(group)
+                            break
+            if matched:
+                display_matches = [', '.join(g) for g in matched[:3]]
+                return True, f"Found keywords: {', '.join(display_matches)}"
+            return False, ""
+
+        def check_list_overlap(source_val, condition_list, label):
+            if not condition_list:
+                return False, ""
+            target_flat = flatten_nested_list(condition_list)
+            if not isinstance(source_val, list):
+                source_val = [str(source_val)] if source_val else []
+            source_str = ' '.join(flatten_nested_list(source_val)).lower()
+            matched = [t for t in target_flat if t and t.lower() in source_str]
+            if matched:
+                return True, f"Found {label}: {', '.join(matched[:5])}"
+            return False, ""
+
+        for key, (triggered, message) in (
+            ('transcription_keywords', check_keywords(transcription.get('transcript', ''), flag_condition.transcription_keywords)),
+            ('summary_keywords', check_keywords(analysis.get('summary', ''), flag_condition.summary_keywords)),
+        ):
+            flags[key] = {'flagged': bool(triggered), 'message': message}
+
+        sentiment_value = None
+        match = re.search(r'-?\d+(\.\d+)?', str(analysis.get('sentiment') or ''))
+        if match:
+            sentiment_value = float(match.group())
+        triggered, message = False, ''
+        if sentiment_value is not None:
+            if flag_condition.target_sentiments is not None and sentiment_value == flag_condition.target_sentiments:
+                triggered, message = True, "Matches target sentiment"
+            for lower, upper in CompiledFlagCondition.get_sentiment_ranges(flag_condition):
+                if lower <= sentiment_value <= upper:
+                    triggered, message = True, f"Sentiment {sentiment_value} in range [{lower}, {upper}]"
+                    break
+        flags['sentiment'] = {'flagged': triggered, 'message': message}
+
+        for key, label in (('iab_topics', "IAB topics"), ('bucket_prompt', "bucket prompts"), ('general_topics', "general topics")):
+            triggered, message = check_list_overlap(analysis.get(key), getattr(flag_condition, key), label)
+            flags[key] = {'flagged': bool(triggered), 'message': message}
+        results.append(flags)
+    return results
+
+
+def run_compiled(segments, compiled):
+    return [compiled.evaluate(transcription, analysis) for transcription, analysis in segments]
+
+
+def run_benchmark(count=None, seed=7, repeat=3) -> dict:
+    """Time the per-keyword reference against the compiled matcher on 500 keyword groups"""
+    flag_condition = build_synthetic_condition(500, seed)
+    segments = build_synthetic_segments(count or 10000, 150, seed)
+    reference, reference_seconds = best_time(run_reference, repeat, segments, flag_condition)
+    compiled, compile_seconds = best_time(CompiledFlagCondition, 1, flag_condition)
+    result, candidate_seconds = best_time(run_compiled, repeat, segments, compiled)
+    keyword_count = sum(len(group) for group in flag_condition.transcription_keywords)
+    flagged = sum(flags['transcription_keywords']['flagged'] for flags in result)
+    return {
+        'reference': reference_seconds,
+        'candidate': candidate_seconds,
+        'matches': result == reference,
+        'details': [
+            f"Groups: 500 ({keyword_count} keywords), transcripts: {len(segments)}, keyword-flagged: {flagged}",
+            f"Compile: {compile_seconds * 1000:.0f} ms, once per condition version",
+        ],
+    }
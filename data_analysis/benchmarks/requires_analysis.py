@@ -0,0 +1,199 @@
+"""
+Synthetic channel rules and segment batches, and the original nested-loop requires_analysis
+annotation apply_channel_rules must reproduce.
+"""
+import copy
+import random
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from data_analysis.services.analysis_prereq_check import (
+    ChannelRules, _merge_intervals, _safe_parse_datetime, apply_channel_rules,
+)
+from data_analysis.benchmarks import best_time
+from shift_analysis.utils import _build_utc_windows_for_local_day
+
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def build_synthetic_rules(seed=7, rule_count=20, shift_count=6, tz_name="America/New_York"):
+    """ChannelRules with random title pairs, some without after_title, and day, evening and overnight shifts"""
+    rng = random.Random(seed)
+    title_rules = []
+    for index in range(rule_count):
+        after_title = "" if rng.random() < 0.2 else f"Title {rng.randint(0, 60)}"
+        title_rules.append((f"Title {rng.randint(0, 60)}", after_title, f"Category {index}"))
+    shifts = []
+    for _ in range(shift_count):
+        days = frozenset(rng.sample(WEEKDAYS, rng.randint(1, 7)))
+        start = dt_time(rng.randint(0, 23), rng.choice([0, 15, 30, 45]))
+        end = dt_time(rng.randint(0, 23), rng.choice([0, 15, 30, 45]))
+        shifts.append((days, start, end))
+    return ChannelRules(title_rules=tuple(title_rules), timezone=ZoneInfo(tz_name), shifts=tuple(shifts))
+
+
+def build_synthetic_segments(count=5000, seed=7, day=None):
+    """
+    Segment dicts as mark_requires_analysis receives them: a week of back to back clips with a
+    small title vocabulary, some recognized or short, ISO string or datetime times, a few overlaps
+    and unparseable rows, in shuffled order.
+    """
+    rng = random.Random(seed)
+    cursor = day or datetime(2025, 3, 6, tzinfo=dt_timezone.utc)
+    segments = []
+    for index in range(count):
+        duration = rng.choice([5, 30, 60, 120, 300, 900, 3600])
+        start, end = cursor, cursor + timedelta(seconds=duration)
+        if rng.random() < 0.5:
+            start, end = start.isoformat(), end.isoformat()
+        if rng.random() < 0.005:
+            start = "not a date"
+        segments.append({
+            'id': index + 1,
+            'channel_id': 1,
+            'title': f"Title {rng.randint(0, 60)}",
+            'start_time': start,
+            'end_time': end,
+            'duration_seconds': duration,
+            'is_recognized': rng.random() < 0.3,
+        })
+        cursor += timedelta(seconds=duration + rng.choice([0, 0, 0, 5, -10, 600]))
+    rng.shuffle(segments)
+    return segments
+
+
+def run_reference(segments, rules, suppression_duration=timedelta(minutes=10)):
+    """
+    The original mark_requires_analysis algorithm on one channel, without database access:
+    a nested loop over rules, shifts, local days and windows per segment, and a full scan of the
+    suppression intervals per segment. Returns (requires_analysis per segment id, renames).
+    """
+    segments = copy.deepcopy(segments)
+    for seg in segments:
+        seg["requires_analysis"] = True
+        if seg.get("is_recognized") is True:
+            seg["requires_analysis"] = False
+            continue
+        duration_val = seg.get("duration_seconds")
+        try:
+            if duration_val is not None and int(duration_val) < 10:
+                seg["requires_analysis"] = False
+                continue
+        except (TypeError, ValueError):
+            pass
+
+    segs = []
+    for seg in segments:
+        seg_start = _safe_parse_datetime(seg.get("start_time"))
+        seg_end = _safe_parse_datetime(seg.get("end_time"))
+        if seg_start is None or seg_end is None:
+            continue
+        segs.append({"_ref": seg, "title": seg.get("title"), "_parsed_start": seg_start, "_parsed_end": seg_end})
+
+    sorted_segs = sorted(segs, key=lambda s: s["_parsed_start"])
+    title_to_indices = defaultdict(list)
+    for idx, s in enumerate(sorted_segs):
+        if isinstance(s.get("title"), str):
+            title_to_indices[s["title"]].append(idx)
+
+    intervals = []
+    for before_title, after_title, _ in rules.title_rules:
+        before_indices = title_to_indices.get(before_title, [])
+        if not after_title:
+            for idx in before_indices:
+                intervals.append((sorted_segs[idx]["_parsed_start"], sorted_segs[idx]["_parsed_end"]))
+            continue
+        after_indices = title_to_indices.get(after_title, [])
+        for b_idx in before_indices:
+            start_at = sorted_segs[b_idx]["_parsed_start"]
+            cap_end = start_at + suppression_duration
+            next_after_start = None
+            for a_idx in after_indices:
+                if a_idx > b_idx:
+                    next_after_start = sorted_segs[a_idx]["_parsed_start"]
+                    break
+            end_at = next_after_start if next_after_start is not None and next_after_start < cap_end else cap_end
+            if end_at > start_at:
+                intervals.append((start_at, end_at))
+    intervals = _merge_intervals(intervals)
+
+    tz = rules.timezone
+    for seg_data in segs:
+        seg_start, seg_end = seg_data["_parsed_start"], seg_data["_parsed_end"]
+        start_day, end_day = seg_start.astimezone(tz).date(), seg_end.astimezone(tz).date()
+        days_to_check = [start_day + timedelta(days=offset) for offset in range((end_day - start_day).days + 1)]
+        in_shift = False
+        for shift_days, start_time, end_time in rules.shifts:
+            for seg_day in days_to_check:
+                if seg_day.strftime('%A').lower() not in shift_days:
+                    continue
+                for window_start, window_end in _build_utc_windows_for_local_day(start_time, end_time, seg_day, tz):
+                    if seg_start < window_end and seg_end > window_start:
+                        in_shift = True
+                        break
+                if in_shift:
+                    break
+            if in_shift:
+                break
+        if not in_shift:
+            seg_data["_ref"]["requires_analysis"] = False
+
+    renames = {}
+    for before_title, _, category_name in rules.title_rules:
+        for b_idx in title_to_indices.get(before_title, []):
+            if b_idx + 1 >= len(sorted_segs):
+                continue
+            next_seg = sorted_segs[b_idx + 1]["_ref"]
+            if next_seg.get("is_recognized") is True:
+                continue
+            next_seg["title"] = category_name
+            renames[next_seg["id"]] = category_name
+
+    for seg_data in segs:
+        seg_start, seg_end = seg_data["_parsed_start"], seg_data["_parsed_end"]
+        for s, e in intervals:
+            if seg_start <= e and seg_end > s:
+                seg_data["_ref"]["requires_analysis"] = False
+                break
+
+    return {seg["id"]: seg["requires_analysis"] for seg in segments}, renames
+
+
+def run_compiled(segments, rules, suppression_duration=timedelta(minutes=10)):
+    """The same annotation through apply_channel_rules (mark_requires_analysis without the database steps)"""
+    segments = copy.deepcopy(segments)
+    segs = []
+    for seg in segments:
+        seg["requires_analysis"] = True
+        if seg.get("is_recognized") is True:
+            seg["requires_analysis"] = False
+        elif seg.get("duration_seconds") is not None and int(seg["duration_seconds"]) < 10:
+            seg["requires_analysis"] = False
+        seg_start = _safe_parse_datetime(seg.get("start_time"))
+        seg_end = _safe_parse_datetime(seg.get("end_time"))
+        if seg_start is not None and seg_end is not None:
+            segs.append({"_ref": seg, "title": seg.get("title"), "_parsed_start": seg_start, "_parsed_end": seg_end})
+    renames = {}
+    apply_channel_rules(segs, rules, suppression_duration, renames)
+    return {seg["id"]: seg["requires_analysis"] for seg in segments}, renames
+
+
+def run_benchmark(count=None, seed=7, repeat=3) -> dict:
+    """Time the nested-loop reference against apply_channel_rules on 20 title rules and 6 shifts"""
+    segments = build_synthetic_segments(count=count or 5000, seed=seed)
+    rules = build_synthetic_rules(seed=seed)
+    reference, reference_seconds = best_time(run_reference, repeat, segments, rules)
+    result, candidate_seconds = best_time(run_compiled, repeat, segments, rules)
+    flags, renames = result
+    return {
+        'reference': reference_seconds,
+        'candidate': candidate_seconds,
+        'matches': result == reference,
+        'details': [
+            f"Segments: {len(segments)}, requiring analysis: {sum(flags.values())}, renamed: {len(renames)}",
+            # Before: one select and one save per renamed segment; now one select and one bulk update
+            f"Rename queries: {2 * len(renames)} one segment at a time, 2 in bulk",
+        ],
+    }
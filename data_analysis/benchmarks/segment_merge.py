@@ -0,0 +1,114 @@
+"""
+A synthetic day of segments, and the original sequential merge planner that
+_plan_short_segment_merges must reproduce.
+"""
+import copy
+import io
+import random
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from core_admin.models import Channel
+from data_analysis.benchmarks import best_time
+from data_analysis.models import AudioSegments as AudioSegmentsModel
+from data_analysis.services.audio_segments import AudioSegments
+
+
+def build_synthetic_segments(count=10000, seed=7, day=None):
+    """
+    Unsaved AudioSegments for a synthetic day, sorted by start time: unrecognized stretches
+    around short and long music recognitions, with occasional custom_file and user segments,
+    gaps, overlaps and already deleted rows.
+    """
+    rng = random.Random(seed)
+    cursor = day or datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    segments = []
+    for index in range(count):
+        kind = rng.random()
+        if kind < 0.45:
+            duration, fields = rng.randint(5, 120), {'is_recognized': False, 'title_before': 'A', 'title_after': 'B'}
+        elif kind < 0.75:
+            duration = rng.randint(3, 19)
+            fields = {'is_recognized': True, 'title': f"Short {index}", 'metadata_json': {'source': 'music'}}
+        elif kind < 0.9:
+            duration = rng.randint(20, 300)
+            fields = {'is_recognized': True, 'title': f"Song {index}", 'metadata_json': {'source': 'music'}}
+        elif kind < 0.94:
+            duration = rng.randint(5, 60)
+            fields = {'is_recognized': rng.random() < 0.5, 'title': 'Custom', 'metadata_json': {'source': 'custom_file'}}
+        else:
+            duration, fields = rng.randint(5, 60), {'is_recognized': False, 'source': 'user'}
+        fields.setdefault('source', 'system')
+        fields['is_delete'] = rng.random() < 0.02
+        segments.append(AudioSegmentsModel(
+            id=index + 1,
+            start_time=cursor,
+            end_time=cursor + timedelta(seconds=duration),
+            duration_seconds=duration,
+            **fields,
+        ))
+        cursor += timedelta(seconds=duration + rng.choice([0, 0, 0, 1, 2, -1]))
+    return segments
+
+
+def run_sequential_planner(segments, channel):
+    """Merge groups chosen by the original per-segment loop over _find_adjacent_unrecognized_segments"""
+    segments = [copy.copy(segment) for segment in segments]
+    processed_for_merge = set()
+    planned_file_paths = set()
+    groups = []
+    with redirect_stdout(io.StringIO()):
+        for i, current_segment in enumerate(segments):
+            if current_segment.source in ('system_merge', 'user_merged', 'merged') or current_segment.is_delete:
+                continue
+            metadata_source = None
+            if current_segment.metadata_json and isinstance(current_segment.metadata_json, dict):
+                metadata_source = current_segment.metadata_json.get("source")
+            if not (current_segment.is_recognized and current_segment.duration_seconds < 20 and
+                    metadata_source == "music" and i not in processed_for_merge):
+                continue
+            segments_to_merge, merge_indices = AudioSegments._find_adjacent_unrecognized_segments(
+                segments, i, processed_for_merge, max_segments=10
+            )
+            if len(segments_to_merge) < 2:
+                continue
+            # Creating a second row with the same file_path fails on the unique constraint
+            _, file_path, _ = AudioSegments._build_merged_file_location(
+                channel,
+                min(seg.start_time for seg in segments_to_merge),
+                max(seg.end_time for seg in segments_to_merge),
+            )
+            if file_path in planned_file_paths:
+                continue
+            planned_file_paths.add(file_path)
+            for seg in segments_to_merge:
+                seg.is_delete = True
+            processed_for_merge.update(merge_indices)
+            groups.append(merge_indices)
+    return groups
+
+
+def run_columnar_planner(segments, channel):
+    """Merge groups chosen by AudioSegments._plan_short_segment_merges"""
+    with redirect_stdout(io.StringIO()):
+        return AudioSegments._plan_short_segment_merges(segments, channel)
+
+
+def run_benchmark(count=None, seed=7, repeat=3) -> dict:
+    """Time the sequential merge planner against _plan_short_segment_merges on a synthetic day"""
+    segments = build_synthetic_segments(count=count or 10000, seed=seed)
+    channel = Channel(project_id=1, channel_id=1)
+    reference, reference_seconds = best_time(run_sequential_planner, repeat, segments, channel)
+    groups, candidate_seconds = best_time(run_columnar_planner, repeat, segments, channel)
+    merged_sources = sum(len(group) for group in groups)
+    return {
+        'reference': reference_seconds,
+        'candidate': candidate_seconds,
+        'matches': groups == reference,
+        'details': [
+            f"Segments: {len(segments)}, merges: {len(groups)}, merged sources: {merged_sources}",
+            # Per merge the old write path ran: insert, one update per source, log lookup, affected
+            # segments select, log insert, and the affected segments set() (select + insert)
+            f"Write queries: {len(groups) * 6 + merged_sources} one merge at a time, 4 plus batching when applied in bulk",
+        ],
+    }
@@ -0,0 +1,78 @@
+"""
+A synthetic day of dense music recognitions, and the original linear overlap scan
+SegmentIntervalIndex must reproduce.
+"""
+import io
+import random
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from data_analysis.benchmarks import best_time
+from data_analysis.services.audio_segments import AudioSegments, SegmentIntervalIndex
+
+
+def build_synthetic_day(seed=7, day=None):
+    """
+    Synthetic 24h of dense ACR music recognitions as (start_time, end_time) pairs in ACR order.
+    Each song is recognized several times: exact repeats, windows contained in the song,
+    and windows running a little (under and over the 2s threshold) past its end.
+    """
+    rng = random.Random(seed)
+    day = day or datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    end_of_day = day + timedelta(days=1)
+    intervals = []
+    cursor = day
+    while cursor < end_of_day:
+        duration = rng.randint(60, 300)
+        song_start, song_end = cursor, cursor + timedelta(seconds=duration)
+        intervals.append((song_start, song_end))
+        for _ in range(rng.randint(2, 8)):
+            kind = rng.random()
+            if kind < 0.3:
+                intervals.append((song_start, song_end))
+            elif kind < 0.6:
+                offset = rng.randint(0, duration // 2)
+                intervals.append((song_start + timedelta(seconds=offset), song_end - timedelta(seconds=rng.randint(0, duration // 4))))
+            else:
+                offset = rng.randint(1, duration - 1)
+                intervals.append((song_start + timedelta(seconds=offset), song_end + timedelta(seconds=rng.randint(1, 5))))
+        cursor = song_end + timedelta(seconds=rng.choice([0, 0, 1, 3, 20]))
+    return intervals
+
+
+def run_linear_scan(intervals):
+    """Accept/reject decisions using the original linear AudioSegments._check_segment_overlap."""
+    accepted = []
+    decisions = []
+    with redirect_stdout(io.StringIO()):
+        for start_time, end_time in intervals:
+            include = AudioSegments._check_segment_overlap({"start_time": start_time, "end_time": end_time}, accepted)
+            decisions.append(include)
+            if include:
+                accepted.append({"start_time": start_time, "end_time": end_time})
+    return decisions
+
+
+def run_interval_index(intervals):
+    """Accept/reject decisions using SegmentIntervalIndex."""
+    index = SegmentIntervalIndex()
+    decisions = []
+    for start_time, end_time in intervals:
+        include = index.should_include(start_time, end_time)
+        decisions.append(include)
+        if include:
+            index.add(start_time, end_time)
+    return decisions
+
+
+def run_benchmark(count=None, seed=7, repeat=3) -> dict:
+    """Time the linear overlap scan against SegmentIntervalIndex on a synthetic 24h day (count is unused)"""
+    intervals = build_synthetic_day(seed=seed)
+    reference, reference_seconds = best_time(run_linear_scan, repeat, intervals)
+    decisions, candidate_seconds = best_time(run_interval_index, repeat, intervals)
+    return {
+        'reference': reference_seconds,
+        'candidate': candidate_seconds,
+        'matches': decisions == reference,
+        'details': [f"Recognitions: {len(intervals)}, accepted: {sum(decisions)}"],
+    }
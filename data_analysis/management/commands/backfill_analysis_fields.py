@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data_analysis.services.analysis_fields import AnalysisFieldsService
+
+
+class Command(BaseCommand):
+    help = "Fill TranscriptionAnalysis sentiment_score, bucket_primary/secondary and the AnalysisTopic rows from the text fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Analyses per committed chunk")
+        parser.add_argument('--start-id', type=int, default=0, help="Resume after this analysis id")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        started = datetime.now()
+        total = 0
+        for last_id, count in AnalysisFieldsService.backfill(options['chunk_size'], options['start_id']):
+            total += count
+            self.stdout.write(f"{total} analyses, last id {last_id}")
+
+        elapsed = (datetime.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} analyses in {elapsed:.1f}s"))
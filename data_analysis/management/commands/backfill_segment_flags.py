@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audio_policy.models import FlagCondition
+from data_analysis.services.segment_flags import SegmentFlagService
+
+
+class Command(BaseCommand):
+    help = "Compute the stored SegmentFlagResult rows of every channel with an active FlagCondition"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel-id', type=int, action='append', help="Only this channel (repeatable)")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Transcriptions per chunk (default SEGMENT_FLAG_RECOMPUTE_CHUNK_SIZE)")
+        parser.add_argument('--queue', action='store_true', help="Queue recompute_segment_flags_task per channel instead of running inline")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] is not None and options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        channels = FlagCondition.objects.filter(is_active=True)
+        if options['channel_id']:
+            channels = channels.filter(channel_id__in=options['channel_id'])
+        channel_ids = sorted(set(channels.values_list('channel_id', flat=True)))
+
+        if options['queue']:
+            from data_analysis.tasks import recompute_segment_flags_task
+
+            for channel_id in channel_ids:
+                recompute_segment_flags_task.delay(channel_id)
+            self.stdout.write(self.style.SUCCESS(f"Queued segment flag recompute for {len(channel_ids)} channels"))
+            return
+
+        started = datetime.now()
+        total = 0
+        for channel_id in channel_ids:
+            written = SegmentFlagService.recompute_channel(channel_id, options['chunk_size'])
+            total += written
+            self.stdout.write(f"Channel {channel_id}: {written} rows")
+
+        elapsed = (datetime.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {total} segment flag results for {len(channel_ids)} channels in {elapsed:.1f}s"
+        ))
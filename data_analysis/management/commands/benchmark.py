@@ -0,0 +1,36 @@
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+
+
+BENCHMARKS = {
+    'flag_matcher': "FlagCondition evaluation: one substring scan per keyword vs the compiled matcher",
+    'requires_analysis': "requires_analysis annotation: nested loops vs the compiled per-channel sweep",
+    'segment_merge': "Short segment merge planning: sequential vs columnar planner",
+    'segment_overlap': "Segment overlap detection: linear scan vs SegmentIntervalIndex",
+}
+
+
+class Command(BaseCommand):
+    help = "Time an optimized code path against its original implementation on synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS), help="Benchmark to run")
+        parser.add_argument('--count', type=int, default=None, help="Synthetic input size (default per benchmark)")
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--repeat', type=int, default=3, help="Timing runs per implementation (best is reported)")
+
+    def handle(self, *args, **options):
+        module = import_module(f"data_analysis.benchmarks.{options['name']}")
+        self.stdout.write(BENCHMARKS[options['name']])
+        result = module.run_benchmark(count=options['count'], seed=options['seed'], repeat=options['repeat'])
+
+        if not result['matches']:
+            self.stderr.write(self.style.ERROR("Results differ between the reference and the optimized implementation"))
+            return
+
+        for line in result['details']:
+            self.stdout.write(line)
+        self.stdout.write(f"reference: {result['reference'] * 1000:.1f} ms")
+        self.stdout.write(f"optimized: {result['candidate'] * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {result['reference'] / result['candidate']:.1f}x"))
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from core_admin.models import Channel
+from data_analysis.models import AudioSegments, ChannelHourOccupancy
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
+
+
+class Command(BaseCommand):
+    help = "Recompute the hour-slot occupancy index (ChannelHourOccupancy) from the audio segments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel-id', type=int, action='append', help="Channel pk (repeatable); all channels by default")
+        parser.add_argument('--days', type=int, help="Only the last N local days instead of the channel's whole history")
+        parser.add_argument('--clear', action='store_true', help="Delete the stored days of the channels first")
+
+    def handle(self, *args, **options):
+        channels = Channel.objects.filter(is_deleted=False).order_by('id')
+        if options['channel_id']:
+            channels = channels.filter(id__in=options['channel_id'])
+            if not channels.exists():
+                raise CommandError("No matching channels")
+
+        for channel in channels:
+            if options['clear']:
+                ChannelHourOccupancy.objects.filter(channel=channel).delete()
+
+            tz = ZoneInfo(channel.timezone or "UTC")
+            if options['days']:
+                end_day = timezone.now().astimezone(tz).date()
+                start_day = end_day - timedelta(days=options['days'] - 1)
+            else:
+                bounds = AudioSegments.objects.filter(channel=channel, is_delete=False).aggregate(
+                    first=Min('start_time'), last=Max('start_time')
+                )
+                if bounds['first'] is None:
+                    self.stdout.write(f"Channel {channel.id}: no segments")
+                    continue
+                # A segment can sit in a slot of the neighbouring local day around DST changes
+                start_day = bounds['first'].astimezone(tz).date() - timedelta(days=1)
+                end_day = bounds['last'].astimezone(tz).date() + timedelta(days=1)
+
+            started = datetime.now()
+            day_count = HourOccupancyIndex.rebuild(channel, start_day, end_day)
+            elapsed = (datetime.now() - started).total_seconds()
+            self.stdout.write(f"Channel {channel.id}: {day_count} days ({start_day} - {end_day}) in {elapsed:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS("Hour occupancy index rebuilt"))
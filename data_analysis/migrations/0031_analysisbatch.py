@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-16 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acr_admin', '0017_generalsetting_custom_vocabulary'),
+        ('data_analysis', '0030_audiosegments_audio_location_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(help_text='OpenAI batch id', max_length=255, unique=True)),
+                ('input_file_id', models.CharField(max_length=255)),
+                ('output_file_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('error_file_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('submitted', 'Submitted'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('ingested', 'Ingested'), ('failed', 'Failed'), ('expired', 'Expired'), ('cancelled', 'Cancelled')], db_index=True, default='submitted', max_length=20)),
+                ('requested_fields', models.JSONField(default=list, help_text='TranscriptionAnalysis fields requested for every transcription in the batch')),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('ingested_count', models.PositiveIntegerField(default=0, help_text='Number of TranscriptionAnalysis rows created from the batch output')),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('submitted_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_batches', to='acr_admin.channel')),
+                ('transcription_details', models.ManyToManyField(blank=True, related_name='analysis_batches', to='data_analysis.transcriptiondetail')),
+            ],
+            options={
+                'ordering': ['-submitted_at'],
+            },
+        ),
+    ]
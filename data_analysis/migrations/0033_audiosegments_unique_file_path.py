@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-16 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def retire_duplicate_file_paths(apps, schema_editor):
+    """
+    Concurrent ingestion runs could insert the same (channel, file_path) twice.
+    Keep the oldest row and soft-delete the others, suffixing their file_path so the
+    unique constraint can be created without dropping any related transcription data.
+    """
+    AudioSegments = apps.get_model('data_analysis', 'AudioSegments')
+    duplicates = (
+        AudioSegments.objects
+        .filter(file_path__isnull=False)
+        .values('channel_id', 'file_path')
+        .annotate(row_count=Count('id'))
+        .filter(row_count__gt=1)
+    )
+    for duplicate in duplicates:
+        segment_ids = list(
+            AudioSegments.objects
+            .filter(channel_id=duplicate['channel_id'], file_path=duplicate['file_path'])
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        for segment_id in segment_ids[1:]:
+            AudioSegments.objects.filter(id=segment_id).update(
+                file_path=f"{duplicate['file_path']}#duplicate-{segment_id}",
+                is_delete=True,
+                is_active=False,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acr_admin', '0017_generalsetting_custom_vocabulary'),
+        ('data_analysis', '0032_llmresponsecacheentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(retire_duplicate_file_paths, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='audiosegments',
+            constraint=models.UniqueConstraint(condition=models.Q(('file_path__isnull', False)), fields=('channel', 'file_path'), name='unique_audio_segment_file_path_per_channel'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-16 19:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acr_admin', '0017_generalsetting_custom_vocabulary'),
+        ('data_analysis', '0033_audiosegments_unique_file_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ACRIngestionCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingestion_date', models.CharField(help_text='Day (YYYYMMDD) the cursor refers to', max_length=8)),
+                ('last_record_timestamp', models.CharField(blank=True, default='', help_text='Last fully ingested ACR record_timestamp (YYYYMMDDHHMMSS)', max_length=14)),
+                ('boundary_start_time', models.DateTimeField(blank=True, null=True)),
+                ('boundary_end_time', models.DateTimeField(blank=True, null=True)),
+                ('boundary_title', models.CharField(blank=True, max_length=500, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('channel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='acr_ingestion_cursor', to='acr_admin.channel')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-16 20:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acr_admin', '0017_generalsetting_custom_vocabulary'),
+        ('data_analysis', '0035_revcallbackinbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelHourOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('local_date', models.DateField()),
+                ('timezone', models.CharField(max_length=64)),
+                ('active_hours', models.IntegerField(default=0)),
+                ('inactive_hours', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hour_occupancy', to='acr_admin.channel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('channel', 'local_date'), name='unique_hour_occupancy_per_channel_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-16 21:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The transcript and analysis tables are large: build the indexes without locking out writes
+    atomic = False
+
+    dependencies = [
+        ('data_analysis', '0036_channelhouroccupancy'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='transcriptiondetail',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('transcript'), name='gin_trgm_ops'), name='da_transcript_upper_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='transcriptionanalysis',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('summary'), name='gin_trgm_ops'), name='da_analysis_summary_upper_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='transcriptionanalysis',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('iab_topics'), name='gin_trgm_ops'), name='da_analysis_iab_upper_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='transcriptionanalysis',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('bucket_prompt'), name='gin_trgm_ops'), name='da_analysis_bucket_upper_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='transcriptionanalysis',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('general_topics'), name='gin_trgm_ops'), name='da_analysis_general_upper_trgm'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-16 20:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acr_admin', '0017_generalsetting_custom_vocabulary'),
+        ('data_analysis', '0037_flag_text_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentFlagResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('condition_version', models.DateTimeField(help_text='updated_at of the FlagCondition the flags were computed with')),
+                ('flags', models.JSONField(default=dict, help_text='Flag entries keyed by condition type')),
+                ('is_flagged', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('audio_segment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='flag_result', to='data_analysis.audiosegments')),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_flag_results', to='acr_admin.channel')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['channel', 'condition_version', 'is_flagged'], name='segflag_channel_flagged_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-16 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_analysis', '0038_segmentflagresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionanalysis',
+            name='bucket_primary',
+            field=models.CharField(blank=True, db_index=True, help_text='Primary wellness bucket, upper case', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='transcriptionanalysis',
+            name='bucket_secondary',
+            field=models.CharField(blank=True, db_index=True, help_text='Secondary wellness bucket, upper case', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='transcriptionanalysis',
+            name='sentiment_score',
+            field=models.FloatField(blank=True, db_index=True, help_text='Sentiment as a number, NULL when not numeric', null=True),
+        ),
+        migrations.CreateModel(
+            name='AnalysisTopic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic_name', models.CharField(max_length=255)),
+                ('topic_key', models.CharField(db_index=True, help_text='Lower-case topic name, for matching GeneralTopic names', max_length=255)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topics', to='data_analysis.transcriptionanalysis')),
+            ],
+            options={
+                'ordering': ['analysis', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('analysis', 'topic_name'), name='analysis_topic_unique')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -16,6 +18,12 @@ class TranscriptionDetail(models.Model):
     transcript = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Trigram index on UPPER(transcript), the expression icontains compares, for the flag keyword filter
+        indexes = [
+            GinIndex(OpClass(Upper('transcript'), name='gin_trgm_ops'), name='da_transcript_upper_trgm'),
+        ]
+
     def __str__(self):
         if self.audio_segment:
             return f"Transcription for {self.audio_segment} at {self.created_at}"
@@ -97,6 +105,36 @@ class RevTranscriptionJob(models.Model):
         self.save(update_fields=['retry_count', 'last_retry_at'])
 
 
+class RevCallbackInbox(models.Model):
+    """Raw Rev.ai webhook deliveries, stored by the callback view and applied in batches by a consumer task"""
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    # "<job_id>:<job status>" - Rev.ai redeliveries of the same job state collapse into one row
+    dedupe_key = models.CharField(max_length=320, unique=True)
+    job_id = models.CharField(max_length=255, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Rev callback {self.dedupe_key} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='rev_callback_status_idx'),
+        ]
+
+
 class TranscriptionQueue(models.Model):
     """Model to track audio segments queued for transcription"""
     audio_segment = models.OneToOneField('AudioSegments', on_delete=models.CASCADE, related_name='transcription_queue')
@@ -116,11 +154,108 @@ class TranscriptionAnalysis(models.Model):
     iab_topics = models.TextField(help_text="IAB topics identified in the transcript")
     bucket_prompt = models.TextField(help_text="Bucket prompt for categorization")
     content_type_prompt = models.TextField(null=True, blank=True, help_text="Content type classification result")
+    # Parsed from the text fields on save (AnalysisFieldsService); backfill_analysis_fields fills older rows
+    sentiment_score = models.FloatField(null=True, blank=True, db_index=True, help_text="Sentiment as a number, NULL when not numeric")
+    bucket_primary = models.CharField(max_length=255, null=True, blank=True, db_index=True, help_text="Primary wellness bucket, upper case")
+    bucket_secondary = models.CharField(max_length=255, null=True, blank=True, db_index=True, help_text="Secondary wellness bucket, upper case")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Trigram indexes on the texts the flag filter matches keywords and topics in with icontains
+        indexes = [
+            GinIndex(OpClass(Upper('summary'), name='gin_trgm_ops'), name='da_analysis_summary_upper_trgm'),
+            GinIndex(OpClass(Upper('iab_topics'), name='gin_trgm_ops'), name='da_analysis_iab_upper_trgm'),
+            GinIndex(OpClass(Upper('bucket_prompt'), name='gin_trgm_ops'), name='da_analysis_bucket_upper_trgm'),
+            GinIndex(OpClass(Upper('general_topics'), name='gin_trgm_ops'), name='da_analysis_general_upper_trgm'),
+        ]
+
     def __str__(self):
-        return f"Analysis for {self.transcription_detail}"  
-    
+        return f"Analysis for {self.transcription_detail}"
+
+    def save(self, *args, **kwargs):
+        from data_analysis.services.analysis_fields import AnalysisFieldsService
+
+        AnalysisFieldsService.populate(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for source, parsed in AnalysisFieldsService.PARSED_FIELDS.items():
+                if source in update_fields:
+                    update_fields.update(parsed)
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        if update_fields is None or 'general_topics' in update_fields:
+            AnalysisFieldsService.store_topics([self])
+
+
+class AnalysisTopic(models.Model):
+    """A topic of TranscriptionAnalysis.general_topics, one row per distinct topic of the analysis"""
+    analysis = models.ForeignKey(TranscriptionAnalysis, on_delete=models.CASCADE, related_name='topics')
+    topic_name = models.CharField(max_length=255)
+    topic_key = models.CharField(max_length=255, db_index=True, help_text="Lower-case topic name, for matching GeneralTopic names")
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['analysis', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['analysis', 'topic_name'], name='analysis_topic_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic_name} ({self.analysis_id})"
+
+
+class AnalysisBatch(models.Model):
+    """Model to track OpenAI Batch API submissions used for non-urgent transcription analysis"""
+
+    STATUS_CHOICES = (
+        ('submitted', 'Submitted'),
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+        ('ingested', 'Ingested'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    )
+    # Batches whose transcriptions must not be collected into a new batch
+    ACTIVE_STATUSES = ('submitted', 'in_progress', 'completed')
+
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='analysis_batches')
+    batch_id = models.CharField(max_length=255, unique=True, help_text="OpenAI batch id")
+    input_file_id = models.CharField(max_length=255)
+    output_file_id = models.CharField(max_length=255, null=True, blank=True)
+    error_file_id = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='submitted', db_index=True)
+    requested_fields = models.JSONField(default=list, help_text="TranscriptionAnalysis fields requested for every transcription in the batch")
+    transcription_details = models.ManyToManyField('TranscriptionDetail', related_name='analysis_batches', blank=True)
+    request_count = models.PositiveIntegerField(default=0)
+    ingested_count = models.PositiveIntegerField(default=0, help_text="Number of TranscriptionAnalysis rows created from the batch output")
+    error_message = models.TextField(null=True, blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Analysis batch {self.batch_id} ({self.status}) - {self.channel}"
+
+    class Meta:
+        ordering = ['-submitted_at']
+
+
+class LLMResponseCacheEntry(models.Model):
+    """Database fallback store for cached LLM analysis responses (primary store is the Redis cache)"""
+    cache_key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the request parameters and normalized transcript")
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='llm_response_cache_entries')
+    response = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"LLM cache {self.cache_key[:12]} - {self.channel}"
+
+
 class GeneralTopic(models.Model):
     """Model to store all general topics with their active/inactive status"""
     topic_name = models.CharField(max_length=255, help_text="Name of the general topic")
@@ -269,6 +404,42 @@ class AudioSegments(models.Model):
         else:
             return f"Unrecognized: {self.start_time} - {self.end_time} ({self.duration_seconds}s) [{status}]{deleted_status}"
 
+    # Fields that decide which hour slots of the ChannelHourOccupancy index a segment occupies
+    OCCUPANCY_FIELDS = ('channel_id', 'start_time', 'is_active', 'is_delete')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._occupancy_state = instance._get_occupancy_state()
+        return instance
+
+    def _get_occupancy_state(self):
+        # Read from __dict__ so deferred fields are not loaded
+        return tuple(self.__dict__.get(field) for field in self.OCCUPANCY_FIELDS)
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'channel', 'channel_id', 'start_time', 'is_active', 'is_delete'} & set(update_fields):
+            return
+        previous = getattr(self, '_occupancy_state', None)
+        current = self._get_occupancy_state()
+        self._occupancy_state = current
+        if not created and previous == current:
+            return
+
+        from data_analysis.services.hour_occupancy import HourOccupancyIndex
+
+        if created:
+            HourOccupancyIndex.on_commit_inserted([self])
+        else:
+            changed = [(self.channel_id, self.start_time)]
+            if previous is not None and previous[0] and previous[1] and previous[:2] != current[:2]:
+                changed.append(previous[:2])
+            HourOccupancyIndex.on_commit_refresh(changed)
+
     def clean(self):
         """Validate the model data"""
         super().clean()
@@ -315,7 +486,14 @@ class AudioSegments(models.Model):
         indexes = [
             # main API path
             models.Index(fields=['channel', 'start_time', 'end_time']),
-        ] 
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['channel', 'file_path'],
+                condition=models.Q(file_path__isnull=False),
+                name='unique_audio_segment_file_path_per_channel',
+            ),
+        ]
     
     @staticmethod
     def insert_audio_segments(segments_data, channel_id=None):
@@ -368,8 +546,16 @@ class AudioSegments(models.Model):
         if not isinstance(segments_data, list):
             raise ValidationError("segments_data must be a list")
         
-        created_segments = []
+        # Resolve the global channel once instead of once per segment
+        global_channel = None
+        if channel_id and any(isinstance(segment_data, dict) and 'channel' not in segment_data for segment_data in segments_data):
+            try:
+                global_channel = Channel.objects.get(id=channel_id)
+            except Channel.DoesNotExist:
+                raise ValidationError(f"Channel with id {channel_id} does not exist")
         
+        # Validate every segment in memory before touching the database
+        segment_dicts = []
         for i, segment_data in enumerate(segments_data):
             if not isinstance(segment_data, dict):
                 raise ValidationError(f"Segment data at index {i} must be a dictionary")
@@ -378,12 +564,8 @@ class AudioSegments(models.Model):
             segment_dict = segment_data.copy()
             
             # Handle channel assignment
-            if channel_id and 'channel' not in segment_dict:
-                try:
-                    channel = Channel.objects.get(id=channel_id)
-                    segment_dict['channel'] = channel
-                except Channel.DoesNotExist:
-                    raise ValidationError(f"Channel with id {channel_id} does not exist")
+            if global_channel and 'channel' not in segment_dict:
+                segment_dict['channel'] = global_channel
             elif 'channel' not in segment_dict:
                 raise ValidationError(f"Channel must be provided either globally or in segment data at index {i}")
             
@@ -420,21 +602,61 @@ class AudioSegments(models.Model):
                     'audio_url' if segment_dict.get('audio_url') else 'file_path'
                 )
             
-            # Check if file_path already exists
-            existing_segment = AudioSegments.objects.filter(file_path=segment_dict['file_path']).first()
-            if existing_segment:
-                # If segment with same file_path exists, add it to the return list and continue
-                created_segments.append(existing_segment)
+            segment_dicts.append(segment_dict)
+        
+        # Prefetch segments that already exist for these file paths in a single query
+        file_paths = {segment_dict['file_path'] for segment_dict in segment_dicts if segment_dict['file_path']}
+        existing_by_path = {}
+        for existing_segment in AudioSegments.objects.filter(file_path__in=file_paths):
+            existing_by_path.setdefault(existing_segment.file_path, existing_segment)
+        
+        # Build the new instances; a file_path repeated within the batch maps to its first occurrence
+        new_segments = []
+        pending_paths = set()
+        unpathed_segments = {}
+        for i, segment_dict in enumerate(segment_dicts):
+            file_path = segment_dict['file_path']
+            if file_path and (file_path in existing_by_path or file_path in pending_paths):
                 continue
-            
-            # Create the AudioSegments instance
             try:
                 audio_segment = AudioSegments(**segment_dict)
-                audio_segment.full_clean()  # Validate the model
-                audio_segment.save()
-                created_segments.append(audio_segment)
+                # Channel was resolved above; skip the per-row FK existence query and DB uniqueness
+                # checks, which are enforced by the database constraints on insert
+                audio_segment.full_clean(exclude=['channel'], validate_unique=False, validate_constraints=False)
             except Exception as e:
                 raise ValidationError(f"Error creating audio segment at index {i}: {str(e)}")
+            if file_path:
+                new_segments.append(audio_segment)
+                pending_paths.add(file_path)
+            else:
+                # Remote (audio_url) segments cannot be matched back by path, save them individually
+                try:
+                    audio_segment.save()
+                except Exception as e:
+                    raise ValidationError(f"Error creating audio segment at index {i}: {str(e)}")
+                unpathed_segments[i] = audio_segment
+        
+        if new_segments:
+            AudioSegments.objects.bulk_create(new_segments, batch_size=500, ignore_conflicts=True)
+            # ignore_conflicts does not return primary keys, so read the rows back in one query.
+            # Rows inserted concurrently by another worker are returned in place of ours.
+            saved_segments = list(AudioSegments.objects.filter(file_path__in=pending_paths))
+            for saved_segment in saved_segments:
+                existing_by_path.setdefault(saved_segment.file_path, saved_segment)
+
+            from data_analysis.services.hour_occupancy import HourOccupancyIndex
+
+            HourOccupancyIndex.on_commit_inserted(saved_segments)
+        
+        created_segments = []
+        for i, segment_dict in enumerate(segment_dicts):
+            if i in unpathed_segments:
+                created_segments.append(unpathed_segments[i])
+                continue
+            saved_segment = existing_by_path.get(segment_dict['file_path'])
+            if saved_segment is None:
+                raise ValidationError(f"Error creating audio segment at index {i}: segment was not inserted")
+            created_segments.append(saved_segment)
         
         return created_segments
     
@@ -454,6 +676,65 @@ class AudioSegments(models.Model):
         return AudioSegments.insert_audio_segments([segment_data], channel_id)[0]
 
 
+class ACRIngestionCursor(models.Model):
+    """High-water mark of the ACRCloud results already ingested by the hourly task for a channel"""
+    channel = models.OneToOneField(Channel, on_delete=models.CASCADE, related_name='acr_ingestion_cursor')
+    ingestion_date = models.CharField(max_length=8, help_text="Day (YYYYMMDD) the cursor refers to")
+    last_record_timestamp = models.CharField(max_length=14, blank=True, default='', help_text="Last fully ingested ACR record_timestamp (YYYYMMDDHHMMSS)")
+    # Last recognized segment accepted so far, used for overlap checks and the gap segment at the boundary
+    boundary_start_time = models.DateTimeField(null=True, blank=True)
+    boundary_end_time = models.DateTimeField(null=True, blank=True)
+    boundary_title = models.CharField(max_length=500, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ACR cursor {self.ingestion_date} {self.last_record_timestamp or '-'} - {self.channel}"
+
+
+class ChannelHourOccupancy(models.Model):
+    """
+    Which local hour slots of a channel's day hold at least one non-deleted segment.
+    Bit h of each mask is the slot starting at local h:00 (see HourOccupancyIndex).
+    """
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='hour_occupancy')
+    local_date = models.DateField()
+    # Timezone the day was computed in; rows for another timezone than the channel's are recomputed
+    timezone = models.CharField(max_length=64)
+    active_hours = models.IntegerField(default=0)
+    inactive_hours = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Hour occupancy {self.local_date} - {self.channel}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['channel', 'local_date'], name='unique_hour_occupancy_per_channel_day'),
+        ]
+
+
+class SegmentFlagResult(models.Model):
+    """
+    FlagCondition entries of a segment, computed when its analysis is written and recomputed for
+    the whole channel when the condition changes. Rows whose condition_version is not the active
+    condition's updated_at are stale and ignored by the readers.
+    """
+    audio_segment = models.OneToOneField(AudioSegments, on_delete=models.CASCADE, related_name='flag_result')
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='segment_flag_results')
+    condition_version = models.DateTimeField(help_text="updated_at of the FlagCondition the flags were computed with")
+    flags = models.JSONField(default=dict, help_text="Flag entries keyed by condition type")
+    is_flagged = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Flags for {self.audio_segment_id} ({'flagged' if self.is_flagged else 'clear'})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['channel', 'condition_version', 'is_flagged'], name='segflag_channel_flagged_idx'),
+        ]
+
+
 class ReportFolder(models.Model):
     """Model to store report folders for organizing saved audio segments"""
     channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='report_folders')
@@ -8,6 +8,7 @@ from django.db import transaction
 from django.db.models import Q, QuerySet
 
 from data_analysis.models import AudioSegments
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
 
 
 class AudioSegmentDAO:
@@ -464,7 +465,10 @@ class AudioSegmentDAO:
     def bulk_update(segment_ids: Sequence[int], **changes) -> int:
         if not changes:
             return 0
-        return AudioSegments.objects.filter(id__in=segment_ids).update(**changes)
+        updated = AudioSegments.objects.filter(id__in=segment_ids).update(**changes)
+        if {'start_time', 'is_active', 'is_delete', 'channel', 'channel_id'} & set(changes):
+            HourOccupancyIndex.on_commit_refresh_ids(segment_ids)
+        return updated
 
     @staticmethod
     def soft_delete(segment_id: int) -> Optional[AudioSegments]:
@@ -0,0 +1,200 @@
+import math
+import re
+from typing import List, Optional, Tuple
+
+from django.db import transaction
+
+from data_analysis.models import AnalysisTopic, TranscriptionAnalysis
+
+
+# A plain number, optionally signed and followed by '%', e.g. "75", "-3", "82.5%"
+SENTIMENT_SCORE_RE = re.compile(r'[+-]?\d+(\.\d+)?')
+UNDEFINED_TOPICS = {'undefined', 'null', 'none'}
+UNDEFINED_BUCKETS = {"undefined", "undef", "none", "null", "na", "n/a", "", "empty result", "output"}
+BUCKET_AI_PREFIXES = ["empty result", "output:", "result:", "analysis:", "response:"]
+TOPIC_MAX_LENGTH = 255
+
+
+def parse_sentiment_score(value) -> Optional[float]:
+    """Sentiment as a float: "75", " 82.5% " -> 75.0, 82.5; None for empty, non-numeric or non-finite values"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    text = str(value).strip().rstrip('%').strip()
+    if not SENTIMENT_SCORE_RE.fullmatch(text):
+        return None
+    return float(text)
+
+
+def parse_topics(topics_text) -> List[str]:
+    """
+    Topic names from the general_topics text, one per line: "1. Funding\n2 Radio Station\nMusic".
+    Number prefixes and "undefined" entries are dropped, duplicates keep their first position.
+    """
+    if not topics_text:
+        return []
+    topics_text = str(topics_text)
+    if topics_text.strip().lower() in UNDEFINED_TOPICS:
+        return []
+
+    topics = []
+    for line in topics_text.split('\n'):
+        line = line.strip()
+        if not line or line.lower() in UNDEFINED_TOPICS:
+            continue
+        if line[0].isdigit():
+            if '. ' in line:
+                topic = line.split('. ', 1)[1].strip()
+            elif ' ' in line:
+                topic = line.split(' ', 1)[1].strip()
+            else:
+                # Just a number
+                continue
+        else:
+            topic = line
+        topic = topic[:TOPIC_MAX_LENGTH].strip()
+        if topic and topic.lower() not in UNDEFINED_TOPICS and topic not in topics:
+            topics.append(topic)
+    return topics
+
+
+def _is_bucket_score(token) -> bool:
+    token = str(token).strip().replace("%", "")
+    if not token:
+        return False
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_bucket_prompt_line(line) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (primary, secondary) bucket names of one line such as "FUN, 85, RELATIONSHIPS, 75" or
+    "RELATIONSHIPS, 90%, FUN, 85%". Lines with fewer than 4 values give (None, None).
+    """
+    if not line:
+        return None, None
+    text = line.strip()
+    if not text:
+        return None, None
+
+    text_lower = text.lower()
+    for prefix in BUCKET_AI_PREFIXES:
+        if text_lower.startswith(prefix):
+            text = text[len(prefix):].strip()
+            break
+
+    parts = [p.strip() for p in text.replace("\t", ",").replace("|", ",").split(",")]
+    if len(parts) < 4:
+        return None, None
+
+    topics = []
+    i = 0
+    while i < len(parts) and len(topics) < 2:
+        token = parts[i]
+        if token == "" or _is_bucket_score(token):
+            i += 1
+            continue
+        if token.lower() not in UNDEFINED_BUCKETS:
+            topics.append(token)
+        # Skip the score paired with this topic
+        i += 2 if i + 1 < len(parts) and _is_bucket_score(parts[i + 1]) else 1
+
+    primary = topics[0] if len(topics) > 0 else None
+    secondary = topics[1] if len(topics) > 1 else None
+    return primary, secondary
+
+
+def normalize_bucket_name(name) -> Optional[str]:
+    """Upper case with single spaces, the form WellnessBucket titles are compared in"""
+    if not name:
+        return None
+    return ' '.join(str(name).upper().split())[:TOPIC_MAX_LENGTH] or None
+
+
+def parse_bucket_prompt(bucket_text) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Normalized (primary, secondary) buckets of the bucket_prompt text. The first line giving a
+    primary and the first line giving a secondary win.
+    """
+    primary = secondary = None
+    if not bucket_text:
+        return None, None
+    for line in str(bucket_text).split('\n'):
+        line_primary, line_secondary = parse_bucket_prompt_line(line)
+        if primary is None and line_primary:
+            primary = line_primary
+        if secondary is None and line_secondary:
+            secondary = line_secondary
+        if primary is not None and secondary is not None:
+            break
+    return normalize_bucket_name(primary), normalize_bucket_name(secondary)
+
+
+class AnalysisFieldsService:
+    """
+    Typed columns parsed from the TranscriptionAnalysis text fields at write time: sentiment_score,
+    bucket_primary / bucket_secondary and the AnalysisTopic rows of general_topics. Dashboards and
+    filters aggregate on them in SQL instead of re-parsing the texts.
+    """
+
+    # TranscriptionAnalysis text field -> columns parsed from it
+    PARSED_FIELDS = {
+        'sentiment': ['sentiment_score'],
+        'bucket_prompt': ['bucket_primary', 'bucket_secondary'],
+    }
+
+    @staticmethod
+    def populate(analysis: TranscriptionAnalysis) -> TranscriptionAnalysis:
+        """Set the parsed columns of an (unsaved or saved) analysis from its text fields"""
+        analysis.sentiment_score = parse_sentiment_score(analysis.sentiment)
+        analysis.bucket_primary, analysis.bucket_secondary = parse_bucket_prompt(analysis.bucket_prompt)
+        return analysis
+
+    @staticmethod
+    def build_topics(analyses) -> list:
+        """Unsaved AnalysisTopic rows for saved analyses"""
+        return [
+            AnalysisTopic(analysis_id=analysis.id, topic_name=topic, topic_key=topic.lower(), position=position)
+            for analysis in analyses
+            for position, topic in enumerate(parse_topics(analysis.general_topics))
+        ]
+
+    @staticmethod
+    def store_topics(analyses):
+        """Replace the AnalysisTopic rows of saved analyses with the ones parsed from general_topics"""
+        analyses = [analysis for analysis in analyses if analysis.id is not None]
+        if not analyses:
+            return
+        with transaction.atomic():
+            AnalysisTopic.objects.filter(analysis_id__in=[analysis.id for analysis in analyses]).delete()
+            AnalysisTopic.objects.bulk_create(AnalysisFieldsService.build_topics(analyses), batch_size=1000)
+
+    @staticmethod
+    def backfill(chunk_size: int = 1000, start_id: int = 0):
+        """
+        Recompute the parsed columns and topic rows of every analysis with id > start_id, in keyset
+        chunks of chunk_size committed one by one. Yields (last id, rows) after each chunk.
+        """
+        last_id = start_id
+        while True:
+            chunk = list(
+                TranscriptionAnalysis.objects
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'sentiment', 'general_topics', 'bucket_prompt')[:chunk_size]
+            )
+            if not chunk:
+                return
+            for analysis in chunk:
+                AnalysisFieldsService.populate(analysis)
+            with transaction.atomic():
+                TranscriptionAnalysis.objects.bulk_update(
+                    chunk, ['sentiment_score', 'bucket_primary', 'bucket_secondary'], batch_size=chunk_size
+                )
+                AnalysisFieldsService.store_topics(chunk)
+            last_id = chunk[-1].id
+            yield last_id, len(chunk)
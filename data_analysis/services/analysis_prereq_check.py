@@ -1,9 +1,11 @@
-from typing import Any, Dict, List, Tuple, DefaultDict, Optional, Set
+from typing import Any, Dict, List, NamedTuple, Tuple, DefaultDict, Optional, Set
 
+from bisect import bisect_right
 from collections import defaultdict
 
-from datetime import timedelta, datetime, date, time
+from datetime import timedelta, datetime, date, time, timezone as dt_timezone
 
+from django.db.models import Count, Max
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 
@@ -11,7 +13,9 @@ from zoneinfo import ZoneInfo
 
 from segmentor.models import TitleMappingRule
 from data_analysis.models import AudioSegments
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
 from shift_analysis.models import Shift
+from shift_analysis.utils import _build_utc_windows_for_local_day
 
 
 def _safe_parse_datetime(value: Any):
@@ -26,6 +30,13 @@ def _safe_parse_datetime(value: Any):
     return dt
 
 
+def _coerce_datetime(value: Any):
+    """_safe_parse_datetime without the string round trip for values that already are datetimes"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=dt_timezone.utc) if timezone.is_naive(value) else value
+    return _safe_parse_datetime(value)
+
+
 def _merge_intervals(intervals: List[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
     if not intervals:
         return []
@@ -59,32 +70,114 @@ def _deactivate_segments_without_analysis(segments: List[Dict[str, Any]]) -> Non
 
     if segments_to_deactivate:
         AudioSegments.objects.filter(id__in=segments_to_deactivate, is_active=True).update(is_active=False)
+        HourOccupancyIndex.on_commit_refresh_ids(segments_to_deactivate)
+
+
+class ChannelRules(NamedTuple):
+    """Title rules and shift windows of one channel, compiled for mark_requires_analysis"""
+    # (before_title, stripped after_title, category name) in TitleMappingRule ordering
+    title_rules: Tuple[Tuple[str, str, str], ...]
+    # Channel timezone; None when the channel has no active shift
+    timezone: Optional[ZoneInfo]
+    # (lower-case day names, start_time, end_time)
+    shifts: Tuple[Tuple[frozenset, time, time], ...]
+
+
+# channel_id -> (fingerprint, ChannelRules), per process
+_CHANNEL_RULES_CACHE: Dict[int, Tuple[tuple, ChannelRules]] = {}
+
+
+def clear_channel_rules_cache() -> None:
+    _CHANNEL_RULES_CACHE.clear()
+
 
+def _channel_rule_fingerprints(channel_ids: List[int]) -> Dict[int, tuple]:
+    """Counts and latest updated_at of the active rules (and their categories) and shifts per channel"""
+    fingerprints: Dict[int, list] = {channel_id: [None, None] for channel_id in channel_ids}
+    rule_stats = (
+        TitleMappingRule.objects
+        .filter(is_active=True, category__channel_id__in=channel_ids)
+        .values("category__channel_id")
+        .annotate(count=Count("id"), updated=Max("updated_at"), category_updated=Max("category__updated_at"))
+    )
+    for row in rule_stats:
+        fingerprints[row["category__channel_id"]][0] = (row["count"], row["updated"], row["category_updated"])
+    shift_stats = (
+        Shift.objects
+        .filter(is_active=True, channel_id__in=channel_ids)
+        .values("channel_id", "channel__timezone")
+        .annotate(count=Count("id"), updated=Max("updated_at"))
+    )
+    for row in shift_stats:
+        fingerprints[row["channel_id"]][1] = (row["count"], row["updated"], row["channel__timezone"])
+    return {channel_id: tuple(value) for channel_id, value in fingerprints.items()}
 
-def update_audio_segment_title(segment_id: Any, category_name: Any) -> bool:
-    """Update a single AudioSegments.title if possible; returns True if updated.
 
-    Safe-casts id to int and category_name to str; ignores invalid inputs.
+def load_channel_rules(channel_ids: List[int]) -> Dict[int, ChannelRules]:
     """
+    Compiled rules per channel. Cached per process and reloaded for a channel only when its
+    active rules, their categories or its shifts changed (count or latest updated_at).
+    """
+    fingerprints = _channel_rule_fingerprints(channel_ids)
+    result: Dict[int, ChannelRules] = {}
+    stale = []
+    for channel_id in channel_ids:
+        cached = _CHANNEL_RULES_CACHE.get(channel_id)
+        if cached is not None and cached[0] == fingerprints[channel_id]:
+            result[channel_id] = cached[1]
+        else:
+            stale.append(channel_id)
+    if not stale:
+        return result
+
+    channel_to_rules = get_active_title_rules(stale)
+    channel_to_shifts: DefaultDict[int, List[Shift]] = defaultdict(list)
+    for shift in Shift.objects.filter(is_active=True, channel__in=stale).select_related("channel"):
+        channel_to_shifts[shift.channel.id].append(shift)
+
+    for channel_id in stale:
+        shifts = channel_to_shifts.get(channel_id, [])
+        rules = ChannelRules(
+            title_rules=tuple(
+                (rule.before_title, (rule.after_title or "").strip(), rule.category.name)
+                for rule in channel_to_rules.get(channel_id, [])
+            ),
+            timezone=ZoneInfo(shifts[0].channel.timezone or "UTC") if shifts else None,
+            shifts=tuple(
+                (
+                    frozenset(day.strip().lower() for day in shift.days.split(",")) if shift.days else frozenset(),
+                    shift.start_time,
+                    shift.end_time,
+                )
+                for shift in shifts
+            ),
+        )
+        _CHANNEL_RULES_CACHE[channel_id] = (fingerprints[channel_id], rules)
+        result[channel_id] = rules
+    return result
+
+
+def update_audio_segment_titles(titles: Dict[int, Any]) -> int:
+    """Set AudioSegments.title for {segment_id: title} with one select and one bulk update; returns rows changed.
+
+    Titles are cast to str and cut to 500 characters; rows already holding the title are not written.
+    """
+    new_titles = {seg_id: str(title)[:500] for seg_id, title in titles.items() if title is not None}
+    if not new_titles:
+        return 0
     try:
-        seg_id_int = int(segment_id)
-    except (TypeError, ValueError):
-        return False
-    if category_name is None:
-        return False
-    new_title = str(category_name)[:500]
-    try:
-        obj = AudioSegments.objects.filter(id=seg_id_int).only("id", "title").first()
-        if not obj:
-            return False
-        if obj.title == new_title:
-            return False
-        obj.title = new_title
-        obj.save(update_fields=["title"])
-        return True
-    except Exception:
-        # Avoid raising from utility; caller can ignore failures
-        return False
+        changed = []
+        for obj in AudioSegments.objects.filter(id__in=list(new_titles)).only("id", "title"):
+            if obj.title != new_titles[obj.id]:
+                obj.title = new_titles[obj.id]
+                changed.append(obj)
+        if changed:
+            AudioSegments.objects.bulk_update(changed, ["title"], batch_size=500)
+        return len(changed)
+    except Exception as e:
+        # Renaming is best effort; annotations are still returned to the caller
+        print(f"Failed to rename audio segments: {e}")
+        return 0
 
 
 def mark_requires_analysis(
@@ -111,6 +204,8 @@ def mark_requires_analysis(
         segments: List of segment dicts to annotate.
         suppression_duration: Time delta to cap suppression after `before_title`. Defaults to 10 minutes.
 
+    Segment times are parsed once. Each channel's segments are sorted once and swept against its
+    sorted suppression intervals and shift windows; renames and deactivations are written in bulk.
     """
 
     # Default all to True first, then apply per-segment immediate suppression rules
@@ -137,8 +232,8 @@ def mark_requires_analysis(
         channel_id = seg.get("channel_id")
         if channel_id is None:
             continue
-        seg_start = _safe_parse_datetime(seg.get("start_time"))
-        seg_end = _safe_parse_datetime(seg.get("end_time"))
+        seg_start = _coerce_datetime(seg.get("start_time"))
+        seg_end = _coerce_datetime(seg.get("end_time"))
         if seg_start is None or seg_end is None:
             # Leave requires_analysis=True; skip timeline processing
             continue
@@ -153,44 +248,54 @@ def mark_requires_analysis(
         _deactivate_segments_without_analysis(segments)
         return segments
 
-    # Compute intervals and handle renaming using TitleMappingRule helpers
-    channel_ids = list(channel_to_segments.keys())
-    channel_to_intervals = build_suppression_intervals_from_title_rules(
-        channel_to_segments,
-        channel_ids,
-        suppression_duration,
-    )
-    
-    # Check if segments fall within any shift - if not, mark as requires_analysis=False
-    check_segments_against_shifts(channel_to_segments, channel_ids)
-    
-    rename_titles_from_title_rules(channel_to_segments, channel_ids)
-
-    # Apply title rule intervals back to original segments
-    for seg in segments:
-        channel_id = seg.get("channel_id")
-        if channel_id is None:
-            continue
-        seg_start = _safe_parse_datetime(seg.get("start_time"))
-        seg_end = _safe_parse_datetime(seg.get("end_time"))
-        if seg_start is None or seg_end is None:
-            continue
-
-        intervals = channel_to_intervals.get(int(channel_id), [])
-        if not intervals:
-            continue
+    effective_duration = suppression_duration or timedelta(minutes=10)
+    channel_rules = load_channel_rules(list(channel_to_segments.keys()))
+    renamed_titles: Dict[int, str] = {}
 
-        # Overlap check: [seg_start, seg_end] intersects any interval [s, e]
-        for s, e in intervals:
-            if seg_start <= e and seg_end > s:
-                seg["requires_analysis"] = False
-                break
+    for channel_id, segs in channel_to_segments.items():
+        apply_channel_rules(segs, channel_rules[channel_id], effective_duration, renamed_titles)
 
+    update_audio_segment_titles(renamed_titles)
     _deactivate_segments_without_analysis(segments)
 
     return segments
 
 
+def apply_channel_rules(
+    segs: List[Dict[str, Any]],
+    rules: ChannelRules,
+    suppression_duration: timedelta,
+    renamed_titles: Dict[int, str],
+) -> None:
+    """
+    Title rule suppression, shift check and renames for the parsed segments of one channel.
+    Sets requires_analysis=False on the referenced dicts and collects renames into renamed_titles.
+    """
+    sorted_segs = sorted(segs, key=lambda s: s["_parsed_start"])  # timeline order
+
+    title_to_indices: DefaultDict[str, List[int]] = defaultdict(list)
+    for idx, s in enumerate(sorted_segs):
+        t = s.get("title")
+        if isinstance(t, str):
+            title_to_indices[t].append(idx)
+
+    intervals = build_suppression_intervals(sorted_segs, title_to_indices, rules.title_rules, suppression_duration)
+    in_shift = find_segments_in_shifts(sorted_segs, rules)
+    rename_titles(sorted_segs, title_to_indices, rules.title_rules, renamed_titles)
+
+    interval_idx = 0
+    for idx, s in enumerate(sorted_segs):
+        if not in_shift[idx]:
+            s["_ref"]["requires_analysis"] = False
+            continue
+        # Intervals ending before this segment starts cannot touch later segments either
+        while interval_idx < len(intervals) and intervals[interval_idx][1] < s["_parsed_start"]:
+            interval_idx += 1
+        # Overlap check: [seg_start, seg_end] intersects [s, e]
+        if interval_idx < len(intervals) and s["_parsed_end"] > intervals[interval_idx][0]:
+            s["_ref"]["requires_analysis"] = False
+
+
 def get_active_title_rules(channel_ids: List[int]) -> DefaultDict[int, List[TitleMappingRule]]:
     """Fetch active TitleMappingRule objects grouped by channel id."""
     rules = (
@@ -204,210 +309,119 @@ def get_active_title_rules(channel_ids: List[int]) -> DefaultDict[int, List[Titl
     return channel_to_rules
 
 
-def check_segments_against_shifts(
-    channel_to_segments: DefaultDict[int, List[Dict[str, Any]]],
-    channel_ids: List[int],
-) -> None:
+def find_segments_in_shifts(sorted_segs: List[Dict[str, Any]], rules: ChannelRules) -> List[bool]:
     """
-    Check if segments fall within any active shift time window.
-    If a segment's time range (start_time, end_time) and day does NOT fall within any shift,
-    mark it as requires_analysis=False.
+    For segments in timeline order, whether each overlaps an active shift window on one of the
+    local days it spans. Channels without shifts have no segment in a shift.
+
+    Windows are built once per local day, merged where they overlap, and swept with one pointer
+    per day, since the segments spanning a day are visited in start order.
     """
-    # Fetch all active shifts for the channels
-    shifts = (
-        Shift.objects
-        .filter(is_active=True, channel__in=channel_ids)
-        .select_related("channel")
-    )
-    
-    # Group shifts by channel and also map channel_id to timezone
-    channel_to_shifts: DefaultDict[int, List[Shift]] = defaultdict(list)
-    channel_id_to_timezone: Dict[int, ZoneInfo] = {}
-    
-    for shift in shifts:
-        channel_to_shifts[shift.channel.id].append(shift)
-        # Store timezone for each channel
-        if shift.channel.id not in channel_id_to_timezone:
-            channel_id_to_timezone[shift.channel.id] = ZoneInfo(shift.channel.timezone or "UTC")
-    
-    # Import the helper function for building UTC windows
-    from shift_analysis.utils import _build_utc_windows_for_local_day
-    
-    # For each channel, check each segment against shifts
-    for channel_id, segs in channel_to_segments.items():
-        if not segs:
-            continue
-        
-        # Get channel timezone
-        tz = channel_id_to_timezone.get(channel_id)
-        if tz is None:
-            # If no timezone, mark all segments as requires_analysis=False (no shifts to check)
-            for seg_data in segs:
-                seg_data["_ref"]["requires_analysis"] = False
-            continue
-        
-        shifts_for_channel = channel_to_shifts.get(channel_id, [])
-        if not shifts_for_channel:
-            # If no shifts for this channel, mark all segments as requires_analysis=False
-            for seg_data in segs:
-                seg_data["_ref"]["requires_analysis"] = False
+    tz = rules.timezone
+    if tz is None or not rules.shifts:
+        return [False] * len(sorted_segs)
+
+    day_windows: Dict[date, List[Tuple[datetime, datetime]]] = {}
+    day_pointers: Dict[date, int] = {}
+
+    def windows_for(day: date) -> List[Tuple[datetime, datetime]]:
+        windows = day_windows.get(day)
+        if windows is None:
+            day_name = day.strftime('%A').lower()
+            raw = []
+            for shift_days, start_time, end_time in rules.shifts:
+                if day_name in shift_days:
+                    raw.extend(_build_utc_windows_for_local_day(start_time, end_time, day, tz))
+            raw.sort(key=lambda window: window[0])
+            windows = []
+            for window_start, window_end in raw:
+                # Only strictly overlapping windows are merged: the overlap test below is strict
+                if windows and window_start < windows[-1][1]:
+                    if window_end > windows[-1][1]:
+                        windows[-1] = (windows[-1][0], window_end)
+                else:
+                    windows.append((window_start, window_end))
+            day_windows[day] = windows
+        return windows
+
+    in_shift = []
+    for s in sorted_segs:
+        seg_start = s["_parsed_start"]
+        seg_end = s["_parsed_end"]
+        current_day = seg_start.astimezone(tz).date()
+        end_day = seg_end.astimezone(tz).date()
+        found = False
+        while current_day <= end_day and not found:
+            windows = windows_for(current_day)
+            pointer = day_pointers.get(current_day, 0)
+            while pointer < len(windows) and windows[pointer][1] <= seg_start:
+                pointer += 1
+            day_pointers[current_day] = pointer
+            # Overlap check: [seg_start, seg_end] intersects [window_start, window_end]
+            found = pointer < len(windows) and seg_end > windows[pointer][0]
+            current_day += timedelta(days=1)
+        in_shift.append(found)
+    return in_shift
+
+
+def build_suppression_intervals(
+    sorted_segs: List[Dict[str, Any]],
+    title_to_indices: Dict[str, List[int]],
+    title_rules: Tuple[Tuple[str, str, str], ...],
+    suppression_duration: timedelta,
+) -> List[Tuple[Any, Any]]:
+    """Merged suppression intervals of one channel's title rules, for segments in timeline order."""
+    intervals: List[Tuple[Any, Any]] = []
+    for before_title, after_title, _ in title_rules:
+        before_indices = title_to_indices.get(before_title, [])
+        if not before_indices:
             continue
-        
-        # Check each segment against all shifts
-        for seg_data in segs:
-            seg_ref = seg_data["_ref"]
-            seg_start = seg_data["_parsed_start"]
-            seg_end = seg_data["_parsed_end"]
-            
-            # Convert segment times to local timezone to get the days
-            seg_start_local = seg_start.astimezone(tz)
-            seg_end_local = seg_end.astimezone(tz)
-            seg_start_day = seg_start_local.date()
-            seg_end_day = seg_end_local.date()
-            
-            # Get all days the segment spans (in case it crosses midnight)
-            days_to_check = [seg_start_day]
-            if seg_end_day != seg_start_day:
-                current_day = seg_start_day + timedelta(days=1)
-                while current_day <= seg_end_day:
-                    days_to_check.append(current_day)
-                    current_day += timedelta(days=1)
-            
-            # Check if segment overlaps with any shift window
-            segment_in_shift = False
-            
-            for shift in shifts_for_channel:
-                # Parse shift days
-                shift_days = [day.strip().lower() for day in shift.days.split(',')] if shift.days else []
-                
-                # Check each day the segment spans
-                for seg_day in days_to_check:
-                    seg_day_name = seg_day.strftime('%A').lower()
-                    
-                    # Check if the segment's day matches any of the shift's days
-                    if seg_day_name not in shift_days:
-                        continue
-                    
-                    # Build UTC windows for this shift on the segment's day
-                    shift_windows = _build_utc_windows_for_local_day(
-                        shift.start_time, shift.end_time, seg_day, tz
-                    )
-                    
-                    # Check if segment overlaps with any shift window
-                    for window_start, window_end in shift_windows:
-                        # Overlap check: [seg_start, seg_end] intersects [window_start, window_end]
-                        if seg_start < window_end and seg_end > window_start:
-                            segment_in_shift = True
-                            break
-                    
-                    if segment_in_shift:
-                        break
-                
-                if segment_in_shift:
-                    break
-            
-            # If segment does NOT fall within any shift, mark as requires_analysis=False
-            if not segment_in_shift:
-                seg_ref["requires_analysis"] = False
-
-
-def build_suppression_intervals_from_title_rules(
-    channel_to_segments: DefaultDict[int, List[Dict[str, Any]]],
-    channel_ids: List[int],
-    suppression_duration: Optional[timedelta],
-) -> DefaultDict[int, List[Tuple[Any, Any]]]:
-    """Create per-channel suppression intervals from TitleMappingRule configuration."""
-    effective_duration = suppression_duration or timedelta(minutes=10)
-    channel_to_rules = get_active_title_rules(channel_ids)
-    channel_to_intervals: DefaultDict[int, List[Tuple[Any, Any]]] = defaultdict(list)
 
-    for channel_id, segs in channel_to_segments.items():
-        sorted_segs = sorted(segs, key=lambda s: s["_parsed_start"])  # timeline order
-        rules_for_channel = channel_to_rules.get(channel_id, [])
-        if not rules_for_channel:
+        if not after_title:
+            for idx in before_indices:
+                s = sorted_segs[idx]
+                intervals.append((s["_parsed_start"], s["_parsed_end"]))
             continue
 
-        # title -> indices map
-        title_to_indices: DefaultDict[str, List[int]] = defaultdict(list)
-        for idx, s in enumerate(sorted_segs):
-            t = s.get("title")
-            if isinstance(t, str):
-                title_to_indices[t].append(idx)
-
-        for rule in rules_for_channel:
-            before_title = rule.before_title
-            after_title = (rule.after_title or "").strip()
+        after_indices = title_to_indices.get(after_title, [])
+        for b_idx in before_indices:
+            start_at = sorted_segs[b_idx]["_parsed_start"]
+            cap_end = start_at + suppression_duration
 
-            before_indices = title_to_indices.get(before_title, [])
-            if not before_indices:
-                continue
-
-            if not after_title:
-                for idx in before_indices:
-                    s = sorted_segs[idx]
-                    channel_to_intervals[channel_id].append((s["_parsed_start"], s["_parsed_end"]))
-                continue
+            # First after_title segment following the before_title segment
+            position = bisect_right(after_indices, b_idx)
+            if position < len(after_indices):
+                next_after_start = sorted_segs[after_indices[position]]["_parsed_start"]
+                end_at = next_after_start if next_after_start < cap_end else cap_end
+            else:
+                end_at = cap_end
 
-            after_indices = title_to_indices.get(after_title, [])
-            for b_idx in before_indices:
-                before_seg = sorted_segs[b_idx]
-                start_at = before_seg["_parsed_start"]
-                cap_end = start_at + effective_duration
+            if end_at > start_at:
+                intervals.append((start_at, end_at))
 
-                next_after_start = None
-                for a_idx in after_indices:
-                    if a_idx > b_idx:
-                        next_after_start = sorted_segs[a_idx]["_parsed_start"]
-                        break
-
-                if next_after_start is not None:
-                    end_at = next_after_start if next_after_start < cap_end else cap_end
-                else:
-                    end_at = cap_end
+    return _merge_intervals(intervals)
 
-                if end_at > start_at:
-                    channel_to_intervals[channel_id].append((start_at, end_at))
 
-        # Merge intervals per channel
-        channel_to_intervals[channel_id] = _merge_intervals(channel_to_intervals[channel_id])
-
-    return channel_to_intervals
-
-
-def rename_titles_from_title_rules(
-    channel_to_segments: DefaultDict[int, List[Dict[str, Any]]],
-    channel_ids: List[int],
+def rename_titles(
+    sorted_segs: List[Dict[str, Any]],
+    title_to_indices: Dict[str, List[int]],
+    title_rules: Tuple[Tuple[str, str, str], ...],
+    renamed_titles: Dict[int, str],
 ) -> None:
-    """Rename titles in-place for the immediate segment after before_title if unrecognized."""
-    channel_to_rules = get_active_title_rules(channel_ids)
-
-    for channel_id, segs in channel_to_segments.items():
-        sorted_segs = sorted(segs, key=lambda s: s["_parsed_start"])  # timeline order
-        rules_for_channel = channel_to_rules.get(channel_id, [])
-        if not rules_for_channel:
-            continue
-
-        title_to_indices: DefaultDict[str, List[int]] = defaultdict(list)
-        for idx, s in enumerate(sorted_segs):
-            t = s.get("title")
-            if isinstance(t, str):
-                title_to_indices[t].append(idx)
-
-        for rule in rules_for_channel:
-            before_title = rule.before_title
-            before_indices = title_to_indices.get(before_title, [])
-            if not before_indices:
+    """
+    Rename titles in-place for the immediate segment after before_title if unrecognized, and
+    collect {segment_id: title} for update_audio_segment_titles (the last matching rule wins).
+    """
+    for before_title, _, category_name in title_rules:
+        for b_idx in title_to_indices.get(before_title, []):
+            next_idx = b_idx + 1
+            if next_idx >= len(sorted_segs):
+                continue
+            next_seg = sorted_segs[next_idx]["_ref"]
+            if next_seg.get("is_recognized") is True:
+                continue
+            next_seg["title"] = category_name
+            try:
+                renamed_titles[int(next_seg.get("id"))] = category_name
+            except (TypeError, ValueError):
                 continue
-            for b_idx in before_indices:
-                next_idx = b_idx + 1
-                if next_idx >= len(sorted_segs):
-                    continue
-                next_seg = sorted_segs[next_idx]["_ref"]
-                if next_seg.get("is_recognized") is True:
-                    continue
-                category_name = rule.category.name
-                next_seg["title"] = category_name
-                seg_id = next_seg.get("id")
-                if seg_id is not None:
-                    update_audio_segment_title(seg_id, category_name)
-
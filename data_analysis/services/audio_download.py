@@ -1,14 +1,25 @@
+import math
 import os
+import tempfile
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from django.conf import settings as django_settings
 from django.core.exceptions import ValidationError
+from config.http_clients import APIClientRegistry
 from core_admin.models import Channel
 from core_admin.repositories import GeneralSettingService
 from data_analysis.models import AudioSegments
+from data_analysis.services.mp3_splitter import MP3FrameSplitter
 
 
 class ACRCloudAudioDownloader:
     BASE_URL = "https://api-v2.acrcloud.com/api/bm-bd-projects/{pid}/channels/{channel_id}/recordings"
+    # Maximum played_duration accepted by the recordings endpoint; longer ranges use record_after
+    MAX_PLAYED_DURATION = 600
+    # Status codes worth retrying (rate limiting and transient server errors)
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
     @staticmethod
     def validate_download_parameters(project_id: int, channel_id: int, start_time, duration_seconds: int):
@@ -38,7 +49,8 @@ class ACRCloudAudioDownloader:
         return start_time_str, int(duration_seconds)
 
     @staticmethod
-    def download_audio(api_key: str, project_id: int, channel_id: int, start_time, duration_seconds: int, filename: str = None, filepath: str = None):
+    def download_audio(api_key: str, project_id: int, channel_id: int, start_time, duration_seconds: int, filename: str = None, filepath: str = None,
+                       session: requests.Session = None):
         """
         Downloads audio from the ACRCloud API for the given parameters and saves it as an mp3 file.
         - api_key: ACRCloud API key (already resolved from settings or caller)
@@ -46,6 +58,7 @@ class ACRCloudAudioDownloader:
         - duration_seconds: played_duration (int)
         - filename: optional custom filename for the downloaded file
         - filepath: optional custom filepath for the downloaded file
+        - session: optional requests.Session to reuse keep-alive connections across downloads
         - If duration_seconds > 600, sets record_after=duration_seconds-600
         Returns the file path of the downloaded mp3.
         """
@@ -89,33 +102,75 @@ class ACRCloudAudioDownloader:
             return media_url
         
         # No existing file found, proceed with download
-        token = api_key
+        ACRCloudAudioDownloader.fetch_recording(
+            api_key=api_key,
+            project_id=project_id,
+            channel_id=channel_id,
+            start_time_str=start_time_str,
+            duration_seconds=duration_seconds,
+            file_path=file_path,
+            session=session,
+        )
+        media_url = f"/api/media/{filename}"
+        return media_url
+
+    @staticmethod
+    def build_recording_params(start_time_str: str, duration_seconds: int) -> dict:
+        """Query parameters for the recordings endpoint, splitting long ranges with record_after"""
         params = {
             "timestamp_utc": start_time_str,
-            "played_duration": min(duration_seconds, 600)
+            "played_duration": min(duration_seconds, ACRCloudAudioDownloader.MAX_PLAYED_DURATION)
         }
-        if duration_seconds > 600:
-            params["record_after"] = duration_seconds - 600
+        if duration_seconds > ACRCloudAudioDownloader.MAX_PLAYED_DURATION:
+            params["record_after"] = duration_seconds - ACRCloudAudioDownloader.MAX_PLAYED_DURATION
+        return params
 
+    @staticmethod
+    def fetch_recording(api_key: str, project_id: int, channel_id: int, start_time_str: str, duration_seconds: int,
+                        file_path: str, session: requests.Session = None):
+        """
+        Stream a recording into file_path.
+        The body is written to a temporary file next to file_path and renamed into place once
+        complete, so an interrupted download never leaves a truncated mp3 behind. Connection
+        errors, timeouts and retryable status codes are retried with exponential backoff.
+        """
         url = ACRCloudAudioDownloader.BASE_URL.format(pid=project_id, channel_id=channel_id)
         headers = {
-            "Authorization": f"Bearer {token}",
+            "Authorization": f"Bearer {api_key}",
         }
-        # response = requests.get(url, headers=headers, params=params, stream=True)
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-
-        with open(file_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        media_url = f"/api/media/{filename}"
-        return media_url
+        params = ACRCloudAudioDownloader.build_recording_params(start_time_str, duration_seconds)
+        timeout = (
+            django_settings.ACR_DOWNLOAD_CONNECT_TIMEOUT_SECONDS,
+            django_settings.ACR_DOWNLOAD_READ_TIMEOUT_SECONDS,
+        )
+        max_retries = django_settings.ACR_DOWNLOAD_MAX_RETRIES
+        http = session or APIClientRegistry.get_session("acrcloud", api_key)
+
+        attempt = 0
+        while True:
+            try:
+                with http.get(url, headers=headers, params=params, stream=True, timeout=timeout) as response:
+                    if response.status_code in ACRCloudAudioDownloader.RETRY_STATUS_CODES and attempt < max_retries:
+                        raise requests.exceptions.RetryError(f"Retryable status {response.status_code}")
+                    response.raise_for_status()
+                    ACRCloudAudioDownloader.write_file_atomically(file_path, response.iter_content(chunk_size=65536))
+                return file_path
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError) as e:
+                if attempt >= max_retries:
+                    raise
+                delay = django_settings.ACR_DOWNLOAD_BACKOFF_SECONDS * (2 ** attempt)
+                attempt += 1
+                print(f"Retrying recording download {start_time_str} ({attempt}/{max_retries}) in {delay}s: {e}")
+                time.sleep(delay)
 
     @staticmethod
     def download_audio_segments_batch(audio_segments: list[AudioSegments], channel: Channel | int):
         """
         Downloads audio for a list of AudioSegments and updates their is_audio_downloaded field.
+        Downloads run on a bounded thread pool (ACR_DOWNLOAD_MAX_WORKERS) sharing the ACRCloud
+        account's keep-alive session; is_audio_downloaded is written with a single bulk_update at the end.
+        With ACR_DOWNLOAD_WINDOW_MODE, runs of adjacent segments are fetched as one recording and
+        sliced locally (see download_window).
         
         Args:
             audio_segments (list[AudioSegments]): List of AudioSegments objects
@@ -133,13 +188,17 @@ class ACRCloudAudioDownloader:
             'failed': [],
             'skipped': []
         }
-        settings = GeneralSettingService.get_active_setting(channel=channel, include_buckets=False)
+        settings = GeneralSettingService.get_settings_snapshot(channel)
         if not settings or not settings.acr_cloud_api_key:
             results['failed'].append({
                 'error': 'ACRCloud API key not configured for channel'
             })
             return results
-        # Process each segment
+
+        downloaded = []
+        pending = []
+        acr_channels = Channel.objects.in_bulk({segment.channel_id for segment in audio_segments})
+        # Resolve everything that touches the database on this thread; workers only do HTTP and file IO
         for segment in audio_segments:
             try:
                 # Skip if already downloaded
@@ -150,15 +209,7 @@ class ACRCloudAudioDownloader:
                         'reason': 'Already downloaded'
                     })
                     continue
-                
-                # Get project_id from the first segment's channel
-                project_id = segment.channel.project_id
-                channel_id = segment.channel.channel_id
-                
-                # Use default media directory
-                media_dir = os.path.join(os.getcwd(), "media")
-                os.makedirs(media_dir, exist_ok=True)
-                
+
                 # Check if file_name and file_path are present
                 if not segment.file_name or not segment.file_path:
                     results['skipped'].append({
@@ -167,51 +218,202 @@ class ACRCloudAudioDownloader:
                         'reason': 'Missing file_name or file_path'
                     })
                     continue
-                
-                # Use segment's file_name and file_path
-                filename = segment.file_name
-                file_path = segment.file_path
-                
+
                 # Check if file already exists
-                if os.path.exists(file_path):
+                if os.path.exists(segment.file_path):
                     # File exists, just update the database
-                    segment.is_audio_downloaded = True
-                    segment.save()
+                    downloaded.append(segment)
                     results['success'].append({
                         'segment_id': segment.id,
-                        'file_name': filename,
-                        'file_path': file_path,
+                        'file_name': segment.file_name,
+                        'file_path': segment.file_path,
                         'status': 'File already existed, marked as downloaded'
                     })
                     continue
-                # Download the audio
-                media_url = ACRCloudAudioDownloader.download_audio(
-                    api_key=settings.acr_cloud_api_key,
-                    project_id=project_id,
-                    channel_id=channel_id,
-                    start_time=segment.start_time,
-                    duration_seconds=segment.duration_seconds,
-                    filepath=file_path
-                )
-                print(f"media_url: {media_url}")
-                # Update the segment
-                segment.is_audio_downloaded = True
-                segment.save()
-                
-                results['success'].append({
-                    'segment_id': segment.id,
-                    'file_name': filename,
-                    'file_path': file_path,
-                    'media_url': media_url,
-                    'status': 'Successfully downloaded'
-                })
-                
+
+                acr_channel = acr_channels[segment.channel_id]
+                pending.append((segment, acr_channel.project_id, acr_channel.channel_id))
             except Exception as e:
                 results['failed'].append({
                     'segment_id': segment.id if hasattr(segment, 'id') else 'Unknown',
                     'file_name': getattr(segment, 'file_name', 'Unknown'),
                     'error': str(e)
                 })
-        
+
+        if pending:
+            if django_settings.ACR_DOWNLOAD_WINDOW_MODE:
+                jobs = ACRCloudAudioDownloader.plan_download_windows(
+                    pending,
+                    max_window_seconds=django_settings.ACR_DOWNLOAD_WINDOW_MAX_SECONDS,
+                    max_gap_seconds=django_settings.ACR_DOWNLOAD_WINDOW_MAX_GAP_SECONDS,
+                )
+            else:
+                jobs = [(project_id, channel_id, [segment]) for segment, project_id, channel_id in pending]
+
+            max_workers = max(1, min(django_settings.ACR_DOWNLOAD_MAX_WORKERS, len(jobs)))
+            session = APIClientRegistry.get_session("acrcloud", settings.acr_cloud_api_key)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(
+                        ACRCloudAudioDownloader._download_job,
+                        settings.acr_cloud_api_key,
+                        project_id,
+                        channel_id,
+                        segments,
+                        session,
+                    )
+                    for project_id, channel_id, segments in jobs
+                ]
+                for future in as_completed(futures):
+                    for segment, media_url, download_status, error in future.result():
+                        if error:
+                            results['failed'].append({
+                                'segment_id': segment.id,
+                                'file_name': segment.file_name,
+                                'error': error
+                            })
+                            continue
+                        downloaded.append(segment)
+                        results['success'].append({
+                            'segment_id': segment.id,
+                            'file_name': segment.file_name,
+                            'file_path': segment.file_path,
+                            'media_url': media_url,
+                            'status': download_status
+                        })
+
+        if downloaded:
+            for segment in downloaded:
+                segment.is_audio_downloaded = True
+            AudioSegments.objects.bulk_update(downloaded, ['is_audio_downloaded'], batch_size=500)
+
         return results
 
+    @staticmethod
+    def plan_download_windows(pending: list, max_window_seconds: int, max_gap_seconds: int) -> list:
+        """
+        Group (segment, project_id, channel_id) entries into runs of adjacent segments of the same
+        ACR channel. A run grows while the next segment starts at most max_gap_seconds after the
+        run's end and the run stays within max_window_seconds.
+        Returns a list of (project_id, channel_id, [segments]) in start time order.
+        """
+        windows = []
+        current = {}
+        for segment, project_id, channel_id in sorted(pending, key=lambda item: (item[1], item[2], item[0].start_time)):
+            key = (project_id, channel_id)
+            run = current.get(key)
+            if run is not None:
+                run_start = run[0].start_time
+                run_end = max(item.end_time for item in run)
+                gap = (segment.start_time - run_end).total_seconds()
+                span = (max(run_end, segment.end_time) - run_start).total_seconds()
+                if gap <= max_gap_seconds and span <= max_window_seconds:
+                    run.append(segment)
+                    continue
+            run = [segment]
+            current[key] = run
+            windows.append((project_id, channel_id, run))
+        return windows
+
+    @staticmethod
+    def download_window(api_key: str, project_id: int, channel_id: int, segments: list[AudioSegments],
+                        session: requests.Session = None) -> list:
+        """
+        Fetch one contiguous recording covering all segments and cut each segment's mp3 out of it
+        at frame boundaries. The window request goes through fetch_recording, so windows longer
+        than 600 seconds use the same played_duration / record_after split as download_audio.
+        Returns [(segment, media_url)]; raises if the window cannot be fetched or parsed.
+        """
+        window_start = min(segment.start_time for segment in segments)
+        window_end = max(segment.end_time for segment in segments)
+        duration_seconds = math.ceil((window_end - window_start).total_seconds())
+        start_time_str, duration_seconds = ACRCloudAudioDownloader.validate_download_parameters(
+            project_id, channel_id, window_start, duration_seconds
+        )
+
+        directory = os.path.dirname(segments[0].file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, window_path = tempfile.mkstemp(dir=directory, prefix=".window_", suffix=".mp3")
+        os.close(fd)
+        try:
+            ACRCloudAudioDownloader.fetch_recording(
+                api_key=api_key,
+                project_id=project_id,
+                channel_id=channel_id,
+                start_time_str=start_time_str,
+                duration_seconds=duration_seconds,
+                file_path=window_path,
+                session=session,
+            )
+            with open(window_path, "rb") as f:
+                data = f.read()
+        finally:
+            if os.path.exists(window_path):
+                os.remove(window_path)
+
+        frames = MP3FrameSplitter.parse_frames(data)
+        sliced = []
+        for segment in segments:
+            offset = (segment.start_time - window_start).total_seconds()
+            audio = MP3FrameSplitter.slice_frames(
+                data, frames, offset, offset + (segment.end_time - segment.start_time).total_seconds()
+            )
+            if not audio:
+                raise ValueError(f"Window recording has no audio for segment {segment.id}")
+            ACRCloudAudioDownloader.write_file_atomically(segment.file_path, [audio])
+            sliced.append((segment, f"/api/media/{os.path.basename(segment.file_path)}"))
+        return sliced
+
+    @staticmethod
+    def write_file_atomically(file_path: str, chunks):
+        """Write chunks to a temporary file next to file_path and rename it into place once complete"""
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def _download_job(api_key: str, project_id: int, channel_id: int, segments: list[AudioSegments],
+                      session: requests.Session) -> list:
+        """
+        Worker for download_audio_segments_batch: a window download for runs of several segments,
+        falling back to per-segment downloads if the window fails. Files already sliced before a
+        failure are kept, download_audio skips existing files.
+        Returns [(segment, media_url, status, error)].
+        """
+        outcomes = []
+        if len(segments) > 1:
+            try:
+                return [
+                    (segment, media_url, 'Sliced from window download', None)
+                    for segment, media_url in ACRCloudAudioDownloader.download_window(
+                        api_key, project_id, channel_id, segments, session=session
+                    )
+                ]
+            except Exception as e:
+                print(f"Window download of {len(segments)} segments failed, downloading individually: {e}")
+
+        for segment in segments:
+            try:
+                media_url = ACRCloudAudioDownloader.download_audio(
+                    api_key=api_key,
+                    project_id=project_id,
+                    channel_id=channel_id,
+                    start_time=segment.start_time,
+                    duration_seconds=segment.duration_seconds,
+                    filepath=segment.file_path,
+                    session=session,
+                )
+                outcomes.append((segment, media_url, 'Successfully downloaded', None))
+            except Exception as e:
+                outcomes.append((segment, None, None, str(e)))
+        return outcomes
@@ -0,0 +1,126 @@
+import math
+import os
+import tempfile
+from datetime import datetime
+
+from core_admin.models import Channel
+from data_analysis.models import AudioSegments
+from data_analysis.services.audio_download import ACRCloudAudioDownloader
+from data_analysis.services.mp3_splitter import MP3FrameSplitter
+
+
+class LocalAudioMerger:
+    """
+    Builds the mp3 for a merged time range from segment files already on disk.
+
+    Source files are cut and joined at MP3 frame level without re-encoding. Only the holes no
+    local file covers are fetched from ACRCloud.
+    """
+
+    # Holes shorter than this are not worth an ACRCloud request
+    MIN_GAP_SECONDS = 1
+
+    @staticmethod
+    def get_local_sources(channel: Channel, start_dt: datetime, end_dt: datetime, exclude_file_path: str = None) -> list:
+        """Segments of the channel overlapping [start_dt, end_dt) whose mp3 exists on disk, by start time"""
+        queryset = (
+            AudioSegments.objects
+            .filter(channel=channel, start_time__lt=end_dt, end_time__gt=start_dt, file_path__isnull=False)
+            .only('id', 'start_time', 'end_time', 'file_path')
+            .order_by('start_time', 'id')
+        )
+        if exclude_file_path:
+            queryset = queryset.exclude(file_path=exclude_file_path)
+        return [segment for segment in queryset if os.path.exists(segment.file_path)]
+
+    @staticmethod
+    def plan_pieces(sources: list, start_dt: datetime, end_dt: datetime) -> list:
+        """
+        Cover [start_dt, end_dt) with pieces of source files and gaps, in time order.
+        At each point the source reaching furthest is used, so overlapping sources are not repeated.
+        Returns ('local', segment, piece_start, piece_end) and ('gap', None, piece_start, piece_end) tuples.
+        """
+        pieces = []
+        cursor = start_dt
+        index = 0
+        while cursor < end_dt:
+            while index < len(sources) and sources[index].start_time <= cursor:
+                index += 1
+            best = max(
+                (source for source in sources[:index] if source.end_time > cursor),
+                key=lambda source: source.end_time,
+                default=None,
+            )
+            if best is not None:
+                piece_end = min(best.end_time, end_dt)
+                pieces.append(('local', best, cursor, piece_end))
+            else:
+                next_start = sources[index].start_time if index < len(sources) else end_dt
+                piece_end = min(next_start, end_dt)
+                pieces.append(('gap', None, cursor, piece_end))
+            cursor = piece_end
+        return pieces
+
+    @staticmethod
+    def _download_gap(api_key: str, channel: Channel, gap_start: datetime, gap_end: datetime, directory: str) -> bytes:
+        gap_seconds = (gap_end - gap_start).total_seconds()
+        start_time_str, duration_seconds = ACRCloudAudioDownloader.validate_download_parameters(
+            channel.project_id, channel.channel_id, gap_start, math.ceil(gap_seconds)
+        )
+        fd, gap_path = tempfile.mkstemp(dir=directory, prefix=".gap_", suffix=".mp3")
+        os.close(fd)
+        try:
+            ACRCloudAudioDownloader.fetch_recording(
+                api_key=api_key,
+                project_id=channel.project_id,
+                channel_id=channel.channel_id,
+                start_time_str=start_time_str,
+                duration_seconds=duration_seconds,
+                file_path=gap_path,
+            )
+            with open(gap_path, "rb") as f:
+                data = f.read()
+        finally:
+            if os.path.exists(gap_path):
+                os.remove(gap_path)
+        return MP3FrameSplitter.slice(data, 0, gap_seconds)
+
+    @staticmethod
+    def merge_to_file(channel: Channel, start_dt: datetime, end_dt: datetime, file_path: str, api_key: str):
+        """
+        Write the audio for [start_dt, end_dt) to file_path from local segment files, downloading
+        only uncovered gaps. Returns the media_url, or None when no local source audio exists (the
+        caller should download the whole range instead).
+        """
+        filename = os.path.basename(file_path)
+        if os.path.exists(file_path):
+            return f"/api/media/{filename}"
+
+        sources = LocalAudioMerger.get_local_sources(channel, start_dt, end_dt, exclude_file_path=file_path)
+        if not sources:
+            return None
+
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        parsed = {}
+        parts = []
+        for kind, source, piece_start, piece_end in LocalAudioMerger.plan_pieces(sources, start_dt, end_dt):
+            if kind == 'gap':
+                if (piece_end - piece_start).total_seconds() < LocalAudioMerger.MIN_GAP_SECONDS:
+                    continue
+                parts.append(LocalAudioMerger._download_gap(api_key, channel, piece_start, piece_end, directory))
+                continue
+            if source.id not in parsed:
+                with open(source.file_path, "rb") as f:
+                    data = f.read()
+                parsed[source.id] = (data, MP3FrameSplitter.parse_frames(data))
+            data, frames = parsed[source.id]
+            parts.append(MP3FrameSplitter.slice_frames(
+                data,
+                frames,
+                (piece_start - source.start_time).total_seconds(),
+                (piece_end - source.start_time).total_seconds(),
+            ))
+
+        ACRCloudAudioDownloader.write_file_atomically(file_path, parts)
+        return f"/api/media/{filename}"
@@ -1,21 +1,77 @@
+from bisect import bisect_left
 from datetime import datetime, timedelta, timezone as dt_timezone
-import requests
 from typing import Optional
 import os
 import copy
+from django.db import transaction
 from django.utils import timezone
 from decouple import config
 from core_admin.models import GeneralSetting, Channel
 from openai import OpenAI
 from django.core.exceptions import ValidationError
+from config.http_clients import APIClientRegistry
 from config.validation import ValidationUtils
 from logger.repositories import AudioSegmentEditLogDAO
 from logger.models import AudioSegmentEditLog
 from logger.models import AudioSegmentEditLog
 
 from data_analysis.models import AudioSegments as AudioSegmentsModel
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
 from data_analysis.services.transcription_service import RevAISpeechToText
 
+class SegmentIntervalIndex:
+    """
+    Accepted segments kept sorted by start time, applying the same accept/reject rules as
+    AudioSegments._check_segment_overlap without scanning every accepted segment.
+
+    An accepted segment can only overlap a new one if it starts before the new end and no
+    earlier than the new start minus the longest accepted duration, so each check bisects to
+    that window. As in the linear scan, the earliest accepted overlapping segment decides.
+    """
+
+    def __init__(self, gap_threshold_seconds=2):
+        self.gap_threshold_seconds = gap_threshold_seconds
+        # Sorted (start, insertion order) keys and the matching (start, end, insertion order) entries
+        self._keys = []
+        self._entries = []
+        self._max_duration = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, start_time, end_time):
+        start, end = start_time.timestamp(), end_time.timestamp()
+        key = (start, len(self._entries))
+        position = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._entries.insert(position, (start, end, key[1]))
+        self._max_duration = max(self._max_duration, end - start)
+
+    def should_include(self, start_time, end_time) -> bool:
+        """True if the segment should be included, False if it should be ignored."""
+        new_start, new_end = start_time.timestamp(), end_time.timestamp()
+
+        low = bisect_left(self._keys, (new_start - self._max_duration, -1))
+        high = bisect_left(self._keys, (new_end, -1))
+        first = None
+        for index in range(low, high):
+            entry = self._entries[index]
+            # Overlaps when the accepted segment ends after the new start (its start is before new_end by construction)
+            if entry[1] > new_start and (first is None or entry[2] < first[2]):
+                first = entry
+
+        if first is None:
+            return True
+        existing_start, existing_end, _ = first
+        # Complete overlap: new segment is within the existing one
+        if new_start >= existing_start and new_end <= existing_end:
+            return False
+        # Partial overlap: keep only if the new segment extends far enough past the existing end
+        if new_end > existing_end:
+            return (new_end - existing_end) >= self.gap_threshold_seconds
+        return False
+
+
 class AudioSegments:
     BASE_URL = "https://api-v2.acrcloud.com/api/bm-bd-projects/{pid}/channels/{channel_id}/results"
 
@@ -47,7 +103,7 @@ class AudioSegments:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {token}",
         }
-        response = requests.get(url, headers=headers)
+        response = APIClientRegistry.request("acrcloud", "GET", url, api_key=token, headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -106,18 +162,25 @@ class AudioSegments:
 
 
     @staticmethod
-    def process_audio_data(data_list, channel=Channel|None):
+    def process_audio_data(data_list, channel=Channel|None, previous_segment: Optional[dict] = None):
         """
         Process data from custom_files or music format and create unrecognized audio segments.
         
         Args:
             data_list: List of dictionaries with metadata containing custom_files or music
             channel: Channel object for generating file names and paths
+            previous_segment: Optional last recognized segment from an earlier ingestion run
+                              (dict with start_time, end_time, title). It takes part in overlap
+                              checks and gap creation but is not returned.
             
         Returns:
             list: List of dictionaries containing all segments (recognized and unrecognized)
         """
         results = []
+        accepted_index = SegmentIntervalIndex()
+        if previous_segment:
+            results.append({**previous_segment, "is_boundary": True})
+            accepted_index.add(previous_segment["start_time"], previous_segment["end_time"])
         
         # Extract recognized segments from the data
         for item in data_list:
@@ -139,17 +202,11 @@ class AudioSegments:
                     print(f"Warning: Skipping zero-duration segment at {start_time}")
                     continue
                 
-                # Create segment dictionary for overlap checking
-                new_segment = {
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "duration_seconds": int(played_duration)
-                }
-                
-                # Check for overlaps with existing segments
-                if not AudioSegments._check_segment_overlap(new_segment, results):
+                # Check for overlaps with already accepted segments (same rules as _check_segment_overlap)
+                if not accepted_index.should_include(start_time, end_time):
                     print(f"Skipping overlapping segment: {start_time} - {end_time}")
                     continue
+                accepted_index.add(start_time, end_time)
                 
                 # Get title and metadata from either custom_files or music
                 title = "Unknown Title"
@@ -255,6 +312,9 @@ class AudioSegments:
                 # Segments are touching (no gap), skip creating unrecognized segment
                 print(f"Segments touching at {current_segment['end_time']}, skipping gap creation")
         
+        # Drop the boundary segment from the previous run, it is already stored
+        all_segments = [segment for segment in all_segments if not segment.get("is_boundary")]
+
         # Sort all segments by start time
         all_segments.sort(key=lambda x: x["start_time"])
         
@@ -412,6 +472,9 @@ class AudioSegments:
         - Stops expanding when hitting recognized segments or custom_file segments
         - Maximum 10 segments per merge
         
+        Runs in two phases: _plan_short_segment_merges computes every merge group in one sweep,
+        then _apply_segment_merges writes them with bulk queries.
+        
         Args:
             segments: List of AudioSegments model instances or dictionaries (will be sorted by start_time)
             channel: Channel object for generating file names and paths
@@ -428,24 +491,20 @@ class AudioSegments:
         # Check if we're dealing with dictionaries or model instances
         is_dict_format = isinstance(segments_list[0], dict) if segments_list else False
         
-        # If dictionaries, convert to model instances first
+        # If dictionaries, convert to model instances first (one query for all ids)
         if is_dict_format:
-            # Convert dict segments to model instances
+            ids = [seg_dict.get('id') for seg_dict in segments_list if seg_dict.get('id')]
+            found = AudioSegmentsModel.objects.in_bulk(ids)
             model_segments = []
             for seg_dict in segments_list:
-                # Get segment ID if exists
                 seg_id = seg_dict.get('id')
-                if seg_id:
-                    try:
-                        # Try to get existing model instance
-                        model_seg = AudioSegmentsModel.objects.get(id=seg_id)
-                        model_segments.append(model_seg)
-                    except AudioSegmentsModel.DoesNotExist:
-                        print(f"Warning: Segment ID {seg_id} not found in database, skipping")
-                        continue
-                else:
+                if not seg_id:
                     print(f"Warning: Segment dict missing 'id' field, skipping")
                     continue
+                if seg_id not in found:
+                    print(f"Warning: Segment ID {seg_id} not found in database, skipping")
+                    continue
+                model_segments.append(found[seg_id])
             segments_list = model_segments
         
         if not segments_list:
@@ -455,66 +514,15 @@ class AudioSegments:
         # Explicitly sort by start_time to ensure correct order (handles unsorted input)
         segments_list = sorted(segments_list, key=lambda x: x.start_time)
         
-        # Track which segments have been used to create a merged segment (to avoid duplicate merges)
-        processed_for_merge = set()
-        merged_segments_created = []
-        
-        # Find recognized segments < 20 seconds and create merged segments
-        for i, current_segment in enumerate(segments_list):
-            # Skip segments that are already merged or deleted
-            if (current_segment.source in ('system_merge', 'user_merged') or 
-                current_segment.is_delete):
-                continue
-            
-            # Remove this after First day of pushing this code to production
-            if current_segment.source == 'merged':
-                continue
-            
-            # Check if current segment is recognized, below 20 seconds, and has music metadata
-            # Only merge segments with metadata_json.source == "music"
-            # Skip segments with metadata_json.source == "custom_file" or missing metadata
-            metadata_source = None
-            if current_segment.metadata_json and isinstance(current_segment.metadata_json, dict):
-                metadata_source = current_segment.metadata_json.get("source")
-            
-            # Skip if not recognized, >= 20 seconds, already processed, or not music
-            if not (current_segment.is_recognized and 
-                    current_segment.duration_seconds < 20 and
-                    metadata_source == "music" and
-                    i not in processed_for_merge):
-                continue
-            
-            # Skip custom_file segments completely
-            if metadata_source == "custom_file":
-                continue
-            
-            # Find adjacent unrecognized segments to merge with
-            # This expands in one direction at a time (backward first, then forward)
-            # Only includes unrecognized segments, stops at recognized or custom_file segments
-            segments_to_merge, merge_indices = AudioSegments._find_adjacent_unrecognized_segments(
-                segments_list, i, processed_for_merge, max_segments=10
-            )
-            
-            # Only create merged segment if we have at least 2 segments to merge
-            # (current recognized segment + at least one unrecognized adjacent segment)
-            if len(segments_to_merge) >= 2:
-                # Create merged segment in database and handle logging
-                merged_segment_model = AudioSegments._create_and_save_merged_segment(
-                    segments_to_merge, channel
-                )
-                
-                if merged_segment_model:
-                    merged_segments_created.append(merged_segment_model)
-                    
-                    # Mark indices as processed to avoid creating duplicate merges
-                    processed_for_merge.update(merge_indices)
-                    
-                    print(f"Created merged segment ID {merged_segment_model.id} from {len(segments_to_merge)} segments: "
-                          f"{merged_segment_model.start_time} - {merged_segment_model.end_time} "
-                          f"({merged_segment_model.duration_seconds}s).")
-            else:
-                print(f"Skipping merge for segment at {current_segment.start_time}: "
-                      f"no adjacent unrecognized segments found (may have gaps or adjacent segments are recognized/custom_file)")
+        # Merged rows always start inside the batch, so only paths in that range can collide
+        existing_file_paths = set(
+            AudioSegmentsModel.objects
+            .filter(channel=channel, start_time__gte=segments_list[0].start_time,
+                    start_time__lte=max(seg.end_time for seg in segments_list))
+            .values_list('file_path', flat=True)
+        )
+        groups = AudioSegments._plan_short_segment_merges(segments_list, channel, existing_file_paths)
+        merged_segments_created = AudioSegments._apply_segment_merges(segments_list, groups, channel)
         
         # Return original segments + newly created merged segments
         all_segments = list(segments_list) + merged_segments_created
@@ -522,52 +530,186 @@ class AudioSegments:
         all_segments.sort(key=lambda x: x.start_time)
         
         return all_segments
-    
+
     @staticmethod
-    def _create_and_save_merged_segment(segments_to_merge, channel):
+    def _plan_short_segment_merges(segments_list, channel, existing_file_paths=frozenset(), max_segments=10):
         """
-        Create a merged segment in the database, mark original segments as deleted, and log the operation.
-        Skips creation if any segment is already merged or deleted.
+        Phase 1 of _merge_short_recognized_segments: compute the merge groups in one linear sweep.
+        
+        The per-segment checks of _find_adjacent_unrecognized_segments are evaluated once into
+        columns: whether a segment can start a merge, whether it may join one, and whether it is
+        adjacent to its successor. A group then grows backward and forward over those columns,
+        never past max_segments or a segment already taken by an earlier group. Groups whose merged
+        file_path already exists (or was planned earlier in the sweep) are dropped, as creating
+        them would fail on the per-channel file_path constraint.
         
         Args:
-            segments_to_merge: List of AudioSegments model instances to merge
-            channel: Channel object for generating file names and paths
+            segments_list: AudioSegments model instances sorted by start_time
+            channel: Channel used to build merged file paths
+            existing_file_paths: file_path values already present for the channel
             
         Returns:
-            AudioSegments: Created merged segment model instance, or None if creation failed
+            list: Index lists into segments_list, one per merge, in creation order
         """
-        if not segments_to_merge:
-            return None
-        
-        # Check if any segment is already merged or deleted - if so, skip creating a new merge
-        for seg in segments_to_merge:
-            if seg.source in ('system_merge', 'user_merged') or seg.is_delete:
-                print(f"Skipping merge: segment {seg.id} is already merged (source={seg.source}) or deleted (is_delete={seg.is_delete})")
-                return None
+        merged_sources = ('system_merge', 'user_merged', 'merged')
+        count = len(segments_list)
+        starts = [seg.start_time for seg in segments_list]
+        ends = [seg.end_time for seg in segments_list]
+        durations = [seg.duration_seconds for seg in segments_list]
+        recognized = [seg.is_recognized for seg in segments_list]
+        sources = [seg.source for seg in segments_list]
+        deleted = [seg.is_delete for seg in segments_list]
+        metadata_sources = [
+            seg.metadata_json.get("source") if seg.metadata_json and isinstance(seg.metadata_json, dict) else None
+            for seg in segments_list
+        ]
+        
+        can_start = [
+            sources[i] not in merged_sources and not deleted[i]
+            and recognized[i] and durations[i] < 20 and metadata_sources[i] == "music"
+            for i in range(count)
+        ]
+        # Unrecognized segments (except custom_file) and short recognized music segments may join a merge
+        can_join = [
+            sources[i] not in merged_sources and sources[i] != 'user' and not deleted[i]
+            and (
+                (recognized[i] and durations[i] < 20 and metadata_sources[i] == "music")
+                or (not recognized[i] and metadata_sources[i] != "custom_file")
+            )
+            for i in range(count)
+        ]
+        # adjacent_to_next[i]: segments i and i + 1 overlap or are at most 1 second apart
+        adjacent_to_next = [
+            ends[i] > starts[i + 1] or abs((starts[i + 1] - ends[i]).total_seconds()) <= 1.0
+            for i in range(count - 1)
+        ]
+        
+        taken = bytearray(count)
+        planned_file_paths = set(existing_file_paths)
+        groups = []
+        for i in range(count):
+            if not can_start[i] or taken[i]:
+                continue
             
-            # Remove this after First day of pushing this code to production
-            if seg.source == 'merged':
-                print(f"Skipping merge: segment {seg.id} is already merged (source={seg.source})")
-                return None
+            low = i
+            while (low > 0 and i - low + 1 < max_segments and not taken[low - 1]
+                   and can_join[low - 1] and adjacent_to_next[low - 1]):
+                low -= 1
+            high = i
+            while (high + 1 < count and high - low + 1 < max_segments and not taken[high + 1]
+                   and can_join[high + 1] and adjacent_to_next[high]):
+                high += 1
+            
+            if high == low:
+                print(f"Skipping merge for segment at {starts[i]}: "
+                      f"no adjacent unrecognized segments found (may have gaps or adjacent segments are recognized/custom_file)")
+                continue
+            
+            _, file_path, _ = AudioSegments._build_merged_file_location(
+                channel, min(starts[low:high + 1]), max(ends[low:high + 1])
+            )
+            if file_path in planned_file_paths:
+                print(f"Error creating merged segment: file_path {file_path} already exists for channel")
+                continue
+            planned_file_paths.add(file_path)
+            
+            groups.append(list(range(low, high + 1)))
+            for index in range(low, high + 1):
+                taken[index] = 1
         
-        # Find earliest start_time and latest end_time
-        start_times = [seg.start_time for seg in segments_to_merge]
-        end_times = [seg.end_time for seg in segments_to_merge]
+        return groups
+
+    @staticmethod
+    def _apply_segment_merges(segments_list, groups, channel):
+        """
+        Phase 2 of _merge_short_recognized_segments: write the planned merges with one bulk_create
+        for the merged rows, one update() soft-deleting the sources and bulk inserts for the merge
+        logs. Falls back to _create_and_save_merged_segment per group if the bulk write fails.
         
-        merged_start_time = min(start_times)
-        merged_end_time = max(end_times)
-        merged_duration = int((merged_end_time - merged_start_time).total_seconds())
+        Returns:
+            list: Created merged AudioSegments instances
+        """
+        if not groups:
+            return []
         
-        # Determine if merged segment should be recognized
-        # If all segments are recognized, keep as recognized
-        # Otherwise, mark as unrecognized
-        all_recognized = all(seg.is_recognized for seg in segments_to_merge)
+        merges = [[segments_list[index] for index in group] for group in groups]
+        merged_objects = [
+            AudioSegmentsModel(**AudioSegments._build_merged_segment_data(segments_to_merge, channel))
+            for segments_to_merge in merges
+        ]
+        source_ids = [seg.id for segments_to_merge in merges for seg in segments_to_merge]
         
-        # Generate file name and path
+        try:
+            with transaction.atomic():
+                merged_segments = AudioSegmentsModel.objects.bulk_create(merged_objects, batch_size=500)
+                AudioSegmentsModel.objects.filter(id__in=source_ids, is_delete=False).update(is_delete=True, is_active=False)
+                HourOccupancyIndex.on_commit_inserted(merged_segments)
+                HourOccupancyIndex.on_commit_refresh_ids(source_ids)
+                
+                logs = AudioSegmentEditLog.objects.bulk_create([
+                    AudioSegmentEditLog(
+                        audio_segment=merged_segment,
+                        action="merge",
+                        trigger_type="automatic",
+                        metadata={
+                            "merged_segment_id": merged_segment.id,
+                            "merged_segment_duration": merged_segment.duration_seconds,
+                            "source_segment_ids": [seg.id for seg in segments_to_merge],
+                            "source_segment_count": len(segments_to_merge),
+                        },
+                    )
+                    for merged_segment, segments_to_merge in zip(merged_segments, merges)
+                ], batch_size=500)
+                
+                AffectedSegment = AudioSegmentEditLog.affected_segments.through
+                AffectedSegment.objects.bulk_create([
+                    AffectedSegment(audiosegmenteditlog_id=log.id, audiosegments_id=seg_id)
+                    for log, segments_to_merge in zip(logs, merges)
+                    for seg_id in {seg.id for seg in segments_to_merge}
+                ], batch_size=1000)
+        except Exception as e:
+            print(f"Bulk merge failed ({e}), creating merged segments one by one")
+            merged_segments = []
+            for segments_to_merge in merges:
+                merged_segment = AudioSegments._create_and_save_merged_segment(segments_to_merge, channel)
+                if merged_segment:
+                    merged_segments.append(merged_segment)
+            return merged_segments
+        
+        for merged_segment, segments_to_merge in zip(merged_segments, merges):
+            for seg in segments_to_merge:
+                seg.is_delete = True
+                seg.is_active = False
+            print(f"Created merged segment ID {merged_segment.id} from {len(segments_to_merge)} segments: "
+                  f"{merged_segment.start_time} - {merged_segment.end_time} "
+                  f"({merged_segment.duration_seconds}s).")
+        
+        return merged_segments
+
+    @staticmethod
+    def _build_merged_file_location(channel, merged_start_time, merged_end_time):
+        """(file_name, file_path, duration_seconds) of a system merge covering the given range"""
+        merged_duration = int((merged_end_time - merged_start_time).total_seconds())
         start_time_str = merged_start_time.strftime("%Y%m%d%H%M%S")
         file_name = f"audio_{channel.project_id}_{channel.channel_id}_{start_time_str}_{merged_duration}.mp3"
         start_date = merged_start_time.strftime("%Y%m%d")
         file_path = f"media/{start_date}/{file_name}"
+        return file_name, file_path, merged_duration
+
+    @staticmethod
+    def _build_merged_segment_data(segments_to_merge, channel):
+        """Field values of the merged segment for a group of source segments"""
+        # Find earliest start_time and latest end_time
+        merged_start_time = min(seg.start_time for seg in segments_to_merge)
+        merged_end_time = max(seg.end_time for seg in segments_to_merge)
+        file_name, file_path, merged_duration = AudioSegments._build_merged_file_location(
+            channel, merged_start_time, merged_end_time
+        )
+        
+        # Determine if merged segment should be recognized
+        # If all segments are recognized, keep as recognized
+        # Otherwise, mark as unrecognized
+        all_recognized = all(seg.is_recognized for seg in segments_to_merge)
         
         # Prepare segment data
         segment_data = {
@@ -612,6 +754,37 @@ class AudioSegments:
             else:
                 segment_data['title_after'] = last_segment.title_after or ""
         
+        return segment_data
+    
+    @staticmethod
+    def _create_and_save_merged_segment(segments_to_merge, channel):
+        """
+        Create a merged segment in the database, mark original segments as deleted, and log the operation.
+        Skips creation if any segment is already merged or deleted.
+        
+        Args:
+            segments_to_merge: List of AudioSegments model instances to merge
+            channel: Channel object for generating file names and paths
+            
+        Returns:
+            AudioSegments: Created merged segment model instance, or None if creation failed
+        """
+        if not segments_to_merge:
+            return None
+        
+        # Check if any segment is already merged or deleted - if so, skip creating a new merge
+        for seg in segments_to_merge:
+            if seg.source in ('system_merge', 'user_merged') or seg.is_delete:
+                print(f"Skipping merge: segment {seg.id} is already merged (source={seg.source}) or deleted (is_delete={seg.is_delete})")
+                return None
+            
+            # Remove this after First day of pushing this code to production
+            if seg.source == 'merged':
+                print(f"Skipping merge: segment {seg.id} is already merged (source={seg.source})")
+                return None
+        
+        segment_data = AudioSegments._build_merged_segment_data(segments_to_merge, channel)
+        
         # Create merged segment in database
         try:
             merged_segment = AudioSegmentsModel.objects.create(**segment_data)
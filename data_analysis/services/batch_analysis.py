@@ -0,0 +1,273 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from config.validation import ValidationUtils
+from core_admin.models import Channel
+from data_analysis.models import AnalysisBatch, AudioSegments, TranscriptionAnalysis, TranscriptionDetail
+from data_analysis.services.analysis_fields import AnalysisFieldsService
+from data_analysis.services.openai import OpenAIService
+from data_analysis.services.segment_flags import SegmentFlagService
+from data_analysis.services.transcription_analyzer import TranscriptionAnalyzer
+
+
+class BatchAnalysisService:
+    """
+    Runs transcription analysis through the OpenAI Batch API.
+
+    Flow: collect TranscriptionDetail rows without a TranscriptionAnalysis, write one chat
+    completion request per (transcription, prompt) into a JSONL file, upload and submit it,
+    poll the batch, then bulk-create TranscriptionAnalysis rows from the output file.
+    """
+
+    BATCH_ENDPOINT = "/v1/chat/completions"
+    COMPLETION_WINDOW = "24h"
+    # OpenAI limit on requests per batch input file
+    MAX_REQUESTS_PER_BATCH = 50000
+    # Segment sources whose analysis may be deferred to the batch path
+    DEFERRABLE_SOURCES = ('system', 'system_merge')
+
+    @staticmethod
+    def should_defer(transcription_detail: TranscriptionDetail) -> bool:
+        """
+        True when batch analysis is enabled and the transcription belongs to a system
+        segment from before the current local day of its channel (the backfill path).
+        """
+        if not django_settings.ANALYSIS_BATCH_ENABLED:
+            return False
+        segment = transcription_detail.audio_segment
+        if not segment or segment.source not in BatchAnalysisService.DEFERRABLE_SOURCES or segment.is_manually_processed:
+            return False
+        try:
+            channel_tz = ZoneInfo(segment.channel.timezone or 'UTC')
+        except Exception:
+            channel_tz = ZoneInfo('UTC')
+        local_now = timezone.now().astimezone(channel_tz)
+        start_of_local_day = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return segment.start_time < start_of_local_day
+
+    @staticmethod
+    def collect_pending_transcriptions(channel: Channel | int, limit: Optional[int] = None):
+        """
+        TranscriptionDetail rows of the channel that have a transcript but no analysis and
+        are not already part of an active batch. Rows younger than ANALYSIS_BATCH_MIN_AGE_MINUTES
+        are left alone so transcriptions still being analysed in real time are not picked up,
+        and rows already sent in ANALYSIS_BATCH_MAX_ATTEMPTS batches are not sent again.
+        """
+        cutoff = timezone.now() - timedelta(minutes=django_settings.ANALYSIS_BATCH_MIN_AGE_MINUTES)
+        queryset = (
+            TranscriptionDetail.objects
+            .filter(
+                audio_segment__channel=channel,
+                audio_segment__is_delete=False,
+                analysis__isnull=True,
+                created_at__lte=cutoff,
+            )
+            .exclude(transcript='')
+            .exclude(analysis_batches__status__in=AnalysisBatch.ACTIVE_STATUSES)
+            .annotate(batch_attempts=Count('analysis_batches', distinct=True))
+            .filter(batch_attempts__lt=django_settings.ANALYSIS_BATCH_MAX_ATTEMPTS)
+            .order_by('id')
+        )
+        if limit:
+            queryset = queryset[:limit]
+        return list(queryset)
+
+    @staticmethod
+    def build_custom_id(transcription_detail_id: int, field: str) -> str:
+        return f"{transcription_detail_id}:{field}"
+
+    @staticmethod
+    def parse_custom_id(custom_id: str) -> tuple[Optional[int], Optional[str]]:
+        detail_id, _, field = (custom_id or "").partition(":")
+        try:
+            return int(detail_id), field
+        except ValueError:
+            return None, None
+
+    @staticmethod
+    def build_batch_requests(transcription_details, settings, prompts) -> list[dict]:
+        """One Batch API request line per transcription and analysis prompt."""
+        requests_data = []
+        for detail in transcription_details:
+            for field, system_prompt, max_tokens in prompts:
+                requests_data.append({
+                    "custom_id": BatchAnalysisService.build_custom_id(detail.id, field),
+                    "method": "POST",
+                    "url": BatchAnalysisService.BATCH_ENDPOINT,
+                    "body": OpenAIService.build_chat_completion_params(settings, system_prompt, detail.transcript, max_tokens),
+                })
+        return requests_data
+
+    @staticmethod
+    def write_batch_file(requests_data) -> str:
+        """Write request lines to a temporary JSONL file and return its path."""
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", prefix="analysis_batch_", delete=False, encoding="utf-8") as batch_file:
+            for request_data in requests_data:
+                batch_file.write(json.dumps(request_data) + "\n")
+            return batch_file.name
+
+    @staticmethod
+    def submit_channel_batch(channel: Channel) -> Optional[AnalysisBatch]:
+        """
+        Collect pending transcriptions for the channel and submit them as one batch.
+        Returns the created AnalysisBatch, or None if there was nothing to submit.
+        """
+        settings = ValidationUtils.validate_settings_exist(channel)
+        api_key = (settings.openai_api_key or "").strip()
+        if not api_key:
+            print(f"OpenAI API key not configured for channel {channel.id}, skipping batch analysis")
+            return None
+
+        bucket_prompt = TranscriptionAnalyzer.get_bucket_prompt(channel)
+        prompts = TranscriptionAnalyzer.build_analysis_prompts(settings, bucket_prompt)
+        max_details = max(1, min(
+            django_settings.ANALYSIS_BATCH_MAX_TRANSCRIPTIONS,
+            BatchAnalysisService.MAX_REQUESTS_PER_BATCH // len(prompts),
+        ))
+        details = BatchAnalysisService.collect_pending_transcriptions(channel, limit=max_details)
+        if not details:
+            return None
+
+        requests_data = BatchAnalysisService.build_batch_requests(details, settings, prompts)
+        batch_file_path = BatchAnalysisService.write_batch_file(requests_data)
+        client = OpenAIService.get_client(api_key)
+        try:
+            with open(batch_file_path, "rb") as batch_file:
+                input_file = client.files.create(file=batch_file, purpose="batch")
+            openai_batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BatchAnalysisService.BATCH_ENDPOINT,
+                completion_window=BatchAnalysisService.COMPLETION_WINDOW,
+                metadata={"channel_id": str(channel.id)},
+            )
+        finally:
+            os.remove(batch_file_path)
+
+        with transaction.atomic():
+            batch = AnalysisBatch.objects.create(
+                channel=channel,
+                batch_id=openai_batch.id,
+                input_file_id=input_file.id,
+                status='submitted',
+                requested_fields=[field for field, _, _ in prompts],
+                request_count=len(requests_data),
+            )
+            batch.transcription_details.add(*details)
+        print(f"Submitted analysis batch {batch.batch_id} with {len(details)} transcriptions for channel {channel.id}")
+        return batch
+
+    @staticmethod
+    def poll_batch(batch: AnalysisBatch) -> AnalysisBatch:
+        """Refresh the batch status from OpenAI and ingest the output once it is completed."""
+        settings = ValidationUtils.validate_settings_exist(batch.channel_id)
+        client = OpenAIService.get_client((settings.openai_api_key or "").strip())
+        openai_batch = client.batches.retrieve(batch.batch_id)
+
+        if openai_batch.status == "completed":
+            batch.status = 'completed'
+            batch.output_file_id = openai_batch.output_file_id
+            batch.error_file_id = openai_batch.error_file_id
+            batch.completed_at = timezone.now()
+            batch.save(update_fields=['status', 'output_file_id', 'error_file_id', 'completed_at', 'updated_at'])
+            BatchAnalysisService.ingest_batch_results(batch, client)
+        elif openai_batch.status in ("failed", "expired", "cancelled"):
+            batch.status = openai_batch.status
+            errors = getattr(openai_batch, "errors", None)
+            batch.error_message = str(errors) if errors else None
+            batch.completed_at = timezone.now()
+            batch.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
+        elif batch.status != 'in_progress' and openai_batch.status in ("in_progress", "finalizing"):
+            batch.status = 'in_progress'
+            batch.save(update_fields=['status', 'updated_at'])
+        return batch
+
+    @staticmethod
+    def parse_batch_output(output_text: str) -> dict[int, dict[str, str]]:
+        """Map transcription_detail_id -> {field: content} for every successful output line."""
+        results = {}
+        for line in output_text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed batch output line: {line[:200]}")
+                continue
+            detail_id, field = BatchAnalysisService.parse_custom_id(record.get("custom_id"))
+            response = record.get("response") or {}
+            if detail_id is None or record.get("error") or response.get("status_code") != 200:
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                continue
+            results.setdefault(detail_id, {})[field] = content.strip() if content else ""
+        return results
+
+    @staticmethod
+    def ingest_batch_results(batch: AnalysisBatch, client) -> int:
+        """
+        Bulk-create TranscriptionAnalysis rows from a completed batch. Transcriptions missing
+        a required field are left without analysis so a later batch picks them up again, up to
+        ANALYSIS_BATCH_MAX_ATTEMPTS batches. Returns the number of analyses created.
+        """
+        results = {}
+        if batch.output_file_id:
+            output_text = client.files.content(batch.output_file_id).text
+            results = BatchAnalysisService.parse_batch_output(output_text)
+
+        # Same answers as the real-time paths accept: isolated and empty-allowed prompts may be empty
+        optional_fields = TranscriptionAnalyzer.ISOLATED_PROMPTS | TranscriptionAnalyzer.EMPTY_ALLOWED_PROMPTS
+        required_fields = [field for field in batch.requested_fields if field not in optional_fields]
+        details = (
+            batch.transcription_details
+            .filter(analysis__isnull=True)
+            .select_related('audio_segment')
+        )
+        analyses = []
+        for detail in details:
+            fields = results.get(detail.id, {})
+            missing = [field for field in required_fields if not fields.get(field)]
+            if missing:
+                print(f"Batch {batch.batch_id}: transcription_detail {detail.id} missing fields {missing}, leaving for a later batch")
+                continue
+            # bulk_create skips save(), so the parsed columns are set here
+            analyses.append(AnalysisFieldsService.populate(TranscriptionAnalysis(
+                transcription_detail=detail,
+                summary=fields.get("summary", ""),
+                sentiment=fields.get("sentiment", ""),
+                general_topics=fields.get("general_topics", ""),
+                iab_topics=fields.get("iab_topics", ""),
+                bucket_prompt=fields.get("bucket_prompt", ""),
+                content_type_prompt=fields.get("content_type_prompt", ""),
+            )))
+
+        with transaction.atomic():
+            TranscriptionAnalysis.objects.bulk_create(analyses, batch_size=1000, ignore_conflicts=True)
+            created = TranscriptionAnalysis.objects.filter(
+                transcription_detail__in=[analysis.transcription_detail for analysis in analyses]
+            ).select_related('transcription_detail__audio_segment')
+            created = list(created)
+            AnalysisFieldsService.store_topics(created)
+            AudioSegments.objects.filter(
+                id__in=[analysis.transcription_detail.audio_segment_id for analysis in created]
+            ).update(is_analysis_completed=True)
+            batch.status = 'ingested'
+            batch.ingested_count = len(created)
+            batch.save(update_fields=['status', 'ingested_count', 'updated_at'])
+
+        SegmentFlagService.store_for_details([analysis.transcription_detail_id for analysis in created])
+        for analysis in created:
+            TranscriptionAnalyzer.check_and_deactivate_by_content_type(analysis, analysis.content_type_prompt)
+
+        print(f"Ingested {len(created)} analyses from batch {batch.batch_id}")
+        return len(created)
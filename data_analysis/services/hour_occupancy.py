@@ -0,0 +1,299 @@
+import time as time_module
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import TruncHour
+
+from core_admin.models import Channel
+from data_analysis.models import AudioSegments, ChannelHourOccupancy
+
+UTC = ZoneInfo("UTC")
+
+
+class HourOccupancyIndex:
+    """
+    Per channel and local day, 24-bit masks of the hour slots holding at least one non-deleted
+    segment, split by is_active. Slot h of day D is [D h:00, +1 hour) in the channel timezone,
+    the window audio_filter v3 lists for (D, h).
+
+    Days are computed with one grouped query the first time they are read and stored in
+    ChannelHourOccupancy. After that, inserts OR their bits into the stored days, and
+    soft-deletes and activation changes recompute the affected days. A day stored for another
+    timezone than the channel's current one counts as not computed. Reads are cached per
+    channel version, which every change bumps. rebuild_hour_occupancy recomputes stored days.
+    """
+
+    VERSION_KEY = "hour_occupancy:version:%s"
+    DAY_MASKS_KEY = "hour_occupancy:days:%s:%s:%s:%s:%s"
+    MAX_DAYS_PER_QUERY = 31
+
+    @staticmethod
+    def day_windows(day, tz) -> list:
+        """UTC (start, end) of the 24 hour slots of a local day"""
+        windows = []
+        for hour in range(24):
+            start = datetime.combine(day, time(hour, 0), tzinfo=tz).astimezone(UTC)
+            windows.append((start, start + timedelta(hours=1)))
+        return windows
+
+    @staticmethod
+    def slot_masks_for_interval(start, end, tz, windows_cache: dict) -> dict:
+        """{local day: mask} of the slots whose window intersects [start, end)"""
+        masks = {}
+        local_day = start.astimezone(tz).date()
+        for day in (local_day - timedelta(days=1), local_day, local_day + timedelta(days=1)):
+            windows = windows_cache.get(day)
+            if windows is None:
+                windows = windows_cache[day] = HourOccupancyIndex.day_windows(day, tz)
+            for hour, (window_start, window_end) in enumerate(windows):
+                if window_start < end and window_end > start:
+                    masks[day] = masks.get(day, 0) | (1 << hour)
+        return masks
+
+    @staticmethod
+    def grouped_hours(queryset, tz):
+        """Distinct (UTC hour, local wall-clock hour, is_active) of the queryset's start times, in one query"""
+        return (
+            queryset
+            .order_by()
+            .annotate(utc_hour=TruncHour('start_time', tzinfo=UTC), local_hour=TruncHour('start_time', tzinfo=tz))
+            .values_list('utc_hour', 'local_hour', 'is_active')
+            .distinct()
+        )
+
+    @staticmethod
+    def masks_from_hours(rows, tz) -> dict:
+        """
+        {local day: [active mask, inactive mask]} from grouped_hours rows.
+
+        A row pins its segments to the part of the UTC hour that falls in the local wall-clock hour.
+        Slot membership is the same for every instant of that part, including around DST changes
+        and for timezones with half-hour offsets.
+        """
+        masks = {}
+        windows_cache = {}
+        for utc_hour, local_hour, is_active in rows:
+            utc_start = utc_hour.astimezone(UTC)
+            wall_start = local_hour.replace(tzinfo=None)
+            for fold in (0, 1):
+                start = max(utc_start, wall_start.replace(tzinfo=tz, fold=fold).astimezone(UTC))
+                end = min(
+                    utc_start + timedelta(hours=1),
+                    (wall_start + timedelta(hours=1)).replace(tzinfo=tz, fold=fold).astimezone(UTC),
+                )
+                if start >= end:
+                    continue
+                for day, mask in HourOccupancyIndex.slot_masks_for_interval(start, end, tz, windows_cache).items():
+                    day_masks = masks.setdefault(day, [0, 0])
+                    day_masks[0 if is_active else 1] |= mask
+        return masks
+
+    @staticmethod
+    def compute_days(channel_id: int, days, tz) -> dict:
+        """{day: [active mask, inactive mask]} for the given local days, from one grouped query"""
+        days = sorted(set(days))
+        if not days:
+            return {}
+        windows = [window for day in days for window in HourOccupancyIndex.day_windows(day, tz)]
+        queryset = AudioSegments.objects.filter(
+            channel_id=channel_id,
+            is_delete=False,
+            start_time__gte=min(start for start, _ in windows),
+            start_time__lt=max(end for _, end in windows),
+        )
+        masks = HourOccupancyIndex.masks_from_hours(HourOccupancyIndex.grouped_hours(queryset, tz), tz)
+        return {day: masks.get(day, [0, 0]) for day in days}
+
+    @staticmethod
+    def store_days(channel_id: int, tz_name: str, day_masks: dict):
+        if not day_masks:
+            return
+        ChannelHourOccupancy.objects.bulk_create(
+            [
+                ChannelHourOccupancy(
+                    channel_id=channel_id, local_date=day, timezone=tz_name,
+                    active_hours=masks[0], inactive_hours=masks[1],
+                )
+                for day, masks in day_masks.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['channel', 'local_date'],
+            update_fields=['timezone', 'active_hours', 'inactive_hours', 'updated_at'],
+            batch_size=500,
+        )
+
+    @staticmethod
+    def get_version(channel_id: int) -> int:
+        key = HourOccupancyIndex.VERSION_KEY % channel_id
+        version = cache.get(key)
+        if version is None:
+            # A lost version key must not bring back results cached under an older one
+            cache.add(key, time_module.time_ns(), timeout=None)
+            version = cache.get(key, 0)
+        return version
+
+    @staticmethod
+    def bump_version(channel_ids):
+        for channel_id in set(channel_ids):
+            cache.set(HourOccupancyIndex.VERSION_KEY % channel_id, time_module.time_ns(), timeout=None)
+
+    @staticmethod
+    def get_day_masks(channel, days) -> dict:
+        """
+        {day: (active mask, inactive mask)} for the channel's local days. Served from the cache
+        when nothing changed; otherwise one query for the stored days, plus one grouped query
+        (and an upsert) for the days not computed yet.
+        """
+        days = sorted(set(days))
+        if not days:
+            return {}
+        tz_name = channel.timezone or "UTC"
+        cache_key = HourOccupancyIndex.DAY_MASKS_KEY % (
+            channel.id, tz_name, days[0].isoformat(), days[-1].isoformat(), HourOccupancyIndex.get_version(channel.id)
+        )
+        cached = cache.get(cache_key)
+        if cached is not None and len(cached) == len(days):
+            return cached
+
+        result = {
+            row.local_date: (row.active_hours, row.inactive_hours)
+            for row in ChannelHourOccupancy.objects.filter(
+                channel_id=channel.id, timezone=tz_name, local_date__in=days
+            )
+        }
+        missing = [day for day in days if day not in result]
+        tz = ZoneInfo(tz_name)
+        for offset in range(0, len(missing), HourOccupancyIndex.MAX_DAYS_PER_QUERY):
+            computed = HourOccupancyIndex.compute_days(
+                channel.id, missing[offset:offset + HourOccupancyIndex.MAX_DAYS_PER_QUERY], tz
+            )
+            HourOccupancyIndex.store_days(channel.id, tz_name, computed)
+            result.update({day: tuple(masks) for day, masks in computed.items()})
+
+        cache.set(cache_key, result, timeout=django_settings.HOUR_OCCUPANCY_CACHE_SECONDS)
+        return result
+
+    @staticmethod
+    def _channel_timezones(channel_ids) -> dict:
+        return {
+            channel_id: tz_name or "UTC"
+            for channel_id, tz_name in Channel.objects.filter(id__in=set(channel_ids)).values_list('id', 'timezone')
+        }
+
+    @staticmethod
+    def mark_inserted(segments):
+        """OR the slots of newly inserted segments into the stored days (days not stored yet stay uncomputed)"""
+        segments = [seg for seg in segments if seg.channel_id and seg.start_time and not seg.is_delete]
+        if not segments:
+            return
+        timezones = HourOccupancyIndex._channel_timezones(seg.channel_id for seg in segments)
+        windows_caches = {}
+        bits = {}
+        for seg in segments:
+            tz_name = timezones.get(seg.channel_id)
+            if tz_name is None:
+                continue
+            tz = ZoneInfo(tz_name)
+            masks = HourOccupancyIndex.slot_masks_for_interval(
+                seg.start_time, seg.start_time + timedelta(microseconds=1), tz,
+                windows_caches.setdefault(seg.channel_id, {}),
+            )
+            for day, mask in masks.items():
+                day_bits = bits.setdefault((seg.channel_id, tz_name, day), [0, 0])
+                day_bits[0 if seg.is_active else 1] |= mask
+
+        for (channel_id, tz_name, day), (active, inactive) in bits.items():
+            ChannelHourOccupancy.objects.filter(channel_id=channel_id, timezone=tz_name, local_date=day).update(
+                active_hours=F('active_hours').bitor(active),
+                inactive_hours=F('inactive_hours').bitor(inactive),
+            )
+        HourOccupancyIndex.bump_version(channel_id for channel_id, _, _ in bits)
+
+    @staticmethod
+    def refresh(changed):
+        """
+        Recompute the stored days touched by (channel_id, start_time) pairs, after soft-deletes,
+        restores or activation changes. Days not stored yet are left to be computed on read.
+        """
+        changed = [(channel_id, start_time) for channel_id, start_time in changed if channel_id and start_time]
+        if not changed:
+            return
+        timezones = HourOccupancyIndex._channel_timezones(channel_id for channel_id, _ in changed)
+        days_by_channel = {}
+        windows_caches = {}
+        for channel_id, start_time in changed:
+            tz_name = timezones.get(channel_id)
+            if tz_name is None:
+                continue
+            masks = HourOccupancyIndex.slot_masks_for_interval(
+                start_time, start_time + timedelta(microseconds=1), ZoneInfo(tz_name),
+                windows_caches.setdefault(channel_id, {}),
+            )
+            days_by_channel.setdefault(channel_id, set()).update(masks)
+
+        for channel_id, days in days_by_channel.items():
+            tz_name = timezones[channel_id]
+            stored = list(
+                ChannelHourOccupancy.objects
+                .filter(channel_id=channel_id, timezone=tz_name, local_date__in=days)
+                .values_list('local_date', flat=True)
+            )
+            for offset in range(0, len(stored), HourOccupancyIndex.MAX_DAYS_PER_QUERY):
+                HourOccupancyIndex.store_days(channel_id, tz_name, HourOccupancyIndex.compute_days(
+                    channel_id, stored[offset:offset + HourOccupancyIndex.MAX_DAYS_PER_QUERY], ZoneInfo(tz_name)
+                ))
+        HourOccupancyIndex.bump_version(days_by_channel)
+
+    @staticmethod
+    def refresh_segment_ids(segment_ids):
+        """refresh() for segments changed with a queryset update()"""
+        segment_ids = list(segment_ids)
+        if not segment_ids:
+            return
+        HourOccupancyIndex.refresh(
+            AudioSegments.objects.filter(id__in=segment_ids).values_list('channel_id', 'start_time')
+        )
+
+    @staticmethod
+    def _run_safely(func, *args):
+        # The index is derived data: a failed update must not fail the segment write
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Error updating hour occupancy index: {e}")
+
+    @staticmethod
+    def on_commit_inserted(segments):
+        segments = list(segments)
+        transaction.on_commit(lambda: HourOccupancyIndex._run_safely(HourOccupancyIndex.mark_inserted, segments))
+
+    @staticmethod
+    def on_commit_refresh(changed):
+        changed = list(changed)
+        transaction.on_commit(lambda: HourOccupancyIndex._run_safely(HourOccupancyIndex.refresh, changed))
+
+    @staticmethod
+    def on_commit_refresh_ids(segment_ids):
+        segment_ids = list(segment_ids)
+        transaction.on_commit(lambda: HourOccupancyIndex._run_safely(HourOccupancyIndex.refresh_segment_ids, segment_ids))
+
+    @staticmethod
+    def rebuild(channel, start_day, end_day) -> int:
+        """Recompute and store every local day from start_day to end_day; returns the number of days"""
+        tz_name = channel.timezone or "UTC"
+        tz = ZoneInfo(tz_name)
+        days = []
+        day = start_day
+        while day <= end_day:
+            days.append(day)
+            day += timedelta(days=1)
+        for offset in range(0, len(days), HourOccupancyIndex.MAX_DAYS_PER_QUERY):
+            HourOccupancyIndex.store_days(channel.id, tz_name, HourOccupancyIndex.compute_days(
+                channel.id, days[offset:offset + HourOccupancyIndex.MAX_DAYS_PER_QUERY], tz
+            ))
+        HourOccupancyIndex.bump_version([channel.id])
+        return len(days)
@@ -0,0 +1,81 @@
+from typing import Optional
+
+from django.utils import timezone
+
+from core_admin.models import Channel
+from data_analysis.models import ACRIngestionCursor
+
+
+class ACRIngestionCursorService:
+    """
+    Per-channel high-water marks for the hourly ACRCloud ingestion.
+
+    The hourly task still downloads the day's results from ACRCloud, but only results with a
+    record_timestamp after the cursor are processed. The cursor also remembers the last
+    recognized segment so the gap segment at the boundary between runs is created once.
+    """
+
+    @staticmethod
+    def get_cursor(channel: Channel, ingestion_date: Optional[str] = None) -> ACRIngestionCursor:
+        """Cursor for the channel, reset when it belongs to an earlier day."""
+        ingestion_date = ingestion_date or timezone.now().strftime("%Y%m%d")
+        cursor, created = ACRIngestionCursor.objects.get_or_create(
+            channel=channel,
+            defaults={'ingestion_date': ingestion_date},
+        )
+        if not created and cursor.ingestion_date != ingestion_date:
+            cursor.ingestion_date = ingestion_date
+            cursor.last_record_timestamp = ''
+            cursor.boundary_start_time = None
+            cursor.boundary_end_time = None
+            cursor.boundary_title = None
+            cursor.save()
+        return cursor
+
+    @staticmethod
+    def filter_new_results(segments_data: dict, cursor: ACRIngestionCursor) -> dict:
+        """Keep only results recorded after the cursor's last ingested record_timestamp."""
+        if not segments_data or not segments_data.get('data') or not cursor.last_record_timestamp:
+            return segments_data
+        return {
+            'data': [
+                item for item in segments_data['data']
+                if item.get('metadata', {}).get('record_timestamp', '') > cursor.last_record_timestamp
+            ]
+        }
+
+    @staticmethod
+    def get_boundary_segment(cursor: Optional[ACRIngestionCursor]) -> Optional[dict]:
+        if not cursor or not cursor.boundary_start_time or not cursor.boundary_end_time:
+            return None
+        return {
+            "start_time": cursor.boundary_start_time,
+            "end_time": cursor.boundary_end_time,
+            "duration_seconds": int((cursor.boundary_end_time - cursor.boundary_start_time).total_seconds()),
+            "title": cursor.boundary_title,
+        }
+
+    @staticmethod
+    def advance(cursor: ACRIngestionCursor, data_list: list, processed_segments: Optional[list]):
+        """
+        Move the cursor past the processed results and remember the last recognized segment.
+        Call only after the results have been stored successfully.
+        """
+        record_timestamps = [
+            item.get('metadata', {}).get('record_timestamp', '')
+            for item in data_list or []
+        ]
+        latest_timestamp = max(record_timestamps, default='')
+        if latest_timestamp > cursor.last_record_timestamp:
+            cursor.last_record_timestamp = latest_timestamp
+
+        recognized = [segment for segment in processed_segments or [] if segment.get('is_recognized')]
+        if recognized:
+            last_segment = max(recognized, key=lambda segment: segment['end_time'])
+            if not cursor.boundary_end_time or last_segment['end_time'] >= cursor.boundary_end_time:
+                cursor.boundary_start_time = last_segment['start_time']
+                cursor.boundary_end_time = last_segment['end_time']
+                cursor.boundary_title = last_segment.get('title')
+
+        cursor.save()
+        return cursor
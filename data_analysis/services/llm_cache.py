@@ -0,0 +1,151 @@
+import hashlib
+import json
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from data_analysis.models import LLMResponseCacheEntry
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache for LLM analysis responses.
+
+    Entries are keyed by a hash of the channel's settings version, model parameters, system
+    prompt and normalized transcript. Redis (the default Django cache) is the primary store with
+    a TTL; LLMResponseCacheEntry rows are the fallback when Redis misses or is unavailable and are
+    pruned by expiry and least-recent access. A new GeneralSetting version changes every key of
+    the channel, and invalidate_channel drops the channel's database rows.
+    """
+
+    CACHE_KEY_PREFIX = "llm_response_"
+    STATS_KEY = "llm_response_cache_{stat}"
+
+    @staticmethod
+    def normalize_transcript(transcript: str) -> str:
+        """Collapse whitespace and case so trivially different copies of a transcript share a key."""
+        return " ".join((transcript or "").split()).casefold()
+
+    @staticmethod
+    def build_key(settings, system_prompt: str, transcript: str, max_tokens: int = 0) -> str:
+        payload = json.dumps(
+            [
+                settings.channel_id,
+                settings.version,
+                settings.chatgpt_model,
+                settings.chatgpt_temperature,
+                settings.chatgpt_top_p,
+                max_tokens,
+                system_prompt,
+                LLMResponseCache.normalize_transcript(transcript),
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _incr_stat(stat: str):
+        key = LLMResponseCache.STATS_KEY.format(stat=stat)
+        try:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+        except Exception as e:
+            print(f"Error updating LLM cache {stat} counter: {e}")
+
+    @staticmethod
+    def get(settings, system_prompt: str, transcript: str, max_tokens: int = 0) -> Optional[str]:
+        """Return the cached response, or None on a miss."""
+        key = LLMResponseCache.build_key(settings, system_prompt, transcript, max_tokens)
+        ttl = django_settings.LLM_RESPONSE_CACHE_TTL_SECONDS
+
+        try:
+            response = cache.get(LLMResponseCache.CACHE_KEY_PREFIX + key)
+        except Exception as e:
+            print(f"Error reading LLM response cache from Redis: {e}")
+            response = None
+        if response is not None:
+            LLMResponseCache._incr_stat("hits")
+            return response
+
+        now = timezone.now()
+        entry = LLMResponseCacheEntry.objects.filter(cache_key=key, expires_at__gt=now).only('id', 'response').first()
+        if entry is None:
+            LLMResponseCache._incr_stat("misses")
+            return None
+
+        LLMResponseCacheEntry.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_accessed_at=now,
+        )
+        try:
+            cache.set(LLMResponseCache.CACHE_KEY_PREFIX + key, entry.response, timeout=ttl)
+        except Exception as e:
+            print(f"Error writing LLM response cache to Redis: {e}")
+        LLMResponseCache._incr_stat("hits")
+        return entry.response
+
+    @staticmethod
+    def set(settings, system_prompt: str, transcript: str, max_tokens: int, response: str):
+        """Store a response in Redis and the database fallback. Empty responses are not cached."""
+        if not response:
+            return
+        key = LLMResponseCache.build_key(settings, system_prompt, transcript, max_tokens)
+        ttl = django_settings.LLM_RESPONSE_CACHE_TTL_SECONDS
+
+        try:
+            cache.set(LLMResponseCache.CACHE_KEY_PREFIX + key, response, timeout=ttl)
+        except Exception as e:
+            print(f"Error writing LLM response cache to Redis: {e}")
+
+        now = timezone.now()
+        LLMResponseCacheEntry.objects.update_or_create(
+            cache_key=key,
+            defaults={
+                'channel_id': settings.channel_id,
+                'response': response,
+                'last_accessed_at': now,
+                'expires_at': now + timedelta(seconds=ttl),
+            },
+        )
+
+    @staticmethod
+    def invalidate_channel(channel_id: int) -> int:
+        """Drop the database entries of a channel. Redis entries become unreachable with the new settings version."""
+        deleted, _ = LLMResponseCacheEntry.objects.filter(channel_id=channel_id).delete()
+        return deleted
+
+    @staticmethod
+    def prune() -> dict:
+        """Delete expired database entries, then the least recently used ones above LLM_RESPONSE_CACHE_MAX_ENTRIES."""
+        expired, _ = LLMResponseCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+        evicted = 0
+        max_entries = django_settings.LLM_RESPONSE_CACHE_MAX_ENTRIES
+        overflow = LLMResponseCacheEntry.objects.count() - max_entries
+        if overflow > 0:
+            stale_ids = list(
+                LLMResponseCacheEntry.objects.order_by('last_accessed_at').values_list('id', flat=True)[:overflow]
+            )
+            evicted, _ = LLMResponseCacheEntry.objects.filter(id__in=stale_ids).delete()
+
+        return {'expired': expired, 'evicted': evicted}
+
+    @staticmethod
+    def get_stats() -> dict:
+        try:
+            hits = cache.get(LLMResponseCache.STATS_KEY.format(stat="hits")) or 0
+            misses = cache.get(LLMResponseCache.STATS_KEY.format(stat="misses")) or 0
+        except Exception as e:
+            print(f"Error reading LLM cache counters: {e}")
+            hits, misses = 0, 0
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'db_entries': LLMResponseCacheEntry.objects.count(),
+        }
@@ -0,0 +1,138 @@
+from bisect import bisect_left
+from typing import NamedTuple
+
+
+class MP3Frame(NamedTuple):
+    offset: int
+    length: int
+    start_seconds: float
+    duration_seconds: float
+
+
+class MP3FrameSplitter:
+    """
+    Frame-level MP3 (MPEG audio layer III) parsing, slicing and concatenation without re-encoding.
+
+    Cuts happen on frame boundaries (~26 ms at 44.1 kHz). A frame belongs to the slice whose
+    [start, end) range contains the frame's midpoint, so slicing a stream at consecutive
+    boundaries hands every frame to exactly one slice. ID3 tags and Xing/Info/VBRI header
+    frames are dropped since their length and seek data would be wrong for the new file.
+    """
+
+    # kbps by bitrate index, layer III
+    MPEG1_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+    MPEG2_BITRATES = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+    # Hz by version bits (MPEG2.5, reserved, MPEG2, MPEG1) and sample rate index
+    SAMPLE_RATES = {
+        0b00: (11025, 12000, 8000),
+        0b10: (22050, 24000, 16000),
+        0b11: (44100, 48000, 32000),
+    }
+    VBR_HEADER_TAGS = (b"Xing", b"Info", b"VBRI")
+
+    @staticmethod
+    def parse_header(data: bytes, offset: int):
+        """(frame_length, samples, sample_rate) of the layer III frame header at offset, or None"""
+        if offset + 4 > len(data):
+            return None
+        b1, b2 = data[offset + 1], data[offset + 2]
+        if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+            return None
+        version = (b1 >> 3) & 0x03
+        layer = (b1 >> 1) & 0x03
+        bitrate_index = (b2 >> 4) & 0x0F
+        sample_rate_index = (b2 >> 2) & 0x03
+        padding = (b2 >> 1) & 0x01
+        # Layer III only; free-format (0) and bad (15) bitrates are not supported
+        if version == 0b01 or layer != 0b01 or bitrate_index in (0, 15) or sample_rate_index == 3:
+            return None
+        sample_rate = MP3FrameSplitter.SAMPLE_RATES[version][sample_rate_index]
+        if version == 0b11:
+            bitrate = MP3FrameSplitter.MPEG1_BITRATES[bitrate_index] * 1000
+            samples = 1152
+            frame_length = 144 * bitrate // sample_rate + padding
+        else:
+            bitrate = MP3FrameSplitter.MPEG2_BITRATES[bitrate_index] * 1000
+            samples = 576
+            frame_length = 72 * bitrate // sample_rate + padding
+        return frame_length, samples, sample_rate
+
+    @staticmethod
+    def _skip_id3v2(data: bytes) -> int:
+        if len(data) < 10 or data[:3] != b"ID3":
+            return 0
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+
+    @staticmethod
+    def _is_vbr_header(data: bytes, frame: MP3Frame) -> bool:
+        # The tag sits right after the side information, at most 36 bytes into the frame
+        head = data[frame.offset + 4:frame.offset + min(frame.length, 40)]
+        return any(tag in head for tag in MP3FrameSplitter.VBR_HEADER_TAGS)
+
+    @staticmethod
+    def parse_frames(data: bytes) -> list[MP3Frame]:
+        """
+        Audio frames of an MP3 byte string in stream order.
+        Garbage between frames is skipped by resyncing on the next header that is followed by
+        another valid header (or the end of the data). Raises ValueError when no frame is found.
+        """
+        frames = []
+        offset = MP3FrameSplitter._skip_id3v2(data)
+        elapsed = 0.0
+        end = len(data)
+        while offset + 4 <= end:
+            header = MP3FrameSplitter.parse_header(data, offset)
+            if header:
+                frame_length, samples, sample_rate = header
+                next_offset = offset + frame_length
+                if next_offset <= end and (
+                    next_offset + 4 > end
+                    or data[next_offset:next_offset + 3] == b"TAG"
+                    or MP3FrameSplitter.parse_header(data, next_offset)
+                ):
+                    duration = samples / sample_rate
+                    frames.append(MP3Frame(offset, frame_length, elapsed, duration))
+                    elapsed += duration
+                    offset = next_offset
+                    continue
+            offset = data.find(b"\xff", offset + 1)
+            if offset == -1:
+                break
+
+        if frames and MP3FrameSplitter._is_vbr_header(data, frames[0]):
+            first = frames.pop(0)
+            frames = [frame._replace(start_seconds=frame.start_seconds - first.duration_seconds) for frame in frames]
+        if not frames:
+            raise ValueError("No MPEG layer III frames found")
+        return frames
+
+    @staticmethod
+    def get_duration(data: bytes) -> float:
+        frames = MP3FrameSplitter.parse_frames(data)
+        return frames[-1].start_seconds + frames[-1].duration_seconds
+
+    @staticmethod
+    def slice_frames(data: bytes, frames: list[MP3Frame], start_seconds: float, end_seconds: float) -> bytes:
+        """Frames of an already parsed stream whose midpoint lies in [start_seconds, end_seconds)"""
+        midpoint = lambda frame: frame.start_seconds + frame.duration_seconds / 2
+        first = bisect_left(frames, start_seconds, key=midpoint)
+        last = bisect_left(frames, end_seconds, lo=first, key=midpoint)
+        if first >= last:
+            return b""
+        return b"".join(data[frame.offset:frame.offset + frame.length] for frame in frames[first:last])
+
+    @staticmethod
+    def slice(data: bytes, start_seconds: float, end_seconds: float) -> bytes:
+        """Cut [start_seconds, end_seconds) out of an MP3 byte string at frame boundaries"""
+        return MP3FrameSplitter.slice_frames(data, MP3FrameSplitter.parse_frames(data), start_seconds, end_seconds)
+
+    @staticmethod
+    def concatenate(parts: list[bytes]) -> bytes:
+        """Join MP3 byte strings frame by frame, dropping their tags and VBR header frames"""
+        output = []
+        for data in parts:
+            for frame in MP3FrameSplitter.parse_frames(data):
+                output.append(data[frame.offset:frame.offset + frame.length])
+        return b"".join(output)
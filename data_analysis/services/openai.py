@@ -1,17 +1,32 @@
+import json
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
 from openai import OpenAI
 
+from config.http_clients import APIClientRegistry
+
 
 class OpenAIService:
     """
     Centralized OpenAI helper methods used by data analysis services.
     """
 
+    CHANNEL_SLOT_CACHE_KEY = "openai_inflight_channel_{channel_id}"
+    # Safety expiry so slots held by a killed worker are eventually released
+    CHANNEL_SLOT_TTL_SECONDS = 300
+
     @staticmethod
     def get_client(api_key: str) -> OpenAI:
-        return OpenAI(api_key=api_key)
+        return APIClientRegistry.get_openai_client(api_key)
 
     @staticmethod
-    def get_chat_completion(client, settings, system_prompt: str, user_prompt: str, max_tokens: int = 0) -> str:
+    def build_chat_completion_params(settings, system_prompt: str, user_prompt: str, max_tokens: int = 0) -> dict:
+        """
+        Chat completion request body for the channel settings, with unset parameters dropped.
+        Shared by the synchronous path and the Batch API request files.
+        """
         params = {
             "model": settings.chatgpt_model,
             "messages": [
@@ -22,10 +37,78 @@ class OpenAIService:
             "temperature": settings.chatgpt_temperature,
             "top_p": settings.chatgpt_top_p,
         }
+        return {key: value for key, value in params.items() if value is not None}
+
+    @staticmethod
+    def get_chat_completion(client, settings, system_prompt: str, user_prompt: str, max_tokens: int = 0) -> str:
+        params = OpenAIService.build_chat_completion_params(settings, system_prompt, user_prompt, max_tokens)
 
-        response = client.chat.completions.create(
-            **{key: value for key, value in params.items() if value is not None}
-        )
+        response = client.chat.completions.create(**params)
 
         content = response.choices[0].message.content
         return content.strip() if content else ""
+
+    @staticmethod
+    def get_structured_completion(client, settings, system_prompt: str, user_prompt: str, schema_name: str, schema: dict, max_tokens: int = 0) -> dict:
+        """
+        Request a response constrained to a JSON schema and return it as a dict.
+        Raises ValueError if the model returns no content or content that is not a JSON object.
+        """
+        params = OpenAIService.build_chat_completion_params(settings, system_prompt, user_prompt, max_tokens)
+        params["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": schema_name, "strict": True, "schema": schema},
+        }
+
+        response = client.chat.completions.create(**params)
+
+        content = response.choices[0].message.content
+        if not content:
+            raise ValueError("Empty structured response from OpenAI")
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Structured response is not valid JSON: {e}")
+        if not isinstance(data, dict):
+            raise ValueError("Structured response is not a JSON object")
+        return data
+
+    @staticmethod
+    @contextmanager
+    def channel_slot(channel_id: int, limit: int, wait_timeout: float = 120, poll_interval: float = 0.05):
+        """
+        Hold one of `limit` in-flight OpenAI request slots for a channel.
+
+        The counter lives in the shared cache so the cap applies across every Celery
+        worker process, not just the threads of the current task. A limit of 0 (or less)
+        disables the cap. Raises TimeoutError if no slot frees up within wait_timeout seconds.
+        """
+        if not limit or limit <= 0:
+            yield
+            return
+
+        key = OpenAIService.CHANNEL_SLOT_CACHE_KEY.format(channel_id=channel_id)
+        deadline = time.monotonic() + wait_timeout
+
+        while True:
+            cache.add(key, 0, timeout=OpenAIService.CHANNEL_SLOT_TTL_SECONDS)
+            try:
+                in_flight = cache.incr(key)
+            except ValueError:
+                # Key expired between add() and incr(), try again
+                continue
+            if in_flight <= limit:
+                break
+            cache.decr(key)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for an OpenAI request slot for channel {channel_id}")
+            time.sleep(poll_interval)
+
+        try:
+            yield
+        finally:
+            try:
+                cache.decr(key)
+            except ValueError:
+                # Counter already expired, nothing to release
+                pass
@@ -0,0 +1,91 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import cache
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: up to `capacity` calls at once, refilled at `rate` tokens per second.
+
+    Buckets from for_key are shared by every thread of the process and, through a per-key
+    counter in the shared cache, by every worker process: concurrent batches using the same
+    provider account draw from one `rate` per second budget. The `capacity` burst is per process.
+    """
+
+    SHARED_CACHE_KEY = "rate_limit:{key}:{window}"
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, rate: float, capacity: int, shared_key: str = None):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self.shared_key = shared_key
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_shared_key(key) -> str:
+        """Cache-safe digest of a bucket key; keys may hold credentials such as an Authorization header"""
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32]
+
+    @classmethod
+    def for_key(cls, key, rate: float, capacity: int) -> "TokenBucket":
+        with cls._registry_lock:
+            bucket = cls._registry.get(key)
+            if bucket is None or bucket.rate != float(rate) or bucket.capacity != max(1, int(capacity)):
+                bucket = cls(rate, capacity, shared_key=cls.build_shared_key(key))
+                cls._registry[key] = bucket
+            return bucket
+
+    def acquire(self, tokens: int = 1):
+        """Block until `tokens` are available and take them. A rate of 0 or less disables limiting."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+        if self.shared_key is None:
+            return
+        while True:
+            wait = self.try_acquire_shared(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def try_acquire_shared(self, tokens: int = 1) -> float:
+        """
+        Take `tokens` from the current window of the cross-process counter: 0 when granted,
+        otherwise the seconds until the next window. Windows last one second, or 1/rate
+        seconds for rates below one per second. Cache errors fall back to the local bucket.
+        """
+        window_seconds = max(1, math.ceil(1 / self.rate))
+        limit = max(1, int(self.rate * window_seconds))
+        now = time.time()
+        window = int(now // window_seconds)
+        key = self.SHARED_CACHE_KEY.format(key=self.shared_key, window=window)
+        try:
+            cache.add(key, 0, timeout=window_seconds * 2)
+            try:
+                used = cache.incr(key, tokens)
+            except ValueError:
+                # Window expired between add() and incr(); it is over, start the next one
+                return 0.01
+        except Exception as e:
+            print(f"Shared rate limit unavailable for {self.shared_key}, using the local bucket only: {e}")
+            return 0
+        if used <= limit:
+            return 0
+        return max(0.01, (window + 1) * window_seconds - now)
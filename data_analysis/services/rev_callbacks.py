@@ -0,0 +1,269 @@
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from data_analysis.models import RevCallbackInbox, RevTranscriptionJob, TranscriptionDetail
+
+
+class RevCallbackInboxService:
+    """
+    Rev.ai webhook ingestion through the RevCallbackInbox table.
+
+    The webhook only stores the raw payload (one row per job state, so redeliveries are dropped)
+    and nudges the consumer. The consumer claims pending rows in batches, applies the latest
+    state of each job to RevTranscriptionJob with bulk queries and queues analysis for
+    transcribed jobs that do not have one yet.
+    """
+
+    CONSUMER_SCHEDULED_KEY = "rev_callback_consumer_scheduled"
+    # RevTranscriptionJob fields written from a callback
+    JOB_FIELDS = (
+        'job_name', 'media_url', 'status', 'created_on', 'completed_on', 'job_type', 'language',
+        'strict_custom_vocabulary', 'duration_seconds', 'failure', 'failure_detail',
+    )
+
+    @staticmethod
+    def build_dedupe_key(job_data: dict) -> str:
+        return f"{job_data.get('id')}:{job_data.get('status', '')}"
+
+    @staticmethod
+    def build_entry(data: dict) -> RevCallbackInbox:
+        """Unsaved inbox row for a callback payload. Raises ValueError when it has no job id."""
+        job_data = data.get('job') if isinstance(data, dict) else None
+        if not isinstance(job_data, dict) or not job_data.get('id'):
+            raise ValueError("Callback payload has no job id")
+
+        return RevCallbackInbox(
+            dedupe_key=RevCallbackInboxService.build_dedupe_key(job_data),
+            job_id=str(job_data['id']),
+            payload=data,
+        )
+
+    @staticmethod
+    def enqueue(data: dict) -> RevCallbackInbox:
+        """Store a webhook payload. Raises ValueError when it has no job id."""
+        entry = RevCallbackInboxService.build_entry(data)
+        RevCallbackInbox.objects.bulk_create([entry], ignore_conflicts=True)
+        RevCallbackInboxService.schedule_consumer()
+        return entry
+
+    @staticmethod
+    def enqueue_many(payloads: list[dict]) -> int:
+        """
+        Store several callback-shaped payloads in one insert; known job states are ignored.
+        Returns the number of new inbox rows.
+        """
+        entries = {}
+        for data in payloads:
+            entry = RevCallbackInboxService.build_entry(data)
+            entries.setdefault(entry.dedupe_key, entry)
+        if not entries:
+            return 0
+        known = set(
+            RevCallbackInbox.objects.filter(dedupe_key__in=list(entries)).values_list('dedupe_key', flat=True)
+        )
+        new_entries = [entry for key, entry in entries.items() if key not in known]
+        if not new_entries:
+            return 0
+        # ignore_conflicts still covers a webhook storing the same state concurrently
+        RevCallbackInbox.objects.bulk_create(new_entries, ignore_conflicts=True, batch_size=500)
+        RevCallbackInboxService.schedule_consumer()
+        return len(new_entries)
+
+    @staticmethod
+    def schedule_consumer():
+        """Queue one consumer run shortly after a burst of callbacks instead of one per callback"""
+        delay = django_settings.REV_CALLBACK_CONSUMER_DELAY_SECONDS
+        try:
+            if not cache.add(RevCallbackInboxService.CONSUMER_SCHEDULED_KEY, 1, timeout=max(1, delay)):
+                return
+            from data_analysis.tasks import process_rev_callbacks_task
+
+            process_rev_callbacks_task.apply_async(countdown=delay)
+        except Exception as e:
+            # The periodic consumer picks the rows up anyway
+            print(f"Could not schedule Rev callback consumer: {e}")
+
+    @staticmethod
+    def parse_job_fields(job_data: dict) -> dict:
+        """RevTranscriptionJob field values from the 'job' object of a callback"""
+        created_on = None
+        completed_on = None
+
+        if job_data.get('created_on'):
+            try:
+                created_on = datetime.fromisoformat(job_data['created_on'].replace('Z', '+00:00'))
+            except ValueError:
+                created_on = timezone.now()
+
+        if job_data.get('completed_on'):
+            try:
+                completed_on = datetime.fromisoformat(job_data['completed_on'].replace('Z', '+00:00'))
+            except ValueError:
+                completed_on = None
+
+        return {
+            'job_name': job_data.get('name', ''),
+            'media_url': job_data.get('media_url', ''),
+            'status': job_data.get('status', ''),
+            'created_on': created_on,
+            'completed_on': completed_on,
+            'job_type': job_data.get('type', 'async'),
+            'language': job_data.get('language', 'en'),
+            'strict_custom_vocabulary': job_data.get('strict_custom_vocabulary', False),
+            'duration_seconds': job_data.get('duration_seconds'),
+            'failure': job_data.get('failure'),
+            'failure_detail': job_data.get('failure_detail'),
+        }
+
+    @staticmethod
+    def claim_batch(batch_size: int) -> list[RevCallbackInbox]:
+        """
+        Claim up to batch_size rows: pending ones, failed ones with attempts left, and rows whose
+        claim is older than REV_CALLBACK_CLAIM_TIMEOUT_SECONDS (a consumer died mid-batch).
+        """
+        now = timezone.now()
+        stale_claim = now - timedelta(seconds=django_settings.REV_CALLBACK_CLAIM_TIMEOUT_SECONDS)
+        with transaction.atomic():
+            ids = list(
+                RevCallbackInbox.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    Q(status='pending')
+                    | Q(status='processing', claimed_at__lt=stale_claim)
+                    | Q(status='failed', attempts__lt=django_settings.REV_CALLBACK_MAX_ATTEMPTS)
+                )
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return []
+            RevCallbackInbox.objects.filter(id__in=ids).update(
+                status='processing', claimed_at=now, attempts=F('attempts') + 1
+            )
+        return list(RevCallbackInbox.objects.filter(id__in=ids).order_by('id'))
+
+    @staticmethod
+    def apply_batch(entries: list[RevCallbackInbox]) -> tuple[list[RevTranscriptionJob], dict]:
+        """
+        Apply the latest state of each job in the batch to RevTranscriptionJob (bulk update of
+        known jobs, bulk create of unknown ones). Entries whose payload cannot be parsed are
+        skipped. Returns (transcribed jobs, {entry id: error} of the skipped entries).
+        """
+        latest = {}
+        failed = {}
+        for entry in entries:
+            try:
+                latest[entry.job_id] = RevCallbackInboxService.parse_job_fields(entry.payload.get('job', {}))
+            except Exception as e:
+                print(f"Error parsing Rev callback {entry.id} for job {entry.job_id}: {e}")
+                failed[entry.id] = str(e)
+
+        existing = {
+            job.job_id: job
+            for job in RevTranscriptionJob.objects.filter(job_id__in=list(latest))
+        }
+        to_update = []
+        to_create = []
+        for job_id, fields in latest.items():
+            job = existing.get(job_id)
+            if job is None:
+                fields['created_on'] = fields['created_on'] or timezone.now()
+                to_create.append(RevTranscriptionJob(job_id=job_id, **fields))
+                continue
+            for field, value in fields.items():
+                # Keep the known creation time when a callback does not carry one
+                if field == 'created_on' and value is None:
+                    continue
+                setattr(job, field, value)
+            job.updated_at = timezone.now()
+            to_update.append(job)
+
+        with transaction.atomic():
+            if to_update:
+                RevTranscriptionJob.objects.bulk_update(
+                    to_update, list(RevCallbackInboxService.JOB_FIELDS) + ['updated_at'], batch_size=500
+                )
+            if to_create:
+                RevTranscriptionJob.objects.bulk_create(to_create, batch_size=500)
+
+        return [job for job in to_update + to_create if job.status == 'transcribed'], failed
+
+    @staticmethod
+    def apply_entries_individually(entries: list[RevCallbackInbox]) -> tuple[list[RevTranscriptionJob], dict]:
+        """apply_batch one entry at a time, so one bad entry only fails itself. Same return value."""
+        transcribed_jobs = []
+        failed = {}
+        for entry in entries:
+            try:
+                jobs, entry_failed = RevCallbackInboxService.apply_batch([entry])
+            except Exception as e:
+                print(f"Error applying Rev callback {entry.id} for job {entry.job_id}: {e}")
+                jobs, entry_failed = [], {entry.id: str(e)}
+            transcribed_jobs.extend(jobs)
+            failed.update(entry_failed)
+        return transcribed_jobs, failed
+
+    @staticmethod
+    def queue_analysis(jobs: list[RevTranscriptionJob]) -> int:
+        """Queue analyze_transcription_task for transcribed jobs whose transcription is not analysed yet"""
+        if not jobs:
+            return 0
+        from data_analysis.tasks import analyze_transcription_task
+
+        analysed_job_ids = set(
+            TranscriptionDetail.objects
+            .filter(rev_job__in=[job.pk for job in jobs], analysis__isnull=False)
+            .values_list('rev_job_id', flat=True)
+        )
+        queued = 0
+        for job in jobs:
+            if job.pk in analysed_job_ids:
+                continue
+            analyze_transcription_task.delay(job.pk, urlparse(job.media_url).path, job.media_url)
+            queued += 1
+        return queued
+
+    @staticmethod
+    def process_pending(batch_size: int = None) -> dict:
+        """
+        Consume one batch of callbacks. When the bulk apply fails the entries are applied one at
+        a time, so only the failing ones are marked failed and retried. Returns counts for logging.
+        """
+        batch_size = batch_size or django_settings.REV_CALLBACK_BATCH_SIZE
+        entries = RevCallbackInboxService.claim_batch(batch_size)
+        if not entries:
+            return {'claimed': 0, 'jobs': 0, 'queued': 0, 'failed': 0}
+
+        try:
+            transcribed_jobs, failed = RevCallbackInboxService.apply_batch(entries)
+        except Exception as e:
+            print(f"Error applying Rev callback batch, applying its entries one at a time: {e}")
+            transcribed_jobs, failed = RevCallbackInboxService.apply_entries_individually(entries)
+            if len(failed) == len(entries):
+                # Nothing applies (e.g. the database is down): fail the run so it is visible
+                RevCallbackInbox.objects.filter(id__in=list(failed)).update(status='failed', error=str(e))
+                raise
+
+        ids = [entry.id for entry in entries if entry.id not in failed]
+        try:
+            queued = RevCallbackInboxService.queue_analysis(transcribed_jobs)
+        except Exception as e:
+            print(f"Error queueing analysis for Rev callback batch: {e}")
+            RevCallbackInbox.objects.filter(id__in=ids + list(failed)).update(status='failed', error=str(e))
+            raise
+
+        for entry_id, error in failed.items():
+            RevCallbackInbox.objects.filter(id=entry_id).update(status='failed', error=error)
+        RevCallbackInbox.objects.filter(id__in=ids).update(status='done', processed_at=timezone.now(), error=None)
+        return {
+            'claimed': len(entries),
+            'jobs': len({entry.job_id for entry in entries}),
+            'queued': queued,
+            'failed': len(failed),
+        }
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings as django_settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from config.http_clients import APIClientRegistry
+from config.validation import ValidationUtils
+from data_analysis.models import RevTranscriptionJob
+from data_analysis.services.rate_limit import TokenBucket
+from data_analysis.services.rev_callbacks import RevCallbackInboxService
+from data_analysis.services.transcription_service import RevAISpeechToText
+
+
+class RevJobReconciliationService:
+    """
+    Polling fallback for Rev.ai jobs whose callback never arrived.
+
+    Jobs still open after REV_RECONCILE_MIN_AGE_SECONDS are polled on the Rev.ai jobs endpoint.
+    Finished states are stored in the callback inbox as if Rev.ai had delivered them, so they go
+    through the same consumer and analysis path (and a late real callback is deduplicated).
+    Jobs still running get retry_count / last_retry_at bumped; jobs Rev.ai does not know and jobs
+    polled REV_RECONCILE_MAX_POLLS times without finishing are marked failed, which frees the
+    segment for a new submission.
+    """
+
+    TERMINAL_STATUSES = ('transcribed', 'failed', 'cancelled')
+
+    @staticmethod
+    def find_stuck_jobs(now, limit: int) -> list[RevTranscriptionJob]:
+        """Open jobs older than the age threshold that were not polled within the poll interval, oldest first"""
+        created_before = now - timedelta(seconds=django_settings.REV_RECONCILE_MIN_AGE_SECONDS)
+        polled_before = now - timedelta(seconds=django_settings.REV_RECONCILE_POLL_INTERVAL_SECONDS)
+        return list(
+            RevTranscriptionJob.objects
+            .exclude(status__in=RevJobReconciliationService.TERMINAL_STATUSES)
+            .filter(created_on__lt=created_before, audio_segment__isnull=False)
+            .filter(Q(last_retry_at__isnull=True) | Q(last_retry_at__lt=polled_before))
+            .select_related('audio_segment__channel')
+            .order_by('created_on', 'id')[:limit]
+        )
+
+    @staticmethod
+    def fetch_job(job_id: str, api_key: str):
+        """
+        (status_code, job json) for one Rev.ai job; status_code is None on connection errors.
+        Uses the same per-account rate limiter as job submission.
+        """
+        authorization = f"Bearer {api_key}"
+        TokenBucket.for_key(
+            ("revai", authorization),
+            rate=django_settings.REV_AI_SUBMIT_RATE_PER_SECOND,
+            capacity=django_settings.REV_AI_SUBMIT_BURST,
+        ).acquire()
+        try:
+            response = APIClientRegistry.get_session("revai", api_key).get(
+                f"{RevAISpeechToText.JOBS_URL}/{job_id}",
+                headers={"Authorization": authorization, "Accept": "application/json"},
+                timeout=django_settings.REV_AI_REQUEST_TIMEOUT_SECONDS,
+            )
+        except requests.RequestException as e:
+            print(f"Failed to poll Rev.ai job {job_id}: {e}")
+            return None, None
+        if response.status_code != 200:
+            return response.status_code, None
+        try:
+            return 200, response.json()
+        except ValueError:
+            return None, None
+
+    @staticmethod
+    def get_backlog_metrics(now) -> dict:
+        """Size and age of the open job backlog"""
+        backlog = (
+            RevTranscriptionJob.objects
+            .exclude(status__in=RevJobReconciliationService.TERMINAL_STATUSES)
+            .aggregate(open_jobs=Count('id'), oldest_created_on=Min('created_on'))
+        )
+        oldest = backlog['oldest_created_on']
+        return {
+            'open_jobs': backlog['open_jobs'],
+            'oldest_open_job_age_seconds': round((now - oldest).total_seconds()) if oldest else 0,
+        }
+
+    @staticmethod
+    def reconcile(batch_size: int = None) -> dict:
+        """Poll one batch of stuck jobs and apply the results. Returns counts and lag metrics."""
+        now = timezone.now()
+        batch_size = batch_size or django_settings.REV_RECONCILE_BATCH_SIZE
+        jobs = RevJobReconciliationService.find_stuck_jobs(now, batch_size)
+        result = {
+            'polled': 0, 'recovered': 0, 'still_running': 0, 'not_found': 0,
+            'timed_out': 0, 'errors': 0, 'max_recovered_lag_seconds': 0,
+        }
+
+        api_keys = {}
+        pollable = []
+        for job in jobs:
+            channel = job.audio_segment.channel
+            if channel.pk not in api_keys:
+                try:
+                    api_keys[channel.pk] = ValidationUtils.validate_revai_api_key(channel)
+                except ValidationError as e:
+                    print(f"Skipping Rev job reconciliation for channel {channel.pk}: {e}")
+                    api_keys[channel.pk] = None
+            if api_keys[channel.pk]:
+                pollable.append((job, api_keys[channel.pk]))
+
+        if pollable:
+            max_workers = max(1, min(django_settings.REV_RECONCILE_MAX_WORKERS, len(pollable)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                responses = list(executor.map(
+                    lambda item: RevJobReconciliationService.fetch_job(item[0].job_id, item[1]),
+                    pollable,
+                ))
+        else:
+            responses = []
+
+        finished_payloads = []
+        finished_ids = []
+        not_found_ids = []
+        error_ids = []
+        open_jobs = []
+        for (job, _), (status_code, job_data) in zip(pollable, responses):
+            result['polled'] += 1
+            if status_code == 404:
+                not_found_ids.append(job.pk)
+            elif job_data is None:
+                # Connection errors, 429s and 5xx say nothing about the job: they must not time it out
+                result['errors'] += 1
+                error_ids.append(job.pk)
+            elif job_data.get('status') in RevJobReconciliationService.TERMINAL_STATUSES:
+                job_data.setdefault('id', job.job_id)
+                finished_payloads.append({'job': job_data})
+                finished_ids.append(job.pk)
+                # How long after Rev.ai finished the job we noticed it
+                completed_on = RevCallbackInboxService.parse_job_fields(job_data)['completed_on']
+                if completed_on:
+                    lag = round((now - completed_on).total_seconds())
+                    result['max_recovered_lag_seconds'] = max(result['max_recovered_lag_seconds'], lag)
+            else:
+                open_jobs.append(job)
+
+        if finished_payloads:
+            result['recovered'] = RevCallbackInboxService.enqueue_many(finished_payloads)
+            # Not polled again before the consumer has applied the inbox row
+            RevTranscriptionJob.objects.filter(pk__in=finished_ids).update(last_retry_at=now)
+
+        if not_found_ids:
+            result['not_found'] = RevTranscriptionJob.objects.filter(pk__in=not_found_ids).update(
+                status='failed', failure='not_found', failure_detail="Job not found on Rev.ai during reconciliation",
+                completed_on=now, updated_at=now,
+            )
+
+        if error_ids:
+            RevTranscriptionJob.objects.filter(pk__in=error_ids).update(last_retry_at=now)
+
+        # Only a confirmed non-terminal Rev.ai status counts toward the timeout
+        max_polls = django_settings.REV_RECONCILE_MAX_POLLS
+        timed_out_ids = [job.pk for job in open_jobs if job.retry_count + 1 >= max_polls]
+        running_ids = [job.pk for job in open_jobs if job.retry_count + 1 < max_polls]
+        if timed_out_ids:
+            result['timed_out'] = RevTranscriptionJob.objects.filter(pk__in=timed_out_ids).update(
+                status='failed', failure='reconciliation_timeout',
+                failure_detail=f"Still not finished after {max_polls} reconciliation polls",
+                retry_count=F('retry_count') + 1, last_retry_at=now, completed_on=now, updated_at=now,
+            )
+        if running_ids:
+            result['still_running'] = RevTranscriptionJob.objects.filter(pk__in=running_ids).update(
+                retry_count=F('retry_count') + 1, last_retry_at=now,
+            )
+
+        result.update(RevJobReconciliationService.get_backlog_metrics(now))
+        return result
@@ -0,0 +1,293 @@
+from django.conf import settings as django_settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import FloatField, Func, Q
+from django.db.models.functions import Coalesce
+
+from audio_policy.flag_matcher import CompiledFlagCondition, flatten_nested_list, get_compiled_flag_condition
+from audio_policy.models import FlagCondition
+from data_analysis.models import SegmentFlagResult, TranscriptionDetail
+
+
+class SentimentNumber(Func):
+    """
+    First number in the sentiment text as a float (NULL without one), the value
+    check_flag_conditions reads with re.search(r'-?\d+(\.\d+)?')
+    """
+    function = 'SUBSTRING'
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f"CAST(SUBSTRING({sql} FROM %s) AS double precision)", [*params, r'-?\d+(?:\.\d+)?']
+
+
+def _flag_terms_q(field, terms):
+    """Q matching rows whose field contains any term, ignoring case (as `term.lower() in text.lower()`)"""
+    condition = Q()
+    for term in terms:
+        condition |= Q(**{f'{field}__icontains': term})
+    return condition
+
+
+def _keyword_group_terms(keyword_groups):
+    """Keywords check_keywords looks for: non-empty entries of the list groups"""
+    return [
+        str(kw) for group in (keyword_groups or [])
+        if isinstance(group, list)
+        for kw in group
+        if kw
+    ]
+
+
+def build_flag_candidate_filter(flag_condition, duration_threshold=None):
+    """
+    Q over AudioSegments for the segments that can have an active flag, or None when nothing can.
+
+    Keyword groups and topic lists become case-insensitive substring matches (served by the
+    pg_trgm indexes), sentiment targets and ranges compare sentiment_score, or the number parsed
+    from the sentiment text when it is NULL, and the shift duration limit compares
+    duration_seconds. The filter never drops a segment check_flag_conditions would flag, so the
+    Python check still builds the messages and has the final word.
+    """
+    analysis = 'transcription_detail__analysis'
+    conditions = []
+    if duration_threshold is not None:
+        conditions.append(Q(duration_seconds__gt=duration_threshold))
+        if duration_threshold < 0:
+            # A missing duration counts as 0
+            conditions.append(Q(duration_seconds__isnull=True))
+
+    if flag_condition is not None:
+        for field, terms in (
+            ('transcription_detail__transcript', _keyword_group_terms(flag_condition.transcription_keywords)),
+            (f'{analysis}__summary', _keyword_group_terms(flag_condition.summary_keywords)),
+            (f'{analysis}__iab_topics', flatten_nested_list(flag_condition.iab_topics)),
+            (f'{analysis}__bucket_prompt', flatten_nested_list(flag_condition.bucket_prompt)),
+            (f'{analysis}__general_topics', flatten_nested_list(flag_condition.general_topics)),
+        ):
+            if terms:
+                conditions.append(_flag_terms_q(field, terms))
+
+        ranges = CompiledFlagCondition.get_sentiment_ranges(flag_condition)
+        if flag_condition.target_sentiments is not None or ranges:
+            sentiment = Q()
+            if flag_condition.target_sentiments is not None:
+                sentiment |= Q(sentiment_number=flag_condition.target_sentiments)
+            for lower, upper in ranges:
+                bounds = Q(sentiment_number__isnull=False)
+                if lower != float('-inf'):
+                    bounds &= Q(sentiment_number__gte=lower)
+                if upper != float('inf'):
+                    bounds &= Q(sentiment_number__lte=upper)
+                sentiment |= bounds
+            conditions.append(sentiment)
+
+    if not conditions:
+        return None
+    candidate_filter = Q()
+    for condition in conditions:
+        candidate_filter |= condition
+    return candidate_filter
+
+
+class SegmentFlagService:
+    """
+    Materialized FlagCondition results (SegmentFlagResult).
+
+    Rows are written when a segment's TranscriptionAnalysis is created and rewritten for the whole
+    channel by a background task when its FlagCondition is saved. A row counts only while its
+    condition_version equals the active condition's updated_at, so a condition change never
+    serves stale flags: until the task (or the backfill_segment_flags command) has run, readers
+    evaluate the segments without a current row in Python and never write rows themselves.
+    """
+
+    @staticmethod
+    def get_active_condition(channel_id):
+        return FlagCondition.objects.filter(channel_id=channel_id, is_active=True).first()
+
+    @staticmethod
+    def flag_inputs(transcription_detail):
+        """(transcription, analysis) dicts with the fields the flag checks read"""
+        if transcription_detail is None:
+            return {}, {}
+        transcription = {'transcript': transcription_detail.transcript}
+        try:
+            analysis_obj = transcription_detail.analysis
+        except ObjectDoesNotExist:
+            return transcription, {}
+        return transcription, {
+            'summary': analysis_obj.summary,
+            'sentiment': analysis_obj.sentiment,
+            'sentiment_score': analysis_obj.sentiment_score,
+            'iab_topics': analysis_obj.iab_topics,
+            'bucket_prompt': analysis_obj.bucket_prompt,
+            'general_topics': analysis_obj.general_topics,
+        }
+
+    @staticmethod
+    def is_flagged(flags: dict) -> bool:
+        return any(isinstance(entry, dict) and entry.get('flagged') for entry in flags.values())
+
+    @staticmethod
+    def build_results(channel_id: int, flag_condition, details) -> list:
+        """Unsaved SegmentFlagResult rows for TranscriptionDetail rows (analysis loaded)"""
+        compiled = get_compiled_flag_condition(flag_condition)
+        results = []
+        for detail in details:
+            flags = compiled.evaluate(*SegmentFlagService.flag_inputs(detail))
+            results.append(SegmentFlagResult(
+                audio_segment_id=detail.audio_segment_id,
+                channel_id=channel_id,
+                condition_version=flag_condition.updated_at,
+                flags=flags,
+                is_flagged=SegmentFlagService.is_flagged(flags),
+            ))
+        return results
+
+    @staticmethod
+    def store(results: list):
+        if not results:
+            return
+        SegmentFlagResult.objects.bulk_create(
+            results,
+            update_conflicts=True,
+            unique_fields=['audio_segment'],
+            update_fields=['channel', 'condition_version', 'flags', 'is_flagged', 'computed_at'],
+            batch_size=500,
+        )
+
+    @staticmethod
+    def store_for_details(detail_ids) -> int:
+        """
+        Compute and store the flags of the given transcription details' segments with their
+        channel's active condition. Called after analyses are created; failures are only logged.
+        """
+        try:
+            details = list(
+                TranscriptionDetail.objects
+                .filter(id__in=list(detail_ids), audio_segment__isnull=False)
+                .select_related('analysis', 'audio_segment')
+            )
+            by_channel = {}
+            for detail in details:
+                by_channel.setdefault(detail.audio_segment.channel_id, []).append(detail)
+            stored = 0
+            for channel_id, channel_details in by_channel.items():
+                flag_condition = SegmentFlagService.get_active_condition(channel_id)
+                if flag_condition is None:
+                    continue
+                results = SegmentFlagService.build_results(channel_id, flag_condition, channel_details)
+                SegmentFlagService.store(results)
+                stored += len(results)
+            return stored
+        except Exception as e:
+            print(f"Error storing segment flag results: {e}")
+            return 0
+
+    @staticmethod
+    def recompute_channel(channel_id: int, chunk_size: int = None) -> int:
+        """
+        Rewrite the flag rows of every transcribed segment of the channel for its active
+        condition, chunk_size transcriptions at a time. Without an active condition the
+        channel's rows are deleted. Returns the number of rows written.
+        """
+        chunk_size = chunk_size or django_settings.SEGMENT_FLAG_RECOMPUTE_CHUNK_SIZE
+        flag_condition = SegmentFlagService.get_active_condition(channel_id)
+        if flag_condition is None:
+            SegmentFlagResult.objects.filter(channel_id=channel_id).delete()
+            return 0
+
+        details = (
+            TranscriptionDetail.objects
+            .filter(audio_segment__channel_id=channel_id)
+            .select_related('analysis')
+            .order_by('id')
+        )
+        written = 0
+        last_id = 0
+        while True:
+            chunk = list(details.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            SegmentFlagService.store(SegmentFlagService.build_results(channel_id, flag_condition, chunk))
+            written += len(chunk)
+            last_id = chunk[-1].id
+            if len(chunk) < chunk_size:
+                break
+        return written
+
+    @staticmethod
+    def schedule_recompute(channel_id: int):
+        """Queue recompute_segment_flags_task for the channel once the current transaction commits"""
+        def enqueue():
+            try:
+                from data_analysis.tasks import recompute_segment_flags_task
+
+                recompute_segment_flags_task.delay(channel_id)
+            except Exception as e:
+                # Readers evaluate missing rows in Python, so a lost task only costs speed
+                print(f"Could not schedule segment flag recompute for channel {channel_id}: {e}")
+
+        transaction.on_commit(enqueue)
+
+    @staticmethod
+    def stored_flags(segment_ids, flag_condition) -> dict:
+        """{segment id: flag entries} of the current rows for the condition, in one query"""
+        return dict(
+            SegmentFlagResult.objects
+            .filter(audio_segment_id__in=list(segment_ids), condition_version=flag_condition.updated_at)
+            .values_list('audio_segment_id', 'flags')
+        )
+
+    @staticmethod
+    def current_result_flags(segment, flag_condition):
+        """Stored flag entries of an AudioSegments instance (flag_result selected), or None when missing or stale"""
+        try:
+            result = segment.flag_result
+        except ObjectDoesNotExist:
+            return None
+        if result is None or result.condition_version != flag_condition.updated_at:
+            return None
+        return result.flags
+
+    @staticmethod
+    def evaluate_missing(queryset, flag_condition) -> list:
+        """
+        Ids of the flagged segments of the queryset that have no current row for the condition,
+        evaluated in Python without storing anything. Only segments that could be flagged
+        (build_flag_candidate_filter) are loaded; the others need no row.
+        """
+        candidate_filter = build_flag_candidate_filter(flag_condition)
+        if candidate_filter is None:
+            return []
+        candidates = queryset.exclude(flag_result__condition_version=flag_condition.updated_at)
+        # The stored score, as check_flag_conditions reads it; the regex only runs for rows without one
+        candidates = candidates.annotate(sentiment_number=Coalesce(
+            'transcription_detail__analysis__sentiment_score',
+            SentimentNumber('transcription_detail__analysis__sentiment'),
+        ))
+        candidates = candidates.filter(candidate_filter).order_by().values('id')
+        details = TranscriptionDetail.objects.filter(audio_segment_id__in=candidates).select_related('analysis')
+        compiled = get_compiled_flag_condition(flag_condition)
+        return [
+            detail.audio_segment_id for detail in details
+            if SegmentFlagService.is_flagged(compiled.evaluate(*SegmentFlagService.flag_inputs(detail)))
+        ]
+
+    @staticmethod
+    def current_flagged_filter(queryset, flag_condition):
+        """
+        Q over AudioSegments for the flagged segments of the queryset: the stored flagged rows,
+        plus the segments without a current row that evaluate_missing flags. Read-only.
+        """
+        missing_flagged_ids = SegmentFlagService.evaluate_missing(queryset, flag_condition)
+        flagged = SegmentFlagService.flagged_filter(flag_condition)
+        if missing_flagged_ids:
+            flagged |= Q(id__in=missing_flagged_ids)
+        return flagged
+
+    @staticmethod
+    def flagged_filter(flag_condition):
+        """Q over AudioSegments for the segments whose current row is flagged (served by the index)"""
+        return Q(flag_result__condition_version=flag_condition.updated_at, flag_result__is_flagged=True)
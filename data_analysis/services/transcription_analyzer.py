@@ -1,7 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import requests
 from typing import Optional
 import os
+from django.conf import settings as django_settings
 from django.utils import timezone
 from decouple import config
 from core_admin.models import Channel, WellnessBucket
@@ -10,7 +12,9 @@ from django.core.exceptions import ValidationError
 from config.validation import ValidationUtils
 
 from data_analysis.models import RevTranscriptionJob, TranscriptionAnalysis, TranscriptionDetail
+from data_analysis.services.llm_cache import LLMResponseCache
 from data_analysis.services.openai import OpenAIService
+from data_analysis.services.segment_flags import SegmentFlagService
 from audio_policy.models import ContentTypeDeactivationRule
 
 class TranscriptionAnalyzer:
@@ -21,12 +25,8 @@ class TranscriptionAnalyzer:
         Returns the constructed prompt or None if no buckets are found.
         """
         try:
-            # Fetch active GeneralSetting with buckets
-            active_setting = GeneralSettingService.get_active_setting(
-                channel=channel,
-                include_buckets=True,
-                exclude_deleted_buckets=True
-            )
+            # Active GeneralSetting with its non-deleted buckets
+            active_setting = GeneralSettingService.get_settings_snapshot(channel)
             
             if not active_setting:
                 print("No active GeneralSetting found")
@@ -133,6 +133,155 @@ class TranscriptionAnalyzer:
             print(f"Error checking content type deactivation rules: {e}")
             # Don't raise, just log the error
 
+    # Prompts whose failure is logged and stored as an empty result instead of failing the analysis
+    ISOLATED_PROMPTS = {"content_type_prompt"}
+    # Prompts whose answer may legitimately be empty, e.g. no wellness bucket fits the transcript
+    EMPTY_ALLOWED_PROMPTS = {"bucket_prompt"}
+
+    @staticmethod
+    def build_analysis_prompts(settings, bucket_prompt: Optional[str]) -> list[tuple[str, str, int]]:
+        """
+        Build the (field, system_prompt, max_tokens) list for a transcript analysis,
+        in the order the prompts are issued. Fields map to TranscriptionAnalysis columns.
+        """
+        prompts = [
+            ("summary", settings.summarize_transcript_prompt, 150),
+            ("sentiment", settings.sentiment_analysis_prompt, 16),
+            ("general_topics", settings.general_topics_prompt, 100),
+            ("iab_topics", settings.iab_topics_prompt, 100),
+        ]
+        if bucket_prompt:
+            prompts.append(("bucket_prompt", bucket_prompt, 50))
+
+        # Content type classification using GeneralSetting.determine_radio_content_type_prompt
+        content_type_definitions = settings.content_type_prompt or ""
+        determine_radio_content_type_prompt = settings.determine_radio_content_type_prompt or ""
+        if determine_radio_content_type_prompt and determine_radio_content_type_prompt.strip():
+            # Replace {{segments}} placeholder with the content type definitions
+            content_type_instruction = determine_radio_content_type_prompt.replace("{{segments}}", content_type_definitions)
+            prompts.append(("content_type_prompt", content_type_instruction, 30))
+
+        return prompts
+
+    @staticmethod
+    def _run_prompts_sequentially(complete, prompts) -> dict:
+        results = {}
+        for field, system_prompt, max_tokens in prompts:
+            if field in TranscriptionAnalyzer.ISOLATED_PROMPTS:
+                try:
+                    results[field] = complete(system_prompt, max_tokens)
+                except Exception as e:
+                    print(f"Error generating {field} analysis: {e}")
+                    results[field] = ""
+            else:
+                results[field] = complete(system_prompt, max_tokens)
+        return results
+
+    @staticmethod
+    def _run_prompts_concurrently(complete, prompts, channel_id: int) -> dict:
+        """
+        Issue all analysis prompts in parallel on a bounded thread pool.
+
+        Failure handling matches the sequential path: isolated prompts fall back to an
+        empty result, any other failure is re-raised (the first one in prompt order).
+        Each request holds a per-channel slot so parallel tasks stay under the
+        channel's OpenAI concurrency cap.
+        """
+        limit = django_settings.OPENAI_CHANNEL_CONCURRENCY_LIMIT
+
+        def _complete_with_slot(system_prompt: str, max_tokens: int) -> str:
+            with OpenAIService.channel_slot(channel_id, limit):
+                return complete(system_prompt, max_tokens)
+
+        max_workers = max(1, min(django_settings.TRANSCRIPTION_ANALYSIS_MAX_WORKERS, len(prompts)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis") as executor:
+            futures = [
+                (field, executor.submit(_complete_with_slot, system_prompt, max_tokens))
+                for field, system_prompt, max_tokens in prompts
+            ]
+
+        results = {}
+        first_error = None
+        for field, future in futures:
+            try:
+                results[field] = future.result()
+            except Exception as e:
+                if field in TranscriptionAnalyzer.ISOLATED_PROMPTS:
+                    print(f"Error generating {field} analysis: {e}")
+                    results[field] = ""
+                elif first_error is None:
+                    first_error = e
+        if first_error is not None:
+            raise first_error
+        return results
+
+    # Extra completion tokens allowed for the JSON keys and punctuation of a combined response
+    COMBINED_RESPONSE_TOKEN_OVERHEAD = 100
+
+    @staticmethod
+    def build_combined_analysis_request(prompts) -> tuple[str, dict, int]:
+        """
+        Fold the per-prompt instructions into one system prompt plus the JSON schema
+        of the expected response (one string property per TranscriptionAnalysis field).
+        Returns (system_prompt, schema, max_tokens).
+        """
+        instructions = [
+            "You will be given a single radio transcript. Complete each of the following tasks independently, "
+            "applying only that task's instructions to the transcript. Return a JSON object with one key per task "
+            "containing that task's answer as plain text, exactly as you would answer the task on its own."
+        ]
+        for field, system_prompt, _ in prompts:
+            instructions.append(f'Task "{field}":\n{system_prompt}')
+
+        fields = [field for field, _, _ in prompts]
+        schema = {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in fields},
+            "required": fields,
+            "additionalProperties": False,
+        }
+        max_tokens = sum(max_tokens for _, _, max_tokens in prompts) + TranscriptionAnalyzer.COMBINED_RESPONSE_TOKEN_OVERHEAD
+        return "\n\n".join(instructions), schema, max_tokens
+
+    @staticmethod
+    def _run_prompts_combined(client, settings, transcript: str, prompts, channel_id: int) -> Optional[dict]:
+        """
+        Run every analysis prompt in one structured-output request, holding a per-channel slot
+        like the per-prompt requests. Returns None if the request fails or the response does
+        not match the schema, so the caller can fall back to the per-prompt path.
+        """
+        system_prompt, schema, max_tokens = TranscriptionAnalyzer.build_combined_analysis_request(prompts)
+        try:
+            with OpenAIService.channel_slot(channel_id, django_settings.OPENAI_CHANNEL_CONCURRENCY_LIMIT):
+                data = OpenAIService.get_structured_completion(
+                    client,
+                    settings,
+                    system_prompt,
+                    transcript,
+                    "transcript_analysis",
+                    schema,
+                    max_tokens,
+                )
+        except Exception as e:
+            print(f"Combined analysis request failed, falling back to per-prompt analysis: {e}")
+            return None
+
+        results = {}
+        for field in schema["required"]:
+            value = data.get(field)
+            if not isinstance(value, str):
+                print(f"Combined analysis response missing or invalid field '{field}', falling back to per-prompt analysis")
+                return None
+            results[field] = value.strip()
+
+        # Required prompts must have an answer, same as a non-empty per-prompt response
+        allowed_empty = TranscriptionAnalyzer.ISOLATED_PROMPTS | TranscriptionAnalyzer.EMPTY_ALLOWED_PROMPTS
+        for field in results:
+            if field not in allowed_empty and not results[field]:
+                print(f"Combined analysis response has empty field '{field}', falling back to per-prompt analysis")
+                return None
+        return results
+
     @staticmethod
     def analyze_transcription(transcription_detail):
         if not isinstance(transcription_detail, TranscriptionDetail):
@@ -188,39 +337,47 @@ class TranscriptionAnalyzer:
                 max_tokens,
             )
 
-        # Summary
-        summary = _complete(settings.summarize_transcript_prompt, 150)
+        bucket_prompt = TranscriptionAnalyzer.get_bucket_prompt(channel_id)
+        if not bucket_prompt:
+            print("No wellness bucket prompt available, skipping bucket analysis")
 
-        # Sentiment
-        sentiment = _complete(settings.sentiment_analysis_prompt, 16)
+        prompts = TranscriptionAnalyzer.build_analysis_prompts(settings, bucket_prompt)
 
-        # General topics
-        general_topics = _complete(settings.general_topics_prompt, 100)
+        # Reuse cached responses for prompts already answered for an identical transcript
+        use_cache = django_settings.LLM_RESPONSE_CACHE_ENABLED
+        cached_results = {}
+        if use_cache:
+            for field, system_prompt, max_tokens in prompts:
+                cached = LLMResponseCache.get(settings, system_prompt, transcript, max_tokens)
+                if cached is not None:
+                    cached_results[field] = cached
+        pending_prompts = [prompt for prompt in prompts if prompt[0] not in cached_results]
 
-        # IAB topics
-        iab_topics = _complete(settings.iab_topics_prompt, 100)
+        analysis_mode = django_settings.TRANSCRIPTION_ANALYSIS_MODE
+        results = {} if not pending_prompts else None
+        if results is None and analysis_mode == "combined":
+            results = TranscriptionAnalyzer._run_prompts_combined(
+                client, settings, transcript, pending_prompts, channel_id
+            )
+        if results is None:
+            if analysis_mode == "concurrent":
+                results = TranscriptionAnalyzer._run_prompts_concurrently(_complete, pending_prompts, channel_id)
+            else:
+                results = TranscriptionAnalyzer._run_prompts_sequentially(_complete, pending_prompts)
 
-        # Wellness bucket analysis
-        bucket_prompt = TranscriptionAnalyzer.get_bucket_prompt(channel_id)
-        wellness_buckets = ""
-        if bucket_prompt:
-            wellness_buckets = _complete(bucket_prompt, 50)
-        else:
-            print("No wellness bucket prompt available, skipping bucket analysis")
+        if use_cache:
+            for field, system_prompt, max_tokens in pending_prompts:
+                LLMResponseCache.set(settings, system_prompt, transcript, max_tokens, results.get(field, ""))
+        results.update(cached_results)
 
-        # Content type classification using GeneralSetting.determine_radio_content_type_prompt
-        content_type_result = ""
-        try:
-            content_type_definitions = settings.content_type_prompt or ""
-            determine_radio_content_type_prompt = settings.determine_radio_content_type_prompt or ""
-            if determine_radio_content_type_prompt and determine_radio_content_type_prompt.strip():
-                # Replace {{segments}} placeholder with the transcript
-                content_type_instruction = determine_radio_content_type_prompt.replace("{{segments}}", content_type_definitions)
-
-                content_type_result = _complete(content_type_instruction, 30)
-                print(content_type_result)
-        except Exception as e:
-            print(f"Error generating content type classification: {e}")
+        summary = results.get("summary", "")
+        sentiment = results.get("sentiment", "")
+        general_topics = results.get("general_topics", "")
+        iab_topics = results.get("iab_topics", "")
+        wellness_buckets = results.get("bucket_prompt", "")
+        content_type_result = results.get("content_type_prompt", "")
+        if content_type_result:
+            print(content_type_result)
 
         # Store in TranscriptionAnalysis
         try:
@@ -234,6 +391,7 @@ class TranscriptionAnalyzer:
                 content_type_prompt=content_type_result
             )
             print(f"Created new transcription analysis for transcription_detail {transcription_detail.id}")
+            SegmentFlagService.store_for_details([transcription_detail.id])
             
             # Check if content type matches deactivation rules
             TranscriptionAnalyzer.check_and_deactivate_by_content_type(analysis, content_type_result)
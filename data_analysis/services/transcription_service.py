@@ -1,9 +1,11 @@
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import requests
 from typing import Optional, Dict, Any
 import os
 from urllib.parse import urlparse
+from django.conf import settings as django_settings
 from django.utils import timezone
 from django.db.models import Q
 from decouple import config
@@ -11,13 +13,40 @@ from core_admin.models import GeneralSetting, Channel
 from core_admin.repositories import GeneralSettingService
 from openai import OpenAI
 from django.core.exceptions import ValidationError
+from config.http_clients import APIClientRegistry
 from config.validation import ValidationUtils
 
 from data_analysis.models import RevTranscriptionJob, TranscriptionDetail, AudioSegments
+from data_analysis.services.rate_limit import TokenBucket
 from segmentor.models import TitleMappingRule
 
 
 class RevAISpeechToText:
+    JOBS_URL = "https://api.rev.ai/speechtotext/v1/jobs"
+
+    @staticmethod
+    def build_job_request(media_url: str, api_key: str, settings) -> tuple[dict, dict]:
+        """Headers and JSON body for a Rev.ai job submission, including the channel's custom vocabulary"""
+        base_url = config('PUBLIC_BASE_URL')
+        notification_url = f"{base_url}/api/rev-callback"
+        phrases = list(settings.custom_vocabulary) if (settings and getattr(settings, "custom_vocabulary", None)) else []
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        data = {
+            "media_url": media_url,
+            "notification_config": {
+                "url": notification_url
+            },
+            "options": {
+                "timestamps": False
+            },
+        }
+        if phrases:
+            data["custom_vocabularies"] = [{"phrases": phrases}]
+        return headers, data
+
     @staticmethod
     def create_transcription_job(media_path: str, is_absolute_url: bool = False, channel: Channel | int = None):
         """
@@ -37,29 +66,13 @@ class RevAISpeechToText:
             ValidationUtils.validate_file_path(media_path)
         
         base_url = config('PUBLIC_BASE_URL')
-        notification_url = f"{base_url}/api/rev-callback"
         media_url = media_path if is_absolute_url else f"{base_url}{media_path}"
         
         api_key = ValidationUtils.validate_revai_api_key(channel)
-        settings = GeneralSettingService.get_active_setting(channel=channel, include_buckets=False)
-        phrases = list(settings.custom_vocabulary) if (settings and getattr(settings, "custom_vocabulary", None)) else []
-        url = "https://api.rev.ai/speechtotext/v1/jobs"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        }
-        data = {
-            "media_url": media_url,
-            "notification_config": {
-                "url": notification_url
-            },
-            "options": {
-                "timestamps": False
-            },
-        }
-        if phrases:
-            data["custom_vocabularies"] = [{"phrases": phrases}]
-        response = requests.post(url, headers=headers, json=data)
+        settings = GeneralSettingService.get_settings_snapshot(channel)
+        headers, data = RevAISpeechToText.build_job_request(media_url, api_key, settings)
+        url = RevAISpeechToText.JOBS_URL
+        response = APIClientRegistry.request("revai", "POST", url, api_key=api_key, headers=headers, json=data)
         print(f"Response: {response.json()}")
         response.raise_for_status()
         return response.json()
@@ -106,94 +119,90 @@ class RevAISpeechToText:
 
         Expected input: a list of dicts (as produced by mark_requires_analysis),
         each containing at least: id, file_path, requires_analysis.
+
+        Segments, existing transcription details and active Rev jobs are prefetched in three
+        queries and settings are resolved once per channel. Jobs are submitted concurrently
+        through one pooled session, rate limited per Rev.ai account, and the resulting
+        RevTranscriptionJob rows are bulk inserted.
         """
         if not isinstance(segments, list):
             raise ValidationError("segments must be a list of dictionaries")
 
-        created_jobs: list[RevTranscriptionJob] = []
-
+        segment_ids = []
         for seg in segments:
-            if not isinstance(seg, dict):
+            if not isinstance(seg, dict) or not bool(seg.get("requires_analysis", False)):
                 continue
-
-            if not bool(seg.get("requires_analysis", False)):
-                continue
-
             segment_id = seg.get("id") or seg.get("segment_id")
-            file_path_from_payload = seg.get("file_path")
-
-            audio_segment: AudioSegments | None = None
-            if segment_id:
-                try:
-                    audio_segment = AudioSegments.objects.get(pk=segment_id)
-                except AudioSegments.DoesNotExist:
-                    audio_segment = None
-
-            if audio_segment is None and file_path_from_payload:
-                try:
-                    audio_segment = AudioSegments.objects.filter(id=segment_id).first()
-                except Exception:
-                    audio_segment = None
+            if segment_id and segment_id not in segment_ids:
+                segment_ids.append(segment_id)
+        if not segment_ids:
+            return []
+
+        audio_segments = AudioSegments.objects.select_related("channel").in_bulk(segment_ids)
+        existing_details = {
+            detail.audio_segment_id: detail
+            for detail in TranscriptionDetail.objects.filter(audio_segment_id__in=segment_ids).select_related("rev_job")
+        }
+        active_job_segment_ids = set(
+            RevTranscriptionJob.objects.filter(
+                audio_segment_id__in=segment_ids,
+                status__in=['transcribed', 'in_progress']
+            ).values_list("audio_segment_id", flat=True)
+        )
 
+        base_url = config('PUBLIC_BASE_URL')
+        channel_requests = {}
+        submissions = []
+        for segment_id in segment_ids:
+            audio_segment = audio_segments.get(segment_id)
             if audio_segment is None:
                 continue
 
             # Transcription already stored: skip new Rev job; optionally queue analysis (same as Rev callback)
-            existing_detail = TranscriptionDetail.objects.filter(
-                audio_segment=audio_segment
-            ).select_related("rev_job").first()
+            existing_detail = existing_details.get(audio_segment.id)
             if existing_detail:
-                if audio_segment.is_analysis_completed:
-                    print(
-                        f"Skipping segment {audio_segment.id} - TranscriptionDetail exists and analysis completed"
-                    )
-                    continue
-                job = existing_detail.rev_job
-                if job and job.status == "transcribed":
-                    from data_analysis.tasks import analyze_transcription_task
-
-                    media_url = job.media_url
-                    parsed_url = urlparse(str(media_url))
-                    analyze_transcription_task.delay(job.pk, parsed_url.path, media_url)
-                    print(
-                        f"Queued analysis for segment {audio_segment.id} "
-                        f"(TranscriptionDetail exists, analysis not completed)"
-                    )
-                else:
-                    print(
-                        f"Skipping segment {audio_segment.id} - TranscriptionDetail exists but "
-                        f"cannot analyze (job status={getattr(job, 'status', None)})"
-                    )
+                RevAISpeechToText._queue_analysis_for_existing_detail(audio_segment, existing_detail)
                 continue
 
-            # # Check if RevTranscriptionJob already exists (job already created, even if not completed)
-            if RevTranscriptionJob.objects.filter(
-                audio_segment=audio_segment,
-                status__in=['transcribed', 'in_progress']
-            ).exists():
+            # Check if RevTranscriptionJob already exists (job already created, even if not completed)
+            if audio_segment.id in active_job_segment_ids:
                 print(f"Skipping segment {audio_segment.id} - RevTranscriptionJob already exists")
-                continue  # Skip this segment if job already exists
+                continue
 
             # Use audio_url when audio_location_type is audio_url, otherwise construct path from file_path
             if audio_segment.audio_location_type == 'audio_url':
                 media_url_path = audio_segment.audio_url
-                is_absolute_url = True
+                media_url = media_url_path
             else:
                 media_url_path = f"/api/{audio_segment.file_path}"
-                is_absolute_url = False
-
-            try:
-                api_response = RevAISpeechToText.create_transcription_job(
-                    media_url_path, is_absolute_url=is_absolute_url, channel=audio_segment.channel
-                )
-            except requests.RequestException:
+                ValidationUtils.validate_file_path(media_url_path)
+                media_url = f"{base_url}{media_url_path}"
+
+            if audio_segment.channel_id not in channel_requests:
+                settings = ValidationUtils.validate_settings_exist(audio_segment.channel)
+                if not settings.revai_access_token:
+                    raise ValidationError(f"Rev.ai API key not configured for channel {audio_segment.channel} in GeneralSetting")
+                channel_requests[audio_segment.channel_id] = (settings.revai_access_token, settings)
+            api_key, settings = channel_requests[audio_segment.channel_id]
+            headers, data = RevAISpeechToText.build_job_request(media_url, api_key, settings)
+            submissions.append((audio_segment, media_url_path, api_key, headers, data))
+
+        if not submissions:
+            return []
+
+        max_workers = max(1, min(django_settings.REV_AI_SUBMIT_MAX_WORKERS, len(submissions)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(
+                lambda submission: RevAISpeechToText._submit_job(*submission[2:]),
+                submissions,
+            ))
+
+        jobs = []
+        for (audio_segment, media_url_path, _, _, _), api_response in zip(submissions, responses):
+            if api_response is None:
                 continue
 
-            job_id = api_response.get("id")
-            job_name = api_response.get("name", "")
-            status = api_response.get("status", "")
             created_on_str = api_response.get("created_on", "")
-
             created_on_dt = None
             if created_on_str:
                 try:
@@ -203,22 +212,74 @@ class RevAISpeechToText:
             else:
                 created_on_dt = timezone.now()
 
-            try:
-                job = RevTranscriptionJob(
-                    job_id=job_id,
-                    job_name=job_name,
-                    media_url=media_url_path,
-                    status=status,
-                    created_on=created_on_dt,
-                    audio_segment=audio_segment,
-                    retry_count=0,
-                )
-                job.save()
-                created_jobs.append(job)
-            except Exception:
-                continue
+            jobs.append(RevTranscriptionJob(
+                job_id=api_response.get("id"),
+                job_name=api_response.get("name", ""),
+                media_url=media_url_path,
+                status=api_response.get("status", ""),
+                created_on=created_on_dt,
+                audio_segment=audio_segment,
+                retry_count=0,
+            ))
 
-        return created_jobs
+        try:
+            return RevTranscriptionJob.objects.bulk_create(jobs, batch_size=500)
+        except Exception as e:
+            print(f"Bulk insert of RevTranscriptionJob rows failed ({e}), saving one by one")
+            created_jobs = []
+            for job in jobs:
+                try:
+                    job.save()
+                    created_jobs.append(job)
+                except Exception:
+                    continue
+            return created_jobs
+
+    @staticmethod
+    def _queue_analysis_for_existing_detail(audio_segment: AudioSegments, existing_detail: TranscriptionDetail):
+        if audio_segment.is_analysis_completed:
+            print(
+                f"Skipping segment {audio_segment.id} - TranscriptionDetail exists and analysis completed"
+            )
+            return
+        job = existing_detail.rev_job
+        if job and job.status == "transcribed":
+            from data_analysis.tasks import analyze_transcription_task
+
+            media_url = job.media_url
+            parsed_url = urlparse(str(media_url))
+            analyze_transcription_task.delay(job.pk, parsed_url.path, media_url)
+            print(
+                f"Queued analysis for segment {audio_segment.id} "
+                f"(TranscriptionDetail exists, analysis not completed)"
+            )
+        else:
+            print(
+                f"Skipping segment {audio_segment.id} - TranscriptionDetail exists but "
+                f"cannot analyze (job status={getattr(job, 'status', None)})"
+            )
+
+    @staticmethod
+    def _submit_job(api_key: str, headers: dict, data: dict) -> Optional[dict]:
+        """POST one job through the account's shared session, waiting on its rate limiter. None on request errors."""
+        limiter = TokenBucket.for_key(
+            ("revai", headers["Authorization"]),
+            rate=django_settings.REV_AI_SUBMIT_RATE_PER_SECOND,
+            capacity=django_settings.REV_AI_SUBMIT_BURST,
+        )
+        limiter.acquire()
+        try:
+            response = APIClientRegistry.get_session("revai", api_key).post(
+                RevAISpeechToText.JOBS_URL,
+                headers=headers,
+                json=data,
+                timeout=django_settings.REV_AI_REQUEST_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            print(f"Failed to create Rev.ai job for {data.get('media_url')}: {e}")
+            return None
 
     @staticmethod
     def get_transcript_by_job_id(revid: RevTranscriptionJob, media_path: str, media_url: Optional[str] = None):
@@ -243,33 +304,36 @@ class RevAISpeechToText:
             media_path = media_path[4:]  # Remove 'api' prefix
                 
         api_key = ValidationUtils.validate_revai_api_key(revid.audio_segment.channel)
-        url = f"https://api.rev.ai/speechtotext/v1/jobs/{revid.job_id}/transcript"
+        url = f"{RevAISpeechToText.JOBS_URL}/{revid.job_id}/transcript"
         headers = {
             "Authorization": f"Bearer {api_key}",
             # "Accept": "application/json",
             "Accept":"text/plain"
         }
-        response = requests.get(url, headers=headers)
+        response = APIClientRegistry.request("revai", "GET", url, api_key=api_key, headers=headers)
         response.raise_for_status()
         transcript = response.text
 
-        # Find the AudioSegments object by file_path, or audio_url if media_url is provided
-        try:
-            if media_url:
-                audio_segments = AudioSegments.objects.filter(Q(file_path=media_path) | Q(audio_url=media_url))
-            else:
-                audio_segments = AudioSegments.objects.filter(file_path=media_path)
-            if not audio_segments.exists():
-                search_paths = f"file_path={media_path}" + (f", audio_url={media_url}" if media_url else "")
-                raise ValueError(f"AudioSegments not found with: {search_paths}")
-            
-            # Log warning if multiple segments found with same file_path
-            if audio_segments.count() > 1:
-                print(f"Warning: Found {audio_segments.count()} AudioSegments with file_path {media_path}. Using the first one (ID: {audio_segments.first().id})")
-            
-            audio_segment = audio_segments.first()
-        except Exception as e:
-            raise ValueError(f"Error finding AudioSegments with file_path {media_path}: {str(e)}")
+        # Use the segment linked to the job; older jobs without the link are matched by file_path / audio_url
+        audio_segment = revid.audio_segment if revid.audio_segment_id else None
+        if audio_segment is None:
+            try:
+                if media_url:
+                    audio_segments = AudioSegments.objects.filter(Q(file_path=media_path) | Q(audio_url=media_url))
+                else:
+                    audio_segments = AudioSegments.objects.filter(file_path=media_path)
+                matches = list(audio_segments.order_by('pk')[:2])
+                if not matches:
+                    search_paths = f"file_path={media_path}" + (f", audio_url={media_url}" if media_url else "")
+                    raise ValueError(f"AudioSegments not found with: {search_paths}")
+                
+                # Log warning if multiple segments found with same file_path
+                if len(matches) > 1:
+                    print(f"Warning: Found multiple AudioSegments with file_path {media_path}. Using the first one (ID: {matches[0].id})")
+                
+                audio_segment = matches[0]
+            except Exception as e:
+                raise ValueError(f"Error finding AudioSegments with file_path {media_path}: {str(e)}")
 
         # Check for existing TranscriptionDetail by audio_segment and rev_job
         from django.core.exceptions import ObjectDoesNotExist
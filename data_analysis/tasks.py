@@ -1,4 +1,5 @@
 from celery import shared_task
+from django.conf import settings as django_settings
 from datetime import datetime, timedelta
 import logging
 
@@ -7,7 +8,13 @@ from data_analysis.services.transcription_analyzer import TranscriptionAnalyzer
 from data_analysis.services.transcription_service import RevAISpeechToText
 from data_analysis.services.audio_segments import AudioSegments
 from data_analysis.services.audio_download import ACRCloudAudioDownloader
-from data_analysis.models import RevTranscriptionJob, AudioSegments as AudioSegmentsModel 
+from data_analysis.services.batch_analysis import BatchAnalysisService
+from data_analysis.services.ingestion_cursor import ACRIngestionCursorService
+from data_analysis.services.llm_cache import LLMResponseCache
+from data_analysis.services.rev_callbacks import RevCallbackInboxService
+from data_analysis.services.rev_reconciliation import RevJobReconciliationService
+from data_analysis.services.segment_flags import SegmentFlagService
+from data_analysis.models import AnalysisBatch, RevTranscriptionJob, AudioSegments as AudioSegmentsModel 
 from core_admin.models import Channel
 from core_admin.repositories import GeneralSettingService
 
@@ -18,8 +25,14 @@ logger = logging.getLogger(__name__)
 @shared_task
 def analyze_transcription_task(job_id, media_url_path, media_url=None):
     try:
-        job = RevTranscriptionJob.objects.get(pk=job_id)
+        job = RevTranscriptionJob.objects.select_related('audio_segment__channel').get(pk=job_id)
         transcription_detail = RevAISpeechToText.get_transcript_by_job_id(job, media_url_path, media_url)
+
+        # Backfill transcriptions are analysed by the Batch API pipeline instead
+        if BatchAnalysisService.should_defer(transcription_detail):
+            print(f"Deferred analysis for job {job_id} to batch analysis")
+            return True
+
         TranscriptionAnalyzer.analyze_transcription(transcription_detail)
         
         # Set is_analysis_completed = True on the AudioSegments object
@@ -36,19 +49,25 @@ def analyze_transcription_task(job_id, media_url_path, media_url=None):
         # Don't raise the error, just log it and return False
         return False
 
-def _handle_channel_processing(channel: Channel | int, segments_data):
+def _handle_channel_processing(channel: Channel | int, segments_data, cursor=None):
     """
     Core logic to process audio segments for a channel.
     Extracted to be shared by both Today and Previous Day tasks.
+
+    When an ingestion cursor is given (hourly path), segments_data must already be limited to
+    results after the cursor; the cursor is advanced once the new results are stored.
     """
     if not segments_data or not segments_data.get('data'):
         logger.info(f"No data found for channel {channel.id}")
         return 0
 
     # Step 2: Process the audio data
-    processed_segments = AudioSegments.process_audio_data(segments_data['data'], channel)
+    previous_segment = ACRIngestionCursorService.get_boundary_segment(cursor)
+    processed_segments = AudioSegments.process_audio_data(segments_data['data'], channel, previous_segment=previous_segment)
     if not processed_segments:
         logger.info(f"No segments processed for channel {channel.id}")
+        if cursor:
+            ACRIngestionCursorService.advance(cursor, segments_data['data'], processed_segments)
         return 0
 
     # Step 3: Insert and Merge
@@ -56,6 +75,8 @@ def _handle_channel_processing(channel: Channel | int, segments_data):
     inserted_segments = AudioSegments._merge_short_recognized_segments(inserted_segments, channel)
 
     if not inserted_segments:
+        if cursor:
+            ACRIngestionCursorService.advance(cursor, segments_data['data'], processed_segments)
         return 0
 
     download_results = ACRCloudAudioDownloader.download_audio_segments_batch(inserted_segments, channel)
@@ -83,6 +104,9 @@ def _handle_channel_processing(channel: Channel | int, segments_data):
     logger.info(f"Creating transcription jobs for {len(marked_segments)} segments")
     transcription_jobs = RevAISpeechToText.create_and_save_transcription_job_v2(marked_segments)
     logger.info(f"Created {len(transcription_jobs)} transcription jobs")
+
+    if cursor:
+        ACRIngestionCursorService.advance(cursor, segments_data['data'], processed_segments)
     
     return len(inserted_segments)
 
@@ -97,17 +121,21 @@ def process_channel_task(self, channel_id, date_str=None, is_today=False):
     """
     try:
         channel = Channel.objects.get(pk=channel_id)
+        cursor = None
         
         if is_today:
             segments_data = AudioSegments.get_today_data_excluding_last_hour(
                 channel.project_id, channel.channel_id
             )
+            # Only process results recorded after the previous hourly run
+            cursor = ACRIngestionCursorService.get_cursor(channel)
+            segments_data = ACRIngestionCursorService.filter_new_results(segments_data, cursor)
         else:
             segments_data = AudioSegments.fetch_data(
                 channel.project_id, channel.channel_id, date=date_str
             )
 
-        count = _handle_channel_processing(channel, segments_data)
+        count = _handle_channel_processing(channel, segments_data, cursor=cursor)
         
         return {
             'channel_id': channel_id,
@@ -119,6 +147,84 @@ def process_channel_task(self, channel_id, date_str=None, is_today=False):
         return {'channel_id': channel_id, 'status': 'error', 'message': str(e)}
 
 
+# --- Batch API analysis (non-urgent path) ---
+
+@shared_task
+def submit_analysis_batches_task():
+    """ Submits one OpenAI analysis batch per channel with pending transcriptions. """
+    if not django_settings.ANALYSIS_BATCH_ENABLED:
+        return {'status': 'disabled'}
+
+    submitted = []
+    channels = Channel.objects.filter(is_deleted=False, is_active=True)
+    for channel in channels:
+        try:
+            batch = BatchAnalysisService.submit_channel_batch(channel)
+            if batch:
+                submitted.append(batch.batch_id)
+        except Exception as e:
+            logger.error(f"Error submitting analysis batch for channel {channel.id}: {str(e)}", exc_info=True)
+    return {'status': 'success', 'batches_submitted': submitted}
+
+
+@shared_task
+def poll_analysis_batches_task():
+    """ Polls open analysis batches and ingests the completed ones. """
+    batches = AnalysisBatch.objects.filter(status__in=AnalysisBatch.ACTIVE_STATUSES).select_related('channel')
+    results = {}
+    for batch in batches:
+        try:
+            results[batch.batch_id] = BatchAnalysisService.poll_batch(batch).status
+        except Exception as e:
+            logger.error(f"Error polling analysis batch {batch.batch_id}: {str(e)}", exc_info=True)
+            results[batch.batch_id] = 'error'
+    return results
+
+
+@shared_task
+def prune_llm_response_cache_task():
+    """ Removes expired and least recently used LLM response cache rows. """
+    result = LLMResponseCache.prune()
+    logger.info(f"Pruned LLM response cache: {result}")
+    return result
+
+
+@shared_task
+def process_rev_callbacks_task():
+    """ Applies stored Rev.ai callbacks in batches until the inbox is drained. """
+    totals = {'claimed': 0, 'jobs': 0, 'queued': 0, 'failed': 0}
+    while True:
+        result = RevCallbackInboxService.process_pending()
+        for key in totals:
+            totals[key] += result[key]
+        if result['claimed'] < django_settings.REV_CALLBACK_BATCH_SIZE:
+            break
+    if totals['claimed']:
+        logger.info(f"Processed Rev callbacks: {totals}")
+    return totals
+
+
+@shared_task
+def reconcile_rev_jobs_task():
+    """ Polls Rev.ai for jobs whose callback never arrived and reports the open job backlog. """
+    result = RevJobReconciliationService.reconcile()
+    if result['polled']:
+        logger.info(f"Reconciled Rev jobs: {result}")
+    if result['open_jobs'] and result['oldest_open_job_age_seconds'] > django_settings.REV_RECONCILE_MIN_AGE_SECONDS:
+        logger.warning(
+            f"Rev backlog: {result['open_jobs']} open jobs, oldest {result['oldest_open_job_age_seconds']}s old"
+        )
+    return result
+
+
+@shared_task
+def recompute_segment_flags_task(channel_id):
+    """ Rewrites the channel's stored flag results after its FlagCondition changed. """
+    written = SegmentFlagService.recompute_channel(channel_id)
+    logger.info(f"Recomputed {written} segment flag results for channel {channel_id}")
+    return written
+
+
 # --- Channel settings validation (for broadcast pipeline) ---
 
 # GeneralSetting fields required for broadcast audio pipeline; if any is missing/empty, channel is deactivated
@@ -147,9 +253,7 @@ def deactivate_channels_without_valid_settings():
     )
     valid_channels = []
     for channel in channels:
-        settings = GeneralSettingService.get_active_setting(
-            channel=channel, include_buckets=False
-        )
+        settings = GeneralSettingService.get_settings_snapshot(channel)
         if not settings:
             logger.warning(
                 "Channel id=%s has no active GeneralSetting; deactivating.", channel.id
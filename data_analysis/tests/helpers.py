@@ -0,0 +1,380 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from unittest.mock import patch
+
+from core_admin.models import Channel, GeneralSetting
+from core_admin.repositories import GeneralSettingSnapshotCache
+from data_analysis.models import AudioSegments, RevTranscriptionJob, TranscriptionDetail
+from data_analysis.services.audio_download import ACRCloudAudioDownloader
+from data_analysis.services.mp3_splitter import MP3FrameSplitter
+from data_analysis.services.transcription_service import RevAISpeechToText
+
+
+class AnalysisFixtureMixin:
+    """Shared channel / settings / segment fixtures for data_analysis tests"""
+
+    def create_channel(self, name="Test Channel", channel_id=1, project_id=1):
+        return Channel.objects.create(
+            name=name,
+            channel_type='broadcast',
+            channel_id=channel_id,
+            project_id=project_id,
+        )
+
+    def create_settings(self, channel, **overrides):
+        values = dict(
+            channel=channel,
+            openai_api_key='sk-test',
+            openai_org_id='org',
+            summarize_transcript_prompt='summarize',
+            sentiment_analysis_prompt='sentiment',
+            general_topics_prompt='general topics',
+            iab_topics_prompt='iab topics',
+            determine_radio_content_type_prompt='classify {{segments}}',
+            content_type_prompt='Commercial, News',
+            is_active=True,
+        )
+        values.update(overrides)
+        setting = GeneralSetting.objects.create(**values)
+        # Rows created outside create_new_version do not move the snapshot cache pointer
+        GeneralSettingSnapshotCache.invalidate(channel.id)
+        return setting
+
+    def create_segment(self, channel, start_time, duration=60, **overrides):
+        values = dict(
+            channel=channel,
+            start_time=start_time,
+            end_time=start_time + timedelta(seconds=duration),
+            duration_seconds=duration,
+            file_name=f"audio_{int(start_time.timestamp())}_{duration}.mp3",
+            file_path=f"media/{start_time:%Y%m%d}/audio_{int(start_time.timestamp())}_{duration}.mp3",
+            audio_location_type='file_path',
+            is_recognized=True,
+            title='Song',
+        )
+        values.update(overrides)
+        return AudioSegments.objects.create(**values)
+
+    def create_transcription(self, segment, transcript='hello world', job_id=None):
+        rev_job = RevTranscriptionJob.objects.create(
+            job_id=job_id or f"job-{segment.id}",
+            job_name=segment.file_name,
+            media_url=f"https://example.com/{segment.file_path}",
+            status='transcribed',
+            created_on=segment.start_time,
+            audio_segment=segment,
+        )
+        return TranscriptionDetail.objects.create(audio_segment=segment, rev_job=rev_job, transcript=transcript)
+
+
+def fake_completion(client, settings, system_prompt, user_prompt, max_tokens=0):
+    return f"{system_prompt}|{max_tokens}"
+
+
+class StubOpenAIBatchServer:
+    """
+    Minimal local stand-in for the OpenAI Files and Batches endpoints.
+    Every request in an uploaded batch file gets the answer "<field> for <transcription_detail_id>",
+    except custom_ids listed in failing_custom_ids which come back as errors and fields listed in
+    empty_fields which are answered with an empty string.
+    """
+
+    def __init__(self, failing_custom_ids=(), empty_fields=()):
+        self.files = {}
+        self.batches = {}
+        self.failing_custom_ids = set(failing_custom_ids)
+        self.empty_fields = set(empty_fields)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload, content_type='application/json'):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if self.path == '/v1/files':
+                    message = BytesParser().parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+                    )
+                    content = next(
+                        part.get_payload(decode=True) for part in message.get_payload()
+                        if part.get_param('name', header='content-disposition') == 'file'
+                    )
+                    self._send(stub._add_file(content))
+                elif self.path == '/v1/batches':
+                    request = json.loads(body)
+                    batch_id = f"batch_{len(stub.batches) + 1}"
+                    stub.batches[batch_id] = request['input_file_id']
+                    self._send(stub._batch_payload(batch_id, 'validating'))
+
+            def do_GET(self):
+                if self.path.startswith('/v1/batches/'):
+                    batch_id = self.path.rsplit('/', 1)[-1]
+                    output = stub._build_output(stub.files[stub.batches[batch_id]])
+                    output_file = stub._add_file(output)
+                    self._send(stub._batch_payload(batch_id, 'completed', output_file['id']))
+                elif self.path.startswith('/v1/files/') and self.path.endswith('/content'):
+                    file_id = self.path.split('/')[3]
+                    self._send(stub.files[file_id], content_type='application/jsonl')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def _add_file(self, content):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = content
+        return {
+            'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': 0,
+            'filename': f"{file_id}.jsonl", 'purpose': 'batch', 'status': 'processed',
+        }
+
+    def _batch_payload(self, batch_id, status, output_file_id=None):
+        return {
+            'id': batch_id, 'object': 'batch', 'endpoint': '/v1/chat/completions',
+            'input_file_id': self.batches[batch_id], 'completion_window': '24h',
+            'status': status, 'created_at': 0, 'output_file_id': output_file_id,
+        }
+
+    def _build_output(self, input_content):
+        lines = []
+        for line in input_content.decode().splitlines():
+            request = json.loads(line)
+            custom_id = request['custom_id']
+            if custom_id in self.failing_custom_ids:
+                lines.append(json.dumps({'custom_id': custom_id, 'response': None, 'error': {'code': 'server_error'}}))
+                continue
+            detail_id, field = custom_id.split(':')
+            content = "" if field in self.empty_fields else f" {field} for {detail_id} "
+            lines.append(json.dumps({
+                'custom_id': custom_id,
+                'response': {'status_code': 200, 'body': {'choices': [{'message': {'content': content}}]}},
+                'error': None,
+            }))
+        return "\n".join(lines).encode()
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def acr_result(start, duration, title, record_offset=30):
+    """ACRCloud result item as returned by the results endpoint"""
+    record_time = start + timedelta(seconds=duration + record_offset)
+    return {
+        'metadata': {
+            'timestamp_utc': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'record_timestamp': record_time.strftime('%Y%m%d%H%M%S'),
+            'played_duration': duration,
+            'music': [{'title': title}],
+        }
+    }
+
+
+# MPEG1 layer III, 128 kbps, 44.1 kHz, no padding: 417 byte frames of 1152 samples
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x00"
+
+
+MP3_FRAME_LENGTH = 417
+
+
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def synthetic_mp3(seconds, first_frame=0, with_tags=True):
+    """Constant bitrate MP3 byte stream whose frames carry their index, optionally with ID3v2 and Xing frames"""
+    frame_count = round(seconds / MP3_FRAME_SECONDS)
+    body = b"".join(
+        MP3_FRAME_HEADER + (first_frame + i).to_bytes(4, 'big') + bytes(MP3_FRAME_LENGTH - 8)
+        for i in range(frame_count)
+    )
+    if not with_tags:
+        return body
+    id3 = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10)
+    xing = MP3_FRAME_HEADER + bytes(32) + b"Xing" + bytes(MP3_FRAME_LENGTH - 40)
+    return id3 + xing + body
+
+
+def frame_indexes(data):
+    return [int.from_bytes(data[frame.offset + 4:frame.offset + 8], 'big') for frame in MP3FrameSplitter.parse_frames(data)]
+
+
+class StubACRRecordingServer:
+    """
+    Local stand-in for the ACRCloud recordings endpoint.
+    Answers with a body derived from the query string; timestamps in flaky_timestamps fail with
+    a 503 on their first request and timestamps in missing_timestamps always return 404.
+    """
+
+    def __init__(self, flaky_timestamps=(), missing_timestamps=(), mp3=False):
+        self.requests = []
+        self.mp3 = mp3
+        self.flaky_timestamps = set(flaky_timestamps)
+        self.missing_timestamps = set(missing_timestamps)
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                timestamp = query.get('timestamp_utc')
+                with stub.lock:
+                    stub.requests.append((urlparse(self.path).path, query, self.headers.get('Authorization')))
+                    flaky = timestamp in stub.flaky_timestamps
+                    stub.flaky_timestamps.discard(timestamp)
+                if flaky or timestamp in stub.missing_timestamps:
+                    status, body = (503 if flaky else 404), b''
+                else:
+                    status, body = 200, (stub.mp3_for(query) if stub.mp3 else stub.body_for(query))
+                self.send_response(status)
+                self.send_header('Content-Type', 'audio/mpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = (
+            f"http://127.0.0.1:{self.server.server_address[1]}"
+            "/api/bm-bd-projects/{pid}/channels/{channel_id}/recordings"
+        )
+
+    @staticmethod
+    def body_for(query):
+        return f"{query.get('timestamp_utc')}:{query.get('played_duration')}:{query.get('record_after', '')}".encode() * 1000
+
+    @staticmethod
+    def mp3_for(query):
+        seconds = int(query.get('played_duration')) + int(query.get('record_after') or 0)
+        return synthetic_mp3(seconds, first_frame=int(query.get('timestamp_utc')[-4:]))
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.patcher = patch.object(ACRCloudAudioDownloader, 'BASE_URL', self.base_url)
+        self.patcher.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ACRDownloadFixtureMixin(AnalysisFixtureMixin):
+    """Channel with an ACRCloud key and segments whose files live in a temporary media directory"""
+
+    def setUp(self):
+        self.channel = self.create_channel(channel_id=77, project_id=5)
+        self.create_settings(self.channel, acr_cloud_api_key='acr-token')
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def _segment(self, offset_minutes, duration=60, **overrides):
+        start = self.start + timedelta(minutes=offset_minutes)
+        return self.create_segment(
+            self.channel, start, duration,
+            file_path=os.path.join(self.media_dir, f"audio_{offset_minutes}.mp3"),
+            is_recognized=False,
+            **overrides,
+        )
+
+
+class StubRevAIServer:
+    """
+    Local stand-in for the Rev.ai jobs endpoint; media URLs listed in failing_media_urls get a 500.
+    GET serves job_states (job id -> job json) and transcripts (job id -> text); unknown ids get a 404.
+    """
+
+    def __init__(self, failing_media_urls=(), job_states=None, transcripts=None):
+        self.jobs = []
+        self.polls = []
+        self.client_addresses = set()
+        self.failing_media_urls = set(failing_media_urls)
+        self.job_states = job_states or {}
+        self.transcripts = transcripts or {}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if request['media_url'] in stub.failing_media_urls:
+                    self._send(500, {'title': 'error'})
+                    return
+                with stub.lock:
+                    stub.jobs.append((request, self.headers.get('Authorization')))
+                    job_id = f"rev-{len(stub.jobs)}"
+                self._send(200, {'id': job_id, 'name': 'job', 'status': 'in_progress', 'created_on': '2025-01-01T10:00:00Z'})
+
+            def do_GET(self):
+                parts = self.path.rstrip('/').split('/')
+                if parts[-1] == 'transcript' and parts[-2] in stub.transcripts:
+                    body = stub.transcripts[parts[-2]].encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                with stub.lock:
+                    stub.polls.append(parts[-1])
+                    stub.client_addresses.add(self.client_address)
+                if parts[-1] in stub.job_states:
+                    self._send(200, stub.job_states[parts[-1]])
+                else:
+                    self._send(404, {'title': 'could not find job'})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.jobs_url = f"http://127.0.0.1:{self.server.server_address[1]}/speechtotext/v1/jobs"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.patchers = [
+            patch.object(RevAISpeechToText, 'JOBS_URL', self.jobs_url),
+            patch.dict(os.environ, {'PUBLIC_BASE_URL': 'https://radio.example.com'}),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        return self
+
+    def __exit__(self, *exc):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,143 @@
+import io
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from audio_filter.utils import AudioSegmentFilterV3Utils
+from audio_policy.flag_matcher import CompiledFlagCondition
+from audio_policy.models import FlagCondition
+from core_admin.models import WellnessBucket
+from dashboard.v1.serializer import _get_shift_analytics_data
+from dashboard.v2.service.BucketCountService import BucketCountService
+from dashboard.v2.service.TopicService import TopicService
+from data_analysis.models import AnalysisTopic, AudioSegments, GeneralTopic, TranscriptionAnalysis
+from data_analysis.services.analysis_fields import parse_bucket_prompt, parse_sentiment_score, parse_topics
+from data_analysis.services.segment_flags import SegmentFlagService
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class AnalysisParsedFieldsTestCase(AnalysisFixtureMixin, TestCase):
+    """Sentiment score, topics and buckets parsed at write time and aggregated in SQL by the dashboards"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.setting = self.create_settings(self.channel)
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.segments = []
+        for i, (duration, sentiment, topics, buckets) in enumerate([
+            (60, '80', '1. Funding\n2. Weather\nundefined', 'FUN, 85, RELATIONSHIPS, 75'),
+            (120, ' 40% ', 'Funding\n3 Local News\n4', 'Output: MENTAL, 90%, undefined, 0%'),
+            (30, 'Neutral', 'undefined', ''),
+        ]):
+            segment = self.create_segment(self.channel, self.start + timedelta(minutes=5 * i), duration=duration)
+            detail = self.create_transcription(segment)
+            TranscriptionAnalysis.objects.create(
+                transcription_detail=detail, summary='summary', sentiment=sentiment,
+                general_topics=topics, iab_topics='', bucket_prompt=buckets,
+            )
+            self.segments.append(segment)
+        self.analyses = list(TranscriptionAnalysis.objects.order_by('id'))
+
+    def stored_topics(self):
+        return {
+            analysis.id: list(analysis.topics.values_list('topic_name', flat=True)) for analysis in self.analyses
+        }
+
+    def test_parsers(self):
+        self.assertEqual(
+            [parse_sentiment_score(v) for v in ['75', ' 82.5% ', '-3', '+4', 'Neutral', 'Sentiment: 50', '', None, 'nan', 7]],
+            [75.0, 82.5, -3.0, 4.0, None, None, None, None, None, 7.0],
+        )
+        self.assertEqual(parse_topics('1. Funding  \n2 Radio Station\nMusic\n3\nNULL\nMusic'), ['Funding', 'Radio Station', 'Music'])
+        self.assertEqual(parse_topics('undefined'), [])
+        self.assertEqual(parse_bucket_prompt('RELATIONSHIPS, 90%, fun  times, 85%'), ('RELATIONSHIPS', 'FUN TIMES'))
+        self.assertEqual(parse_bucket_prompt('Empty Result\nFAITH, 10, undefined, 0\nx, 1, MENTAL, 2'), ('FAITH', 'MENTAL'))
+        self.assertEqual(parse_bucket_prompt('FUN, 85'), (None, None))
+
+    def test_columns_filled_on_save_and_by_backfill(self):
+        self.assertEqual([a.sentiment_score for a in self.analyses], [80.0, 40.0, None])
+        self.assertEqual(
+            [(a.bucket_primary, a.bucket_secondary) for a in self.analyses],
+            [('FUN', 'RELATIONSHIPS'), ('MENTAL', None), (None, None)],
+        )
+        expected_topics = {
+            self.analyses[0].id: ['Funding', 'Weather'],
+            self.analyses[1].id: ['Funding', 'Local News'],
+            self.analyses[2].id: [],
+        }
+        self.assertEqual(self.stored_topics(), expected_topics)
+
+        analysis = self.analyses[2]
+        analysis.sentiment = '55'
+        analysis.general_topics = 'Sports'
+        analysis.save(update_fields=['sentiment', 'general_topics'])
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.sentiment_score, 55.0)
+        self.assertEqual(list(analysis.topics.values_list('topic_name', flat=True)), ['Sports'])
+        expected_topics[analysis.id] = ['Sports']
+
+        # Rows written before the columns existed: queryset updates bypass save()
+        TranscriptionAnalysis.objects.update(sentiment_score=None, bucket_primary=None, bucket_secondary=None)
+        AnalysisTopic.objects.all().delete()
+        call_command('backfill_analysis_fields', chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(
+            list(TranscriptionAnalysis.objects.order_by('id').values_list('sentiment_score', 'bucket_primary')),
+            [(80.0, 'FUN'), (40.0, 'MENTAL'), (55.0, None)],
+        )
+        self.assertEqual(self.stored_topics(), expected_topics)
+
+    def test_dashboard_aggregations_read_parsed_columns(self):
+        GeneralTopic.objects.create(topic_name='weather', channel=self.channel)
+        end = self.start + timedelta(hours=1)
+        result = TopicService.get_topics_with_both_metrics(self.start, end, channel_id=self.channel.id)
+        self.assertEqual(
+            [(t['topic_name'], t['count'], t['total_duration_seconds']) for t in result['top_topics']],
+            [('Funding', 2, 180), ('Local News', 1, 120)],
+        )
+        all_topics = TopicService.get_topics_with_both_metrics(
+            self.start, end, channel_id=self.channel.id, show_all_topics=True
+        )
+        self.assertEqual(all_topics['total_topics'], 3)
+
+        segments = AudioSegments.objects.filter(channel=self.channel)
+        self.assertEqual(TopicService.get_queryset_average_sentiment(segments), round((80 * 60 + 40 * 120) / 180, 3))
+        self.assertEqual(
+            TopicService.get_queryset_average_sentiment(segments),
+            TopicService.get_average_sentiment(list(segments.select_related('transcription_detail__analysis'))),
+        )
+
+        filtered = AudioSegmentFilterV3Utils.filter_segments(segments, {'sentiment_min': 50})
+        self.assertEqual([seg.id for seg in filtered], [self.segments[0].id])
+
+        for title, category in [('FUN', 'personal'), ('RELATIONSHIPS', 'community'), ('MENTAL', 'spiritual')]:
+            WellnessBucket.objects.create(general_setting=self.setting, title=title, description='', category=category)
+        counts = BucketCountService.get_bucket_counts(self.start, end, channel_id=self.channel.id)
+        self.assertEqual(
+            {key: counts[key]['count'] for key in ('personal', 'community', 'spiritual')},
+            {'personal': 1, 'community': 1, 'spiritual': 1},
+        )
+        spiritual = BucketCountService.get_category_bucket_counts(self.start, end, 'spiritual', channel_id=self.channel.id)
+        self.assertEqual(spiritual['buckets']['MENTAL']['duration_seconds'], 120)
+
+    def test_shift_analytics_count_topics_in_one_query(self):
+        topic_table = AnalysisTopic._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            data = _get_shift_analytics_data(self.start, self.start + timedelta(hours=1), self.channel.id, show_all_topics=True)
+        self.assertEqual(sum(topic_table in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual(
+            {row['topic']: row['count'] for row in data['topTopicsByShift']['morning']},
+            {'Funding': 2, 'Weather': 1, 'Local News': 1},
+        )
+        self.assertEqual(data['topTopicsByShift']['night'], [])
+
+    def test_flag_check_uses_stored_score(self):
+        condition = FlagCondition(channel=self.channel, sentiment_min_lower=35, sentiment_min_upper=45)
+        compiled = CompiledFlagCondition(condition)
+        self.assertTrue(compiled.evaluate({}, {'sentiment': 'forty', 'sentiment_score': 40.0})['sentiment']['flagged'])
+        # Without a stored score the first number of the text is used, as before
+        self.assertTrue(compiled.evaluate({}, {'sentiment': 'Sentiment: 40'})['sentiment']['flagged'])
+        detail = self.segments[1].transcription_detail
+        self.assertEqual(SegmentFlagService.flag_inputs(detail)[1]['sentiment_score'], 40.0)
@@ -0,0 +1,76 @@
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.test import TestCase
+
+from segmentor.models import AudioUnrecognizedCategory, TitleMappingRule
+from shift_analysis.models import Shift
+from data_analysis.models import AudioSegments
+from data_analysis.services.analysis_prereq_check import clear_channel_rules_cache, mark_requires_analysis
+from data_analysis.benchmarks.requires_analysis import (
+    build_synthetic_rules, build_synthetic_segments as build_synthetic_segment_dicts, run_compiled, run_reference,
+)
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class MarkRequiresAnalysisTestCase(AnalysisFixtureMixin, TestCase):
+    """Compiled per-channel rules: same annotation as the original loops, rules cached, renames in bulk"""
+
+    def setUp(self):
+        clear_channel_rules_cache()
+        self.channel = self.create_channel()
+        self.channel.timezone = 'UTC'
+        self.channel.save()
+        self.start = datetime(2025, 1, 6, 9, 0, tzinfo=dt_timezone.utc)  # Monday
+        Shift.objects.create(
+            name='Day', channel=self.channel, start_time=dt_time(8, 0), end_time=dt_time(12, 0), days='monday,tuesday'
+        )
+        category = AudioUnrecognizedCategory.objects.create(name='News', channel=self.channel)
+        TitleMappingRule.objects.create(category=category, before_title='Intro', after_title='Outro')
+
+    def segment_dicts(self, segments):
+        return [
+            {
+                'id': segment.id, 'channel_id': self.channel.id, 'title': segment.title,
+                'start_time': segment.start_time.isoformat(), 'end_time': segment.end_time.isoformat(),
+                'duration_seconds': segment.duration_seconds, 'is_recognized': segment.is_recognized,
+            }
+            for segment in segments
+        ]
+
+    def test_matches_reference_implementation(self):
+        for seed in range(5):
+            segments = build_synthetic_segment_dicts(count=1500, seed=seed)
+            rules = build_synthetic_rules(seed=seed)
+            self.assertEqual(run_compiled(segments, rules), run_reference(segments, rules))
+
+    def test_annotates_and_renames_in_bulk(self):
+        at = lambda minutes: self.start + timedelta(minutes=minutes)
+        layout = [
+            (0, 'Intro'), (1, 'Talk'), (2, 'Talk'), (4, 'Outro'), (6, 'Talk'),
+            (8, 'Intro'), (9, 'Talk'), (30, 'Talk'),
+            # Outside the 08:00-12:00 shift
+            (200, 'Talk'),
+        ]
+        segments = [
+            self.create_segment(self.channel, at(minutes), duration=60, title=title, is_recognized=False)
+            for minutes, title in layout
+        ]
+
+        # Rule and shift fingerprints, rules, shifts, current titles, bulk title update, deactivation
+        with self.assertNumQueries(7):
+            result = mark_requires_analysis(self.segment_dicts(segments))
+        self.assertEqual(
+            [seg['requires_analysis'] for seg in result],
+            [False, False, False, False, True, False, False, True, False],
+        )
+        self.assertEqual([seg['title'] for seg in result][:3], ['Intro', 'News', 'Talk'])
+        self.assertEqual(AudioSegments.objects.filter(title='News').count(), 2)
+        self.assertEqual(AudioSegments.objects.filter(is_active=False).count(), 7)
+
+        # Compiled rules are reused until a rule or shift changes; titles already match, so no rename write
+        with self.assertNumQueries(4):
+            mark_requires_analysis(self.segment_dicts(segments))
+        TitleMappingRule.objects.update(is_active=False)
+        result = mark_requires_analysis(self.segment_dicts(segments))
+        self.assertTrue(result[4]['requires_analysis'])
+        self.assertTrue(result[2]['requires_analysis'])
@@ -0,0 +1,109 @@
+import os
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+
+from core_admin.repositories import GeneralSettingService
+from data_analysis.models import AudioSegments
+from data_analysis.services.audio_download import ACRCloudAudioDownloader
+from data_analysis.services.mp3_splitter import MP3FrameSplitter
+from data_analysis.tests.helpers import (
+    MP3_FRAME_SECONDS, frame_indexes, StubACRRecordingServer, ACRDownloadFixtureMixin,
+)
+
+
+@override_settings(ACR_DOWNLOAD_MAX_WORKERS=4, ACR_DOWNLOAD_BACKOFF_SECONDS=0, ACR_DOWNLOAD_MAX_RETRIES=2)
+class ACRCloudAudioDownloaderBatchTestCase(ACRDownloadFixtureMixin, TestCase):
+    """Parallel batch download: streamed files, retries, and one bulk update of is_audio_downloaded"""
+
+    def test_downloads_in_parallel_and_bulk_updates(self):
+        segments = [self._segment(i) for i in range(12)]
+        segments.append(self._segment(30, duration=900))
+        already = self._segment(40, is_audio_downloaded=True)
+
+        # Settings come from the snapshot cache once it is warm
+        GeneralSettingService.get_settings_snapshot(self.channel)
+        with StubACRRecordingServer(flaky_timestamps={'20250101100300'}) as stub:
+            with self.assertNumQueries(2):
+                results = ACRCloudAudioDownloader.download_audio_segments_batch(segments + [already], self.channel)
+
+        self.assertEqual(len(results['success']), 13)
+        self.assertEqual(results['failed'], [])
+        self.assertEqual([item['segment_id'] for item in results['skipped']], [already.id])
+        # 13 downloads plus one retry of the flaky request
+        self.assertEqual(len(stub.requests), 14)
+        self.assertTrue(all(path == '/api/bm-bd-projects/5/channels/77/recordings' for path, _, _ in stub.requests))
+        self.assertTrue(all(auth == 'Bearer acr-token' for _, _, auth in stub.requests))
+
+        long_segment = segments[-1]
+        with open(long_segment.file_path, 'rb') as f:
+            self.assertEqual(f.read(), StubACRRecordingServer.body_for(
+                {'timestamp_utc': '20250101103000', 'played_duration': '600', 'record_after': '300'}
+            ))
+        self.assertEqual(sorted(os.listdir(self.media_dir)), sorted(f"audio_{i}.mp3" for i in list(range(12)) + [30]))
+        self.assertEqual(AudioSegments.objects.filter(channel=self.channel, is_audio_downloaded=True).count(), 14)
+
+    def test_failed_download_leaves_no_partial_file(self):
+        ok, missing = self._segment(0), self._segment(1)
+
+        with StubACRRecordingServer(missing_timestamps={'20250101100100'}):
+            results = ACRCloudAudioDownloader.download_audio_segments_batch([ok, missing], self.channel)
+
+        self.assertEqual([item['segment_id'] for item in results['success']], [ok.id])
+        self.assertEqual([item['segment_id'] for item in results['failed']], [missing.id])
+        self.assertEqual(os.listdir(self.media_dir), ['audio_0.mp3'])
+        missing.refresh_from_db()
+        self.assertFalse(missing.is_audio_downloaded)
+
+
+@override_settings(
+    ACR_DOWNLOAD_MAX_WORKERS=4, ACR_DOWNLOAD_BACKOFF_SECONDS=0, ACR_DOWNLOAD_WINDOW_MODE=True,
+    ACR_DOWNLOAD_WINDOW_MAX_SECONDS=1800, ACR_DOWNLOAD_WINDOW_MAX_GAP_SECONDS=2,
+)
+class ACRCloudWindowDownloadTestCase(ACRDownloadFixtureMixin, TestCase):
+    """Window mode: one recording per run of adjacent segments, sliced locally"""
+
+    def test_adjacent_segments_share_one_request(self):
+        # 10:00 - 10:20 in 40 one-minute or half-minute pieces, then an isolated segment at 11:00
+        segments = []
+        start = self.start
+        for i in range(40):
+            duration = 60 if i % 2 else 30
+            segments.append(self.create_segment(
+                self.channel, start, duration,
+                file_path=os.path.join(self.media_dir, f"run_{i}.mp3"), is_recognized=False,
+            ))
+            start += timedelta(seconds=duration)
+        isolated = self._segment(60)
+
+        with StubACRRecordingServer(mp3=True) as stub:
+            results = ACRCloudAudioDownloader.download_audio_segments_batch(segments + [isolated], self.channel)
+
+        self.assertEqual(results['failed'], [])
+        self.assertEqual(len(results['success']), 41)
+        windows = sorted((query['timestamp_utc'], query['played_duration'], query.get('record_after')) for _, query, _ in stub.requests)
+        self.assertEqual(windows, [('20250101100000', '600', '1200'), ('20250101110000', '60', None)])
+
+        # Slices are contiguous: every frame of the window lands in exactly one segment file
+        all_frames = []
+        for segment in segments:
+            with open(segment.file_path, 'rb') as f:
+                data = f.read()
+            self.assertAlmostEqual(MP3FrameSplitter.get_duration(data), segment.duration_seconds, delta=MP3_FRAME_SECONDS)
+            all_frames.extend(frame_indexes(data))
+        self.assertEqual(all_frames, list(range(all_frames[0], all_frames[0] + len(all_frames))))
+        self.assertEqual(len(all_frames), round(1800 / MP3_FRAME_SECONDS))
+        self.assertFalse([name for name in os.listdir(self.media_dir) if name.startswith('.')])
+        self.assertEqual(AudioSegments.objects.filter(channel=self.channel, is_audio_downloaded=True).count(), 41)
+
+    def test_unparseable_window_falls_back_to_single_downloads(self):
+        segments = [self._segment(0), self._segment(1)]
+
+        with StubACRRecordingServer() as stub:
+            results = ACRCloudAudioDownloader.download_audio_segments_batch(segments, self.channel)
+
+        self.assertEqual(len(results['success']), 2)
+        # One window attempt, then one request per segment
+        self.assertEqual(len(stub.requests), 3)
+        with open(segments[1].file_path, 'rb') as f:
+            self.assertEqual(f.read(), StubACRRecordingServer.body_for({'timestamp_utc': '20250101100100', 'played_duration': '60'}))
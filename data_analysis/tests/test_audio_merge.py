@@ -0,0 +1,75 @@
+import os
+from datetime import timedelta
+
+from django.test import TestCase
+
+from data_analysis.services.audio_merge import LocalAudioMerger
+from data_analysis.services.mp3_splitter import MP3FrameSplitter
+from data_analysis.tests.helpers import (
+    MP3_FRAME_SECONDS, synthetic_mp3, frame_indexes, StubACRRecordingServer, ACRDownloadFixtureMixin,
+)
+
+
+class LocalAudioMergerTestCase(ACRDownloadFixtureMixin, TestCase):
+    """Merged audio is built from local segment files; only uncovered gaps hit ACRCloud"""
+
+    def _local_segment(self, offset_seconds, duration, first_frame):
+        start = self.start + timedelta(seconds=offset_seconds)
+        segment = self.create_segment(
+            self.channel, start, duration,
+            file_path=os.path.join(self.media_dir, f"src_{offset_seconds}.mp3"),
+        )
+        with open(segment.file_path, 'wb') as f:
+            f.write(synthetic_mp3(duration, first_frame=first_frame))
+        return segment
+
+    def test_plan_prefers_longest_covering_source(self):
+        first = self._local_segment(0, 60, 0)
+        overlapping = self._local_segment(30, 90, 10000)
+        later = self._local_segment(180, 60, 20000)
+        at = lambda seconds: self.start + timedelta(seconds=seconds)
+
+        pieces = LocalAudioMerger.plan_pieces([first, overlapping, later], at(10), at(200))
+
+        self.assertEqual(
+            [(kind, source.id if source else None, start, end) for kind, source, start, end in pieces],
+            [
+                ('local', first.id, at(10), at(60)),
+                ('local', overlapping.id, at(60), at(120)),
+                ('gap', None, at(120), at(180)),
+                ('local', later.id, at(180), at(200)),
+            ],
+        )
+
+    def test_merge_concatenates_local_files_and_downloads_gaps(self):
+        self._local_segment(0, 60, 0)
+        self._local_segment(60, 60, 10000)
+        self._local_segment(180, 60, 20000)
+        # Listed in the database but missing on disk: treated as a gap
+        self.create_segment(self.channel, self.start + timedelta(seconds=120), 60,
+                            file_path=os.path.join(self.media_dir, 'missing.mp3'))
+        file_path = os.path.join(self.media_dir, 'merged.mp3')
+
+        with StubACRRecordingServer(mp3=True) as stub:
+            media_url = LocalAudioMerger.merge_to_file(
+                self.channel, self.start + timedelta(seconds=30), self.start + timedelta(seconds=240), file_path, 'acr-token'
+            )
+
+        self.assertEqual(media_url, '/api/media/merged.mp3')
+        self.assertEqual([query for _, query, _ in stub.requests], [{'timestamp_utc': '20250101100200', 'played_duration': '60'}])
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        self.assertAlmostEqual(MP3FrameSplitter.get_duration(data), 210, delta=2 * MP3_FRAME_SECONDS)
+        indexes = frame_indexes(data)
+        # Second half of the first file, all of the second, the downloaded gap, then the third file
+        self.assertEqual(indexes[0], round(30 / MP3_FRAME_SECONDS))
+        self.assertIn(10000, indexes)
+        self.assertIn(200, indexes)
+        self.assertEqual(indexes[-1], 20000 + round(60 / MP3_FRAME_SECONDS) - 1)
+
+    def test_no_local_sources_returns_none(self):
+        file_path = os.path.join(self.media_dir, 'merged.mp3')
+        self.assertIsNone(LocalAudioMerger.merge_to_file(
+            self.channel, self.start, self.start + timedelta(minutes=5), file_path, 'acr-token'
+        ))
+        self.assertFalse(os.path.exists(file_path))
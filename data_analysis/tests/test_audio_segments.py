@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from core_admin.models import Channel
+from logger.models import AudioSegmentEditLog
+from data_analysis.models import AudioSegments
+from data_analysis.services.audio_segments import AudioSegments as AudioSegmentsService, SegmentIntervalIndex
+from data_analysis.benchmarks.segment_merge import build_synthetic_segments, run_columnar_planner, run_sequential_planner
+from data_analysis.benchmarks.segment_overlap import build_synthetic_day, run_interval_index, run_linear_scan
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class InsertAudioSegmentsTestCase(AnalysisFixtureMixin, TestCase):
+    """Bulk insert keeps the per-row contract: one saved instance per input, existing paths reused"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def _segment_data(self, offset_minutes, duration=60):
+        start = self.start + timedelta(minutes=offset_minutes)
+        return {
+            'start_time': start,
+            'end_time': start + timedelta(seconds=duration),
+            'duration_seconds': duration,
+            'is_recognized': False,
+            'title_before': 'A',
+            'title_after': 'B',
+            'file_name': f"audio_{offset_minutes}.mp3",
+            'file_path': f"media/20250101/audio_{offset_minutes}.mp3",
+        }
+
+    def test_returns_saved_instances_in_input_order(self):
+        existing = AudioSegments.insert_audio_segments([self._segment_data(0)], self.channel.id)[0]
+        data = [self._segment_data(i) for i in range(30)] + [self._segment_data(3)]
+
+        with self.assertNumQueries(4):
+            segments = AudioSegments.insert_audio_segments(data, self.channel.id)
+
+        self.assertEqual(len(segments), 31)
+        self.assertEqual(segments[0].pk, existing.pk)
+        self.assertTrue(all(segment.pk for segment in segments))
+        self.assertEqual(segments[30].pk, segments[3].pk)
+        self.assertEqual([segment.file_path for segment in segments], [item['file_path'] for item in data])
+        self.assertEqual(AudioSegments.objects.filter(channel=self.channel).count(), 30)
+
+    def test_invalid_segment_raises_before_insert(self):
+        bad = self._segment_data(1)
+        bad['duration_seconds'] = 30
+        with self.assertRaises(ValidationError):
+            AudioSegments.insert_audio_segments([self._segment_data(0), bad], self.channel.id)
+        self.assertFalse(AudioSegments.objects.exists())
+
+
+class SegmentIntervalIndexTestCase(TestCase):
+    """SegmentIntervalIndex must accept/reject exactly like the linear _check_segment_overlap scan"""
+
+    def test_matches_linear_scan_on_synthetic_days(self):
+        for seed in range(5):
+            intervals = build_synthetic_day(seed=seed)
+            # Also exercise results arriving out of chronological order
+            shuffled = intervals[:]
+            random.Random(seed).shuffle(shuffled)
+            for sample in (intervals, shuffled[:400]):
+                self.assertEqual(run_interval_index(sample), run_linear_scan(sample))
+
+    def test_gap_threshold(self):
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        index = SegmentIntervalIndex()
+        index.add(start, start + timedelta(seconds=60))
+        self.assertFalse(index.should_include(start + timedelta(seconds=10), start + timedelta(seconds=50)))
+        self.assertFalse(index.should_include(start + timedelta(seconds=30), start + timedelta(seconds=61)))
+        self.assertTrue(index.should_include(start + timedelta(seconds=30), start + timedelta(seconds=62)))
+        self.assertTrue(index.should_include(start + timedelta(seconds=60), start + timedelta(seconds=70)))
+
+
+class MergeShortRecognizedSegmentsTestCase(AnalysisFixtureMixin, TestCase):
+    """Two-phase merge planner: same groups as the sequential loop, applied with bulk queries"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def test_planner_matches_sequential_loop(self):
+        channel = Channel(project_id=1, channel_id=1)
+        for seed in range(5):
+            segments = build_synthetic_segments(count=2000, seed=seed)
+            self.assertEqual(run_columnar_planner(segments, channel), run_sequential_planner(segments, channel))
+
+    def test_merges_are_applied_in_bulk(self):
+        at = lambda seconds: self.start + timedelta(seconds=seconds)
+        music = {'source': 'music'}
+        layout = [
+            (0, 30, dict(is_recognized=False, title_before='A', title_after='B')),
+            (30, 10, dict(title='Jingle', metadata_json=music)),
+            (40, 50, dict(is_recognized=False, title_before='Jingle', title_after='Song')),
+            (90, 200, dict(title='Song', metadata_json=music)),
+            (290, 15, dict(title='Short', metadata_json=music)),
+            # 5 second gap: not adjacent
+            (310, 40, dict(is_recognized=False, title_before='Short', title_after='C')),
+        ]
+        for seconds in range(400, 1000, 20):
+            layout.append((seconds, 10, dict(title=f"Sting {seconds}", metadata_json=music)))
+            layout.append((seconds + 10, 10, dict(is_recognized=False, title_before='x', title_after='y')))
+        segments = [self.create_segment(self.channel, at(offset), duration, **fields) for offset, duration, fields in layout]
+
+        # in_bulk, existing paths, savepoint, bulk_create, update, log and affected segment inserts, release
+        with self.assertNumQueries(8):
+            result = AudioSegmentsService._merge_short_recognized_segments(
+                [{'id': segment.id} for segment in segments], self.channel
+            )
+
+        merged = [segment for segment in result if segment.source == 'system_merge']
+        # The first group, then the alternating stretch in groups of at most 10 segments
+        self.assertEqual(len(merged), 7)
+        first = merged[0]
+        self.assertEqual((first.start_time, first.end_time, first.duration_seconds), (at(0), at(90), 90))
+        self.assertEqual((first.title_before, first.title_after, first.is_recognized), ('A', 'Song', False))
+        self.assertEqual([(m.start_time, m.duration_seconds) for m in merged[1:]], [(at(400 + 100 * i), 100) for i in range(6)])
+
+        deleted_ids = set(AudioSegments.objects.filter(is_delete=True, is_active=False).values_list('id', flat=True))
+        self.assertEqual(deleted_ids, {segments[0].id, segments[1].id, segments[2].id} | {s.id for s in segments[6:]})
+        self.assertTrue(all(segment.is_delete for segment in result if segment.id in deleted_ids))
+
+        log = AudioSegmentEditLog.objects.get(audio_segment=first)
+        self.assertEqual(log.metadata['source_segment_ids'], [segments[0].id, segments[1].id, segments[2].id])
+        self.assertEqual(log.metadata['merged_segment_duration'], 90)
+        self.assertEqual(set(log.affected_segments.values_list('id', flat=True)), set(log.metadata['source_segment_ids']))
+        self.assertEqual(AudioSegmentEditLog.objects.filter(action='merge', trigger_type='automatic').count(), 7)
+
+        # Running again over the same rows plans nothing new
+        again = AudioSegmentsService._merge_short_recognized_segments(list(AudioSegments.objects.filter(source='system')), self.channel)
+        self.assertEqual(AudioSegments.objects.filter(source='system_merge').count(), 7)
+        self.assertEqual(len(again), AudioSegments.objects.filter(source='system').count())
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from openai import OpenAI
+
+from data_analysis.models import AnalysisBatch, TranscriptionAnalysis, TranscriptionDetail
+from data_analysis.services.batch_analysis import BatchAnalysisService
+from data_analysis.services.transcription_analyzer import TranscriptionAnalyzer
+from data_analysis.tests.helpers import AnalysisFixtureMixin, StubOpenAIBatchServer
+
+
+@override_settings(ANALYSIS_BATCH_ENABLED=True, ANALYSIS_BATCH_MIN_AGE_MINUTES=0)
+class BatchAnalysisServiceTestCase(AnalysisFixtureMixin, TestCase):
+    """Batch API pipeline: collect, submit, poll and ingest against a local stub server"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.settings = self.create_settings(self.channel)
+        start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.details = [
+            self.create_transcription(self.create_segment(self.channel, start + timedelta(minutes=i)))
+            for i in range(3)
+        ]
+
+    def _run_pipeline(self, stub):
+        with patch(
+            'data_analysis.services.batch_analysis.OpenAIService.get_client',
+            side_effect=lambda api_key: OpenAI(api_key=api_key, base_url=stub.base_url, max_retries=0),
+        ):
+            batch = BatchAnalysisService.submit_channel_batch(self.channel)
+            return BatchAnalysisService.poll_batch(batch)
+
+    def test_submit_poll_and_ingest(self):
+        with StubOpenAIBatchServer() as stub:
+            batch = self._run_pipeline(stub)
+
+        self.assertEqual(batch.status, 'ingested')
+        self.assertEqual(batch.request_count, 3 * 5)
+        self.assertEqual(batch.ingested_count, 3)
+        for detail in self.details:
+            detail.refresh_from_db()
+            self.assertEqual(detail.analysis.summary, f"summary for {detail.id}")
+            self.assertEqual(detail.analysis.content_type_prompt, f"content_type_prompt for {detail.id}")
+            self.assertTrue(detail.audio_segment.is_analysis_completed)
+        self.assertEqual(BatchAnalysisService.collect_pending_transcriptions(self.channel), [])
+
+    def test_incomplete_results_are_collected_again(self):
+        failing = BatchAnalysisService.build_custom_id(self.details[0].id, 'sentiment')
+        with StubOpenAIBatchServer(failing_custom_ids=[failing]) as stub:
+            batch = self._run_pipeline(stub)
+
+        self.assertEqual(batch.ingested_count, 2)
+        self.assertFalse(TranscriptionDetail.objects.filter(pk=self.details[0].id, analysis__isnull=False).exists())
+        self.assertEqual(BatchAnalysisService.collect_pending_transcriptions(self.channel), [self.details[0]])
+
+    def test_empty_bucket_answer_is_ingested(self):
+        with StubOpenAIBatchServer(empty_fields=['bucket_prompt']) as stub, \
+                patch.object(TranscriptionAnalyzer, 'get_bucket_prompt', return_value='Pick two buckets'):
+            batch = self._run_pipeline(stub)
+
+        self.assertIn('bucket_prompt', batch.requested_fields)
+        self.assertEqual(batch.ingested_count, 3)
+        self.assertEqual(TranscriptionAnalysis.objects.get(transcription_detail=self.details[0]).bucket_prompt, '')
+
+    @override_settings(ANALYSIS_BATCH_MAX_ATTEMPTS=2)
+    def test_failing_transcriptions_stop_being_batched(self):
+        failing = BatchAnalysisService.build_custom_id(self.details[0].id, 'sentiment')
+        with StubOpenAIBatchServer(failing_custom_ids=[failing]) as stub:
+            self._run_pipeline(stub)
+            self.assertEqual(BatchAnalysisService.collect_pending_transcriptions(self.channel), [self.details[0]])
+            self._run_pipeline(stub)
+
+        self.assertEqual(self.details[0].analysis_batches.count(), 2)
+        self.assertEqual(BatchAnalysisService.collect_pending_transcriptions(self.channel), [])
+
+    def test_active_batch_transcriptions_are_not_collected(self):
+        batch = AnalysisBatch.objects.create(channel=self.channel, batch_id='batch_open', input_file_id='file-x')
+        batch.transcription_details.add(self.details[0])
+        pending = BatchAnalysisService.collect_pending_transcriptions(self.channel)
+        self.assertEqual(pending, self.details[1:])
+
+    def test_should_defer_only_backfill_system_segments(self):
+        self.assertTrue(BatchAnalysisService.should_defer(self.details[0]))
+        recent = self.create_segment(self.channel, timezone.now() - timedelta(minutes=5))
+        self.assertFalse(BatchAnalysisService.should_defer(self.create_transcription(recent)))
+        user_segment = self.create_segment(self.channel, datetime(2025, 1, 2, tzinfo=dt_timezone.utc), source='user')
+        self.assertFalse(BatchAnalysisService.should_defer(self.create_transcription(user_segment)))
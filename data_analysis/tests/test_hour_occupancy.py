@@ -0,0 +1,129 @@
+import io
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from audio_filter.utils import AudioSegmentFilterV3Utils
+from data_analysis.models import ChannelHourOccupancy
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class HourOccupancyIndexTestCase(AnalysisFixtureMixin, TestCase):
+    """audio_filter v3 slot masks (index and grouped query) match the per-slot EXISTS checks they replace"""
+
+    def setUp(self):
+        cache.clear()
+        self.channel = self.create_channel()
+        self.channel.timezone = 'America/New_York'
+        self.channel.save()
+        rng = random.Random(5)
+        # Around the spring-forward and fall-back changes, plus a plain day
+        for day_start in (
+            datetime(2025, 3, 8, 12, tzinfo=dt_timezone.utc),
+            datetime(2025, 11, 1, 12, tzinfo=dt_timezone.utc),
+            datetime(2025, 6, 10, 0, tzinfo=dt_timezone.utc),
+        ):
+            for seconds in sorted(rng.sample(range(0, 2 * 86400), 40)):
+                self.create_segment(
+                    self.channel, day_start + timedelta(seconds=seconds), duration=30,
+                    is_active=rng.random() < 0.6, title=rng.choice(['News', 'Song']),
+                )
+
+    def per_slot_masks(self, segments, start, end):
+        """The original loop: one EXISTS per slot of every day in range"""
+        masks = {}
+        for day in AudioSegmentFilterV3Utils.iter_days_in_range(self.channel, start, end):
+            for hour in range(24):
+                if AudioSegmentFilterV3Utils.filter_by_slot(segments, self.channel, day.strftime("%Y%m%d"), hour).exists():
+                    masks[day] = masks.get(day, 0) | (1 << hour)
+        return masks
+
+    def segments(self, start, end, status=None):
+        segments = AudioSegmentFilterV3Utils.get_segments(self.channel.id, start, end)
+        return AudioSegmentFilterV3Utils.filter_segments(segments, {"status": status})
+
+    def test_matches_per_slot_exists(self):
+        ranges = [
+            (datetime(2025, 3, 8, 10, 17, tzinfo=dt_timezone.utc), datetime(2025, 3, 10, 15, 42, tzinfo=dt_timezone.utc)),
+            (datetime(2025, 11, 1, 0, 0, tzinfo=dt_timezone.utc), datetime(2025, 11, 3, 12, 30, tzinfo=dt_timezone.utc)),
+            (datetime(2025, 6, 10, 4, 0, tzinfo=dt_timezone.utc), datetime(2025, 6, 11, 4, 0, tzinfo=dt_timezone.utc)),
+        ]
+        for tz_name in ('America/New_York', 'Asia/Kolkata'):
+            self.channel.timezone = tz_name
+            self.channel.save()
+            for start, end in ranges:
+                for status in (None, 'active', 'inactive'):
+                    segments = self.segments(start, end, status)
+                    expected = self.per_slot_masks(segments, start, end)
+                    self.assertTrue(expected)
+                    for use_index in (False, True):
+                        masks = AudioSegmentFilterV3Utils.slot_masks(
+                            segments, self.channel, start, end, status=status, use_index=use_index
+                        )
+                        self.assertEqual(masks, expected, (tz_name, start, status, use_index))
+
+    def test_pagination_from_masks(self):
+        start = datetime(2025, 3, 8, 10, 17, tzinfo=dt_timezone.utc)
+        end = datetime(2025, 3, 10, 15, 42, tzinfo=dt_timezone.utc)
+        segments = self.segments(start, end)
+        expected = self.per_slot_masks(segments, start, end)
+        masks = AudioSegmentFilterV3Utils.slot_masks(segments, self.channel, start, end, use_index=True)
+        with self.assertNumQueries(0):
+            slot_date, slot_index = AudioSegmentFilterV3Utils.find_first_slot_with_data(
+                segments, self.channel, start, end, masks
+            )
+            pagination = AudioSegmentFilterV3Utils.build_slot_pagination(
+                segments, self.channel, start, end, slot_date, slot_index, masks
+            )
+        first_day = min(expected)
+        self.assertEqual(slot_date, first_day.strftime("%Y%m%d"))
+        self.assertEqual(slot_index, min(h for h in range(24) if expected[first_day] & (1 << h)))
+        self.assertEqual([h['has_data'] for h in pagination['hours']], [bool(expected[first_day] & (1 << h)) for h in range(24)])
+        self.assertEqual(len(pagination['dates_with_data']), len(expected))
+
+    def test_query_counts(self):
+        # Whole local days: no slot is cut by the range ends
+        start = datetime(2025, 6, 10, 4, tzinfo=dt_timezone.utc)
+        end = datetime(2025, 6, 12, 4, tzinfo=dt_timezone.utc)
+        segments = self.segments(start, end)
+        with self.assertNumQueries(1):
+            filtered = AudioSegmentFilterV3Utils.slot_masks(segments, self.channel, start, end)
+        AudioSegmentFilterV3Utils.slot_masks(segments, self.channel, start, end, use_index=True)
+        # iter_days_in_range includes the local day the exclusive end falls on
+        self.assertEqual(ChannelHourOccupancy.objects.filter(channel=self.channel).count(), 3)
+        with self.assertNumQueries(0):
+            indexed = AudioSegmentFilterV3Utils.slot_masks(segments, self.channel, start, end, use_index=True)
+        self.assertEqual(indexed, filtered)
+
+    def test_index_maintenance(self):
+        day = datetime(2025, 6, 15).date()
+        at = datetime(2025, 6, 15, 14, 30, tzinfo=dt_timezone.utc)  # 10:30 in New York
+        self.assertEqual(HourOccupancyIndex.get_day_masks(self.channel, [day])[day], (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segment = self.create_segment(self.channel, at, is_active=True)
+        self.assertEqual(HourOccupancyIndex.get_day_masks(self.channel, [day])[day], (1 << 10, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.is_active = False
+            segment.save(update_fields=['is_active'])
+        self.assertEqual(HourOccupancyIndex.get_day_masks(self.channel, [day])[day], (0, 1 << 10))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.is_delete = True
+            segment.save()
+        self.assertEqual(HourOccupancyIndex.get_day_masks(self.channel, [day])[day], (0, 0))
+
+    def test_rebuild_command(self):
+        day = datetime(2025, 6, 10).date()
+        ChannelHourOccupancy.objects.create(channel=self.channel, local_date=day, timezone='America/New_York')
+        call_command('rebuild_hour_occupancy', channel_id=[self.channel.id], stdout=io.StringIO())
+        expected = HourOccupancyIndex.compute_days(self.channel.id, [day], ZoneInfo('America/New_York'))[day]
+        row = ChannelHourOccupancy.objects.get(channel=self.channel, local_date=day)
+        self.assertEqual([row.active_hours, row.inactive_hours], expected)
+        self.assertTrue(row.active_hours | row.inactive_hours)
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase
+
+from data_analysis.services.audio_segments import AudioSegments as AudioSegmentsService
+from data_analysis.services.ingestion_cursor import ACRIngestionCursorService
+from data_analysis.tests.helpers import AnalysisFixtureMixin, acr_result
+
+
+class ACRIngestionCursorTestCase(AnalysisFixtureMixin, TestCase):
+    """Incremental hourly runs produce the same segments as processing the whole day at once"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        day = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.items = []
+        start = day + timedelta(hours=8)
+        for i in range(40):
+            duration = 120 + (i % 5) * 30
+            self.items.append(acr_result(start, duration, f"Song {i}"))
+            start += timedelta(seconds=duration + (0 if i % 3 else 45))
+
+    def _keys(self, segments):
+        return [(s['start_time'], s['end_time'], s['is_recognized'], s.get('title'), s.get('title_before'), s.get('title_after')) for s in segments]
+
+    def test_incremental_runs_match_full_day(self):
+        full_day = AudioSegmentsService.process_audio_data(self.items, self.channel)
+
+        cursor = ACRIngestionCursorService.get_cursor(self.channel, '20250101')
+        incremental = []
+        for visible in (15, 28, 40):
+            new_data = ACRIngestionCursorService.filter_new_results({'data': self.items[:visible]}, cursor)
+            previous = ACRIngestionCursorService.get_boundary_segment(cursor)
+            processed = AudioSegmentsService.process_audio_data(new_data['data'], self.channel, previous_segment=previous)
+            incremental.extend(processed)
+            ACRIngestionCursorService.advance(cursor, new_data['data'], processed)
+
+        self.assertEqual(self._keys(sorted(incremental, key=lambda s: s['start_time'])), self._keys(full_day))
+        self.assertEqual(cursor.last_record_timestamp, self.items[-1]['metadata']['record_timestamp'])
+
+    def test_cursor_resets_on_new_day(self):
+        cursor = ACRIngestionCursorService.get_cursor(self.channel, '20250101')
+        ACRIngestionCursorService.advance(cursor, self.items[:5], [])
+        self.assertTrue(cursor.last_record_timestamp)
+
+        cursor = ACRIngestionCursorService.get_cursor(self.channel, '20250102')
+        self.assertEqual(cursor.last_record_timestamp, '')
+        self.assertIsNone(ACRIngestionCursorService.get_boundary_segment(cursor))
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core_admin.repositories import GeneralSettingService
+from data_analysis.models import LLMResponseCacheEntry
+from data_analysis.services.llm_cache import LLMResponseCache
+from data_analysis.services.transcription_analyzer import TranscriptionAnalyzer
+from data_analysis.tests.helpers import AnalysisFixtureMixin, fake_completion
+
+
+@override_settings(LLM_RESPONSE_CACHE_ENABLED=True)
+class LLMResponseCacheTestCase(AnalysisFixtureMixin, TestCase):
+    """Repeated transcripts are answered from the cache until the settings version changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.channel = self.create_channel()
+        self.settings = self.create_settings(self.channel)
+        start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.first = self.create_transcription(self.create_segment(self.channel, start), transcript='Station  ID  jingle')
+        self.second = self.create_transcription(self.create_segment(self.channel, start + timedelta(minutes=5)), transcript='station id\njingle ')
+
+    def _analyze(self, detail):
+        with patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion', side_effect=fake_completion) as completion:
+            analysis = TranscriptionAnalyzer.analyze_transcription(detail)
+        return analysis, completion.call_count
+
+    def test_identical_transcript_is_served_from_cache(self):
+        first, first_calls = self._analyze(self.first)
+        second, second_calls = self._analyze(self.second)
+
+        self.assertEqual(first_calls, 5)
+        self.assertEqual(second_calls, 0)
+        self.assertEqual(second.summary, first.summary)
+        stats = LLMResponseCache.get_stats()
+        self.assertEqual(stats['hits'], 5)
+        self.assertEqual(stats['misses'], 5)
+
+    def test_database_fallback_when_redis_misses(self):
+        self._analyze(self.first)
+        cache.clear()
+        second, calls = self._analyze(self.second)
+        self.assertEqual(calls, 0)
+        self.assertEqual(second.sentiment, 'sentiment|16')
+
+    def test_new_settings_version_invalidates_cache(self):
+        self._analyze(self.first)
+        self.assertEqual(LLMResponseCacheEntry.objects.filter(channel=self.channel).count(), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GeneralSettingService.create_new_version(
+                settings_data={
+                    'channel_id': self.channel.id,
+                    'openai_api_key': 'sk-test',
+                    'openai_org_id': 'org',
+                    'summarize_transcript_prompt': 'summarize',
+                    'sentiment_analysis_prompt': 'sentiment',
+                    'general_topics_prompt': 'general topics',
+                    'iab_topics_prompt': 'iab topics',
+                    'determine_radio_content_type_prompt': 'classify {{segments}}',
+                    'content_type_prompt': 'Commercial, News',
+                },
+                buckets_data=[],
+            )
+
+        self.assertEqual(LLMResponseCacheEntry.objects.filter(channel=self.channel).count(), 0)
+        _, calls = self._analyze(self.second)
+        self.assertEqual(calls, 5)
+
+    @override_settings(LLM_RESPONSE_CACHE_MAX_ENTRIES=2)
+    def test_prune_evicts_least_recently_used(self):
+        self._analyze(self.first)
+        LLMResponseCacheEntry.objects.filter(response='summarize|150').update(expires_at=timezone.now() - timedelta(seconds=1))
+        result = LLMResponseCache.prune()
+        self.assertEqual(result, {'expired': 1, 'evicted': 2})
+        self.assertEqual(LLMResponseCacheEntry.objects.count(), 2)
@@ -0,0 +1,31 @@
+
+from django.test import TestCase
+
+from data_analysis.services.mp3_splitter import MP3FrameSplitter
+from data_analysis.tests.helpers import MP3_FRAME_HEADER, MP3_FRAME_SECONDS, synthetic_mp3, frame_indexes
+
+
+class MP3FrameSplitterTestCase(TestCase):
+    """Frame-level slicing and concatenation of MP3 streams"""
+
+    def test_parse_skips_tags_and_garbage(self):
+        data = synthetic_mp3(10)
+        data = data[:5000] + b"\xff\x00garbage" + data[5000:]
+        frames = MP3FrameSplitter.parse_frames(data)
+        self.assertEqual(len(frames), round(10 / MP3_FRAME_SECONDS) - 1)
+        self.assertAlmostEqual(frames[0].start_seconds, 0)
+        self.assertTrue(all(data[frame.offset:frame.offset + 4] == MP3_FRAME_HEADER for frame in frames))
+
+    def test_consecutive_slices_partition_the_stream(self):
+        data = synthetic_mp3(120, with_tags=False)
+        boundaries = [0, 7, 30, 30.5, 61, 119, 120]
+        slices = [MP3FrameSplitter.slice(data, start, end) for start, end in zip(boundaries, boundaries[1:])]
+        self.assertEqual(b"".join(slices), data)
+        self.assertAlmostEqual(MP3FrameSplitter.get_duration(slices[1]), 23, delta=MP3_FRAME_SECONDS)
+
+    def test_concatenate_drops_headers(self):
+        first, second = synthetic_mp3(5), synthetic_mp3(5, first_frame=1000)
+        joined = MP3FrameSplitter.concatenate([first, second])
+        self.assertEqual(frame_indexes(joined), frame_indexes(first) + frame_indexes(second))
+        with self.assertRaises(ValueError):
+            MP3FrameSplitter.concatenate([b"not audio"])
@@ -0,0 +1,141 @@
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from data_analysis.models import RevCallbackInbox, RevTranscriptionJob, TranscriptionAnalysis, TranscriptionDetail
+from data_analysis.services.rev_callbacks import RevCallbackInboxService
+from data_analysis.services.transcription_service import RevAISpeechToText
+from data_analysis.tests.helpers import AnalysisFixtureMixin, StubRevAIServer
+
+
+class RevCallbackInboxTestCase(AnalysisFixtureMixin, TestCase):
+    """Rev.ai callbacks are stored once per job state and applied in batches by the consumer"""
+
+    def setUp(self):
+        cache.clear()
+        self.channel = self.create_channel()
+        self.create_settings(self.channel, revai_access_token='rev-token')
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def callback(self, job_id, status='transcribed', media_url='https://radio.example.com/api/media/a.mp3'):
+        return {'job': {
+            'id': job_id, 'name': f"{job_id}.mp3", 'status': status, 'media_url': media_url,
+            'created_on': '2025-01-01T10:00:00Z', 'completed_on': '2025-01-01T10:01:00.5Z',
+            'duration_seconds': 60.0,
+        }}
+
+    def create_job(self, job_id, segment, status='in_progress'):
+        return RevTranscriptionJob.objects.create(
+            job_id=job_id, job_name=segment.file_name, media_url=f"https://radio.example.com/api/{segment.file_path}",
+            status=status, created_on=segment.start_time, audio_segment=segment,
+        )
+
+    def test_webhook_deduplicates_redeliveries(self):
+        body = json.dumps(self.callback('job-1'))
+        with patch.object(RevCallbackInboxService, 'schedule_consumer') as schedule:
+            for _ in range(3):
+                response = self.client.post('/api/rev-callback', data=body, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), {'success': True, 'action': 'queued', 'job_id': 'job-1'})
+            response = self.client.post('/api/rev-callback', data='{"job": {}}', content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(RevCallbackInbox.objects.count(), 1)
+        self.assertEqual(schedule.call_count, 3)
+        self.assertFalse(RevTranscriptionJob.objects.filter(job_id='job-1').exists())
+
+    def test_consumer_applies_batch_and_queues_analysis_once(self):
+        segments = [self.create_segment(self.channel, self.start + timedelta(minutes=i)) for i in range(3)]
+        pending = self.create_job('job-pending', segments[0])
+        analysed = self.create_job('job-analysed', segments[1], status='transcribed')
+        detail = TranscriptionDetail.objects.create(audio_segment=segments[1], rev_job=analysed, transcript='x')
+        TranscriptionAnalysis.objects.create(transcription_detail=detail, summary='s', sentiment='50')
+        failed = self.create_job('job-failed', segments[2])
+
+        with patch.object(RevCallbackInboxService, 'schedule_consumer'):
+            RevCallbackInboxService.enqueue(self.callback('job-pending', status='in_progress'))
+            RevCallbackInboxService.enqueue(self.callback('job-pending'))
+            RevCallbackInboxService.enqueue(self.callback('job-pending'))
+            RevCallbackInboxService.enqueue(self.callback('job-analysed'))
+            RevCallbackInboxService.enqueue(self.callback('job-failed', status='failed'))
+            RevCallbackInboxService.enqueue(self.callback('job-unknown'))
+
+        with patch('data_analysis.tasks.analyze_transcription_task.delay') as delay:
+            result = RevCallbackInboxService.process_pending(batch_size=100)
+            self.assertEqual(RevCallbackInboxService.process_pending(batch_size=100)['claimed'], 0)
+
+        self.assertEqual(result, {'claimed': 5, 'jobs': 4, 'queued': 2, 'failed': 0})
+        pending.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(pending.status, 'transcribed')
+        self.assertEqual(pending.duration_seconds, 60.0)
+        self.assertEqual(pending.media_url, 'https://radio.example.com/api/media/a.mp3')
+        self.assertEqual(failed.status, 'failed')
+        self.assertTrue(RevTranscriptionJob.objects.filter(job_id='job-unknown', status='transcribed').exists())
+        queued_jobs = {call.args[0] for call in delay.call_args_list}
+        self.assertEqual(queued_jobs, {pending.pk, RevTranscriptionJob.objects.get(job_id='job-unknown').pk})
+        self.assertEqual(delay.call_args_list[0].args[1:], ('/api/media/a.mp3', 'https://radio.example.com/api/media/a.mp3'))
+        self.assertEqual(set(RevCallbackInbox.objects.values_list('status', flat=True)), {'done'})
+
+    def test_failed_batch_is_retried(self):
+        with patch.object(RevCallbackInboxService, 'schedule_consumer'):
+            RevCallbackInboxService.enqueue(self.callback('job-1'))
+
+        with patch.object(RevCallbackInboxService, 'apply_batch', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                RevCallbackInboxService.process_pending()
+        entry = RevCallbackInbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts, entry.error), ('failed', 1, 'db down'))
+
+        with patch('data_analysis.tasks.analyze_transcription_task.delay'):
+            self.assertEqual(RevCallbackInboxService.process_pending()['claimed'], 1)
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ('done', 2))
+
+    def test_bad_entry_only_fails_itself(self):
+        bad = self.callback('job-bad')
+        bad['job']['created_on'] = 1735725600
+        with patch.object(RevCallbackInboxService, 'schedule_consumer'):
+            RevCallbackInboxService.enqueue(self.callback('job-1'))
+            RevCallbackInboxService.enqueue(bad)
+            RevCallbackInboxService.enqueue(self.callback('job-2'))
+
+        with patch('data_analysis.tasks.analyze_transcription_task.delay'):
+            result = RevCallbackInboxService.process_pending()
+        self.assertEqual((result['claimed'], result['failed']), (3, 1))
+        self.assertEqual(
+            dict(RevCallbackInbox.objects.values_list('job_id', 'status')),
+            {'job-1': 'done', 'job-bad': 'failed', 'job-2': 'done'},
+        )
+        self.assertEqual(set(RevTranscriptionJob.objects.values_list('job_id', flat=True)), {'job-1', 'job-2'})
+
+        # A failure of the bulk write falls back to applying entries one at a time
+        with patch.object(RevCallbackInboxService, 'schedule_consumer'):
+            RevCallbackInboxService.enqueue(self.callback('job-3'))
+        apply_batch = RevCallbackInboxService.apply_batch
+
+        def fail_bulk(entries):
+            if len(entries) > 1:
+                raise RuntimeError('bulk write failed')
+            return apply_batch(entries)
+
+        with patch.object(RevCallbackInboxService, 'apply_batch', side_effect=fail_bulk), \
+                patch('data_analysis.tasks.analyze_transcription_task.delay'):
+            result = RevCallbackInboxService.process_pending()
+        self.assertEqual((result['claimed'], result['failed']), (2, 1))
+        self.assertEqual(RevCallbackInbox.objects.get(job_id='job-3').status, 'done')
+        self.assertEqual(RevCallbackInbox.objects.get(job_id='job-bad').attempts, 2)
+
+    def test_transcript_is_stored_on_the_job_segment(self):
+        segment = self.create_segment(self.channel, self.start)
+        job = self.create_job('job-1', segment, status='transcribed')
+
+        with StubRevAIServer(transcripts={'job-1': 'hello from rev'}):
+            # The media path no longer matches the segment (e.g. the file was moved)
+            detail = RevAISpeechToText.get_transcript_by_job_id(job, '/api/media/moved.mp3')
+
+        self.assertEqual(detail.audio_segment_id, segment.id)
+        self.assertEqual(detail.transcript, 'hello from rev')
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from data_analysis.models import RevCallbackInbox, RevTranscriptionJob
+from data_analysis.services.rev_callbacks import RevCallbackInboxService
+from data_analysis.services.rev_reconciliation import RevJobReconciliationService
+from data_analysis.services.transcription_service import RevAISpeechToText
+from data_analysis.tests.helpers import AnalysisFixtureMixin, StubRevAIServer
+
+
+@override_settings(
+    REV_RECONCILE_MIN_AGE_SECONDS=1800, REV_RECONCILE_POLL_INTERVAL_SECONDS=900, REV_RECONCILE_MAX_POLLS=4,
+    REV_AI_SUBMIT_RATE_PER_SECOND=1000, REV_AI_SUBMIT_BURST=1000,
+)
+class RevJobReconciliationTestCase(AnalysisFixtureMixin, TestCase):
+    """Stuck Rev.ai jobs are polled and finished ones go through the callback inbox"""
+
+    def setUp(self):
+        cache.clear()
+        self.channel = self.create_channel()
+        self.create_settings(self.channel, revai_access_token='rev-token')
+        self.now = timezone.now()
+
+    def create_job(self, job_id, age_minutes, **fields):
+        created_on = self.now - timedelta(minutes=age_minutes)
+        segment = self.create_segment(self.channel, created_on)
+        return RevTranscriptionJob.objects.create(
+            job_id=job_id, job_name=segment.file_name, media_url=f"/api/{segment.file_path}",
+            status=fields.pop('status', 'in_progress'), created_on=created_on, audio_segment=segment, **fields,
+        )
+
+    def test_reconcile_polls_stuck_jobs(self):
+        finished = self.create_job('finished', 120)
+        running = self.create_job('running', 90)
+        exhausted = self.create_job('exhausted', 600, retry_count=3)
+        missing = self.create_job('missing', 60)
+        young = self.create_job('young', 10)
+        recently_polled = self.create_job('recently-polled', 121, last_retry_at=self.now - timedelta(minutes=5))
+        self.create_job('done', 122, status='transcribed')
+        completed_on = self.now - timedelta(minutes=50)
+        job_states = {
+            'finished': {
+                'id': 'finished', 'status': 'transcribed', 'media_url': 'https://radio.example.com/api/media/f.mp3',
+                'created_on': '2025-01-01T10:00:00Z', 'completed_on': completed_on.isoformat(),
+                'duration_seconds': 60.0,
+            },
+            'running': {'id': 'running', 'status': 'in_progress'},
+            'exhausted': {'id': 'exhausted', 'status': 'in_progress'},
+        }
+
+        # No Celery worker: the consumer is run explicitly, and only after both sweeps
+        with StubRevAIServer(job_states=job_states) as stub, \
+                patch.object(RevCallbackInboxService, 'schedule_consumer'), \
+                patch('data_analysis.tasks.analyze_transcription_task.delay') as delay:
+            result = RevJobReconciliationService.reconcile()
+            again = RevJobReconciliationService.reconcile()
+            RevCallbackInboxService.process_pending()
+
+        self.assertEqual(sorted(stub.polls), ['exhausted', 'finished', 'missing', 'running'])
+        self.assertEqual((again['polled'], again['recovered']), (0, 0))
+        self.assertEqual(RevCallbackInboxService.enqueue_many([{'job': job_states['finished']}]), 0)
+        self.assertEqual(
+            {key: result[key] for key in ('polled', 'recovered', 'still_running', 'not_found', 'timed_out', 'errors')},
+            {'polled': 4, 'recovered': 1, 'still_running': 1, 'not_found': 1, 'timed_out': 1, 'errors': 0},
+        )
+        self.assertGreaterEqual(result['max_recovered_lag_seconds'], 3000)
+        # finished stays open until the consumer applies its inbox row
+        self.assertEqual(result['open_jobs'], 4)
+        # young, recently_polled and running are still open; recently_polled is the oldest
+        backlog = RevJobReconciliationService.get_backlog_metrics(timezone.now())
+        self.assertEqual(backlog['open_jobs'], 3)
+        self.assertAlmostEqual(backlog['oldest_open_job_age_seconds'], 7260, delta=5)
+
+        for job in (finished, running, exhausted, missing, young, recently_polled):
+            job.refresh_from_db()
+        self.assertEqual(finished.status, 'transcribed')
+        self.assertEqual(finished.duration_seconds, 60.0)
+        delay.assert_called_once_with(finished.pk, '/api/media/f.mp3', 'https://radio.example.com/api/media/f.mp3')
+        self.assertEqual((running.status, running.retry_count), ('in_progress', 1))
+        self.assertIsNotNone(running.last_retry_at)
+        self.assertEqual((exhausted.status, exhausted.failure, exhausted.retry_count), ('failed', 'reconciliation_timeout', 4))
+        self.assertEqual((missing.status, missing.failure), ('failed', 'not_found'))
+        self.assertEqual((young.retry_count, recently_polled.retry_count), (0, 0))
+
+        # The real callback arriving late is deduplicated against the reconciled state
+        with patch.object(RevCallbackInboxService, 'schedule_consumer'):
+            RevCallbackInboxService.enqueue({'job': job_states['finished']})
+        self.assertEqual(RevCallbackInbox.objects.filter(job_id='finished').count(), 1)
+
+    def test_transient_errors_do_not_time_jobs_out(self):
+        exhausted = self.create_job('exhausted', 600, retry_count=3)
+        for status_code in (None, 429, 503):
+            RevTranscriptionJob.objects.filter(pk=exhausted.pk).update(last_retry_at=None)
+            with patch.object(RevJobReconciliationService, 'fetch_job', return_value=(status_code, None)):
+                result = RevJobReconciliationService.reconcile()
+            self.assertEqual((result['errors'], result['timed_out'], result['still_running']), (1, 0, 0))
+
+        exhausted.refresh_from_db()
+        self.assertEqual((exhausted.status, exhausted.retry_count), ('in_progress', 3))
+        self.assertIsNotNone(exhausted.last_retry_at)
+
+    def test_transcript_is_fetched_from_jobs_endpoint(self):
+        job = self.create_job('finished', 120, status='transcribed')
+        with StubRevAIServer(transcripts={'finished': 'recovered transcript'}):
+            detail = RevAISpeechToText.get_transcript_by_job_id(job, job.media_url)
+        self.assertEqual(detail.audio_segment_id, job.audio_segment_id)
+        self.assertEqual(detail.transcript, 'recovered transcript')
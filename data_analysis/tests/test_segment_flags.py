@@ -0,0 +1,134 @@
+import io
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from audio_filter.utils import AudioSegmentFilterV3Utils
+from audio_policy.flag_matcher import clear_compiled_flag_conditions
+from audio_policy.models import FlagCondition
+from data_analysis.models import SegmentFlagResult, TranscriptionAnalysis
+from data_analysis.services.segment_flags import SegmentFlagService
+from data_analysis.tasks import recompute_segment_flags_task
+from data_analysis.v2.service import apply_flag_candidate_filter, get_segments_queryset
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class SegmentFlagResultTestCase(AnalysisFixtureMixin, TestCase):
+    """Stored flag results: written with the analysis, rewritten on condition change, read by the list endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        clear_compiled_flag_conditions()
+        self.channel = self.create_channel()
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.condition = FlagCondition.objects.create(channel=self.channel, transcription_keywords=[['storm']])
+        self.segments = []
+        for i, (transcript, summary) in enumerate([
+            ('storm warning', 'weather'), ('calm seas', 'Traffic jam'), ('sunny', 'storm later'), ('no analysis', None),
+        ]):
+            segment = self.create_segment(self.channel, self.start + timedelta(minutes=5 * i))
+            detail = self.create_transcription(segment, transcript=transcript)
+            if summary is not None:
+                TranscriptionAnalysis.objects.create(
+                    transcription_detail=detail, summary=summary, sentiment='40',
+                    general_topics='', iab_topics='', bucket_prompt='',
+                )
+            self.segments.append(segment)
+        self.details = [segment.transcription_detail for segment in self.segments]
+
+    def stored(self):
+        return {
+            result.audio_segment_id: result
+            for result in SegmentFlagResult.objects.filter(channel=self.channel)
+        }
+
+    def test_rows_written_for_new_analyses(self):
+        self.assertEqual(SegmentFlagService.store_for_details([detail.id for detail in self.details[:3]]), 3)
+        stored = self.stored()
+        self.assertEqual({seg_id: row.is_flagged for seg_id, row in stored.items()}, {
+            self.segments[0].id: True, self.segments[1].id: False, self.segments[2].id: False,
+        })
+        row = stored[self.segments[0].id]
+        self.assertEqual(row.condition_version, self.condition.updated_at)
+        self.assertEqual(row.flags['transcription_keywords'], {'flagged': True, 'message': 'Found keywords: storm'})
+
+    def test_condition_change_recomputes_channel(self):
+        SegmentFlagService.store_for_details([detail.id for detail in self.details])
+        with patch('data_analysis.tasks.recompute_segment_flags_task.delay', side_effect=recompute_segment_flags_task):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.condition.summary_keywords = [['traffic']]
+                self.condition.save()
+        stored = self.stored()
+        self.assertEqual(len(stored), 4)
+        self.assertTrue(all(row.condition_version == self.condition.updated_at for row in stored.values()))
+        self.assertEqual(
+            [seg.id for seg in self.segments if stored[seg.id].is_flagged], [self.segments[0].id, self.segments[1].id]
+        )
+
+        with patch('data_analysis.tasks.recompute_segment_flags_task.delay', side_effect=recompute_segment_flags_task):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.condition.delete()
+        self.assertFalse(SegmentFlagResult.objects.filter(channel=self.channel).exists())
+
+    def test_stale_rows_are_ignored_until_recomputed(self):
+        SegmentFlagService.store_for_details([detail.id for detail in self.details])
+        # Saved without running the background task: every stored row is now stale
+        self.condition.transcription_keywords = [['calm']]
+        self.condition.save()
+        queryset = get_segments_queryset(self.channel, self.start, self.start + timedelta(hours=1), is_last_page=True)
+        flagged = apply_flag_candidate_filter(queryset, self.channel)
+        self.assertEqual([seg.id for seg in flagged], [self.segments[1].id])
+        self.assertEqual(
+            [seg.id for seg in AudioSegmentFilterV3Utils.filter_flagged(queryset, self.condition)], [self.segments[1].id]
+        )
+        # The request path only reads: the stale rows stay until the backfill rewrites them
+        self.assertFalse(SegmentFlagResult.objects.filter(condition_version=self.condition.updated_at).exists())
+
+        out = io.StringIO()
+        call_command('backfill_segment_flags', stdout=out)
+        self.assertIn(f"Channel {self.channel.id}: 4 rows", out.getvalue())
+        self.assertEqual(SegmentFlagService.evaluate_missing(queryset, self.condition), [])
+        self.assertEqual([seg.id for seg in apply_flag_candidate_filter(queryset, self.channel)], [self.segments[1].id])
+
+    def test_sentiment_candidates_use_the_stored_score(self):
+        self.condition.transcription_keywords = []
+        self.condition.sentiment_max_upper = 20
+        self.condition.save()
+        analyses = TranscriptionAnalysis.objects.filter(transcription_detail__in=self.details)
+        # The stored score wins over the text; the text only counts when the score is NULL
+        analyses.filter(transcription_detail=self.details[1]).update(sentiment_score=10)
+        analyses.filter(transcription_detail=self.details[2]).update(sentiment='15', sentiment_score=None)
+        queryset = get_segments_queryset(self.channel, self.start, self.start + timedelta(hours=1), is_last_page=True)
+        self.assertEqual(
+            sorted(SegmentFlagService.evaluate_missing(queryset, self.condition)),
+            [self.segments[1].id, self.segments[2].id],
+        )
+
+    def test_list_endpoints_read_stored_flags(self):
+        SegmentFlagService.store_for_details([detail.id for detail in self.details])
+        # A marker message proves the stored row is served instead of a recomputation
+        SegmentFlagResult.objects.filter(audio_segment=self.segments[0]).update(
+            flags={'transcription_keywords': {'flagged': True, 'message': 'stored'}}
+        )
+        params = {
+            'channel_id': self.channel.id,
+            'start_datetime': '2025-01-01T10:00:00+00:00',
+            'end_datetime': '2025-01-01T11:00:00+00:00',
+            'show_flagged_only': 'true',
+        }
+        v2 = self.client.get('/api/v2/audio-segments/', params).json()['data']['segments']
+        self.assertEqual([seg['id'] for seg in v2], [self.segments[0].id])
+        self.assertEqual(v2[0]['flag']['transcription_keywords']['message'], 'stored')
+
+        v3 = self.client.get('/api/audio/filter/v3/audio-segments/', params).json()['data']
+        self.assertEqual([seg['id'] for seg in v3], [self.segments[0].id])
+        self.assertEqual(v3[0]['flag']['transcription_keywords']['message'], 'stored')
+
+        all_segments = self.client.get(
+            '/api/audio/filter/v3/audio-segments/', {**params, 'show_flagged_only': 'false'}
+        ).json()['data']
+        self.assertEqual(len(all_segments), 4)
+        self.assertFalse(all_segments[1]['flag']['transcription_keywords']['flagged'])
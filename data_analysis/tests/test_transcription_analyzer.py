@@ -0,0 +1,117 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from data_analysis.services.transcription_analyzer import TranscriptionAnalyzer
+from data_analysis.tests.helpers import AnalysisFixtureMixin, fake_completion
+
+
+class TranscriptionAnalyzerFanOutTestCase(AnalysisFixtureMixin, TestCase):
+    """analyze_transcription must produce the same analysis in sequential and concurrent modes"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.settings = self.create_settings(self.channel)
+        start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.segment = self.create_segment(self.channel, start)
+        self.detail = self.create_transcription(self.segment)
+
+    def _analyze(self, mode):
+        with override_settings(TRANSCRIPTION_ANALYSIS_MODE=mode):
+            with patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion', side_effect=fake_completion):
+                analysis = TranscriptionAnalyzer.analyze_transcription(self.detail)
+        values = (analysis.summary, analysis.sentiment, analysis.general_topics, analysis.iab_topics, analysis.content_type_prompt)
+        analysis.delete()
+        return values
+
+    def test_concurrent_matches_sequential(self):
+        sequential = self._analyze('sequential')
+        concurrent = self._analyze('concurrent')
+        self.assertEqual(sequential, concurrent)
+        self.assertEqual(concurrent[0], 'summarize|150')
+        self.assertEqual(concurrent[4], 'classify Commercial, News|30')
+
+    @override_settings(TRANSCRIPTION_ANALYSIS_MODE='concurrent')
+    def test_content_type_failure_is_isolated(self):
+        def completion(client, settings, system_prompt, user_prompt, max_tokens=0):
+            if system_prompt.startswith('classify'):
+                raise RuntimeError('boom')
+            return fake_completion(client, settings, system_prompt, user_prompt, max_tokens)
+
+        with patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion', side_effect=completion):
+            analysis = TranscriptionAnalyzer.analyze_transcription(self.detail)
+        self.assertEqual(analysis.summary, 'summarize|150')
+        self.assertEqual(analysis.content_type_prompt, '')
+
+    @override_settings(TRANSCRIPTION_ANALYSIS_MODE='concurrent')
+    def test_required_prompt_failure_propagates(self):
+        def completion(client, settings, system_prompt, user_prompt, max_tokens=0):
+            if system_prompt == 'sentiment':
+                raise RuntimeError('sentiment failed')
+            return fake_completion(client, settings, system_prompt, user_prompt, max_tokens)
+
+        with patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion', side_effect=completion):
+            with self.assertRaisesMessage(RuntimeError, 'sentiment failed'):
+                TranscriptionAnalyzer.analyze_transcription(self.detail)
+
+
+class TranscriptionAnalyzerCombinedModeTestCase(AnalysisFixtureMixin, TestCase):
+    """The combined mode maps one structured response onto the analysis and falls back when it is invalid"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.settings = self.create_settings(self.channel)
+        start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.segment = self.create_segment(self.channel, start)
+        self.detail = self.create_transcription(self.segment)
+
+    @override_settings(TRANSCRIPTION_ANALYSIS_MODE='combined')
+    def test_combined_response_is_mapped_to_fields(self):
+        response = {
+            'summary': 'A summary',
+            'sentiment': '72',
+            'general_topics': 'Music',
+            'iab_topics': 'Entertainment',
+            'content_type_prompt': 'News',
+        }
+        with patch('data_analysis.services.transcription_analyzer.OpenAIService.get_structured_completion', return_value=response) as structured, \
+                patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion') as per_prompt:
+            analysis = TranscriptionAnalyzer.analyze_transcription(self.detail)
+
+        self.assertEqual(structured.call_count, 1)
+        per_prompt.assert_not_called()
+        schema = structured.call_args.args[5]
+        self.assertEqual(schema['required'], ['summary', 'sentiment', 'general_topics', 'iab_topics', 'content_type_prompt'])
+        self.assertEqual(analysis.summary, 'A summary')
+        self.assertEqual(analysis.sentiment, '72')
+        self.assertEqual(analysis.content_type_prompt, 'News')
+
+    @override_settings(TRANSCRIPTION_ANALYSIS_MODE='combined', OPENAI_CHANNEL_CONCURRENCY_LIMIT=2)
+    def test_empty_bucket_answer_is_accepted_and_request_holds_slot(self):
+        response = {
+            'summary': 'A summary',
+            'sentiment': '72',
+            'general_topics': 'Music',
+            'iab_topics': 'Entertainment',
+            'bucket_prompt': '',
+            'content_type_prompt': 'News',
+        }
+        with patch.object(TranscriptionAnalyzer, 'get_bucket_prompt', return_value='Pick two buckets'), \
+                patch('data_analysis.services.transcription_analyzer.OpenAIService.channel_slot') as slot, \
+                patch('data_analysis.services.transcription_analyzer.OpenAIService.get_structured_completion', return_value=response), \
+                patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion') as per_prompt:
+            analysis = TranscriptionAnalyzer.analyze_transcription(self.detail)
+
+        per_prompt.assert_not_called()
+        slot.assert_called_once_with(self.channel.id, 2)
+        self.assertEqual((analysis.summary, analysis.bucket_prompt), ('A summary', ''))
+
+    @override_settings(TRANSCRIPTION_ANALYSIS_MODE='combined')
+    def test_invalid_combined_response_falls_back(self):
+        with patch('data_analysis.services.transcription_analyzer.OpenAIService.get_structured_completion', return_value={'summary': 'only summary'}), \
+                patch('data_analysis.services.transcription_analyzer.OpenAIService.get_chat_completion', side_effect=fake_completion) as per_prompt:
+            analysis = TranscriptionAnalyzer.analyze_transcription(self.detail)
+
+        self.assertEqual(per_prompt.call_count, 5)
+        self.assertEqual(analysis.summary, 'summarize|150')
@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from data_analysis.models import RevTranscriptionJob
+from data_analysis.services.rate_limit import TokenBucket
+from data_analysis.services.transcription_service import RevAISpeechToText
+from data_analysis.tests.helpers import AnalysisFixtureMixin, StubRevAIServer
+
+
+@override_settings(REV_AI_SUBMIT_MAX_WORKERS=4, REV_AI_SUBMIT_RATE_PER_SECOND=1000, REV_AI_SUBMIT_BURST=1000)
+class RevBatchSubmissionTestCase(AnalysisFixtureMixin, TestCase):
+    """Batched Rev.ai submission keeps the per-segment skip rules and bulk inserts the jobs"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.create_settings(self.channel, revai_access_token='rev-token', custom_vocabulary=['Luke Radio'])
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def test_submits_only_segments_without_transcription(self):
+        segments = [self.create_segment(self.channel, self.start + timedelta(minutes=i)) for i in range(12)]
+        transcribed = segments[0]
+        self.create_transcription(transcribed)
+        transcribed.is_analysis_completed = True
+        transcribed.save()
+        RevTranscriptionJob.objects.create(
+            job_id='running', job_name='x', media_url='/api/x', status='in_progress',
+            created_on=self.start, audio_segment=segments[1],
+        )
+        failing = segments[2]
+        payload = [{'id': segment.id, 'file_path': segment.file_path, 'requires_analysis': True} for segment in segments]
+        payload.append({'id': segments[3].id, 'requires_analysis': True})
+        payload.append({'id': segments[4].id, 'requires_analysis': False})
+
+        with StubRevAIServer(failing_media_urls={f"https://radio.example.com/api/{failing.file_path}"}) as stub:
+            jobs = RevAISpeechToText.create_and_save_transcription_job_v2(payload)
+
+        expected = {segment.id for segment in segments[3:]}
+        self.assertEqual({job.audio_segment_id for job in jobs}, expected)
+        self.assertTrue(all(job.pk for job in jobs))
+        self.assertEqual(len(stub.jobs), 9)
+        request, authorization = stub.jobs[0]
+        self.assertEqual(authorization, 'Bearer rev-token')
+        self.assertEqual(request['notification_config'], {'url': 'https://radio.example.com/api/rev-callback'})
+        self.assertEqual(request['custom_vocabularies'], [{'phrases': ['Luke Radio']}])
+        self.assertEqual(
+            set(RevTranscriptionJob.objects.filter(status='in_progress').values_list('audio_segment_id', flat=True)),
+            expected | {segments[1].id},
+        )
+        self.assertEqual(
+            RevTranscriptionJob.objects.get(audio_segment=segments[5], job_id__startswith='rev-').media_url,
+            f"/api/{segments[5].file_path}",
+        )
+
+    def test_token_bucket_paces_after_burst(self):
+        bucket = TokenBucket(rate=100, capacity=5)
+        started = time.monotonic()
+        for _ in range(15):
+            bucket.acquire()
+        # 5 immediate tokens, then 10 more at 100 per second
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertIs(TokenBucket.for_key('k', 10, 2), TokenBucket.for_key('k', 10, 2))
+
+    def test_token_bucket_rate_is_shared_across_processes(self):
+        cache.clear()
+        # Two processes' buckets for one account share the per-second budget
+        first = TokenBucket(rate=2, capacity=5, shared_key=TokenBucket.build_shared_key(('revai', 'Bearer x')))
+        second = TokenBucket(rate=2, capacity=5, shared_key=TokenBucket.build_shared_key(('revai', 'Bearer x')))
+        other = TokenBucket(rate=2, capacity=5, shared_key=TokenBucket.build_shared_key(('revai', 'Bearer y')))
+        self.assertNotIn('Bearer', first.shared_key)
+        with patch('data_analysis.services.rate_limit.time.time', return_value=1000.25):
+            self.assertEqual([first.try_acquire_shared(), second.try_acquire_shared()], [0, 0])
+            self.assertAlmostEqual(second.try_acquire_shared(), 0.75)
+            self.assertEqual(other.try_acquire_shared(), 0)
+        with patch('data_analysis.services.rate_limit.time.time', return_value=1001.0):
+            self.assertEqual(first.try_acquire_shared(), 0)
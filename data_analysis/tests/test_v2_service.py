@@ -0,0 +1,227 @@
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from audio_policy.models import FlagCondition
+from shift_analysis.models import Shift
+from data_analysis.models import TranscriptionAnalysis
+from data_analysis.serializers import AudioSegmentsSerializer
+from data_analysis.v2.service import (
+    apply_flag_candidate_filter, apply_flag_conditions_to_segments, build_pagination_info_v2, flag_entry_is_active,
+    get_segments_queryset,
+)
+from data_analysis.tests.helpers import AnalysisFixtureMixin
+
+
+class ListAudioSegmentsV2CursorTestCase(AnalysisFixtureMixin, TestCase):
+    """Keyset cursor pages and NDJSON streaming next to the hour-window pages"""
+
+    url = '/api/v2/audio-segments/'
+
+    def setUp(self):
+        cache.clear()
+        self.channel = self.create_channel()
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.segments = [
+            self.create_segment(self.channel, self.start + timedelta(minutes=20 * i), duration=60 + i)
+            for i in range(7)
+        ]
+        # Same start time as the first segment: the id breaks the tie
+        self.segments.insert(1, self.create_segment(self.channel, self.start, duration=30, title='Tie'))
+        self.range = {
+            'channel_id': self.channel.id,
+            'start_datetime': '2025-01-01T10:00:00+00:00',
+            'end_datetime': '2025-01-01T13:00:00+00:00',
+        }
+
+    def test_hour_window_pages_are_unchanged(self):
+        response = self.client.get(self.url, {**self.range, 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([seg['id'] for seg in body['data']['segments']], [s.id for s in self.segments[4:7]])
+        self.assertEqual(body['pagination']['current_page'], 2)
+        self.assertEqual(body['pagination']['total_pages'], 3)
+
+    def test_cursor_pages_walk_the_range_in_keyset_order(self):
+        seen = []
+        cursor = ''
+        pages = 0
+        while True:
+            response = self.client.get(self.url, {**self.range, 'limit': 3, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            pages += 1
+            seen.extend(seg['id'] for seg in body['data']['segments'])
+            self.assertEqual(body['pagination']['has_more'], body['pagination']['next_cursor'] is not None)
+            if not body['pagination']['has_more']:
+                break
+            cursor = body['pagination']['next_cursor']
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [s.id for s in self.segments])
+
+        response = self.client.get(self.url, {**self.range, 'limit': 3, 'cursor': cursor[:-2] + 'xx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json()['errors'])
+
+    def test_stream_returns_ndjson(self):
+        with patch('data_analysis.v2.service.KEYSET_CHUNK_SIZE', 2):
+            response = self.client.get(self.url, {**self.range, 'stream': 'true'})
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['segment']['id'] for line in lines[:-1]], [s.id for s in self.segments])
+        summary = lines[-1]
+        self.assertEqual((summary['type'], summary['total_segments'], summary['total_recognized']), ('summary', 8, 8))
+
+        # A stream can resume from a cursor page
+        first_page = self.client.get(self.url, {**self.range, 'limit': 5}).json()
+        response = self.client.get(self.url, {**self.range, 'stream': 'true', 'cursor': first_page['pagination']['next_cursor']})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['segment']['id'] for line in lines[:-1]], [s.id for s in self.segments[5:]])
+
+
+class PaginationHistogramTestCase(AnalysisFixtureMixin, TestCase):
+    """build_pagination_info_v2 counts all hour pages in one grouped query, as the per-page COUNTs did"""
+
+    def setUp(self):
+        self.channel = self.create_channel()
+        self.start = datetime(2025, 1, 1, 0, 0, tzinfo=dt_timezone.utc)
+        rng = random.Random(3)
+        offsets = {0, 3600, 7200, 3599, 36000, 86400, 90000, 172800}
+        offsets.update(rng.randint(0, 172800) for _ in range(150))
+        for seconds in sorted(offsets):
+            segment = self.create_segment(
+                self.channel, self.start + timedelta(seconds=seconds), duration=30,
+                is_active=rng.random() < 0.7, title=rng.choice(['News', 'Song', 'Ad']),
+            )
+            if rng.random() < 0.5:
+                TranscriptionAnalysis.objects.create(
+                    transcription_detail=self.create_transcription(segment),
+                    summary='s', sentiment='50', general_topics='', iab_topics='', bucket_prompt='',
+                    content_type_prompt=rng.choice(['Commercial', 'News, 90%', 'Announcer']),
+                )
+
+    def per_page_counts(self, base_start, base_end, page_size, valid_windows, **filters):
+        """The original loop: one filtered COUNT per page"""
+        total_pages = math.ceil(math.ceil((base_end - base_start).total_seconds() / 3600) / page_size)
+        counts = []
+        for page_num in range(1, total_pages + 1):
+            page_start = base_start + timedelta(hours=(page_num - 1) * page_size)
+            page_end = min(page_start + timedelta(hours=page_size), base_end)
+            counts.append(get_segments_queryset(
+                self.channel, page_start, page_end, valid_windows, filters.get('status'),
+                filters.get('content_type_list'), filters.get('search_text'), filters.get('search_in'),
+                page_num == total_pages,
+            ).distinct().count())
+        return counts
+
+    def test_matches_per_page_counts(self):
+        at = lambda hours: self.start + timedelta(hours=hours)
+        windows = [(at(1), at(2)), (at(10), at(10.5)), (at(24), at(26)), (at(40), at(48))]
+        cases = [
+            (at(0), at(48), 1, None, {}),
+            (at(0), at(48), 5, None, {'status': True}),
+            (at(0.5), at(47.25), 3, None, {'content_type_list': ['News']}),
+            (at(0), at(48), 1, windows, {}),
+            (at(0), at(48), 7, windows, {'status': False, 'search_text': 'o', 'search_in': 'title'}),
+        ]
+        for base_start, base_end, page_size, valid_windows, filters in cases:
+            expected = self.per_page_counts(base_start, base_end, page_size, valid_windows, **filters)
+            with self.assertNumQueries(1):
+                info = build_pagination_info_v2(
+                    base_start, base_end, 1, page_size, self.channel, valid_windows, filters.get('status'),
+                    filters.get('content_type_list'), filters.get('search_text'), filters.get('search_in'),
+                )
+            self.assertEqual([p['segment_count'] for p in info['available_pages']], expected)
+            self.assertEqual([p['has_data'] for p in info['available_pages']], [c > 0 for c in expected])
+            self.assertGreater(sum(expected), 0)
+
+
+class FlaggedOnlyCandidateFilterTestCase(AnalysisFixtureMixin, TestCase):
+    """Flagged-only listings fetch only the segments the database predicates let through, with the same result"""
+
+    url = '/api/v2/audio-segments/'
+
+    def setUp(self):
+        cache.clear()
+        self.channel = self.create_channel()
+        self.start = datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+        rng = random.Random(11)
+        words = ['weather', 'Traffic', 'election', 'über', 'sports', 'music', 'promo', 'discount']
+        for i in range(60):
+            segment = self.create_segment(self.channel, self.start + timedelta(minutes=3 * i), duration=rng.choice([20, 90, 400]))
+            if rng.random() < 0.2:
+                continue
+            transcript = ' '.join(rng.sample(words, 2)) + (' ÜBER' if rng.random() < 0.1 else '')
+            detail = self.create_transcription(segment, transcript=transcript)
+            if rng.random() < 0.2:
+                continue
+            TranscriptionAnalysis.objects.create(
+                transcription_detail=detail,
+                summary=' '.join(rng.sample(words, 2)),
+                sentiment=rng.choice(['12', 'Sentiment: 85.5%', 'Neutral', '50', '', '-3']),
+                general_topics=rng.choice(['Politics, Local', 'Sports', '']),
+                iab_topics=rng.choice(['["Automotive"]', 'News and Politics', 'Food & Drink']),
+                bucket_prompt=rng.choice(['Advertising 100%', 'Talk', '']),
+            )
+        self.range = {
+            'channel_id': self.channel.id,
+            'start_datetime': '2025-01-01T10:00:00+00:00',
+            'end_datetime': '2025-01-01T13:00:00+00:00',
+        }
+
+    def python_flagged_ids(self, shift=None):
+        """The original path: serialize the whole range and check every segment in Python"""
+        queryset = get_segments_queryset(self.channel, self.start, self.start + timedelta(hours=3), is_last_page=True)
+        segments = apply_flag_conditions_to_segments(
+            AudioSegmentsSerializer.serialize_segments_data(queryset, self.channel.timezone), self.channel, shift
+        )
+        return [seg['id'] for seg in segments if any(flag_entry_is_active(f) for f in seg['flag'].values())]
+
+    def flagged_ids(self, **params):
+        response = self.client.get(self.url, {**self.range, 'show_flagged_only': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return [seg['id'] for seg in response.json()['data']['segments']]
+
+    def test_conditions_match_python_evaluation(self):
+        conditions = [
+            dict(transcription_keywords=[['weather', 'rain'], ['über']], summary_keywords=[]),
+            dict(summary_keywords=[['PROMO'], 'ignored'], iab_topics=['automotive']),
+            dict(bucket_prompt=[['advertising']], general_topics=['politics']),
+            dict(sentiment_min_lower=10, sentiment_min_upper=20, target_sentiments=50),
+            dict(sentiment_max_lower=80),
+            dict(sentiment_min_lower=0, sentiment_min_upper=100),
+        ]
+        for values in conditions:
+            FlagCondition.objects.filter(channel=self.channel).delete()
+            FlagCondition.objects.create(channel=self.channel, **values)
+            cache.clear()
+            expected = self.python_flagged_ids()
+            self.assertEqual(self.flagged_ids(), expected, values)
+            self.assertEqual(self.flagged_ids(limit=1000), expected, values)
+
+            queryset = get_segments_queryset(self.channel, self.start, self.start + timedelta(hours=3), is_last_page=True)
+            candidates = set(apply_flag_candidate_filter(queryset, self.channel).values_list('id', flat=True))
+            self.assertTrue(set(expected) <= candidates, values)
+
+    def test_candidates_skip_unflaggable_segments(self):
+        FlagCondition.objects.create(channel=self.channel, transcription_keywords=[['election']])
+        queryset = get_segments_queryset(self.channel, self.start, self.start + timedelta(hours=3), is_last_page=True)
+        candidates = list(apply_flag_candidate_filter(queryset, self.channel))
+        self.assertTrue(candidates)
+        self.assertTrue(all('election' in seg.transcription_detail.transcript for seg in candidates))
+        self.assertEqual([seg.id for seg in candidates], self.python_flagged_ids())
+
+    def test_shift_duration_limit_and_empty_condition(self):
+        FlagCondition.objects.create(channel=self.channel)
+        queryset = get_segments_queryset(self.channel, self.start, self.start + timedelta(hours=3), is_last_page=True)
+        self.assertFalse(apply_flag_candidate_filter(queryset, self.channel).exists())
+
+        shift = Shift(flag_seconds=60)
+        candidates = apply_flag_candidate_filter(queryset, self.channel, shift)
+        self.assertEqual(list(candidates.values_list('id', flat=True)), self.python_flagged_ids(shift))
+        self.assertTrue(all(seg.duration_seconds > 60 for seg in candidates))
@@ -32,6 +32,11 @@ class ListAudioSegmentsV2QuerySerializer(serializers.Serializer):
     )
     page = serializers.IntegerField(default=1, min_value=1, help_text="Page number")
     page_size = serializers.IntegerField(default=1, min_value=1, help_text="Hours per page")
+
+    # Keyset pagination parameters (used instead of hour pages when either is given)
+    cursor = serializers.CharField(required=False, allow_blank=True, help_text="Opaque next_cursor token from the previous page")
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, help_text="Segments per cursor page")
+    stream = serializers.BooleanField(required=False, default=False, help_text="When 'true', stream all matching segments as NDJSON")
     
     # Search parameters
     search_text = serializers.CharField(required=False, allow_null=True, allow_blank=True, help_text="Text to search for")
@@ -110,6 +115,17 @@ class ListAudioSegmentsV2QuerySerializer(serializers.Serializer):
             attrs['search_text'] = None
         if search_in == '':
             attrs['search_in'] = None
+
+        # Decode the keyset cursor; an empty cursor asks for the first page
+        if attrs.get('cursor'):
+            from data_analysis.v2.service import decode_segment_cursor
+
+            try:
+                attrs['cursor_position'] = decode_segment_cursor(attrs['cursor'])
+            except ValueError:
+                raise serializers.ValidationError({
+                    'cursor': ['Invalid or expired cursor']
+                })
         
         return attrs
     
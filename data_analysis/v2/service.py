@@ -9,38 +9,31 @@ from datetime import datetime, timezone as dt_utc
 from zoneinfo import ZoneInfo
 from typing import List, Optional, Dict, Any, Tuple
 
+from django.core import signing
 from django.http import JsonResponse
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Count, DateTimeField, Func, IntegerField, Q, Value
 
 from core_admin.models import Channel
 from data_analysis.repositories import AudioSegmentDAO
 from data_analysis.serializers import AudioSegmentsSerializer
+from data_analysis.services.segment_flags import SegmentFlagService, build_flag_candidate_filter
+from audio_policy.flag_matcher import get_compiled_flag_condition
 from audio_policy.models import FlagCondition
 from config.validation import TimezoneUtils
 
 
+# Segments per page when a cursor is used without a limit
+DEFAULT_CURSOR_LIMIT = 200
+# Rows fetched per query while walking a keyset page or stream
+KEYSET_CHUNK_SIZE = 500
+CURSOR_SALT = 'data_analysis.v2.audio_segments.cursor'
+
+
 # ==========================================
 # Utility Functions
 # ==========================================
 
-def flatten_nested_list(nested_list):
-    """
-    Flatten a nested list structure into a single list of strings.
-    Handles cases like: [["item1"], ["item2"], ["item3", "item4"]] -> ["item1", "item2", "item3", "item4"]
-    """
-    if not nested_list:
-        return []
-    
-    flattened = []
-    for item in nested_list:
-        if isinstance(item, list):
-            flattened.extend(flatten_nested_list(item))
-        elif item:
-            flattened.append(str(item))
-    return flattened
-
-
 def parse_dt(value):
     """Parse string to timezone-aware datetime."""
     if isinstance(value, str):
@@ -97,7 +90,12 @@ def validate_v2_parameters(request):
         'content_type': validated_data.get('content_type', []),
         'search_text': validated_data.get('search_text'),
         'search_in': validated_data.get('search_in'),
-        'show_flagged_only': validated_data.get('show_flagged_only', False)
+        'show_flagged_only': validated_data.get('show_flagged_only', False),
+        'use_cursor': 'cursor' in validated_data or 'limit' in validated_data,
+        'cursor': validated_data.get('cursor') or '',
+        'cursor_position': validated_data.get('cursor_position'),
+        'limit': validated_data.get('limit') or DEFAULT_CURSOR_LIMIT,
+        'stream': validated_data.get('stream', False),
     }
     
     return params, None
@@ -248,6 +246,77 @@ def get_segments_queryset(channel, start_dt, end_dt, valid_windows=None, status=
     return base_query.order_by('start_time')
 
 
+# ==========================================
+# Keyset Pagination
+# ==========================================
+
+def encode_segment_cursor(start_time, segment_id):
+    """Opaque, signed token for the (start_time, id) position of the last returned segment."""
+    return signing.dumps([start_time.isoformat(), segment_id], salt=CURSOR_SALT, compress=True)
+
+
+def decode_segment_cursor(token):
+    """(start_time, id) from a cursor token. Raises ValueError for tampered or malformed tokens."""
+    try:
+        start_iso, segment_id = signing.loads(token, salt=CURSOR_SALT)
+        start_time = datetime.fromisoformat(start_iso)
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if timezone.is_naive(start_time) or not isinstance(segment_id, int):
+        raise ValueError("Invalid cursor position")
+    return start_time, segment_id
+
+
+def apply_keyset_cursor(queryset, position=None):
+    """Order by (start_time, id) and keep only rows after position."""
+    if position is not None:
+        start_time, segment_id = position
+        queryset = queryset.filter(
+            Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=segment_id)
+        )
+    return queryset.order_by('start_time', 'id')
+
+
+def iter_segments_keyset(queryset, channel, shift=None, position=None, flagged_only=False, chunk_size=None):
+    """
+    Yield (segment_data, (start_time, id)) in keyset order, serialized and flagged like the list view.
+    Rows are read chunk_size at a time from after position, so memory does not grow with the range.
+    With flagged_only, segments without an active flag are skipped.
+    """
+    chunk_size = chunk_size or KEYSET_CHUNK_SIZE
+    if flagged_only:
+        queryset = apply_flag_candidate_filter(queryset, channel, shift)
+    while True:
+        rows = list(apply_keyset_cursor(queryset, position)[:chunk_size])
+        if not rows:
+            return
+        segments = AudioSegmentsSerializer.serialize_segments_data(rows, channel.timezone)
+        segments = apply_flag_conditions_to_segments(segments, channel, shift)
+        for row, segment_data in zip(rows, segments):
+            if flagged_only and not any(flag_entry_is_active(f_data) for f_data in segment_data.get('flag', {}).values()):
+                continue
+            yield segment_data, (row.start_time, row.id)
+        if len(rows) < chunk_size:
+            return
+        position = (rows[-1].start_time, rows[-1].id)
+
+
+def get_keyset_page(queryset, channel, shift=None, position=None, limit=DEFAULT_CURSOR_LIMIT, flagged_only=False):
+    """
+    One cursor page: (segments, next_cursor). next_cursor is None on the last page.
+    """
+    segments = []
+    last_position = None
+    for segment_data, segment_position in iter_segments_keyset(
+        queryset, channel, shift, position, flagged_only, chunk_size=min(limit + 1, KEYSET_CHUNK_SIZE)
+    ):
+        if len(segments) == limit:
+            return segments, encode_segment_cursor(*last_position)
+        segments.append(segment_data)
+        last_position = segment_position
+    return segments, None
+
+
 # ==========================================
 # Shift & Time Calculation
 # ==========================================
@@ -356,109 +425,25 @@ def calculate_pagination_window(base_start_dt, base_end_dt, page, page_size, sea
 # Flagging Logic
 # ==========================================
 
+def get_flag_duration_threshold(shift):
+    """The shift's duration flag limit in seconds, or None"""
+    if shift and getattr(shift, 'flag_seconds', None) is not None:
+        try:
+            return int(shift.flag_seconds)
+        except (ValueError, TypeError):
+            pass
+    return None
+
+
 def check_flag_conditions(segment, flag_condition):
     """
     Check if a segment matches the flag condition criteria.
     Returns a dictionary with flag information.
+    Keywords and topics go through the condition's compiled matcher (one pass per text field).
     """
-    flags = {}
-    transcription = segment.get('transcription') or {}
-    analysis = segment.get('analysis') or {}
-    
-    def build_flag_entry(triggered, message=''):
-        return {'flagged': bool(triggered), 'message': message}
-
-    # Helper for simple keyword checking
-    def check_keywords(text, keyword_groups):
-        if not text or not keyword_groups:
-            return False, ""
-        text_lower = text.lower()
-        matched = []
-        for group in keyword_groups:
-            if isinstance(group, list):
-                for kw in group:
-                    if kw and kw.lower() in text_lower:
-                        matched.append(group)
-                        break
-        if matched:
-            display_matches = [', '.join(g) for g in matched[:3]]
-            return True, f"Found keywords: {', '.join(display_matches)}"
-        return False, ""
-
-    # 1. Transcription
-    t_trig, t_msg = check_keywords(transcription.get('transcript', ''), flag_condition.transcription_keywords)
-    flags['transcription_keywords'] = build_flag_entry(t_trig, t_msg)
-
-    # 2. Summary
-    s_trig, s_msg = check_keywords(analysis.get('summary', ''), flag_condition.summary_keywords)
-    flags['summary_keywords'] = build_flag_entry(s_trig, s_msg)
-
-    # 3. Sentiment (Robust Parsing)
-    sentiment_str = str(analysis.get('sentiment') or '')
-    sentiment_value = None
-    match = re.search(r'-?\d+(\.\d+)?', sentiment_str)
-    if match:
-        try:
-            sentiment_value = float(match.group())
-        except ValueError:
-            pass
-            
-    triggered = False
-    message = ''
-    if sentiment_value is not None:
-        # Check target match
-        if flag_condition.target_sentiments is not None and sentiment_value == flag_condition.target_sentiments:
-            triggered = True
-            message = "Matches target sentiment"
-        
-        # Check Ranges
-        # Logic: Flag if value is WITHIN the configured risk range
-        ranges = []
-        if flag_condition.sentiment_min_lower is not None or flag_condition.sentiment_min_upper is not None:
-             ranges.append((flag_condition.sentiment_min_lower or float('-inf'), flag_condition.sentiment_min_upper or float('inf')))
-        if flag_condition.sentiment_max_lower is not None or flag_condition.sentiment_max_upper is not None:
-             ranges.append((flag_condition.sentiment_max_lower or float('-inf'), flag_condition.sentiment_max_upper or float('inf')))
-             
-        for lower, upper in ranges:
-            # Skip default 0-100 ranges which flag everything
-            if lower == 0.0 and upper == 100.0:
-                continue
-            if lower <= sentiment_value <= upper:
-                triggered = True
-                message = f"Sentiment {sentiment_value} in range [{lower}, {upper}]"
-                break
-    
-    flags['sentiment'] = build_flag_entry(triggered, message)
-
-    # 4. Topics & Prompts (Using flatten_nested_list helper)
-    def check_list_overlap(segment_list_or_str, condition_list, label):
-        if not condition_list:
-            return False, ""
-        
-        target_flat = flatten_nested_list(condition_list)
-        
-        source_val = segment_list_or_str
-        if not isinstance(source_val, list):
-            source_val = [str(source_val)] if source_val else []
-        source_flat = flatten_nested_list(source_val)
-        source_str = ' '.join(source_flat).lower()
-        
-        matched = [t for t in target_flat if t and t.lower() in source_str]
-        
-        if matched:
-            return True, f"Found {label}: {', '.join(matched[:5])}"
-        return False, ""
-
-    i_trig, i_msg = check_list_overlap(analysis.get('iab_topics'), flag_condition.iab_topics, "IAB topics")
-    flags['iab_topics'] = build_flag_entry(i_trig, i_msg)
-    
-    b_trig, b_msg = check_list_overlap(analysis.get('bucket_prompt'), flag_condition.bucket_prompt, "bucket prompts")
-    flags['bucket_prompt'] = build_flag_entry(b_trig, b_msg)
-    
-    g_trig, g_msg = check_list_overlap(analysis.get('general_topics'), flag_condition.general_topics, "general topics")
-    flags['general_topics'] = build_flag_entry(g_trig, g_msg)
-
-    return flags
+    return get_compiled_flag_condition(flag_condition).evaluate(
+        segment.get('transcription'), segment.get('analysis')
+    )
 
 
 def apply_flag_conditions_to_segments(segments, channel, shift=None):
@@ -473,12 +458,12 @@ def apply_flag_conditions_to_segments(segments, channel, shift=None):
         flag_condition = None
 
     # 2. Get Duration Threshold from Shift
-    duration_threshold = None
-    if shift and getattr(shift, 'flag_seconds', None) is not None:
-        try:
-            duration_threshold = int(shift.flag_seconds)
-        except (ValueError, TypeError):
-            pass
+    duration_threshold = get_flag_duration_threshold(shift)
+
+    # Policy flags already stored for the current condition are read instead of recomputed
+    stored_flags = {}
+    if flag_condition:
+        stored_flags = SegmentFlagService.stored_flags([seg['id'] for seg in segments], flag_condition)
 
     # 3. Apply checks
     for seg in segments:
@@ -493,7 +478,9 @@ def apply_flag_conditions_to_segments(segments, channel, shift=None):
             
         # Apply Policy Flags
         if flag_condition:
-            policy_flags = check_flag_conditions(seg, flag_condition)
+            policy_flags = stored_flags.get(seg['id'])
+            if policy_flags is None:
+                policy_flags = check_flag_conditions(seg, flag_condition)
             seg['flag'].update(policy_flags)
     
     return segments
@@ -510,10 +497,89 @@ def has_active_flag_condition(channel):
     return FlagCondition.objects.filter(channel=channel, is_active=True).exists()
 
 
+# ==========================================
+# Flag Predicates (database side)
+# ==========================================
+
+def apply_flag_candidate_filter(queryset, channel, shift=None):
+    """
+    Narrow a segments queryset to the flagged rows, before they are fetched and serialized.
+    Policy flags come from the stored SegmentFlagResult rows (candidates that have none for the
+    current condition are evaluated in Python); the shift duration limit compares duration_seconds.
+    """
+    flag_condition = FlagCondition.objects.filter(channel=channel, is_active=True).first()
+    conditions = []
+    if flag_condition is not None:
+        conditions.append(SegmentFlagService.current_flagged_filter(queryset, flag_condition))
+    duration_filter = build_flag_candidate_filter(None, get_flag_duration_threshold(shift))
+    if duration_filter is not None:
+        conditions.append(duration_filter)
+    if not conditions:
+        return queryset.none()
+    flagged_filter = Q()
+    for condition in conditions:
+        flagged_filter |= condition
+    return queryset.filter(flagged_filter)
+
+
 # ==========================================
 # Pagination & Response
 # ==========================================
 
+class PageIndex(Func):
+    """
+    0-based index of the page_seconds wide page that a datetime expression falls in, counted
+    from origin: floor((expression - origin) / page_seconds).
+    """
+    output_field = IntegerField()
+
+    def __init__(self, expression, origin, page_seconds, **extra):
+        super().__init__(expression, Value(origin, output_field=DateTimeField()), **extra)
+        self.page_seconds = int(page_seconds)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        expression_sql, expression_params = compiler.compile(self.source_expressions[0])
+        origin_sql, origin_params = compiler.compile(self.source_expressions[1])
+        return (
+            f"CAST(FLOOR(EXTRACT(EPOCH FROM ({expression_sql} - {origin_sql})) / {self.page_seconds}) AS integer)",
+            (*expression_params, *origin_params),
+        )
+
+
+def count_segments_per_page(base_start_dt, base_end_dt, page_size, total_pages, channel, valid_windows=None,
+                            status=None, content_type_list=None, search_text=None, search_in=None):
+    """
+    {page index (0-based): distinct segment count} for the hour pages of the range, in one grouped query.
+
+    Matches counting each page with get_segments_queryset: pages (and shift windows) are end-exclusive
+    except the last page, which also takes segments starting exactly at its end. That is the
+    range queryset for [base_start_dt, base_end_dt) OR the inclusive last page queryset.
+    """
+    if total_pages <= 0:
+        return {}
+    last_page_start = base_start_dt + timezone.timedelta(hours=(total_pages - 1) * page_size)
+    queryset = get_segments_queryset(
+        channel, base_start_dt, base_end_dt, valid_windows, status,
+        content_type_list, search_text, search_in, is_last_page=False
+    ) | get_segments_queryset(
+        channel, last_page_start, base_end_dt, valid_windows, status,
+        content_type_list, search_text, search_in, is_last_page=True
+    )
+    rows = (
+        queryset
+        .order_by()
+        .annotate(page_index=PageIndex('start_time', base_start_dt, page_size * 3600))
+        .values('page_index')
+        .annotate(segment_count=Count('id', distinct=True))
+    )
+    page_counts = {}
+    for row in rows:
+        # Segments starting exactly at base_end_dt belong to the last page
+        index = min(row['page_index'], total_pages - 1)
+        page_counts[index] = page_counts.get(index, 0) + row['segment_count']
+    return page_counts
+
+
 def build_pagination_info_v2(base_start_dt, base_end_dt, page, page_size, channel, valid_windows=None, 
                              status=None, content_type_list=None, search_text=None, search_in=None):
     """
@@ -525,6 +591,10 @@ def build_pagination_info_v2(base_start_dt, base_end_dt, page, page_size, channe
     available_pages = []
     total_hours = math.ceil((base_end_dt - base_start_dt).total_seconds() / 3600)
     total_pages_needed = math.ceil(total_hours / page_size)
+    page_counts = count_segments_per_page(
+        base_start_dt, base_end_dt, page_size, total_pages_needed, channel, valid_windows, status,
+        content_type_list, search_text, search_in
+    )
 
     for page_num in range(1, total_pages_needed + 1):
         hour_offset = (page_num - 1) * page_size
@@ -534,13 +604,7 @@ def build_pagination_info_v2(base_start_dt, base_end_dt, page, page_size, channe
         if page_end > base_end_dt:
             page_end = base_end_dt
 
-        is_last_page = (page_num == total_pages_needed)
-
-        page_query = get_segments_queryset(
-            channel, page_start, page_end, valid_windows, status,
-            content_type_list, search_text, search_in, is_last_page
-        )
-        segment_count = page_query.distinct().count()
+        segment_count = page_counts.get(page_num - 1, 0)
 
         available_pages.append({
             'page': page_num,
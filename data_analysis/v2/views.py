@@ -4,6 +4,8 @@ V2 API views for data_analysis app.
 
 import json
 import traceback
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -23,9 +25,12 @@ from data_analysis.v2.service import (
     calculate_pagination_window,
     get_segments_queryset,
     apply_flag_conditions_to_segments,
+    apply_flag_candidate_filter,
     build_pagination_info_v2,
     has_active_flag_condition,
-    flag_entry_is_active
+    flag_entry_is_active,
+    get_keyset_page,
+    iter_segments_keyset,
 )
 
 from data_analysis.serializers import AudioSegmentsSerializer
@@ -42,7 +47,7 @@ def _audio_segments_v2_cache_key(params, channel):
     content_type_str = ",".join(sorted(params.get('content_type') or []))
     status_val = params.get('status')
     status_str = "active" if status_val is True else ("inactive" if status_val is False else "both")
-    return "data_analysis:v2:audio_segments:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s" % (
+    key = "data_analysis:v2:audio_segments:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s" % (
         getattr(channel, 'id', params.get('channel_pk')),
         start_iso,
         end_iso,
@@ -56,11 +61,19 @@ def _audio_segments_v2_cache_key(params, channel):
         params.get('search_in') or "",
         "1" if params.get('show_flagged_only') else "0",
     )
+    if params.get('use_cursor'):
+        key += ":cursor:%s:%s" % (params['limit'], params.get('cursor') or "")
+    return key
 
 
 class ListAudioSegmentsV2View(APIView):
     """
     V2 API endpoint for listing audio segments with comprehensive filtering.
+
+    Without cursor/limit the response is one hour-window page (page, page_size), or the whole
+    range in search, flagged and podcast modes. With cursor and/or limit it is a keyset page of
+    at most `limit` segments plus pagination.next_cursor; stream=true returns every matching
+    segment as NDJSON. Both read the range in fixed-size chunks.
     """
     
     def get(self, request, *args, **kwargs):
@@ -74,8 +87,9 @@ class ListAudioSegmentsV2View(APIView):
             if error_response:
                 return Response(json.loads(error_response.content), status=error_response.status_code)
 
-            cache_key = _audio_segments_v2_cache_key(params, channel)
-            cached = cache.get(cache_key)
+            # Streams are never cached: the point is not to hold the whole range in memory
+            cache_key = None if params.get('stream') else _audio_segments_v2_cache_key(params, channel)
+            cached = cache.get(cache_key) if cache_key else None
             if cached is not None:
                 return Response(cached)
             
@@ -106,6 +120,9 @@ class ListAudioSegmentsV2View(APIView):
                         'error': 'No FlagCondition or Shift Duration limit configured. Cannot filter flagged segments.'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
+            if params.get('use_cursor') or params.get('stream'):
+                return self._keyset_response(params, channel, shift, valid_windows, cache_key)
+
             if skip_pagination:
                 # Query the full requested date range
                 current_page_start = params['base_start_dt']
@@ -136,6 +153,9 @@ class ListAudioSegmentsV2View(APIView):
                 search_in=params.get('search_in'),
                 is_last_page=is_last_page
             )
+            if is_flagged_mode:
+                # Only segments that can be flagged are fetched; the Python check below builds the messages
+                db_segments = apply_flag_candidate_filter(db_segments, channel, shift)
 
             all_segments = AudioSegmentsSerializer.serialize_segments_data(db_segments, channel.timezone)
             
@@ -190,8 +210,97 @@ class ListAudioSegmentsV2View(APIView):
                 'traceback': traceback.format_exc() if __debug__ else None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _keyset_response(self, params, channel, shift, valid_windows, cache_key=None):
+        """
+        Cursor page (or NDJSON stream) over the whole requested range, ordered by (start_time, id).
+        Works in every mode, including search, flagged and podcast channels that have no hour pages.
+        """
+        queryset = get_segments_queryset(
+            channel=channel,
+            start_dt=params['base_start_dt'],
+            end_dt=params['base_end_dt'],
+            valid_windows=valid_windows,
+            status=params.get('status'),
+            content_types=params.get('content_type'),
+            search_text=params.get('search_text'),
+            search_in=params.get('search_in'),
+            is_last_page=True
+        )
+        if valid_windows is not None and not valid_windows:
+            # The shift or predefined filter has no window inside the range
+            queryset = queryset.none()
+        time_range = {
+            'start': TimezoneUtils.convert_to_channel_tz(params['base_start_dt'], channel.timezone),
+            'end': TimezoneUtils.convert_to_channel_tz(params['base_end_dt'], channel.timezone)
+        }
+
+        if params.get('stream'):
+            segments = iter_segments_keyset(
+                queryset, channel, shift, params.get('cursor_position'), bool(params.get('show_flagged_only'))
+            )
+            response = StreamingHttpResponse(
+                self._ndjson_lines(segments, channel, time_range), content_type='application/x-ndjson'
+            )
+            response['Cache-Control'] = 'no-store'
+            return response
+
+        segments, next_cursor = get_keyset_page(
+            queryset, channel, shift,
+            position=params.get('cursor_position'),
+            limit=params['limit'],
+            flagged_only=bool(params.get('show_flagged_only')),
+        )
+        response_data = AudioSegmentsSerializer.build_response(segments, channel)
+        response_data['pagination'] = {
+            'mode': 'cursor',
+            'limit': params['limit'],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'time_range': time_range,
+        }
+        response_data['has_data'] = len(segments) > 0
+
+        if cache_key is not None:
+            cache.set(cache_key, response_data, timeout=AUDIO_SEGMENTS_V2_CACHE_TIMEOUT)
+        return Response(response_data)
+
+    @staticmethod
+    def _ndjson_lines(segments, channel, time_range):
+        """
+        One {"type": "segment"} line per segment, then a {"type": "summary"} line with the counts
+        build_response reports. Statistics are accumulated as the segments go by.
+        """
+        totals = {
+            'total_segments': 0,
+            'total_recognized': 0,
+            'total_unrecognized': 0,
+            'total_with_transcription': 0,
+            'total_with_analysis': 0,
+        }
+        for segment_data, _ in segments:
+            totals['total_segments'] += 1
+            totals['total_recognized' if segment_data['is_recognized'] else 'total_unrecognized'] += 1
+            totals['total_with_transcription'] += segment_data.get('transcription') is not None
+            totals['total_with_analysis'] += segment_data.get('analysis') is not None
+            yield json.dumps({'type': 'segment', 'segment': segment_data}, cls=DjangoJSONEncoder) + "\n"
+
+        yield json.dumps({
+            'type': 'summary',
+            'success': True,
+            **totals,
+            'has_data': totals['total_segments'] > 0,
+            'channel_info': {
+                'channel_id': channel.channel_id,
+                'project_id': channel.project_id,
+                'channel_name': channel.name
+            },
+            'time_range': time_range,
+        }, cls=DjangoJSONEncoder) + "\n"
+
     def _return_empty_response(self, params, channel, cache_key=None):
         """Helper to return consistent empty response structure."""
+        if params.get('use_cursor') or params.get('stream'):
+            return self._keyset_response(params, channel, None, [], cache_key)
         response_data = {
             'success': True,
             'data': [],
@@ -1,7 +1,7 @@
 from datetime import datetime
 import json
 import os
-from urllib.parse import unquote, urlparse
+from urllib.parse import unquote
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
@@ -17,7 +17,8 @@ from core_admin.models import Channel
 from core_admin.repositories import GeneralSettingService
 from data_analysis.models import RevTranscriptionJob, AudioSegments as AudioSegmentsModel, TranscriptionDetail, TranscriptionQueue
 from data_analysis.services.transcription_service import RevAISpeechToText
-from data_analysis.tasks import analyze_transcription_task
+from data_analysis.services.hour_occupancy import HourOccupancyIndex
+from data_analysis.services.rev_callbacks import RevCallbackInboxService
 from data_analysis.serializers import AudioSegmentBulkUpdateRequestSerializer
 
 # Import helper functions from the separate module
@@ -84,6 +85,7 @@ class AudioSegmentBulkIsActiveUpdateView(APIView):
                 is_active=is_active_value,
                 is_manually_processed=True
             )
+            HourOccupancyIndex.on_commit_refresh_ids(segment_ids)
 
             # Fetch updated segments for response (refresh from database)
             updated_segments = AudioSegmentsModel.objects.filter(id__in=segment_ids).values('id', 'is_active', 'start_time', 'end_time')
@@ -611,55 +613,13 @@ class AudioTranscriptionAndAnalysisView(View):
 @method_decorator(csrf_exempt, name='dispatch')
 class RevCallbackView(View):
     def post(self, request, *args, **kwargs):
-        data = json.loads(request.body)
-        # Extract job data from callback
-        job_data = data.get('job', {})
-        
-        # Parse datetime fields
-        created_on = None
-        completed_on = None
-        
-        if job_data.get('created_on'):
-            try:
-                created_on = datetime.fromisoformat(job_data['created_on'].replace('Z', '+00:00'))
-            except ValueError:
-                created_on = timezone.now()
-        
-        if job_data.get('completed_on'):
-            try:
-                completed_on = datetime.fromisoformat(job_data['completed_on'].replace('Z', '+00:00'))
-            except ValueError:
-                completed_on = None
-        
-        # Create or update RevTranscriptionJob record
-        job, created = RevTranscriptionJob.objects.update_or_create(
-            job_id=job_data['id'],
-            defaults={
-                'job_name': job_data.get('name', ''),
-                'media_url': job_data.get('media_url', ''),
-                'status': job_data.get('status', ''),
-                'created_on': created_on,
-                'completed_on': completed_on,
-                'job_type': job_data.get('type', 'async'),
-                'language': job_data.get('language', 'en'),
-                'strict_custom_vocabulary': job_data.get('strict_custom_vocabulary', False),
-                'duration_seconds': job_data.get('duration_seconds'),
-                'failure': job_data.get('failure'),
-                'failure_detail': job_data.get('failure_detail'),
-            }
-        )
-        
-
-        action = 'created' if created else 'updated'
-
-        if job.status == 'transcribed':
-            try:
-                media_url = job_data.get('media_url')
-                parsed_url = urlparse(media_url)
-                analyze_transcription_task.delay(job.pk, parsed_url.path, media_url)
-            except Exception as e:
-                return JsonResponse({'success': False, 'error': str(e)}, status=400)
-        return JsonResponse({'success': True, 'action': action, 'job_id': job.job_id})
+        """Store the Rev.ai callback in the inbox; RevCallbackInboxService applies it asynchronously"""
+        try:
+            data = json.loads(request.body)
+            entry = RevCallbackInboxService.enqueue(data)
+        except (json.JSONDecodeError, ValueError) as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        return JsonResponse({'success': True, 'action': 'queued', 'job_id': entry.job_id})
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -1,5 +1,7 @@
 import requests
 
+from config.http_clients import APIClientRegistry
+
 
 class OpenRouterService:
     BASE_URL = "https://openrouter.ai/api/v1"
@@ -9,7 +11,9 @@ class OpenRouterService:
 
     @staticmethod
     def list_models():
-        response = requests.get(
+        response = APIClientRegistry.request(
+            "openrouter",
+            "GET",
             OpenRouterService.MODELS_ENDPOINT,
             timeout=OpenRouterService.TIMEOUT_SECONDS,
         )
@@ -74,8 +78,11 @@ class OpenRouterService:
         request_body = {key: value for key, value in payload.items() if value is not None}
 
         try:
-            response = requests.post(
+            response = APIClientRegistry.request(
+                "openrouter",
+                "POST",
                 OpenRouterService.CHAT_COMPLETIONS_ENDPOINT,
+                api_key=bearer_token,
                 headers=headers,
                 json=request_body,
                 timeout=OpenRouterService.TIMEOUT_SECONDS,
@@ -151,8 +158,11 @@ class OpenRouterService:
         transcript_total_len = sum(len(str(t or "")) for t in transcripts)
 
         try:
-            response = requests.post(
+            response = APIClientRegistry.request(
+                "openrouter",
+                "POST",
                 OpenRouterService.CHAT_COMPLETIONS_ENDPOINT,
+                api_key=bearer_token,
                 headers=headers,
                 json=request_body,
                 timeout=OpenRouterService.TIMEOUT_SECONDS,